@@ -5,16 +5,21 @@ Created on:     25/03/21, 7:00 pm
 
 Get the API key from http://develop-api.aliceblueonline.com/
 """
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Iterator, Tuple, Callable, Set
 import datetime
 import logging
-import requests
-from bs4 import BeautifulSoup
 import json
 
 from alice_blue_api.config import Config
 from alice_blue_api.exceptions import AliceBlueApiError
+from alice_blue_api.form_parser import parse_form_fields
+from alice_blue_api.http_client import HttpClient
+from alice_blue_api.response_decoder import TransferStats, iter_body, read_json
+from alice_blue_api.token_manager import TokenManager
 from alice_blue_api.instruments import Instrument
+from alice_blue_api.instrument_index import InstrumentIndex
+from alice_blue_api.contract_cache import MasterContractCache
+from alice_blue_api.contract_stream import MasterContractStream
 from alice_blue_api.enums import OptionType, Exchanges
 
 
@@ -30,6 +35,18 @@ class ApiEndpoint:
 class AliceBlueApi:
     """ Class responsible for AliceBlue API. This is a singleton class """
     BASE_URL = "https://ant.aliceblueonline.com"
+    # Underlyings whose option and future instruments are kept from the NFO master contracts
+    NFO_UNDERLYINGS: Tuple[str, ...] = ("BANKNIFTY", "NIFTY")
+    NFO_SEGMENTS: Tuple[str, ...] = ("NSE-OPT", "NSE-FUT")
+    NSE_INDICES: Tuple[str, ...] = ("Nifty 50", "Nifty Bank", "India VIX")
+    STREAM_CHUNK_SIZE: int = 64 * 1024
+    # Pooled HTTP client settings
+    HTTP_POOL_SIZE: int = 10
+    HTTP_TIMEOUT: Tuple[float, float] = (5.0, 30.0)
+    HTTP_MAX_RETRIES: int = 3
+    # Tokens are valid for a day and expire every morning (IST) before the market opens
+    TOKEN_TTL: int = 24 * 3600
+    TOKEN_DAILY_EXPIRY: datetime.time = datetime.time(hour=8, minute=0)
     __instance: Optional["AliceBlueApi"] = None
 
     def __new__(cls, *args, **kwargs):
@@ -46,20 +63,40 @@ class AliceBlueApi:
         self._logger.addHandler(handler)
         self._headers = {
             "Content-Type": "application/json",
+            # Responses are decompressed by response_decoder
+            "Accept-Encoding": "gzip, deflate, br",
         }
-        self._master_contracts_nfo = dict()
-        self._master_contracts_nse = dict()
-        self._options_master_contracts = []
-        self._future_master_contracts = []
         self._nse_indices_contracts = []
-        self._nse_stock_contracts = []
+        self._derivative_instruments: Dict[str, List[Instrument]] = dict()
         self._bnf_instruments: List[Instrument] = []
         self._nifty_instruments: List[Instrument] = []
         self._nifty_index: Optional[Instrument] = None
         self._banknifty_index: Optional[Instrument] = None
         self._india_vix_index: Optional[Instrument] = None
-        self._access_token: str = ""
-        self._auth_token: str = ""
+        self._instrument_index: InstrumentIndex = InstrumentIndex()
+        self._contract_cache: MasterContractCache = MasterContractCache()
+        # Tokens are cached on disk per user and refreshed before they expire
+        self._access_token_name: str = f"{Config.USERNAME}_access_token"
+        self._auth_token_name: str = f"{Config.USERNAME}_auth_token"
+        self._token_manager: TokenManager = TokenManager()
+        self._token_manager.register(
+            self._access_token_name,
+            self.generate_access_token,
+            ttl=self.TOKEN_TTL,
+            daily_expiry=self.TOKEN_DAILY_EXPIRY
+        )
+        self._token_manager.register(
+            self._auth_token_name,
+            self.generate_auth_token,
+            ttl=self.TOKEN_TTL,
+            daily_expiry=self.TOKEN_DAILY_EXPIRY
+        )
+        # Shared by all the API calls so that connections are reused
+        self._http: HttpClient = HttpClient(
+            pool_size=self.HTTP_POOL_SIZE,
+            timeout=self.HTTP_TIMEOUT,
+            max_retries=self.HTTP_MAX_RETRIES
+        )
 
     @classmethod
     def get_handler(cls):
@@ -71,24 +108,51 @@ class AliceBlueApi:
     @classmethod
     def reset(cls):
         """ Method for test purposes. Don't use it in real code """
+        if cls.__instance is not None:
+            cls.__instance._token_manager.stop()
         cls.__instance = None
 
     def api_setup(self):
-        """ Setup APIs """
-        self.refresh_access_token()
-        # self.refresh_auth_token()
-        self._headers["Authorization"] = f"Bearer {self._access_token}"
+        """
+        Setup APIs. Access token of the last login is reused if still valid. Tokens are
+        refreshed in the background before they expire.
+        """
+        self._token_manager.get(self._access_token_name)
+        self._token_manager.start()
 
     def refresh_auth_token(self):
         """ Generate a new auth token """
-        self._auth_token = self.generate_auth_token()
+        self._token_manager.refresh(self._auth_token_name)
 
     def refresh_access_token(self):
         """ Generate a new access token """
-        self._access_token = self.generate_access_token()
+        self._token_manager.refresh(self._access_token_name)
+
+    def get_headers(self) -> Dict:
+        """ Headers of the API calls. Authorization is sent once api_setup loads the token """
+        if self._token_manager.get_token(self._access_token_name) is None:
+            return self._headers
+        return {**self._headers, "Authorization": f"Bearer {self.access_token}"}
+
+    def _create_login_client(self) -> HttpClient:
+        """
+        Short lived client of a login. Background token refresh logs in while other threads
+        use the pooled session, which must not get the cookies of the login pages.
+        """
+        return HttpClient(
+            pool_size=1, timeout=self.HTTP_TIMEOUT, max_retries=self.HTTP_MAX_RETRIES
+        )
 
     def generate_auth_token(self):
         """ This token will be used for alice blue internal API such as to get candle data """
+        http = self._create_login_client()
+        try:
+            return self._user_login(http)
+        finally:
+            http.close()
+
+    def _user_login(self, http: HttpClient) -> str:
+        """ Login and 2FA of the user API. Returns the auth token """
         headers = {
             "Content-Type": "application/json",
             "Accept": "application/json, text/plain, */*",
@@ -98,63 +162,75 @@ class AliceBlueApi:
                           "(KHTML, like Gecko) Chrome/91.0.4472.164 Safari/537.36",
             "x-device-type": "web"
         }
-        with requests.Session() as session:
-            # Send post request to login to get two factor authentication token
-            login_url = f"{self.BASE_URL}{ApiEndpoint.LOGIN}"
-            payload = {
-                "login_id": Config.USERNAME,
-                "password": Config.PASSWORD,
-                "device": "WEB"
-            }
-            response = session.post(url=login_url, data=json.dumps(payload), headers=headers)
-            if not response.ok:
-                self._logger.error(f"Non 200 status code from {login_url}")
-                self._logger.error(response.text)
-                raise AliceBlueApiError("Non 200 status code")
-            # Send post request for two FA authentication
-            data = response.json()["data"]
-            twofa_data = data["twofa"]
-            twofa_token = twofa_data["twofa_token"]
-            twofa_type = twofa_data["type"]
-            twofa_questions = twofa_data["questions"]
-            twofa_url = f"{self.BASE_URL}{ApiEndpoint.TWO_FA}"
-            payload = {
-                "login_id": Config.USERNAME,
-                "twofa": [
-                    {"question_id": str(x["question_id"]), "answer": Config.TWO_FA_ANSWER}
-                    for x in twofa_questions
-                ],
-                "twofa_token": twofa_token,
-                "type": twofa_type
-            }
-            response = session.post(url=twofa_url, data=json.dumps(payload), headers=headers)
-            if not response.ok:
-                self._logger.error(f"Non 200 status code from {twofa_url}")
-                self._logger.error(response.text)
-                raise AliceBlueApiError("Non 200 status code")
-            data = response.json()["data"]
-            return data["auth_token"]
+        # Send post request to login to get two factor authentication token
+        login_url = f"{self.BASE_URL}{ApiEndpoint.LOGIN}"
+        payload = {
+            "login_id": Config.USERNAME,
+            "password": Config.PASSWORD,
+            "device": "WEB"
+        }
+        response = http.request(
+            "POST", login_url, endpoint=ApiEndpoint.LOGIN, data=json.dumps(payload), headers=headers
+        )
+        if not response.ok:
+            self._logger.error(f"Non 200 status code from {login_url}")
+            self._logger.error(response.text)
+            raise AliceBlueApiError("Non 200 status code")
+        # Send post request for two FA authentication
+        data = response.json()["data"]
+        twofa_data = data["twofa"]
+        twofa_token = twofa_data["twofa_token"]
+        twofa_type = twofa_data["type"]
+        twofa_questions = twofa_data["questions"]
+        twofa_url = f"{self.BASE_URL}{ApiEndpoint.TWO_FA}"
+        payload = {
+            "login_id": Config.USERNAME,
+            "twofa": [
+                {"question_id": str(x["question_id"]), "answer": Config.TWO_FA_ANSWER}
+                for x in twofa_questions
+            ],
+            "twofa_token": twofa_token,
+            "type": twofa_type
+        }
+        response = http.request(
+            "POST", twofa_url, endpoint=ApiEndpoint.TWO_FA, data=json.dumps(payload),
+            headers=headers
+        )
+        if not response.ok:
+            self._logger.error(f"Non 200 status code from {twofa_url}")
+            self._logger.error(response.text)
+            raise AliceBlueApiError("Non 200 status code")
+        data = response.json()["data"]
+        return data["auth_token"]
 
     def generate_access_token(self):
         """ Get access token """
-        session = requests.Session()
+        # Login pages keep their state in cookies, so the login gets a session of its own
+        http = self._create_login_client()
+        try:
+            return self._oauth_login(http)
+        finally:
+            http.close()
+
+    def _oauth_login(self, http: HttpClient) -> Optional[str]:
+        """ OAuth page flow (login, 2FA, consent) and exchange of the code for access token """
         url = f"{self.BASE_URL}{ApiEndpoint.AUTHORIZE}?response_type=code&" \
               f"state=test_state&client_id={Config.APPID}&redirect_uri={Config.REDIRECT_URL}"
-        response = session.get(url)
+        response = http.request("GET", url, endpoint=ApiEndpoint.AUTHORIZE)
         if "OAuth 2.0 Error" in response.text:
             self._logger.error(
                 "OAuth 2.0 Error occurred. Please verify your app id and redirect url"
             )
-        soup = BeautifulSoup(response.text, features="html.parser")
-        csrf_token = soup.find("input", attrs={"name": "_csrf_token"})["value"]
-        login_challenge = soup.find("input", attrs={"name": "login_challenge"})["value"]
+        fields = parse_form_fields(response.text, ["_csrf_token", "login_challenge"])
         payload = {
             "client_id": Config.USERNAME,
             "password": Config.PASSWORD,
-            "login_challenge": login_challenge,
-            "_csrf_token": csrf_token
+            "login_challenge": fields.get("login_challenge"),
+            "_csrf_token": fields.get("_csrf_token")
         }
-        response = session.post(response.url, data=payload)
+        response = http.request(
+            "POST", response.url, endpoint="/oauth2/login", data=payload
+        )
         if "Please Enter Valid Password" in response.text:
             self._logger.error("Invalid password")
 
@@ -162,20 +238,19 @@ class AliceBlueApi:
             self._logger.error("Something went wrong at username password stage. "
                                "Not able to redirect to two factor authentication (2FA)")
 
-        question_ids = []
-        soup = BeautifulSoup(response.text, features="html.parser")
-        for x in soup.find_all("input", attrs={"name": "question_id1"}):
-            question_ids.append(x["value"])
-        csrf_token = soup.find("input", attrs={"name": "_csrf_token"})["value"]
-        login_challenge = soup.find("input", attrs={"name": "login_challenge"})["value"]
+        fields = parse_form_fields(
+            response.text, ["question_id1", "_csrf_token", "login_challenge"]
+        )
         payload = {
             "answer1": Config.TWO_FA_ANSWER,
             "answer2": Config.TWO_FA_ANSWER,
-            "question_id1": question_ids,
-            "login_challenge": login_challenge,
-            "_csrf_token": csrf_token
+            "question_id1": fields.get_all("question_id1"),
+            "login_challenge": fields.get("login_challenge"),
+            "_csrf_token": fields.get("_csrf_token")
         }
-        response = session.post(response.url, data=payload)
+        response = http.request(
+            "POST", response.url, endpoint="/oauth2/twofa", data=payload
+        )
         if "Wrong Answers" in response.text:
             self._logger.error("2FA answers are wrong. Make sure all your 2FA answers are same")
 
@@ -186,14 +261,15 @@ class AliceBlueApi:
         if "consent_challenge" in response.url:
             authorize_app_url = response.url
             self._logger.info("Authorizing app for the first time")
-            soup = BeautifulSoup(response.text, features="html.parser")
-            csrf_token = soup.find("input", attrs={"name": "_csrf_token"})["value"]
+            fields = parse_form_fields(response.text, ["_csrf_token"])
             payload = {
-                "_csrf_token": csrf_token,
+                "_csrf_token": fields.get("_csrf_token"),
                 "consent": "Authorize",
                 "scopes": ""
             }
-            response = session.post(response.url, data=payload)
+            response = http.request(
+                "POST", response.url, endpoint="/oauth2/consent", data=payload
+            )
             if not response.ok:
                 self._logger.error(f"Something went wrong while authorizing the app for the first "
                                    f"time. Please authorize manually by going to URL "
@@ -212,7 +288,10 @@ class AliceBlueApi:
             "grant_type": "authorization_code"
         }
         url = f"{self.BASE_URL}{ApiEndpoint.ACCESS_TOKEN}"
-        response = session.post(url, auth=(Config.APPID, Config.APPSECRET), data=payload)
+        response = http.request(
+            "POST", url, endpoint=ApiEndpoint.ACCESS_TOKEN,
+            auth=(Config.APPID, Config.APPSECRET), data=payload
+        )
         json_data = response.json()
         if "access_token" in json_data:
             access_token = json_data["access_token"]
@@ -230,34 +309,89 @@ class AliceBlueApi:
         url = f"{self.BASE_URL}{endpoint}"
         if query_params is not None:
             url = url.format(**query_params)
-        kwargs = {"headers": self._headers}
+        kwargs = {"headers": self.get_headers()}
         self._logger.debug(f"Sending {method.upper()} request to {url}")
         if method.upper() in ["GET"]:
             kwargs["params"] = data
         elif method.upper() in ["POST"]:
             kwargs["data"] = data
-        response = requests.request(method=method.upper(), url=url, **kwargs)
-        if not response.ok:
-            self._logger.error(f"Non 200 status code from {url}")
-            self._logger.error(response.text)
-            raise AliceBlueApiError("Non 200 status code")
-        return response.json()
+        with self._http.request(
+                method, url, endpoint=endpoint, stream=True, **kwargs
+        ) as response:
+            if not response.ok:
+                self._logger.error(f"Non 200 status code from {url}")
+                self._logger.error(response.text)
+                raise AliceBlueApiError("Non 200 status code")
+            stats = TransferStats.create(response, endpoint=f"{method.upper()} {endpoint}")
+            data = read_json(response, stats)
+        self.record_transfer(stats)
+        return data
+
+    def api_stream(
+            self,
+            endpoint: str,
+            method: str,
+            query_params: Optional[Dict] = None
+    ) -> Iterator[bytes]:
+        """ API call which yields the response body in chunks instead of parsing it """
+        url = f"{self.BASE_URL}{endpoint}"
+        if query_params is not None:
+            url = url.format(**query_params)
+        self._logger.debug(f"Streaming {method.upper()} request to {url}")
+        with self._http.request(
+                method, url, endpoint=endpoint, headers=self.get_headers(), stream=True
+        ) as response:
+            if not response.ok:
+                self._logger.error(f"Non 200 status code from {url}")
+                self._logger.error(response.text)
+                raise AliceBlueApiError("Non 200 status code")
+            stats = TransferStats.create(response, endpoint=f"{method.upper()} {endpoint}")
+            try:
+                yield from iter_body(response, stats, self.STREAM_CHUNK_SIZE)
+            finally:
+                # Consumer can stop before the end of the body
+                self.record_transfer(stats)
+
+    def record_transfer(self, stats: TransferStats):
+        """ Add body size of a response to the transfer stats and log it """
+        self._http.record_transfer(stats.endpoint, stats.compressed_bytes, stats.decoded_bytes)
+        self._logger.debug(
+            f"{stats.endpoint}: {stats.compressed_bytes} bytes {stats.encoding}, "
+            f"{stats.decoded_bytes} bytes decoded, headers in {stats.headers_time * 1000:.1f} ms, "
+            f"total {stats.total_time * 1000:.1f} ms"
+        )
 
     def nfo_setup(self):
         """ Get all the required master contracts """
-        self._master_contracts_nfo = self.get_master_contracts(exchange=Exchanges.NFO.name)
-        self._options_master_contracts = self._master_contracts_nfo["NSE-OPT"]
-        self._future_master_contracts = self._master_contracts_nfo["NSE-FUT"]
         self.create_banknifty_instruments()
-        
+
     def nse_setup(self):
         """ Get all the required master contracts for stock and indices """
-        self._master_contracts_nse = self.get_master_contracts(exchange=Exchanges.NSE.name)
-        self._nse_indices_contracts = self._master_contracts_nse["NSE-IND"]
-        self._nse_stock_contracts = self._master_contracts_nse["NSE"]
-        self.create_nifty_index()
-        self.create_banknifty_index()
-        self.create_indiavix_index()
+        indices = self._contract_cache.load(exchange=Exchanges.NSE.name, name="INDICES")
+        if indices is None:
+            self._nse_indices_contracts = [
+                contract for _, contract in self.stream_master_contracts(
+                    exchange=Exchanges.NSE.name,
+                    segments={"NSE-IND"},
+                    predicate=lambda x: x["symbol"] in self.NSE_INDICES
+                )
+            ]
+            self.create_nifty_index()
+            self.create_banknifty_index()
+            self.create_indiavix_index()
+            indices = [
+                x for x in [self._nifty_index, self._banknifty_index, self._india_vix_index]
+                if x is not None
+            ]
+            self._contract_cache.save(
+                exchange=Exchanges.NSE.name, name="INDICES", instruments=indices
+            )
+        else:
+            indices_by_symbol = {x.symbol: x for x in indices}
+            self._nifty_index = indices_by_symbol.get("Nifty 50")
+            self._banknifty_index = indices_by_symbol.get("Nifty Bank")
+            self._india_vix_index = indices_by_symbol.get("India VIX")
+        self._instrument_index.add(indices)
 
     def get_master_contracts(self, exchange):
         """ Get all the tradable contracts of an exchange """
@@ -267,27 +401,67 @@ class AliceBlueApi:
             query_params={"exchange": exchange}
         )
 
+    def stream_master_contracts(
+            self,
+            exchange: str,
+            segments: Optional[Set[str]] = None,
+            predicate: Optional[Callable[[Dict], bool]] = None
+    ) -> Iterator[Tuple[str, Dict]]:
+        """
+        Stream (segment, contract) of an exchange filtered by segments and predicate without
+        holding the full master contracts payload in memory
+        """
+        stream = MasterContractStream(segments=segments, predicate=predicate)
+        chunks = self.api_stream(
+            endpoint=ApiEndpoint.MASTER_CONTRACT,
+            method="GET",
+            query_params={"exchange": exchange}
+        )
+        return stream.iter_contracts(chunks)
+
     def create_banknifty_instruments(self):
-        """ Return list of bnf instruments from master contracts """
-        self._bnf_instruments = [
-            Instrument.create(x)
-            for x in self._options_master_contracts if x["symbol"].startswith("BANKNIFTY")
-        ]
-        self._bnf_instruments += [
-            Instrument.create(x)
-            for x in self._future_master_contracts if x["symbol"].startswith("BANKNIFTY")
-        ]
+        """ Return list of bnf instruments from master contracts cache or network """
+        self._bnf_instruments = self._load_derivative_instruments(symbol="BANKNIFTY")
+        self._instrument_index.add(self._bnf_instruments)
 
     def create_nifty_instruments(self):
-        """ Return list of nifty instruments from master contracts """
-        self._nifty_instruments = [
-            Instrument.create(x)
-            for x in self._options_master_contracts if x["symbol"].startswith("NIFTY")
-        ]
-        self._nifty_instruments += [
-            Instrument.create(x)
-            for x in self._future_master_contracts if x["symbol"].startswith("NIFTY")
-        ]
+        """ Return list of nifty instruments from master contracts cache or network """
+        self._nifty_instruments = self._load_derivative_instruments(symbol="NIFTY")
+        self._instrument_index.add(self._nifty_instruments)
+
+    def _load_derivative_instruments(self, symbol: str) -> List[Instrument]:
+        """ Option and future instruments whose symbol starts with symbol """
+        if symbol not in self._derivative_instruments:
+            instruments = self._contract_cache.load(exchange=Exchanges.NFO.name, name=symbol)
+            if instruments is not None:
+                self._derivative_instruments[symbol] = instruments
+            else:
+                self._stream_derivative_instruments(symbols=set(self.NFO_UNDERLYINGS) | {symbol})
+        return self._derivative_instruments[symbol]
+
+    def _stream_derivative_instruments(self, symbols: Set[str]):
+        """ Stream NFO master contracts once and create instruments of all the symbols """
+        prefixes = tuple(symbols)
+        instruments = {(x, segment): [] for x in symbols for segment in self.NFO_SEGMENTS}
+        contracts = self.stream_master_contracts(
+            exchange=Exchanges.NFO.name,
+            segments=set(self.NFO_SEGMENTS),
+            predicate=lambda x: x["symbol"].startswith(prefixes)
+        )
+        for segment, contract in contracts:
+            instrument = Instrument.create(contract)
+            for symbol in symbols:
+                if instrument.symbol.startswith(symbol):
+                    instruments[(symbol, segment)].append(instrument)
+        for symbol in symbols:
+            # Options followed by futures
+            symbol_instruments = [
+                x for segment in self.NFO_SEGMENTS for x in instruments[(symbol, segment)]
+            ]
+            self._derivative_instruments[symbol] = symbol_instruments
+            self._contract_cache.save(
+                exchange=Exchanges.NFO.name, name=symbol, instruments=symbol_instruments
+            )
 
     def create_nifty_index(self):
         """ Create nifty index NSEIndex """
@@ -320,45 +494,29 @@ class AliceBlueApi:
             self, strike: int, expiry: datetime.date, option_type: OptionType
     ) -> Optional[Instrument]:
         """ Get Call Option instrument by strike and expiry for banknifty """
-        return next(
-            (
-                x for x in self._bnf_instruments
-                if x.option_type == option_type and x.strike == strike and x.expiry == expiry
-            ),
-            None
+        return self._instrument_index.get_option(
+            underlying="BANKNIFTY", expiry=expiry, strike=strike, option_type=option_type
         )
 
     def get_banknifty_future_instrument(self, expiry: datetime.date):
         """ Get future instrument for banknifty """
-        return next(
-            (
-                x for x in self._bnf_instruments
-                if x.option_type == OptionType.FUT and x.expiry == expiry
-            ),
-            None
-        )
+        return self._instrument_index.get_future(underlying="BANKNIFTY", expiry=expiry)
 
     def get_nifty_option_instrument(
             self, strike: int, expiry: datetime.date, option_type: OptionType
     ) -> Optional[Instrument]:
         """ Get Call Option instrument by strike and expiry for nifty"""
-        return next(
-            (
-                x for x in self._nifty_instruments
-                if x.option_type == option_type and x.strike == strike and x.expiry == expiry
-            ),
-            None
+        return self._instrument_index.get_option(
+            underlying="NIFTY", expiry=expiry, strike=strike, option_type=option_type
         )
 
     def get_nifty_future_instrument(self, expiry: datetime.date):
         """ Get future instrument for nifty """
-        return next(
-            (
-                x for x in self._nifty_instruments
-                if x.option_type == OptionType.FUT and x.expiry == expiry
-            ),
-            None
-        )
+        return self._instrument_index.get_future(underlying="NIFTY", expiry=expiry)
+
+    def get_instrument_by_code(self, code: int) -> Optional[Instrument]:
+        """ Get instrument by code """
+        return self._instrument_index.get_by_code(code)
 
     @property
     def banknifty_instruments(self) -> List[Instrument]:
@@ -368,17 +526,37 @@ class AliceBlueApi:
     def nifty_instruments(self) -> List[Instrument]:
         return self._nifty_instruments
 
+    def get_latency_stats(self) -> Dict[str, Dict]:
+        """ Latency summary in milliseconds of every endpoint called """
+        return self._http.get_latency_stats()
+
+    def get_transfer_stats(self) -> Dict[str, Dict[str, int]]:
+        """ Compressed and decoded response bytes of every endpoint called """
+        return self._http.get_transfer_stats()
+
+    @property
+    def http_client(self) -> HttpClient:
+        return self._http
+
+    @property
+    def instrument_index(self) -> InstrumentIndex:
+        return self._instrument_index
+
+    @property
+    def contract_cache(self) -> MasterContractCache:
+        return self._contract_cache
+
+    @property
+    def token_manager(self) -> TokenManager:
+        return self._token_manager
+
     @property
     def access_token(self) -> str:
-        if not self._access_token:
-            self.refresh_access_token()
-        return self._access_token
+        return self._token_manager.get(self._access_token_name)
 
     @property
     def auth_token(self) -> str:
-        if not self._auth_token:
-            self.refresh_auth_token()
-        return self._auth_token
+        return self._token_manager.get(self._auth_token_name)
 
     @property
     def nifty_index(self) -> Instrument:
@@ -0,0 +1,477 @@
+"""
+File:           async_websocket.py
+Author:         Dibyaranjan Sathua
+Created on:     26/10/21, 6:30 pm
+
+Asyncio client of the market data feed. AliceBlueWebSocket needs a thread for run_forever and
+another for the heartbeat. Here one event loop does everything: a reader task receives the
+frames, updates the option chain and passes the decoded ticks to callbacks and async
+iterators, a heartbeat task pings the server, and connection open is an event which is awaited.
+The web socket protocol (RFC 6455) is implemented on asyncio streams, so no extra package or
+thread is needed.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import ssl
+import struct
+
+from alice_blue_api.enums import FeedAction, FeedModes
+from alice_blue_api.exceptions import FeedConnectionError
+from alice_blue_api.instruments import Instrument
+from alice_blue_api.option_chain import OptionChain
+from alice_blue_api.websocket_streams import decode_stream
+
+
+OPCODE_CONTINUATION: int = 0x0
+OPCODE_TEXT: int = 0x1
+OPCODE_BINARY: int = 0x2
+OPCODE_CLOSE: int = 0x8
+OPCODE_PING: int = 0x9
+OPCODE_PONG: int = 0xA
+# Appended to the key of the handshake to compute Sec-WebSocket-Accept
+WS_GUID: str = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MAX_FRAME_SIZE: int = 1 << 20
+
+
+def get_accept_key(key: str) -> str:
+    """ Sec-WebSocket-Accept of a Sec-WebSocket-Key """
+    return base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+
+
+def mask_payload(payload: bytes, mask: bytes) -> bytes:
+    """ XOR payload with the 4 byte mask, as one big integer operation """
+    length = len(payload)
+    if not length:
+        return payload
+    key = (mask * (length // 4 + 1))[:length]
+    return (
+        int.from_bytes(payload, "little") ^ int.from_bytes(key, "little")
+    ).to_bytes(length, "little")
+
+
+def encode_frame(opcode: int, payload: bytes, mask: bool) -> bytes:
+    """ Single (final) frame. Frames sent by a client are masked """
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    length = len(payload)
+    if length < 126:
+        header.append(mask_bit | length)
+    elif length < 65536:
+        header.append(mask_bit | 126)
+        header += struct.pack(">H", length)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack(">Q", length)
+    if mask:
+        key = os.urandom(4)
+        return bytes(header) + key + mask_payload(payload, key)
+    return bytes(header) + payload
+
+
+class FrameReader:
+    """
+    Frames of a stream. Data is read in large chunks and the frames of a chunk are parsed
+    without awaiting, so a burst of ticks costs one read instead of a few awaits per frame.
+    """
+    CHUNK_SIZE: int = 64 * 1024
+
+    def __init__(self, reader: asyncio.StreamReader):
+        self._reader: asyncio.StreamReader = reader
+        self._buffer: bytearray = bytearray()
+        # Start of the next frame in buffer
+        self._pos: int = 0
+
+    async def read(self) -> Tuple[bool, int, bytes]:
+        """ (fin, opcode, payload) of the next frame. Masked payload is unmasked """
+        while True:
+            frame = self._parse()
+            if frame is not None:
+                return frame
+            data = await self._reader.read(self.CHUNK_SIZE)
+            if not data:
+                raise asyncio.IncompleteReadError(bytes(self._buffer[self._pos:]), None)
+            # Only an incomplete frame is left before the position
+            del self._buffer[:self._pos]
+            self._pos = 0
+            self._buffer += data
+
+    def _parse(self) -> Optional[Tuple[bool, int, bytes]]:
+        """ Frame at the position. None if the buffer has only a part of it """
+        buffer, pos = self._buffer, self._pos
+        available = len(buffer) - pos
+        if available < 2:
+            return None
+        first, second = buffer[pos], buffer[pos + 1]
+        length = second & 0x7F
+        header = 2
+        if length == 126:
+            if available < 4:
+                return None
+            length = int.from_bytes(buffer[pos + 2:pos + 4], "big")
+            header = 4
+        elif length == 127:
+            if available < 10:
+                return None
+            length = int.from_bytes(buffer[pos + 2:pos + 10], "big")
+            header = 10
+        if length > MAX_FRAME_SIZE:
+            raise FeedConnectionError(f"Web socket frame of {length} bytes is too large")
+        masked = second & 0x80
+        if masked:
+            header += 4
+        if available < header + length:
+            return None
+        start = pos + header
+        payload = bytes(buffer[start:start + length])
+        if masked:
+            payload = mask_payload(payload, bytes(buffer[start - 4:start]))
+        self._pos = start + length
+        return bool(first & 0x80), first & 0x0F, payload
+
+
+class WebSocketConnection:
+    """
+    Web socket on asyncio streams. Pings are answered while receiving. Writes of the reader
+    (pongs), the heartbeat and the callers are serialised by a lock, as concurrent drain of a
+    stream writer is not supported before Python 3.10.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, mask: bool):
+        """
+        Constructor.
+        Args:
+            reader: Stream after the handshake.
+            writer: Stream after the handshake.
+            mask: Mask the sent frames. True for a client and False for a server.
+        """
+        self._frames: FrameReader = FrameReader(reader)
+        self._writer: asyncio.StreamWriter = writer
+        self._mask: bool = mask
+        self._send_lock = asyncio.Lock()
+        self.closed: bool = False
+
+    @classmethod
+    async def connect(
+            cls,
+            url: str,
+            ssl_context: Optional[ssl.SSLContext] = None,
+            timeout: float = 10.0
+    ) -> "WebSocketConnection":
+        """ Open a client connection to a ws:// or wss:// url """
+        parsed = urlparse(url)
+        if parsed.scheme not in ("ws", "wss"):
+            raise FeedConnectionError(f"Invalid web socket url {url}")
+        secure = parsed.scheme == "wss"
+        if secure and ssl_context is None:
+            ssl_context = ssl.create_default_context()
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(
+                    parsed.hostname, parsed.port or (443 if secure else 80),
+                    ssl=ssl_context if secure else None
+                ),
+                timeout
+            )
+        except (OSError, asyncio.TimeoutError) as err:
+            raise FeedConnectionError(f"Unable to connect to {parsed.netloc}: {err!r}")
+        key = base64.b64encode(os.urandom(16)).decode()
+        path = f"{parsed.path or '/'}{'?' + parsed.query if parsed.query else ''}"
+        writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: {parsed.netloc}\r\nUpgrade: websocket\r\n"
+            f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\n"
+            f"Sec-WebSocket-Version: 13\r\n\r\n".encode()
+        )
+        try:
+            response = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as err:
+            writer.close()
+            raise FeedConnectionError(f"Web socket handshake failed: {err!r}")
+        status, *lines = response.decode("latin-1").split("\r\n")
+        headers = {
+            name.strip().lower(): value.strip()
+            for name, _, value in (x.partition(":") for x in lines if x)
+        }
+        if status.split(" ")[1:2] != ["101"] or \
+                headers.get("sec-websocket-accept") != get_accept_key(key):
+            writer.close()
+            raise FeedConnectionError(f"Web socket handshake failed: {status}")
+        return cls(reader, writer, mask=True)
+
+    async def recv(self) -> Tuple[int, bytes]:
+        """ (opcode, payload) of the next text or binary message """
+        fragments: List[bytes] = []
+        message_opcode = OPCODE_BINARY
+        while True:
+            try:
+                fin, opcode, payload = await self._frames.read()
+            except (OSError, asyncio.IncompleteReadError) as err:
+                self.closed = True
+                raise FeedConnectionError(f"Web socket connection lost: {err!r}")
+            if opcode == OPCODE_PING:
+                await self.send(payload, OPCODE_PONG)
+                continue
+            if opcode == OPCODE_PONG:
+                continue
+            if opcode == OPCODE_CLOSE:
+                code = struct.unpack(">H", payload[:2])[0] if len(payload) >= 2 else 1005
+                await self.close(code)
+                raise FeedConnectionError(f"Web socket closed by peer with code {code}")
+            if opcode != OPCODE_CONTINUATION:
+                message_opcode = opcode
+            if fin and not fragments:
+                return message_opcode, payload
+            fragments.append(payload)
+            if fin:
+                return message_opcode, b"".join(fragments)
+
+    async def send(self, payload: bytes, opcode: int = OPCODE_BINARY):
+        """ Send a message """
+        async with self._send_lock:
+            if self.closed:
+                raise FeedConnectionError("Web socket is closed")
+            try:
+                self._writer.write(encode_frame(opcode, payload, self._mask))
+                await self._writer.drain()
+            except OSError as err:
+                self.closed = True
+                raise FeedConnectionError(f"Web socket connection lost: {err!r}")
+
+    async def close(self, code: int = 1000):
+        """ Send a close frame and close the connection """
+        async with self._send_lock:
+            if self.closed:
+                return
+            self.closed = True
+            try:
+                self._writer.write(
+                    encode_frame(OPCODE_CLOSE, struct.pack(">H", code), self._mask)
+                )
+                await self._writer.drain()
+            except OSError:
+                pass
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except OSError:
+            pass
+
+
+class TickStream:
+    """
+    Async iterator of decoded ticks. It ends when the feed stops. A consumer which falls
+    behind by maxsize ticks loses the oldest ones, counted in dropped.
+    """
+
+    def __init__(self, maxsize: int):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self._ended: bool = False
+        self.dropped: int = 0
+
+    def put(self, tick):
+        """ Add a tick. None ends the stream """
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(tick)
+
+    def __aiter__(self) -> "TickStream":
+        return self
+
+    async def __anext__(self):
+        if self._ended:
+            raise StopAsyncIteration
+        tick = await self._queue.get()
+        if tick is None:
+            self._ended = True
+            raise StopAsyncIteration
+        return tick
+
+
+class AsyncFeedClient:
+    """ Market data feed on an asyncio event loop """
+    WS_ENDPOINT: str = 'wss://ant.aliceblueonline.com/hydrasocket/v2/websocket' \
+                       '?access_token={access_token}'
+    HEARTBEAT_INTERVAL: float = 5.0
+
+    def __init__(
+            self,
+            url: str,
+            option_chain: Optional[OptionChain] = None,
+            mode: FeedModes = FeedModes.COMPACT_MARKETDATA,
+            heartbeat_interval: float = HEARTBEAT_INTERVAL,
+            ssl_context: Optional[ssl.SSLContext] = None
+    ):
+        """
+        Constructor.
+        Args:
+            url: Web socket url of the feed including the access token.
+            option_chain: Updated from every packet if given.
+            mode: Feed mode of the subscriptions.
+            heartbeat_interval: Seconds between the heartbeat pings.
+            ssl_context: SSL context of wss urls. Default context if None.
+        """
+        self._url: str = url
+        self._option_chain: Optional[OptionChain] = option_chain
+        self._mode: FeedModes = mode
+        self._heartbeat_interval: float = heartbeat_interval
+        self._ssl_context: Optional[ssl.SSLContext] = ssl_context
+        self._connection: Optional[WebSocketConnection] = None
+        # Created on start, so that it belongs to the running event loop
+        self._connected: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._callbacks: List[Callable] = []
+        self._streams: List[TickStream] = []
+        # Packets and callbacks which raised, logged and skipped
+        self.errors: int = 0
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+    @classmethod
+    def create(cls, **kwargs) -> "AsyncFeedClient":
+        """ Client of the AliceBlue feed updating the option chain. Logs in if required """
+        from alice_blue_api.api import AliceBlueApi
+        url = cls.WS_ENDPOINT.format(access_token=AliceBlueApi.get_handler().access_token)
+        return cls(url, option_chain=OptionChain.get_instance(), **kwargs)
+
+    async def start(self):
+        """ Connect and start the reader and heartbeat tasks """
+        if self._connected is None:
+            self._connected = asyncio.Event()
+        self._connection = await WebSocketConnection.connect(
+            self._url, ssl_context=self._ssl_context
+        )
+        self._connected.set()
+        self._tasks = [
+            asyncio.create_task(self._read()),
+            asyncio.create_task(self._send_heartbeat()),
+        ]
+
+    async def wait_until_connection_open(self, timeout: Optional[float] = None):
+        """ Wait till the web socket connection is open. Call after start is scheduled """
+        if self._connected is None:
+            self._connected = asyncio.Event()
+        await asyncio.wait_for(self._connected.wait(), timeout)
+
+    async def _read(self):
+        """ Receive and dispatch packets till the connection is closed """
+        try:
+            while True:
+                opcode, message = await self._connection.recv()
+                if opcode != OPCODE_BINARY:
+                    continue
+                try:
+                    self.dispatch(message)
+                except Exception as err:
+                    # A bad packet should not stop the reader
+                    self.errors += 1
+                    self._logger.exception(f"Error dispatching feed packet: {err}")
+        except FeedConnectionError as err:
+            self._logger.warning(f"Feed stopped. {err}")
+        finally:
+            self._connected.clear()
+            for stream in self._streams:
+                stream.put(None)
+
+    def dispatch(self, message: bytes):
+        """
+        Update the option chain from a packet and pass the decoded tick to the callbacks and
+        tick streams. Packet is decoded once, and only if there is a consumer.
+        """
+        if not self._callbacks and not self._streams:
+            if self._option_chain is not None:
+                self._option_chain.update_from_stream(message)
+            return
+        tick = decode_stream(message)
+        if tick is None:
+            return
+        if self._option_chain is not None:
+            self._option_chain.update_decoded(tick)
+        for callback in self._callbacks:
+            try:
+                callback(tick)
+            except Exception as err:
+                # A failing callback should not stop the other consumers
+                self.errors += 1
+                self._logger.exception(f"Error in tick callback: {err}")
+        for stream in self._streams:
+            stream.put(tick)
+
+    def add_callback(self, callback: Callable):
+        """ Call callback with every decoded tick. It runs on the event loop, so keep it quick """
+        self._callbacks.append(callback)
+
+    def remove_callback(self, callback: Callable):
+        """ Remove a callback """
+        self._callbacks.remove(callback)
+
+    def ticks(self, maxsize: int = 10000) -> TickStream:
+        """ Async iterator of the decoded ticks received from now on """
+        stream = TickStream(maxsize)
+        self._streams.append(stream)
+        return stream
+
+    def close_ticks(self, stream: TickStream):
+        """ Stop a tick stream """
+        self._streams.remove(stream)
+        stream.put(None)
+
+    async def _send_heartbeat(self):
+        """ Ping with the heartbeat message to keep the connection alive """
+        data = json.dumps({"a": FeedAction.HEARTBEAT.value, "v": [], "m": ""}).encode()
+        while True:
+            await asyncio.sleep(self._heartbeat_interval)
+            try:
+                await self._connection.send(data, OPCODE_PING)
+            except FeedConnectionError:
+                return
+
+    async def send(self, data: Dict):
+        """ Send a json message """
+        if not self.connected:
+            raise FeedConnectionError("Feed is not connected")
+        await self._connection.send(json.dumps(data).encode(), OPCODE_TEXT)
+
+    async def subscribe(self, instruments: List[Instrument]):
+        """ Subscribe the instruments in the feed mode """
+        await self.send({
+            "a": FeedAction.SUBSCRIBE.value,
+            "v": [(x.exchange_code, x.code) for x in instruments],
+            "m": self._mode.value
+        })
+
+    async def unsubscribe(self, instruments: List[Instrument]):
+        """ Unsubscribe the instruments """
+        await self.send({
+            "a": FeedAction.UNSUBSCRIBE.value,
+            "v": [(x.exchange_code, x.code) for x in instruments],
+            "m": self._mode.value
+        })
+
+    async def close(self):
+        """ Stop the tasks and close the connection """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._connection is not None:
+            await self._connection.close()
+        if self._connected is not None:
+            self._connected.clear()
+        for stream in self._streams:
+            stream.put(None)
+
+    async def __aenter__(self) -> "AsyncFeedClient":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    @property
+    def connected(self) -> bool:
+        return self._connected is not None and self._connected.is_set()
@@ -3,14 +3,20 @@ File:           candle.py
 Author:         Dibyaranjan Sathua
 Created on:     24/07/21, 8:04 pm
 """
-from typing import Optional, List, Dict, Tuple
+from typing import Optional, List, Dict, Iterable, Iterator, Sequence, Tuple
 import datetime
 from dataclasses import dataclass
 import requests
-import brotli
-import json
+import numpy as np
 import enum
 from alice_blue_api.api import AliceBlueApi
+from alice_blue_api.enums import CandleTimeFrame
+from alice_blue_api.response_decoder import TransferStats, read_json
+from alice_blue_api.timezone import IST
+from candles.container import CandleContainer, LazyCandles
+from candles.exceptions import CandleStoreError
+from candles.fetcher import CandleFetcher, CandleJob, CandleResult
+from candles.store import CandleStore, CandleKey, rows_to_records
 
 
 @dataclass()
@@ -40,16 +46,21 @@ class InstrumentCandle:
             open_interest=data[6] if len(data) == 7 else None
         )
 
-
-class CandleTimeFrame(enum.IntEnum):
-    """ Candle timeframe """
-    ONE_MINUTE = 1
-    FIVE_MINUTE = 2
-    FIFTEEN_MINUTE = 3
-    THIRTY_MINUTE = 4
-    ONE_HOUR = 5
-    FOUR_HOUR = 6
-    ONE_DAY = 7
+    @classmethod
+    def from_record(cls, record: Tuple):
+        """ Create object from a candle store record """
+        timestamp, open_, high, low, close, volume, open_interest = record
+        timestamp = datetime.datetime.fromtimestamp(timestamp, tz=IST)
+        return cls(
+            date=timestamp.date(),
+            time=timestamp.time(),
+            open=open_,
+            high=high,
+            low=low,
+            close=close,
+            volume=volume,
+            open_interest=None if open_interest != open_interest else open_interest
+        )
 
 
 class CandleExchange(enum.Enum):
@@ -62,27 +73,43 @@ class CandleExchange(enum.Enum):
 class CandleApi:
     """ Alice blue internal API to get candle data of an instrument """
     BASE_URL: str = "https://ant.aliceblueonline.com/api/v1/charts/tdv"
+    # Longest range in days of a request. Longer ranges are fetched in chunks by fetch_many
+    MAX_RANGE_DAYS: Dict[CandleTimeFrame, int] = {
+        CandleTimeFrame.ONE_MINUTE: 60,
+        CandleTimeFrame.FIVE_MINUTE: 100,
+        CandleTimeFrame.FIFTEEN_MINUTE: 200,
+        CandleTimeFrame.THIRTY_MINUTE: 200,
+        CandleTimeFrame.ONE_HOUR: 400,
+        CandleTimeFrame.FOUR_HOUR: 400,
+        CandleTimeFrame.ONE_DAY: 2000,
+    }
 
     @classmethod
-    def for_nse_indices(cls):
+    def for_nse_indices(cls, store: Optional[CandleStore] = None):
         """ API for nse indices instruments """
-        return cls(exchange=CandleExchange.NSE_INDICES)
+        return cls(exchange=CandleExchange.NSE_INDICES, store=store)
 
     @classmethod
-    def for_nfo(cls):
+    def for_nfo(cls, store: Optional[CandleStore] = None):
         """ APT for nfo instruments """
-        return cls(exchange=CandleExchange.NFO)
+        return cls(exchange=CandleExchange.NFO, store=store)
 
     @classmethod
-    def for_nse(cls):
+    def for_nse(cls, store: Optional[CandleStore] = None):
         """ API for nse stocks instruments """
-        return cls(exchange=CandleExchange.NSE)
+        return cls(exchange=CandleExchange.NSE, store=store)
 
-    def __init__(self, exchange: CandleExchange):
+    def __init__(self, exchange: CandleExchange, store: Optional[CandleStore] = None):
         self._exchange: CandleExchange = exchange
-        self._candles: List[InstrumentCandle] = []
+        # Candles are served from the store and only missing ranges are downloaded
+        self._store: Optional[CandleStore] = store
+        self._candles: Sequence[InstrumentCandle] = []
+        # Time index of the candles
+        self._container: CandleContainer = CandleContainer.from_candles([])
         self._request_successful: bool = False
         self._today: Optional[datetime.date] = None
+        # Bytes and time of the last response
+        self._transfer_stats: Optional[TransferStats] = None
         self._alice_blue_api_handler: AliceBlueApi = AliceBlueApi.get_handler()
 
     def send_request(
@@ -94,31 +121,136 @@ class CandleApi:
             open_interest: bool = False     # For future use
     ):
         """ Send API request and create InstrumentCandle """
-        headers = self.get_headers()
-        params = self.get_query_params(
+        if self._store is not None:
+            self._send_request_with_store(instrument_token, timeframe, from_date, to_date)
+            return None
+        response = self._fetch(
             instrument_token=instrument_token,
             timeframe=timeframe,
             from_date=from_date,
             to_date=to_date
         )
-        with requests.Session() as session:
-            response = session.get(url=self.BASE_URL, params=params, headers=headers)
         if response.ok:
             self._request_successful = True
-            # Check the content encoding
-            # content_encoding = response.headers.get("Content-Encoding", "")
-            # if content_encoding == "br":
-            #     response_data = json.loads(brotli.decompress(response.content))
-            #     self._candles = self._get_candles(response_data)
-            # else:
-            #     print(
-            #         f"Content-Encoding is {content_encoding}. "
-            #         f"Currenly only br encoding is supported."
-            #     )
-            self._candles = self._get_candles(response.json())
+            self._set_candles(self._get_candles(self._read_json(response)))
         else:
+            # Error body is read so that the connection goes back to the pool
+            response.content
             print("Error fetching data using AliceBlue internal API.")
 
+    def _fetch(
+            self,
+            instrument_token: int,
+            timeframe: CandleTimeFrame,
+            from_date: datetime.datetime,
+            to_date: datetime.datetime
+    ) -> requests.Response:
+        """ Send candle API request """
+        headers = self.get_headers()
+        params = self.get_query_params(
+            instrument_token=instrument_token,
+            timeframe=timeframe,
+            from_date=from_date,
+            to_date=to_date
+        )
+        # Body is decoded by _read_json
+        return self._alice_blue_api_handler.http_client.request(
+            "GET", self.BASE_URL, params=params, headers=headers, stream=True
+        )
+
+    def _read_json(self, response: requests.Response) -> Dict:
+        """
+        Decompress (br, gzip) the response body chunk by chunk and parse it. Bytes and time
+        of the response are kept in transfer_stats.
+        """
+        with response:
+            stats = TransferStats.create(response, endpoint=f"GET {self.BASE_URL}")
+            data = read_json(response, stats)
+        self._transfer_stats = stats
+        self._alice_blue_api_handler.record_transfer(stats)
+        return data
+
+    def _send_request_with_store(
+            self,
+            instrument_token: int,
+            timeframe: CandleTimeFrame,
+            from_date: datetime.datetime,
+            to_date: datetime.datetime
+    ):
+        """ Get candles from the store fetching only the missing ranges """
+        def fetch(start: int, end: int):
+            response = self._fetch(
+                instrument_token=instrument_token,
+                timeframe=timeframe,
+                from_date=datetime.datetime.fromtimestamp(start),
+                to_date=datetime.datetime.fromtimestamp(end)
+            )
+            if not response.ok:
+                response.content
+                raise CandleStoreError(
+                    f"Candle API returned {response.status_code} for {instrument_token}"
+                )
+            return self._get_candles(self._read_json(response))
+
+        key = self._get_key(instrument_token, timeframe)
+        try:
+            records = self._store.get(
+                key, int(from_date.timestamp()), int(to_date.timestamp()), fetch
+            )
+        except CandleStoreError as err:
+            print(f"Error fetching data using AliceBlue internal API. {err}")
+            return None
+        self._request_successful = True
+        self._set_candles(records)
+
+    def fetch_many(
+            self,
+            jobs: Iterable[CandleJob],
+            max_workers: int = 8,
+            rate_limit: float = 10.0
+    ) -> Iterator[CandleResult]:
+        """
+        Fetch candles of many instruments (job timeframe is CandleTimeFrame) in parallel on
+        the pooled HTTP client of the API. Results are yielded as the jobs complete.
+        """
+        max_range = {x: days * 86400 for x, days in self.MAX_RANGE_DAYS.items()}
+        with CandleFetcher(
+                get_request=self._get_request,
+                headers=self.get_headers(),
+                max_workers=max_workers,
+                rate_limit=rate_limit,
+                max_range=max_range,
+                parse=lambda response: self._get_candles(self._read_json(response)),
+                store=self._store,
+                get_key=lambda job: self._get_key(job.token, job.timeframe),
+                http_client=self._alice_blue_api_handler.http_client
+        ) as fetcher:
+            yield from fetcher.fetch(jobs)
+
+    def _get_request(self, job: CandleJob) -> Tuple[str, Dict]:
+        """ URL and query params of the request of a job """
+        params = self.get_query_params(
+            instrument_token=job.token,
+            timeframe=job.timeframe,
+            from_date=datetime.datetime.fromtimestamp(job.start),
+            to_date=datetime.datetime.fromtimestamp(job.end)
+        )
+        return self.BASE_URL, params
+
+    def _get_key(self, instrument_token: int, timeframe: CandleTimeFrame) -> CandleKey:
+        """ Candle store key of an instrument """
+        return CandleKey(
+            source="aliceblue",
+            exchange=self._exchange.value,
+            token=instrument_token,
+            timeframe=timeframe.name
+        )
+
+    def _set_candles(self, records: np.ndarray):
+        """ Index the candles. InstrumentCandle objects are created only when accessed """
+        self._container = CandleContainer(records)
+        self._candles = LazyCandles(self._container, InstrumentCandle.from_record)
+
     def get_todays_open_price(self) -> Optional[float]:
         """ Return today's open price """
         nine_fifteen_candle = self.get_todays_price_by_time(time=datetime.time(hour=9, minute=15))
@@ -128,28 +260,20 @@ class CandleApi:
     def get_todays_price_by_time(self, time: datetime.time) -> InstrumentCandle:
         """ Return today's price by time """
         today = self._today if self._today is not None else datetime.date.today()
-        candle = next((x for x in self._candles if x.date == today and x.time == time), None)
-        if candle is not None:
-            return candle
+        pos = self._container.find(today, time)
+        if pos is not None:
+            return self._candles[pos]
         print(f"No candle data for date {today} and time {time}")
 
     def get_previous_trading_day_high_low(self) -> Tuple[Optional[float], Optional[float]]:
         """ Return previous trading day's high low """
         today = self._today if self._today is not None else datetime.date.today()
         # Previous day can be a non-trading day. So check up to today - 5
-        for day in range(1, 6):
-            time_delta = datetime.timedelta(days=day)
-            previous_day = today - time_delta
-            candles = [x for x in self._candles if x.date == previous_day]
-            if candles:
-                break
-        else:
-            # Executed if for loop is not terminated by break statement
+        previous_day = self._container.get_previous_trading_day(today, max_days=5)
+        if previous_day is None:
             print("No candles data found for the last 5 days")
             return None, None
-        high = max(x.high for x in candles)
-        low = min(x.low for x in candles)
-        return high, low
+        return self._container.get_day_high_low(previous_day)
 
     def get_query_params(
             self,
@@ -201,15 +325,22 @@ class CandleApi:
         return headers
 
     @staticmethod
-    def _get_candles(json_data: Dict):
-        """ Convert json data into list on InstrumentCandles """
-        candles = json_data["data"]["candles"]
-        return [InstrumentCandle.create(x) for x in candles]
+    def _get_candles(json_data: Dict) -> np.ndarray:
+        """ Convert json data into candle records """
+        return rows_to_records(json_data["data"]["candles"])
 
     @property
-    def candles(self) -> List[InstrumentCandle]:
+    def candles(self) -> Sequence[InstrumentCandle]:
         return self._candles
 
+    @property
+    def container(self) -> CandleContainer:
+        return self._container
+
+    @property
+    def transfer_stats(self) -> Optional[TransferStats]:
+        return self._transfer_stats
+
     @property
     def request_successful(self) -> bool:
         return self._request_successful
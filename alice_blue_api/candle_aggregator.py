@@ -0,0 +1,283 @@
+"""
+File:           candle_aggregator.py
+Author:         Dibyaranjan Sathua
+Created on:     16/10/21, 6:20 pm
+
+Build OHLCV bars of every candle timeframe from the websocket ticks. Bars are aligned to the
+session start (9:15 IST) like the exchange candles and the last bar of the day ends at the
+session end (15:30 IST). A bar is closed by the first tick of a later bar or by a timer thread
+at the bar end, whichever comes first, and bar close callbacks are called with the closed bar.
+"""
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+from collections import deque
+from dataclasses import dataclass, replace
+import datetime
+import logging
+import threading
+import time
+
+from alice_blue_api.enums import CandleTimeFrame
+
+
+TIMEFRAME_SECONDS: Dict[CandleTimeFrame, int] = {
+    CandleTimeFrame.ONE_MINUTE: 60,
+    CandleTimeFrame.FIVE_MINUTE: 300,
+    CandleTimeFrame.FIFTEEN_MINUTE: 900,
+    CandleTimeFrame.THIRTY_MINUTE: 1800,
+    CandleTimeFrame.ONE_HOUR: 3600,
+    CandleTimeFrame.FOUR_HOUR: 14400,
+    CandleTimeFrame.ONE_DAY: 86400,
+}
+SECONDS_IN_DAY: int = 86400
+
+
+@dataclass()
+class Bar:
+    """ OHLCV bar. start is epoch seconds and volume is the volume traded within the bar """
+    __slots__ = ("code", "timeframe", "start", "open", "high", "low", "close", "volume")
+    code: int
+    timeframe: CandleTimeFrame
+    start: int
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: int
+
+    @property
+    def start_time(self) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(self.start)
+
+
+class _BarSeries:
+    """ Current bar and bounded history of closed bars of an instrument and timeframe """
+    __slots__ = ("timeframe", "seconds", "bar", "end", "history")
+
+    def __init__(self, timeframe: CandleTimeFrame, history: int):
+        self.timeframe: CandleTimeFrame = timeframe
+        self.seconds: int = TIMEFRAME_SECONDS[timeframe]
+        self.bar: Optional[Bar] = None
+        # End of the current bar, or of the last closed bar if there is no current bar
+        self.end: int = 0
+        self.history: Deque[Bar] = deque(maxlen=history)
+
+
+class CandleAggregator:
+    """
+    Aggregate ticks of many instruments into bars of multiple timeframes.
+    update_tick has the signature of an option chain tick listener.
+    """
+    SESSION_START: datetime.time = datetime.time(hour=9, minute=15)
+    SESSION_END: datetime.time = datetime.time(hour=15, minute=30)
+    # IST
+    SESSION_OFFSET: int = 19800
+    DEFAULT_HISTORY: int = 400
+
+    def __init__(
+            self,
+            timeframes: Optional[Iterable[CandleTimeFrame]] = None,
+            history: int = DEFAULT_HISTORY,
+            close_delay: float = 0.1
+    ):
+        """
+        Constructor.
+        Args:
+            timeframes: Timeframes to build. All timeframes if None.
+            history: Number of closed bars kept per instrument and timeframe.
+            close_delay: Seconds after the bar end at which the timer closes the bar. Gives
+            time to the ticks stamped just before the bar end to arrive.
+        """
+        self._timeframes: Tuple[CandleTimeFrame, ...] = tuple(
+            sorted(CandleTimeFrame if timeframes is None else set(timeframes))
+        )
+        self._history: int = history
+        self._close_delay: float = close_delay
+        self._series: Dict[int, Tuple[_BarSeries, ...]] = dict()
+        # Last cumulative volume of the day of every instrument
+        self._last_volume: Dict[int, int] = dict()
+        self._callbacks: List[Tuple[Optional[CandleTimeFrame], Callable[[Bar], None]]] = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._timer_thread: Optional[threading.Thread] = None
+        self._session_start: int = self.SESSION_START.hour * 3600 + self.SESSION_START.minute * 60
+        self._session_end: int = self.SESSION_END.hour * 3600 + self.SESSION_END.minute * 60
+        self.late_ticks: int = 0
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+    def add_bar_close_callback(
+            self,
+            callback: Callable[[Bar], None],
+            timeframe: Optional[CandleTimeFrame] = None
+    ):
+        """ Call callback with every closed bar of a timeframe (all timeframes if None) """
+        self._callbacks.append((timeframe, callback))
+
+    def get_bar_range(self, timestamp: int, seconds: int) -> Tuple[int, int]:
+        """ (start, end) in epoch seconds of the bar of length seconds containing timestamp """
+        local = timestamp + self.SESSION_OFFSET
+        day_start = local - local % SECONDS_IN_DAY
+        if seconds >= SECONDS_IN_DAY:
+            return day_start - self.SESSION_OFFSET, day_start + seconds - self.SESSION_OFFSET
+        session_start = day_start + self._session_start
+        start = session_start + (local - session_start) // seconds * seconds
+        end = start + seconds
+        session_end = day_start + self._session_end
+        if start < session_end < end:
+            end = session_end
+        return start - self.SESSION_OFFSET, end - self.SESSION_OFFSET
+
+    def update_tick(self, code: int, ltp: float, volume: int, timestamp: int):
+        """ Add a tick. volume is the cumulative volume of the day """
+        closed = []
+        with self._lock:
+            series_list = self._series.get(code)
+            last_volume = self._last_volume.get(code)
+            if series_list is None:
+                series_list = self._series[code] = tuple(
+                    _BarSeries(x, self._history) for x in self._timeframes
+                )
+            self._last_volume[code] = volume
+            if last_volume is None:
+                # Volume traded before the first tick is unknown
+                traded = 0
+            else:
+                # Volume drops when a new day starts
+                traded = volume - last_volume if volume >= last_volume else volume
+            for series in series_list:
+                bar = series.bar
+                if timestamp < series.end:
+                    if bar is None:
+                        # Tick of a bar already closed by the timer
+                        self.late_ticks += 1
+                        continue
+                    if ltp > bar.high:
+                        bar.high = ltp
+                    elif ltp < bar.low:
+                        bar.low = ltp
+                    bar.close = ltp
+                    bar.volume += traded
+                    continue
+                if bar is not None:
+                    series.history.append(bar)
+                    closed.append(bar)
+                start, series.end = self.get_bar_range(timestamp, series.seconds)
+                series.bar = Bar(code, series.timeframe, start, ltp, ltp, ltp, ltp, traded)
+        if closed:
+            self._on_bars_closed(closed)
+
+    def close_due_bars(self, now: Optional[float] = None) -> int:
+        """ Close the bars ending at or before now (epoch seconds). Returns number of bars """
+        if now is None:
+            now = time.time()
+        closed = []
+        with self._lock:
+            for series_list in self._series.values():
+                for series in series_list:
+                    if series.bar is not None and series.end <= now:
+                        series.history.append(series.bar)
+                        closed.append(series.bar)
+                        series.bar = None
+        if closed:
+            self._on_bars_closed(closed)
+        return len(closed)
+
+    def fill_bars(self, bars: Iterable[Bar]) -> int:
+        """
+        Add closed bars missed by the feed (for example fetched from the candle API after a
+        reconnect) to the history. Bars of instruments without any tick, bars already in the
+        history and bars not older than the current bar are skipped. Bar close callbacks are
+        not called. Returns the number of bars added.
+        """
+        added = 0
+        with self._lock:
+            new_bars: Dict[int, List[Bar]] = dict()
+            series_by_id: Dict[int, _BarSeries] = dict()
+            for bar in bars:
+                series = self._get_series(bar.code, bar.timeframe)
+                if series is None or (series.bar is not None and bar.start >= series.bar.start):
+                    continue
+                series_by_id[id(series)] = series
+                new_bars.setdefault(id(series), []).append(bar)
+            for key, bars_to_add in new_bars.items():
+                series = series_by_id[key]
+                starts = {x.start for x in series.history}
+                bars_to_add = [x for x in bars_to_add if x.start not in starts]
+                if bars_to_add:
+                    history = sorted([*series.history, *bars_to_add], key=lambda x: x.start)
+                    series.history = deque(history, maxlen=self._history)
+                    added += len(bars_to_add)
+        return added
+
+    def _on_bars_closed(self, bars: List[Bar]):
+        """ Call the bar close callbacks. Exception in a callback doesn't stop the others """
+        for bar in bars:
+            for timeframe, callback in self._callbacks:
+                if timeframe is None or timeframe == bar.timeframe:
+                    try:
+                        callback(bar)
+                    except Exception as err:
+                        self._logger.exception(f"Error in bar close callback {callback}: {err}")
+
+    def _run_timer(self):
+        """ Wake up at every bar boundary of the smallest timeframe and close the due bars """
+        seconds = TIMEFRAME_SECONDS[self._timeframes[0]]
+        while not self._stop_event.is_set():
+            now = time.time()
+            _, end = self.get_bar_range(int(now), seconds)
+            if self._stop_event.wait(end + self._close_delay - now):
+                break
+            self.close_due_bars(time.time() - self._close_delay)
+
+    def start(self):
+        """ Start the timer thread closing bars at their end """
+        if self._timer_thread is not None or not self._timeframes:
+            return
+        self._stop_event.clear()
+        self._timer_thread = threading.Thread(target=self._run_timer)
+        self._timer_thread.daemon = True
+        self._timer_thread.start()
+
+    def stop(self):
+        """ Stop the timer thread """
+        self._stop_event.set()
+        if self._timer_thread is not None:
+            self._timer_thread.join()
+            self._timer_thread = None
+
+    def _get_series(self, code: int, timeframe: CandleTimeFrame) -> Optional[_BarSeries]:
+        """ Bar series of an instrument and timeframe """
+        series_list = self._series.get(code)
+        if series_list is None or timeframe not in self._timeframes:
+            return None
+        return series_list[self._timeframes.index(timeframe)]
+
+    def get_bars(self, code: int, timeframe: CandleTimeFrame) -> List[Bar]:
+        """ Closed bars of an instrument, oldest first """
+        with self._lock:
+            series = self._get_series(code, timeframe)
+            return [] if series is None else list(series.history)
+
+    def get_current_bar(self, code: int, timeframe: CandleTimeFrame) -> Optional[Bar]:
+        """ Copy of the bar being built. None if the last bar is closed """
+        with self._lock:
+            series = self._get_series(code, timeframe)
+            if series is None or series.bar is None:
+                return None
+            return replace(series.bar)
+
+    def get_bar(
+            self,
+            code: int,
+            timeframe: CandleTimeFrame,
+            start: datetime.datetime
+    ) -> Optional[Bar]:
+        """ Bar starting at start. Current bar is returned as a copy """
+        timestamp = int(start.timestamp())
+        current = self.get_current_bar(code, timeframe)
+        if current is not None and current.start == timestamp:
+            return current
+        return next((x for x in self.get_bars(code, timeframe) if x.start == timestamp), None)
+
+    @property
+    def timeframes(self) -> Tuple[CandleTimeFrame, ...]:
+        return self._timeframes
@@ -0,0 +1,137 @@
+"""
+File:           conflation.py
+Author:         Dibyaranjan Sathua
+Created on:     28/10/21, 7:10 pm
+
+Conflated subscriptions for consumers which only need the latest state of their instruments.
+Ticks are not queued for the consumer. A tick only sets the dirty flag of its instrument in the
+subscriptions of the instrument, and the consumer takes a snapshot of the dirty instruments from
+the tick store when it is ready, at most max_rate times a second. Work done by the consumer is
+proportional to the number of instruments changed, not to the number of ticks received.
+"""
+from typing import Dict, Iterable, Optional, Set, Tuple
+import threading
+import time
+
+from alice_blue_api.tick_store import TickStore, TickSnapshot
+
+
+class ConflatedSubscription:
+    """ Latest state of a set of instruments, delivered at most max_rate times a second """
+
+    def __init__(self, tick_store: TickStore, codes: Iterable[int], max_rate: Optional[float]):
+        self._tick_store: TickStore = tick_store
+        self._codes: frozenset = frozenset(codes)
+        self._interval: float = 1 / max_rate if max_rate else 0.0
+        # Codes which got a tick since the last delivery
+        self._dirty: Set[int] = set()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._next_delivery: float = 0.0
+        self._closed: bool = False
+        # Number of polls which returned a snapshot and of instrument rows in them
+        self.deliveries: int = 0
+        self.updates: int = 0
+
+    def mark(self, code: int):
+        """ Set the dirty flag of an instrument. Called by the tick writer after the write """
+        # Already dirty: the next snapshot is taken after this tick was written
+        if code in self._dirty:
+            return
+        with self._lock:
+            self._dirty.add(code)
+            if len(self._dirty) == 1:
+                self._changed.notify()
+
+    def poll(self, timeout: Optional[float] = None) -> Optional[TickSnapshot]:
+        """
+        Snapshot of the instruments changed since the previous poll. Waits till the rate limit
+        allows a delivery and an instrument has changed. None on timeout or if closed.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        wait = self._next_delivery - time.monotonic()
+        if wait > 0:
+            if deadline is not None and time.monotonic() + wait > deadline:
+                time.sleep(max(deadline - time.monotonic(), 0))
+                return None
+            time.sleep(wait)
+        with self._changed:
+            while not self._dirty and not self._closed:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._changed.wait(remaining)
+            if self._closed:
+                return None
+            dirty, self._dirty = self._dirty, set()
+        self._next_delivery = time.monotonic() + self._interval
+        snapshot = self._tick_store.snapshot(dirty)
+        self.deliveries += 1
+        self.updates += len(dirty)
+        return snapshot
+
+    def close(self):
+        """ Wake up a waiting poll. Later polls return None """
+        with self._lock:
+            self._closed = True
+            self._changed.notify_all()
+
+    @property
+    def codes(self) -> frozenset:
+        return self._codes
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+
+class Conflator:
+    """
+    Routes ticks to the conflated subscriptions of their instrument.
+    update_tick has the signature of an option chain tick listener.
+    """
+
+    def __init__(self, tick_store: TickStore):
+        self._tick_store: TickStore = tick_store
+        # Code to subscriptions of the code. Tuples are replaced, never changed in place, so
+        # the tick writer reads them without locking
+        self._routes: Dict[int, Tuple[ConflatedSubscription, ...]] = dict()
+        self._lock = threading.Lock()
+
+    def subscribe(
+            self,
+            codes: Iterable[int],
+            max_rate: Optional[float] = None
+    ) -> ConflatedSubscription:
+        """
+        Subscription to the instrument codes delivering at most max_rate snapshots a second
+        (no limit if None). Instruments which already have a tick are in the first snapshot.
+        """
+        subscription = ConflatedSubscription(self._tick_store, codes, max_rate)
+        with self._lock:
+            for code in subscription.codes:
+                self._routes[code] = self._routes.get(code, ()) + (subscription,)
+        for code in subscription.codes:
+            if self._tick_store.get_slot(code) is not None:
+                subscription.mark(code)
+        return subscription
+
+    def unsubscribe(self, subscription: ConflatedSubscription):
+        """ Stop routing ticks to a subscription and close it """
+        with self._lock:
+            for code in subscription.codes:
+                subscriptions = tuple(
+                    x for x in self._routes.get(code, ()) if x is not subscription
+                )
+                if subscriptions:
+                    self._routes[code] = subscriptions
+                else:
+                    self._routes.pop(code, None)
+        subscription.close()
+
+    def update_tick(self, code: int, ltp: float, volume: int, timestamp: int):
+        """ Mark the instrument dirty in its subscriptions """
+        subscriptions = self._routes.get(code)
+        if subscriptions is not None:
+            for subscription in subscriptions:
+                subscription.mark(code)
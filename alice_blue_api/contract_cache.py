@@ -0,0 +1,88 @@
+"""
+File:           contract_cache.py
+Author:         Dibyaranjan Sathua
+Created on:     10/10/21, 5:15 pm
+
+On disk cache of the instruments created from master contracts. Instruments are saved as a
+numpy structured array (.npy) and memory mapped on load. Cache is keyed by exchange, name
+(for example BANKNIFTY) and trading date. Exchange refreshes the master contracts every day
+before the market opens, so a cache file is valid from that refresh time till the next one.
+"""
+from typing import List, Optional
+from pathlib import Path
+import datetime
+import logging
+import os
+import numpy as np
+
+from alice_blue_api.instruments import Instrument, InstrumentTable
+from alice_blue_api.timezone import IST
+
+
+class MasterContractCache:
+    """ Memory mapped daily cache of instruments """
+    CACHE_DIR: Path = Path.home() / ".stocklabs" / "master_contracts"
+    # IST time at which exchange master contracts are refreshed
+    REFRESH_TIME: datetime.time = datetime.time(hour=8, minute=0)
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self._cache_dir: Path = Path(cache_dir) if cache_dir is not None else self.CACHE_DIR
+        self._logger = logging.getLogger(self.__class__.__name__)
+        # Used in testing to fix the current IST time
+        self._now: Optional[datetime.datetime] = None
+
+    def trading_date(self) -> datetime.date:
+        """ Date (IST) of the latest master contracts refresh """
+        now = self._now if self._now is not None else datetime.datetime.now(IST)
+        if now.time() < self.REFRESH_TIME:
+            return now.date() - datetime.timedelta(days=1)
+        return now.date()
+
+    def get_path(self, exchange: str, name: str, trading_date: datetime.date) -> Path:
+        """ Cache file path """
+        return self._cache_dir / f"{exchange}_{name}_{trading_date.strftime('%Y%m%d')}.npy"
+
+    def load(self, exchange: str, name: str) -> Optional[List[Instrument]]:
+        """ Load instruments from the cache. None if there is no valid cache file """
+        path = self.get_path(exchange, name, self.trading_date())
+        if not path.is_file():
+            return None
+        try:
+            records = np.load(str(path), mmap_mode="r")
+            instruments = self.to_instruments(records)
+        except (OSError, ValueError) as err:
+            self._logger.warning(f"Ignoring corrupt master contract cache {path}: {err}")
+            return None
+        self._logger.debug(f"Loaded {len(instruments)} instruments from {path}")
+        return instruments
+
+    def save(self, exchange: str, name: str, instruments: List[Instrument]):
+        """ Save instruments for the current trading date and remove stale files """
+        trading_date = self.trading_date()
+        path = self.get_path(exchange, name, trading_date)
+        # Write to a temporary file and rename so that readers never see a partial file
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            self._cache_dir.mkdir(parents=True, exist_ok=True)
+            try:
+                with open(tmp_path, "wb") as fh_:
+                    np.save(fh_, self.to_records(instruments))
+                os.replace(str(tmp_path), str(path))
+            finally:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+            for stale in self._cache_dir.glob(f"{exchange}_{name}_*.npy"):
+                if stale != path:
+                    stale.unlink()
+        except OSError as err:
+            self._logger.warning(f"Unable to write master contract cache {path}: {err}")
+
+    @staticmethod
+    def to_records(instruments: List[Instrument]) -> np.ndarray:
+        """ Convert instruments to a structured array """
+        return InstrumentTable.from_instruments(instruments).to_numpy()
+
+    @staticmethod
+    def to_instruments(records: np.ndarray) -> List[Instrument]:
+        """ Convert structured array to instruments """
+        return InstrumentTable.from_numpy(records).to_instruments()
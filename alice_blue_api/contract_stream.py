@@ -0,0 +1,146 @@
+"""
+File:           contract_stream.py
+Author:         Dibyaranjan Sathua
+Created on:     12/10/21, 9:40 pm
+
+Incremental parser of the master contracts payload which looks like
+{"NSE-OPT": [{contract}, {contract}, ...], "NSE-FUT": [...], ...}
+The payload is read chunk by chunk and only one contract is decoded at a time, so the full json
+tree is never held in memory.
+"""
+from typing import Callable, Dict, Iterable, Iterator, Optional, Set, Tuple
+import codecs
+import json
+import re
+
+from alice_blue_api.exceptions import AliceBlueApiError
+from alice_blue_api.instruments import Instrument
+
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class _ChunkReader:
+    """ Text buffer over an iterable of byte chunks """
+    # Trim the consumed part of the buffer once it grows beyond this many characters
+    TRIM_SIZE: int = 1 << 16
+    # Read chunks till at least this many characters are added to the buffer
+    MIN_FILL_SIZE: int = 1 << 13
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json_decoder = json.JSONDecoder()
+        self._text: str = ""
+        self._pos: int = 0
+        self._eof: bool = False
+
+    def _fill(self) -> bool:
+        """ Read next chunks into the buffer. False if there is nothing more to read """
+        if self._eof:
+            return False
+        if self._pos > self.TRIM_SIZE:
+            self._text = self._text[self._pos:]
+            self._pos = 0
+        pieces = []
+        size = 0
+        for chunk in self._chunks:
+            text = self._decoder.decode(chunk)
+            pieces.append(text)
+            size += len(text)
+            if size >= self.MIN_FILL_SIZE:
+                break
+        else:
+            pieces.append(self._decoder.decode(b"", final=True))
+            self._eof = True
+        text = "".join(pieces)
+        self._text += text
+        return bool(text)
+
+    def peek(self) -> str:
+        """ Next non whitespace character without consuming it """
+        while True:
+            self._pos = WHITESPACE.match(self._text, self._pos).end()
+            if self._pos < len(self._text):
+                return self._text[self._pos]
+            if not self._fill():
+                raise AliceBlueApiError("Unexpected end of master contracts payload")
+
+    def expect(self, char: str):
+        """ Consume the next non whitespace character which must be char """
+        if self.peek() != char:
+            raise AliceBlueApiError(
+                f"Expected {char!r} at {self._pos} of master contracts payload, "
+                f"got {self._text[self._pos]!r}"
+            )
+        self._pos += 1
+
+    def decode_value(self):
+        """ Decode next json value. Reads more chunks till the value is complete """
+        self.peek()
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self._text, self._pos)
+            except json.JSONDecodeError as err:
+                if self._fill():
+                    continue
+                raise AliceBlueApiError(f"Invalid master contracts payload: {err}")
+            # A number at the end of the buffer can continue in the next chunk
+            if end == len(self._text) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+
+class MasterContractStream:
+    """ Stream contracts from the master contracts payload applying segment and row filter """
+
+    def __init__(
+            self,
+            segments: Optional[Set[str]] = None,
+            predicate: Optional[Callable[[Dict], bool]] = None
+    ):
+        """
+        Constructor.
+        Args:
+            segments: Segments (for example NSE-OPT) to keep. All segments if None.
+            predicate: Called with each contract of the kept segments. Contract is kept if True.
+        """
+        self._segments = segments
+        self._predicate = predicate
+
+    def iter_contracts(self, chunks: Iterable[bytes]) -> Iterator[Tuple[str, Dict]]:
+        """ Yield (segment, contract) for every contract passing the filters """
+        reader = _ChunkReader(chunks)
+        reader.expect("{")
+        while True:
+            char = reader.peek()
+            if char == "}":
+                return
+            if char == ",":
+                reader.expect(",")
+                continue
+            segment = reader.decode_value()
+            reader.expect(":")
+            if reader.peek() != "[":
+                # Not a list of contracts
+                reader.decode_value()
+                continue
+            reader.expect("[")
+            keep = self._segments is None or segment in self._segments
+            while True:
+                char = reader.peek()
+                if char == "]":
+                    reader.expect("]")
+                    break
+                if char == ",":
+                    reader.expect(",")
+                    continue
+                contract = reader.decode_value()
+                if keep and (self._predicate is None or self._predicate(contract)):
+                    yield segment, contract
+
+    def iter_instruments(self, chunks: Iterable[bytes]) -> Iterator[Tuple[str, Instrument]]:
+        """ Yield (segment, instrument) for every contract passing the filters """
+        for segment, contract in self.iter_contracts(chunks):
+            yield segment, Instrument.create(contract)
@@ -42,3 +42,22 @@ class FeedAction(enum.Enum):
     SUBSCRIBE = "subscribe"
     UNSUBSCRIBE = "unsubscribe"
     HEARTBEAT = "h"
+
+
+class OverflowPolicy(enum.Enum):
+    """ What a full tick queue does with a new frame """
+    # Drop the oldest queued frame
+    DROP_OLDEST = "drop_oldest"
+    # Replace the queued frame of the same instrument and mode. Drop the oldest if there is none
+    COALESCE = "coalesce"
+
+
+class CandleTimeFrame(enum.IntEnum):
+    """ Candle timeframe """
+    ONE_MINUTE = 1
+    FIVE_MINUTE = 2
+    FIFTEEN_MINUTE = 3
+    THIRTY_MINUTE = 4
+    ONE_HOUR = 5
+    FOUR_HOUR = 6
+    ONE_DAY = 7
@@ -7,3 +7,11 @@ Created on:     12/06/21, 12:01 pm
 
 class AliceBlueApiError(Exception):
     pass
+
+
+class FeedDecodeError(AliceBlueApiError):
+    pass
+
+
+class FeedConnectionError(AliceBlueApiError):
+    pass
@@ -0,0 +1,180 @@
+"""
+File:           feed_recovery.py
+Author:         Dibyaranjan Sathua
+Created on:     30/10/21, 6:20 pm
+
+Reconnect delays and recovery tracking of the feed. Backoff gives exponentially growing delays
+with jitter, so that many clients dropped together do not reconnect together. FeedRecovery
+records disconnects and reconnects. After an outage (disconnect till reconnect) of at least
+min_gap_seconds, the first tick of every instrument seen before the disconnect closes a gap from
+the disconnect, reported to the gap callbacks (which can backfill the missed bars). A shorter
+outage has no gaps, however long ago an illiquid instrument last traded.
+Time to reconnect and time to recover (disconnect till the first tick) are kept as histograms.
+"""
+from typing import Callable, Dict, List, Optional, Set
+from dataclasses import dataclass
+import logging
+import random
+import threading
+import time
+
+from alice_blue_api.latency import LatencyHistogram
+
+
+class Backoff:
+    """ Exponential backoff with jitter """
+
+    def __init__(
+            self,
+            initial: float = 0.5,
+            maximum: float = 30.0,
+            multiplier: float = 2.0,
+            jitter: float = 0.5
+    ):
+        """
+        Constructor.
+        Args:
+            initial: Delay in seconds before the first retry.
+            maximum: Longest delay in seconds.
+            multiplier: Delay grows by this factor after every retry.
+            jitter: Fraction of the delay which is random. 0.5 gives delays between half and
+            full of the exponential delay.
+        """
+        self._initial: float = initial
+        self._maximum: float = maximum
+        self._multiplier: float = multiplier
+        self._jitter: float = jitter
+        self._attempts: int = 0
+
+    def next_delay(self) -> float:
+        """ Delay in seconds before the next retry """
+        delay = min(self._maximum, self._initial * self._multiplier ** self._attempts)
+        self._attempts += 1
+        return delay * (1 - self._jitter * random.random())
+
+    def reset(self):
+        """ Start again from the initial delay """
+        self._attempts = 0
+
+    @property
+    def attempts(self) -> int:
+        return self._attempts
+
+
+@dataclass()
+class Gap:
+    """
+    Ticks of an instrument missed by the feed. start and end are exchange timestamps of the
+    latest tick of the feed before the disconnect and of the first tick of the instrument after
+    the reconnect.
+    """
+    code: int
+    start: int
+    end: int
+
+
+class FeedRecovery:
+    """
+    Track disconnects, reconnects and gaps in the ticks of the instruments.
+    update_tick has the signature of an option chain tick listener.
+    """
+
+    def __init__(self, min_gap_seconds: float = 60):
+        """
+        Constructor.
+        Args:
+            min_gap_seconds: Shortest outage (disconnect till reconnect) which has gaps.
+        """
+        self._min_gap_seconds: float = min_gap_seconds
+        self._gap_callbacks: List[Callable[[Gap], None]] = []
+        # Exchange timestamp of the last tick of every instrument
+        self._last_timestamp: Dict[int, int] = dict()
+        # Latest exchange timestamp of the feed, and its value at the disconnect (gap start)
+        self._feed_timestamp: int = 0
+        self._disconnect_timestamp: int = 0
+        # Outage was long enough for gaps
+        self._gaps_expected: bool = False
+        # Instruments without a tick since the reconnect
+        self._pending: Set[int] = set()
+        # perf_counter times of the disconnect and of the reconnect. None once recovered
+        self._disconnected_at: Optional[float] = None
+        self._reconnected_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self.disconnects: int = 0
+        self.reconnects: int = 0
+        self.gaps: List[Gap] = []
+        # Milliseconds from the disconnect till the connection is open and till the first tick
+        self.time_to_reconnect: LatencyHistogram = LatencyHistogram()
+        self.time_to_recover: LatencyHistogram = LatencyHistogram()
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+    def add_gap_callback(self, callback: Callable[[Gap], None]):
+        """ Call callback with every gap. It runs on the tick thread, so it should be quick """
+        self._gap_callbacks.append(callback)
+
+    def on_disconnect(self):
+        """ Connection lost. Instruments with a tick are checked for gaps after the reconnect """
+        with self._lock:
+            if self._disconnected_at is not None and self._reconnected_at is None:
+                # Failed reconnect attempt of the same outage
+                return
+            self.disconnects += 1
+            self._disconnected_at = time.perf_counter()
+            self._reconnected_at = None
+            self._disconnect_timestamp = self._feed_timestamp
+            self._pending = set(self._last_timestamp)
+
+    def on_connect(self):
+        """ Connection open. First connection is not a reconnect """
+        with self._lock:
+            if self._disconnected_at is None or self._reconnected_at is not None:
+                return
+            self._reconnected_at = time.perf_counter()
+            self.reconnects += 1
+            outage = self._reconnected_at - self._disconnected_at
+            self.time_to_reconnect.add(outage * 1000)
+            self._gaps_expected = outage >= self._min_gap_seconds
+
+    def update_tick(self, code: int, ltp: float, volume: int, timestamp: int):
+        """ Record the exchange timestamp. First tick after a reconnect is checked for a gap """
+        self._last_timestamp[code] = timestamp
+        if timestamp > self._feed_timestamp:
+            self._feed_timestamp = timestamp
+        if self._reconnected_at is None:
+            return
+        gap = None
+        with self._lock:
+            if self._reconnected_at is None:
+                return
+            if self._disconnected_at is not None:
+                self.time_to_recover.add((time.perf_counter() - self._disconnected_at) * 1000)
+                self._disconnected_at = None
+            if code in self._pending:
+                self._pending.discard(code)
+                if self._gaps_expected and timestamp > self._disconnect_timestamp:
+                    gap = Gap(code, self._disconnect_timestamp, timestamp)
+                    self.gaps.append(gap)
+            if not self._pending:
+                self._reconnected_at = None
+        if gap is not None:
+            for callback in self._gap_callbacks:
+                try:
+                    callback(gap)
+                except Exception as err:
+                    self._logger.exception(f"Error in gap callback {callback} for {gap}: {err}")
+
+    @property
+    def recovering(self) -> bool:
+        """ True from a disconnect till the first tick after the reconnect """
+        return self._disconnected_at is not None
+
+    def get_stats(self) -> Dict:
+        """ Disconnects, reconnects, gaps and time to reconnect and recover in milliseconds """
+        return {
+            "disconnects": self.disconnects,
+            "reconnects": self.reconnects,
+            "gaps": len(self.gaps),
+            "recovering": self.recovering,
+            "time_to_reconnect": self.time_to_reconnect.to_dict(),
+            "time_to_recover": self.time_to_recover.to_dict(),
+        }
@@ -3,33 +3,87 @@ File:           feed_system.py
 Author:         Dibyaranjan Sathua
 Created on:     27/07/21, 2:02 am
 """
-from typing import Set, List, Optional
-from alice_blue_api.api import AliceBlueApi
-from alice_blue_api.websocket import AliceBlueWebSocket
+from typing import Dict, Iterable, Iterator, Set, List, Optional, TYPE_CHECKING
+import datetime
+import logging
+import threading
+import time
+from alice_blue_api.candle_aggregator import Bar, CandleAggregator
+from alice_blue_api.conflation import Conflator, ConflatedSubscription
 from alice_blue_api.option_chain import OptionChain
-from alice_blue_api.enums import OptionType, FeedModes, FeedAction
+from alice_blue_api.enums import CandleTimeFrame, OptionType, FeedModes, FeedAction
+from alice_blue_api.exceptions import AliceBlueApiError
+from alice_blue_api.feed_recovery import Gap
 from alice_blue_api.instruments import Instrument
+from alice_blue_api.tick_router import TickCallback, TickRouter, TickSubscription
 from alice_blue_api.websocket_streams import CompactMarketData
 
+if TYPE_CHECKING:
+    # API (requests) and web socket (websocket-client) are imported when the feed system is
+    # created, so that a process only decoding packets does not pay for them at import
+    from alice_blue_api.api import AliceBlueApi
+    from alice_blue_api.websocket import AliceBlueWebSocket
+    from candles.fetcher import CandleJob, CandleResult
+
 
 class FeedSystem:
     """ System to wrap all the APIs and provide methods to subscribe or unsubscribe instruments """
     FEED_MODE = FeedModes.COMPACT_MARKETDATA
+    # Instruments sent per subscribe message when resubscribing after a reconnect
+    RESUBSCRIBE_BATCH_SIZE: int = 500
+    # Fetch the one minute bars missed during a reconnect from the candle API
+    BACKFILL_GAPS: bool = False
+    # Gaps found within this many seconds are backfilled in one batch, on one thread, with
+    # BACKFILL_MAX_WORKERS parallel requests and at most BACKFILL_RATE_LIMIT requests a second
+    BACKFILL_DELAY_SECONDS: float = 2.0
+    BACKFILL_MAX_WORKERS: int = 2
+    BACKFILL_RATE_LIMIT: float = 3.0
     __instance: Optional["FeedSystem"] = None
 
     def __new__(cls, *args, **kwargs):
         if cls.__instance is None:
-            cls.__instance = super(FeedSystem, cls).__new__(cls, *args, **kwargs)
+            cls.__instance = super(FeedSystem, cls).__new__(cls)
             return cls.__instance
         raise SyntaxError("This is a Singleton class. Use get_instance() method")
 
-    def __init__(self):
-        self._api_handler: AliceBlueApi = AliceBlueApi.get_handler()
-        self._web_socket: AliceBlueWebSocket = AliceBlueWebSocket()
+    def __init__(
+            self,
+            api_handler: Optional["AliceBlueApi"] = None,
+            web_socket: Optional["AliceBlueWebSocket"] = None
+    ):
+        """ API handler and web socket are created if not given """
+        if api_handler is None:
+            from alice_blue_api.api import AliceBlueApi
+            api_handler = AliceBlueApi.get_handler()
+        if web_socket is None:
+            from alice_blue_api.websocket import AliceBlueWebSocket
+            web_socket = AliceBlueWebSocket()
+        self._api_handler: "AliceBlueApi" = api_handler
+        self._web_socket: "AliceBlueWebSocket" = web_socket
         self._option_chain: OptionChain = OptionChain.get_instance()
+        # Bars built from the ticks of the subscribed instruments. Only after enable_candles as
+        # it is a listener on the decode path
+        self._candle_aggregator: Optional[CandleAggregator] = None
+        # Latest state of instruments for consumers slower than the feed
+        self._conflator: Conflator = Conflator(self._option_chain.tick_store)
+        self._option_chain.add_tick_listener(self._conflator.update_tick)
+        # Callbacks per instrument, underlying and expiry
+        self._tick_router: TickRouter = TickRouter()
+        self._option_chain.add_tick_listener(self._tick_router.update_tick)
         # Keep track of the instruments that are subscribed
         self._subscribed_instrument_code: Set[int] = set()
+        # Every instrument ever subscribed, for exchange code of resubscribe and backfill
+        self._instruments_by_code: Dict[int, Instrument] = dict()
+        # Gaps waiting for the backfill thread, which runs while there are gaps
+        self._gaps: List[Gap] = []
+        self._backfilling: bool = False
+        self._gaps_lock = threading.Lock()
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._web_socket.add_reconnect_callback(self._resubscribe)
+        if self.BACKFILL_GAPS:
+            self._web_socket.recovery.add_gap_callback(self._on_gap)
         self._start = False
+        self._closed = False
 
     @classmethod
     def get_instance(cls):
@@ -57,6 +111,32 @@ class FeedSystem:
         self._web_socket.wait_until_connection_open()
         self._subscribe_indices()
 
+    def close(self):
+        """ Close the web socket, stop the candle aggregator and remove the tick listeners """
+        if self._closed:
+            return None
+        self._closed = True
+        self._web_socket.close()
+        self._option_chain.remove_tick_listener(self._conflator.update_tick)
+        self._option_chain.remove_tick_listener(self._tick_router.update_tick)
+        if self._candle_aggregator is not None:
+            self._option_chain.remove_tick_listener(self._candle_aggregator.update_tick)
+            self._candle_aggregator.stop()
+
+    def enable_candles(
+            self,
+            timeframes: Iterable[CandleTimeFrame],
+            history: int = CandleAggregator.DEFAULT_HISTORY
+    ) -> CandleAggregator:
+        """ Build bars of the timeframes from the ticks of the subscribed instruments """
+        if self._candle_aggregator is not None:
+            raise AliceBlueApiError("Candles are already enabled")
+        candle_aggregator = CandleAggregator(timeframes=timeframes, history=history)
+        candle_aggregator.start()
+        self._option_chain.add_tick_listener(candle_aggregator.update_tick)
+        self._candle_aggregator = candle_aggregator
+        return candle_aggregator
+
     def _subscribe_indices(self):
         """ Subscribe the indices nifty, banknifty and india vix at the start of the feed system """
         self.subscribe(instruments=[
@@ -67,10 +147,14 @@ class FeedSystem:
 
     def subscribe(self, instruments: List[Instrument]):
         """ Subscribe the instrument if it is not subscribed """
+        # Underlying and expiry callbacks get the ticks of the subscribed instruments
+        self._tick_router.add_instruments(instruments)
         # Filter out the instruments that are not subscribed and the code of new instrument to set
         instruments_to_be_subscribed = []
         for instrument in instruments:
             if instrument.code not in self._subscribed_instrument_code:
+                # Instrument first, as a reconnect can resubscribe the code at any time
+                self._instruments_by_code[instrument.code] = instrument
                 self._subscribed_instrument_code.add(instrument.code)
                 instruments_to_be_subscribed.append((instrument.exchange_code, instrument.code))
         data = {
@@ -94,6 +178,146 @@ class FeedSystem:
         }
         self._web_socket.send(data)
 
+    def subscribe_conflated(
+            self,
+            instruments: List[Instrument],
+            max_rate: Optional[float] = None
+    ) -> ConflatedSubscription:
+        """
+        Subscribe the instruments and return a conflated subscription to them. Its poll returns
+        only the latest state of the instruments changed since the previous poll, at most
+        max_rate times a second.
+        """
+        subscription = self._conflator.subscribe([x.code for x in instruments], max_rate)
+        self.subscribe(instruments)
+        return subscription
+
+    def unsubscribe_conflated(self, subscription: ConflatedSubscription):
+        """ Close a conflated subscription. Instruments stay subscribed in the feed """
+        self._conflator.unsubscribe(subscription)
+
+    def _resubscribe(self):
+        """ Subscribe the tracked instruments again on a reconnect, in batches """
+        instruments = [
+            (self._instruments_by_code[x].exchange_code, x)
+            for x in list(self._subscribed_instrument_code)
+        ]
+        for pos in range(0, len(instruments), self.RESUBSCRIBE_BATCH_SIZE):
+            self._web_socket.send({
+                "a": FeedAction.SUBSCRIBE.value,
+                "v": instruments[pos:pos + self.RESUBSCRIBE_BATCH_SIZE],
+                "m": self.FEED_MODE.value
+            })
+
+    def _on_gap(self, gap: Gap):
+        """ Queue a gap for the backfill thread. Gap callbacks run on the tick thread """
+        with self._gaps_lock:
+            self._gaps.append(gap)
+            if self._backfilling:
+                return
+            self._backfilling = True
+        thread = threading.Thread(target=self._run_backfill)
+        thread.daemon = True
+        thread.start()
+
+    def _run_backfill(self):
+        """ Backfill the queued gaps in batches till there are none """
+        while True:
+            # Gaps of a reconnect come one by one, with the first tick of every instrument
+            time.sleep(self.BACKFILL_DELAY_SECONDS)
+            with self._gaps_lock:
+                gaps, self._gaps = self._gaps, []
+                if not gaps:
+                    self._backfilling = False
+                    return
+            try:
+                self._backfill(gaps)
+            except Exception as err:
+                self._logger.exception(f"Error backfilling {len(gaps)} gaps: {err}")
+
+    def _backfill(self, gaps: List[Gap]) -> int:
+        """
+        Add the one minute bars of the gaps from the candle API to the candle aggregator.
+        Returns the number of bars added.
+        """
+        # Candle fetcher (numpy, requests) is imported only when gaps are backfilled
+        from candles.fetcher import CandleJob
+        if self._candle_aggregator is None:
+            return 0
+        jobs_by_exchange: Dict[str, List["CandleJob"]] = dict()
+        for gap in gaps:
+            instrument = self._instruments_by_code.get(gap.code)
+            if instrument is None:
+                continue
+            if instrument.index:
+                exchange = "NSE_INDICES"
+            elif instrument.exchange == "NFO":
+                exchange = "NFO"
+            else:
+                exchange = "NSE"
+            jobs_by_exchange.setdefault(exchange, []).append(
+                CandleJob(gap.code, CandleTimeFrame.ONE_MINUTE, gap.start, gap.end)
+            )
+        added = 0
+        for exchange, jobs in jobs_by_exchange.items():
+            for result in self._fetch_candles(exchange, jobs):
+                if not result.ok:
+                    self._logger.warning(f"Backfill of {result.job} failed. {result.error}")
+                    continue
+                bars = [
+                    Bar(result.job.token, CandleTimeFrame.ONE_MINUTE, int(x["timestamp"]),
+                        float(x["open"]), float(x["high"]), float(x["low"]), float(x["close"]),
+                        int(x["volume"]))
+                    for x in result.records
+                ]
+                added += self._candle_aggregator.fill_bars(bars)
+        self._logger.info(f"Backfilled {added} one minute bars of {len(gaps)} gaps")
+        return added
+
+    def _fetch_candles(self, exchange: str, jobs: List["CandleJob"]) -> Iterator["CandleResult"]:
+        """ Candles of the jobs of a candle exchange from the rate limited candle API """
+        # Candle API (candle store) is imported only when gaps are backfilled
+        from alice_blue_api.candle import CandleApi, CandleExchange
+        yield from CandleApi(CandleExchange(exchange)).fetch_many(
+            jobs, max_workers=self.BACKFILL_MAX_WORKERS, rate_limit=self.BACKFILL_RATE_LIMIT
+        )
+
+    def add_tick_callback(
+            self,
+            callback: TickCallback,
+            instruments: Optional[List[Instrument]] = None,
+            underlying: Optional[str] = None,
+            expiry: Optional[datetime.date] = None,
+            threaded: bool = False
+    ) -> TickSubscription:
+        """
+        Call callback with (code, ltp, volume, timestamp) of every tick of the subscribed
+        instruments matching all the given filters. The instruments are subscribed if given.
+        Callback runs on its own thread from the start if threaded.
+        """
+        subscription = self._tick_router.subscribe(
+            callback, instruments, underlying, expiry, threaded
+        )
+        if instruments is not None:
+            self.subscribe(instruments)
+        return subscription
+
+    def remove_tick_callback(self, subscription: TickSubscription):
+        """ Remove a tick callback. Instruments stay subscribed in the feed """
+        self._tick_router.unsubscribe(subscription)
+
+    def get_callback_stats(self) -> List[Dict]:
+        """ Calls, errors, slow calls and call time of every tick callback """
+        return self._tick_router.get_stats()
+
+    def get_queue_stats(self) -> Dict:
+        """ Depth, drops and lag of the queues between the web socket and the decoders """
+        return self._web_socket.get_queue_stats()
+
+    def get_recovery_stats(self) -> Dict:
+        """ Disconnects, reconnects, gaps and time to reconnect and recover of the feed """
+        return self._web_socket.get_recovery_stats()
+
     def nifty_index(self) -> CompactMarketData:
         """ Get the current value of nifty index """
         return self._option_chain.get_market_data_by_instrument(self._api_handler.nifty_index)
@@ -107,9 +331,13 @@ class FeedSystem:
         return self._option_chain.get_market_data_by_instrument(self._api_handler.india_vix_index)
 
     @property
-    def api_handler(self) -> AliceBlueApi:
+    def api_handler(self) -> "AliceBlueApi":
         return self._api_handler
 
     @property
     def option_chain(self) -> OptionChain:
         return self._option_chain
+
+    @property
+    def candle_aggregator(self) -> Optional[CandleAggregator]:
+        return self._candle_aggregator
@@ -0,0 +1,114 @@
+"""
+File:           form_parser.py
+Author:         Dibyaranjan Sathua
+Created on:     24/10/21, 6:20 pm
+
+Extract the input fields of the OAuth login pages (csrf token, login challenge, 2FA question
+ids). Instead of building a tree like BeautifulSoup, the page is scanned by a regex which only
+matches input tags, and comments, scripts and styles so that inputs inside them are skipped.
+The page can be fed chunk by chunk, only an incomplete tag at the end of a chunk is buffered.
+"""
+from typing import Dict, Iterable, List, Optional
+import html
+import re
+
+from alice_blue_api.exceptions import AliceBlueApiError
+
+
+# Alternatives are tried in order at every "<". The last one matches the start of a comment,
+# script, style or input which is not complete yet
+TOKEN_REGEX = re.compile(
+    r"<!--.*?-->"
+    r"|<(script|style)\b.*?</\1\s*>"
+    r"|<input\b((?:[^>\"']|\"[^\"]*\"|'[^']*')*)>"
+    r"|(<(?:!--|script\b|style\b|input\b))",
+    re.IGNORECASE | re.DOTALL
+)
+ATTRIBUTE_REGEX = re.compile(
+    r"([^\s=/>\"']+)(?:\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s>\"']+)))?"
+)
+# Longest start of a token ("<script") which can be split across chunks
+MAX_TOKEN_START: int = 7
+
+
+class FormFieldExtractor:
+    """ Values of the input fields of a page by name """
+
+    def __init__(self, names: Optional[Iterable[str]] = None):
+        """
+        Constructor.
+        Args:
+            names: Names of the input fields to extract. All input fields if None.
+        """
+        self._names: Optional[set] = set(names) if names is not None else None
+        self._buffer: str = ""
+        self.fields: Dict[str, List[str]] = dict()
+
+    def feed(self, chunk: str):
+        """ Scan the next chunk of the page """
+        self._buffer = self._scan(self._buffer + chunk, final=False)
+
+    def close(self):
+        """ End of the page. Unterminated comment or script is ignored """
+        self._buffer = self._scan(self._buffer, final=True)
+        self._buffer = ""
+
+    def _scan(self, text: str, final: bool) -> str:
+        """ Extract the inputs of text. Returns the part to be scanned with the next chunk """
+        end = 0
+        match = TOKEN_REGEX.search(text)
+        while match is not None:
+            start = match.group(3)
+            if start is not None:
+                if not final:
+                    # Incomplete token, may be completed by the next chunk
+                    return text[match.start():]
+                if not start.lower().startswith("<input"):
+                    # Rest of the page is comment or script
+                    return ""
+                # Input with an unbalanced quote like value=don't. It ends at the next ">"
+                end = text.find(">", match.end()) + 1
+                if end == 0:
+                    return ""
+                match = TOKEN_REGEX.search(text, end)
+                continue
+            end = match.end()
+            attrs = match.group(2)
+            if attrs is not None:
+                self._add_input(attrs)
+            match = TOKEN_REGEX.search(text, end)
+        return "" if final else text[max(end, len(text) - MAX_TOKEN_START):]
+
+    def _add_input(self, attrs: str):
+        """ Add the input tag having the attributes attrs """
+        name = value = None
+        for match in ATTRIBUTE_REGEX.finditer(attrs):
+            attr = match.group(1).lower()
+            if attr == "name" or attr == "value":
+                text = next((x for x in match.group(2, 3, 4) if x is not None), "")
+                if attr == "name":
+                    name = html.unescape(text)
+                else:
+                    value = html.unescape(text)
+        if name is None or (self._names is not None and name not in self._names):
+            return
+        self.fields.setdefault(name, []).append(value or "")
+
+    def get(self, name: str) -> str:
+        """ Value of the first input field with name """
+        values = self.fields.get(name)
+        if not values:
+            raise AliceBlueApiError(f"Input field {name} not found in the page")
+        return values[0]
+
+    def get_all(self, name: str) -> List[str]:
+        """ Values of all input fields with name in page order """
+        return self.fields.get(name, [])
+
+
+def parse_form_fields(page: str, names: Optional[Iterable[str]] = None) -> FormFieldExtractor:
+    """ Input fields of a page """
+    extractor = FormFieldExtractor(names)
+    extractor.feed(page)
+    extractor.close()
+    return extractor
@@ -0,0 +1,133 @@
+"""
+File:           http_client.py
+Author:         Dibyaranjan Sathua
+Created on:     21/10/21, 6:15 pm
+
+Long lived HTTP client of the AliceBlue APIs. A single session keeps a pool of keep-alive
+connections, so only the first call to a host pays the TCP and TLS handshake. Idempotent
+requests are retried with backoff on connection errors and 429/5xx, and the latency of every
+endpoint is recorded in a histogram.
+"""
+from typing import Dict, Optional, Tuple, Union
+import logging
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from alice_blue_api.latency import LatencyHistogram
+
+
+class HttpClient:
+    """ Pooled HTTP session with retries and per endpoint latency histograms """
+    RETRY_STATUS: Tuple[int, ...] = (429, 500, 502, 503, 504)
+
+    def __init__(
+            self,
+            pool_size: int = 10,
+            timeout: Union[float, Tuple[float, float]] = (5.0, 30.0),
+            max_retries: int = 3,
+            backoff: float = 0.3
+    ):
+        """
+        Constructor.
+        Args:
+            pool_size: Keep-alive connections kept per host.
+            timeout: Request timeout in seconds, or (connect, read) timeouts.
+            max_retries: Retries of idempotent requests (GET, PUT, DELETE, HEAD, OPTIONS) on
+            connection errors and RETRY_STATUS. POST is retried only if it could not connect.
+            backoff: Backoff factor of the retries. Waits are backoff * 2 ** (retry - 1).
+        """
+        self._timeout = timeout
+        self._max_retries: int = max_retries
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff,
+            status_forcelist=self.RETRY_STATUS,
+            raise_on_status=False
+        )
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._latency: Dict[str, LatencyHistogram] = dict()
+        # Responses, compressed and decoded bytes of every endpoint
+        self._transfer: Dict[str, Dict[str, int]] = dict()
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+    def request(
+            self,
+            method: str,
+            url: str,
+            endpoint: Optional[str] = None,
+            **kwargs
+    ) -> requests.Response:
+        """
+        Send a request on the pooled session. Latency (till the whole body is read, or the
+        headers if stream is True) is recorded under "METHOD endpoint", endpoint defaults to
+        the url without the query string. kwargs are passed to requests.
+        """
+        method = method.upper()
+        kwargs.setdefault("timeout", self._timeout)
+        start = time.perf_counter()
+        try:
+            return self._session.request(method=method, url=url, **kwargs)
+        finally:
+            self.record(f"{method} {endpoint or url.split('?')[0]}", time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        """ Add latency of a request """
+        with self._lock:
+            histogram = self._latency.get(name)
+            if histogram is None:
+                histogram = self._latency[name] = LatencyHistogram()
+            histogram.add(seconds * 1000)
+
+    def get_latency_stats(self) -> Dict[str, Dict]:
+        """ Latency summary in milliseconds of every endpoint """
+        with self._lock:
+            return {name: x.to_dict() for name, x in self._latency.items()}
+
+    def record_transfer(self, endpoint: str, compressed_bytes: int, decoded_bytes: int):
+        """ Add body size of a response """
+        with self._lock:
+            transfer = self._transfer.get(endpoint)
+            if transfer is None:
+                transfer = self._transfer[endpoint] = {
+                    "responses": 0, "compressed_bytes": 0, "decoded_bytes": 0
+                }
+            transfer["responses"] += 1
+            transfer["compressed_bytes"] += compressed_bytes
+            transfer["decoded_bytes"] += decoded_bytes
+
+    def get_transfer_stats(self) -> Dict[str, Dict[str, int]]:
+        """ Response body bytes of every endpoint """
+        with self._lock:
+            return {name: dict(x) for name, x in self._transfer.items()}
+
+    def get_histogram(self, name: str) -> Optional[LatencyHistogram]:
+        """ Latency histogram of an endpoint """
+        return self._latency.get(name)
+
+    def reset_stats(self):
+        """ Clear the latency histograms and transfer stats """
+        with self._lock:
+            self._latency.clear()
+            self._transfer.clear()
+
+    def close(self):
+        """ Close the pooled connections """
+        self._session.close()
+
+    @property
+    def session(self) -> requests.Session:
+        return self._session
+
+    @property
+    def max_retries(self) -> int:
+        return self._max_retries
@@ -0,0 +1,150 @@
+"""
+File:           instrument_index.py
+Author:         Dibyaranjan Sathua
+Created on:     09/10/21, 6:30 pm
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+import bisect
+import datetime
+
+from alice_blue_api.enums import OptionType
+from alice_blue_api.instruments import Instrument
+
+
+InstrumentKey = Tuple[str, Optional[datetime.date], Optional[int], Optional[OptionType]]
+
+
+class InstrumentIndex:
+    """
+    Index of instruments built once from the master contracts.
+    Lookup by (underlying, expiry, strike, option type) and by code are O(1).
+    Strikes and expiries are kept sorted per underlying for range queries.
+    """
+
+    def __init__(self, instruments: Optional[Iterable[Instrument]] = None):
+        self._by_key: Dict[InstrumentKey, Instrument] = dict()
+        self._by_code: Dict[int, Instrument] = dict()
+        self._strikes: Dict[Tuple[str, datetime.date], List[int]] = dict()
+        self._expiries: Dict[str, List[datetime.date]] = dict()
+        if instruments is not None:
+            self.add(instruments)
+
+    @staticmethod
+    def get_underlying(instrument: Instrument) -> str:
+        """ Underlying of an instrument. Symbol is like 'BANKNIFTY AUG 36000.0 CE' """
+        if instrument.index:
+            return instrument.symbol
+        return instrument.symbol.split(" ", 1)[0]
+
+    def add(self, instruments: Iterable[Instrument]):
+        """ Add instruments to the index. First instrument wins if a key is repeated """
+        strikes_to_sort = set()
+        expiries_to_sort = set()
+        for instrument in instruments:
+            self._by_code.setdefault(instrument.code, instrument)
+            if instrument.option_type is None:
+                continue
+            underlying = self.get_underlying(instrument)
+            key = (underlying, instrument.expiry, instrument.strike, instrument.option_type)
+            if key in self._by_key:
+                continue
+            self._by_key[key] = instrument
+            expiries = self._expiries.setdefault(underlying, [])
+            if instrument.expiry not in expiries:
+                expiries.append(instrument.expiry)
+                expiries_to_sort.add(underlying)
+            if instrument.strike is not None:
+                strikes = self._strikes.setdefault((underlying, instrument.expiry), [])
+                strikes.append(instrument.strike)
+                strikes_to_sort.add((underlying, instrument.expiry))
+        for underlying in expiries_to_sort:
+            self._expiries[underlying].sort()
+        for key in strikes_to_sort:
+            self._strikes[key] = sorted(set(self._strikes[key]))
+
+    def get_by_code(self, code: int) -> Optional[Instrument]:
+        """ Get instrument by code """
+        return self._by_code.get(code)
+
+    def get_option(
+            self,
+            underlying: str,
+            expiry: datetime.date,
+            strike: int,
+            option_type: OptionType
+    ) -> Optional[Instrument]:
+        """ Get option instrument of an underlying by expiry, strike and option type """
+        return self._by_key.get((underlying, expiry, strike, option_type))
+
+    def get_future(self, underlying: str, expiry: datetime.date) -> Optional[Instrument]:
+        """ Get future instrument of an underlying by expiry """
+        return self._by_key.get((underlying, expiry, None, OptionType.FUT))
+
+    def get_expiries(self, underlying: str) -> List[datetime.date]:
+        """ Sorted expiries of an underlying """
+        return list(self._expiries.get(underlying, []))
+
+    def get_strikes(self, underlying: str, expiry: datetime.date) -> List[int]:
+        """ Sorted strikes of an underlying for an expiry """
+        return list(self._strikes.get((underlying, expiry), []))
+
+    def get_options_in_range(
+            self,
+            underlying: str,
+            expiry: datetime.date,
+            low_strike: int,
+            high_strike: int,
+            option_type: Optional[OptionType] = None
+    ) -> List[Instrument]:
+        """
+        Option instruments with low_strike <= strike <= high_strike ordered by strike.
+        Both CE and PE are returned if option_type is None.
+        """
+        strikes = self._strikes.get((underlying, expiry), [])
+        start = bisect.bisect_left(strikes, low_strike)
+        end = bisect.bisect_right(strikes, high_strike)
+        return self._options_for_strikes(underlying, expiry, strikes[start:end], option_type)
+
+    def get_options_around_atm(
+            self,
+            underlying: str,
+            expiry: datetime.date,
+            atm_strike: int,
+            count: int,
+            option_type: Optional[OptionType] = None
+    ) -> List[Instrument]:
+        """
+        Option instruments of count strikes below and above the strike nearest to atm_strike
+        ordered by strike. Both CE and PE are returned if option_type is None.
+        """
+        strikes = self._strikes.get((underlying, expiry), [])
+        if not strikes:
+            return []
+        pos = bisect.bisect_left(strikes, atm_strike)
+        # Pick the nearest listed strike as ATM
+        if pos == len(strikes) or \
+                (pos > 0 and atm_strike - strikes[pos - 1] <= strikes[pos] - atm_strike):
+            pos -= 1
+        start = max(pos - count, 0)
+        end = pos + count + 1
+        return self._options_for_strikes(underlying, expiry, strikes[start:end], option_type)
+
+    def _options_for_strikes(
+            self,
+            underlying: str,
+            expiry: datetime.date,
+            strikes: List[int],
+            option_type: Optional[OptionType]
+    ) -> List[Instrument]:
+        """ Option instruments for the strikes """
+        option_types = [OptionType.CE, OptionType.PE] if option_type is None else [option_type]
+        instruments = []
+        for strike in strikes:
+            for x in option_types:
+                instrument = self._by_key.get((underlying, expiry, strike, x))
+                if instrument is not None:
+                    instruments.append(instrument)
+        return instruments
+
+    def __len__(self) -> int:
+        return len(self._by_code)
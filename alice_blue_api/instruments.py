@@ -3,62 +3,322 @@ File:           instruments.py
 Author:         Dibyaranjan Sathua
 Created on:     12/06/21, 12:44 pm
 """
-from typing import Optional
-from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, TYPE_CHECKING
+import array
 import datetime
+import sys
 
 from alice_blue_api.enums import OptionType
 
+if TYPE_CHECKING:
+    # numpy is imported by the master contract cache conversions only
+    import numpy as np
+
+
+# Option type is stored as OptionType value. 0 means no option type
+OPTION_TYPE_BY_VALUE: Tuple[Optional[OptionType], ...] = (
+    None, OptionType.CE, OptionType.PE, OptionType.FUT
+)
+OPTION_TYPE_BY_SUFFIX: Dict[str, int] = {" CE": OptionType.CE.value, " PE": OptionType.PE.value}
+# Expiry is stored as date ordinal. 0 means no expiry
+_EXPIRY_BY_ORDINAL: Dict[int, Optional[datetime.date]] = {0: None}
+# Master contracts have a handful of distinct expiry timestamps and strike texts
+_EXPIRY_ORDINAL_BY_TIMESTAMP: Dict[int, int] = dict()
+_STRIKE_BY_TEXT: Dict[str, int] = dict()
+
+# (trading_symbol, symbol, lot_size, expiry ordinal, exchange_code, exchange, code,
+# option type value, strike, index)
+InstrumentRow = Tuple[
+    str, str, Optional[int], int, Optional[int], str, int, int, Optional[int], bool
+]
+
+
+def get_expiry(ordinal: int) -> Optional[datetime.date]:
+    """ Shared date object of an expiry ordinal """
+    expiry = _EXPIRY_BY_ORDINAL.get(ordinal)
+    if expiry is None and ordinal:
+        expiry = _EXPIRY_BY_ORDINAL[ordinal] = datetime.date.fromordinal(ordinal)
+    return expiry
+
+
+def get_expiry_ordinal(timestamp: int) -> int:
+    """ Date ordinal of an expiry epoch timestamp """
+    ordinal = _EXPIRY_ORDINAL_BY_TIMESTAMP.get(timestamp)
+    if ordinal is None:
+        ordinal = datetime.datetime.fromtimestamp(timestamp).date().toordinal()
+        _EXPIRY_ORDINAL_BY_TIMESTAMP[timestamp] = ordinal
+    return ordinal
+
+
+def parse_contract(data) -> InstrumentRow:
+    """ Parse a master contract into an instrument row """
+    lot_size = data.get("lotSize")
+    if lot_size is not None:
+        lot_size = int(lot_size)
+    expiry = data.get("expiry")
+    expiry = 0 if expiry is None else get_expiry_ordinal(expiry)
+    symbol = sys.intern(data["symbol"])
+    index = data.get("index", False)
+    option_type = 0
+    strike = None
+    if not index:
+        # Symbol is like 'BANKNIFTY AUG 36000.0 CE' or 'BANKNIFTY AUG FUT'
+        option_type = OPTION_TYPE_BY_SUFFIX.get(symbol[-3:], 0)
+        if option_type:
+            text = symbol[symbol.rfind(" ", 0, -3) + 1:-3]
+            strike = _STRIKE_BY_TEXT.get(text)
+            if strike is None:
+                # strike will be in float. S0 first convert it to float then int
+                strike = _STRIKE_BY_TEXT[text] = int(float(text))
+        elif symbol[-4:] == " FUT" or symbol == "FUT":
+            option_type = OptionType.FUT.value
+    return (
+        data["trading_symbol"],
+        symbol,
+        lot_size,
+        expiry,
+        data["exchange_code"],
+        sys.intern(data["exchange"]),
+        int(data["code"]),
+        option_type,
+        strike,
+        index
+    )
+
 
-@dataclass()
 class Instrument:
-    trading_symbol: str
-    symbol: str
-    lot_size: Optional[int]
-    expiry: Optional[datetime.date]
-    exchange_code: Optional[int]
-    exchange: str
-    code: int
-    option_type: Optional[OptionType]
-    strike: Optional[int]
-    index: bool
+    """
+    Slotted instrument. Expiry is kept as date ordinal and option type as OptionType value.
+    Symbol and exchange strings are interned so that they are shared between instruments.
+    """
+    __slots__ = (
+        "trading_symbol", "symbol", "lot_size", "expiry_ordinal", "exchange_code", "exchange",
+        "code", "option_type_value", "strike", "index"
+    )
+    # Mutable like the dataclass it replaces
+    __hash__ = None
+
+    def __init__(
+            self,
+            trading_symbol: str,
+            symbol: str,
+            lot_size: Optional[int],
+            expiry: Optional[datetime.date],
+            exchange_code: Optional[int],
+            exchange: str,
+            code: int,
+            option_type: Optional[OptionType],
+            strike: Optional[int],
+            index: bool
+    ):
+        self.trading_symbol: str = trading_symbol
+        self.symbol: str = sys.intern(symbol)
+        self.lot_size: Optional[int] = lot_size
+        self.expiry_ordinal: int = 0 if expiry is None else expiry.toordinal()
+        self.exchange_code: Optional[int] = exchange_code
+        self.exchange: str = sys.intern(exchange)
+        self.code: int = code
+        self.option_type_value: int = 0 if option_type is None else option_type.value
+        self.strike: Optional[int] = strike
+        self.index: bool = index
+
+    @classmethod
+    def from_row(cls, row: InstrumentRow) -> "Instrument":
+        """ Create Instrument from an instrument row without any conversion """
+        instrument = object.__new__(cls)
+        (
+            instrument.trading_symbol, instrument.symbol, instrument.lot_size,
+            instrument.expiry_ordinal, instrument.exchange_code, instrument.exchange,
+            instrument.code, instrument.option_type_value, instrument.strike, instrument.index
+        ) = row
+        return instrument
 
     @classmethod
     def create(cls, data):
         """ Create Instrument class object from the input data """
-        lot_size = None
-        expiry = None
-        option_type = None
-        strike = None
-        if "lotSize" in data:
-            lot_size = int(data["lotSize"])
-        if "expiry" in data:
-            expiry = datetime.datetime.fromtimestamp(data["expiry"]).date()
-        code = int(data["code"])
-        index = data.get("index", False)
-        if not index:
-            # Check if the data is for Option or Fut Instrument
-            symbol_parts = data["symbol"].split(" ")
-            if symbol_parts[-1] == "CE":
-                option_type = OptionType.CE
-                # strike will be in float. S0 first convert it to float then int
-                strike = int(float(symbol_parts[-2]))
-            elif symbol_parts[-1] == "PE":
-                option_type = OptionType.PE
-                strike = int(float(symbol_parts[-2]))
-            elif symbol_parts[-1] == "FUT":
-                option_type = OptionType.FUT
-                strike = None
-
-        return cls(
-            trading_symbol=data["trading_symbol"],
-            symbol=data["symbol"],
-            lot_size=lot_size,
-            expiry=expiry,
-            exchange_code=data["exchange_code"],
-            exchange=data["exchange"],
-            code=code,
-            option_type=option_type,
-            strike=strike,
-            index=index
+        return cls.from_row(parse_contract(data))
+
+    @property
+    def expiry(self) -> Optional[datetime.date]:
+        return get_expiry(self.expiry_ordinal)
+
+    @expiry.setter
+    def expiry(self, value: Optional[datetime.date]):
+        self.expiry_ordinal = 0 if value is None else value.toordinal()
+
+    @property
+    def option_type(self) -> Optional[OptionType]:
+        return OPTION_TYPE_BY_VALUE[self.option_type_value]
+
+    @option_type.setter
+    def option_type(self, value: Optional[OptionType]):
+        self.option_type_value = 0 if value is None else value.value
+
+    def to_row(self) -> InstrumentRow:
+        """ Instrument row """
+        return (
+            self.trading_symbol, self.symbol, self.lot_size, self.expiry_ordinal,
+            self.exchange_code, self.exchange, self.code, self.option_type_value, self.strike,
+            self.index
         )
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self.to_row() == other.to_row()
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(trading_symbol={self.trading_symbol!r}, "
+            f"symbol={self.symbol!r}, lot_size={self.lot_size!r}, expiry={self.expiry!r}, "
+            f"exchange_code={self.exchange_code!r}, exchange={self.exchange!r}, "
+            f"code={self.code!r}, option_type={self.option_type!r}, strike={self.strike!r}, "
+            f"index={self.index!r})"
+        )
+
+
+class InstrumentTable:
+    """
+    Columnar table of instruments. Numeric columns are array.array buffers and string columns
+    are lists of interned strings. None is stored as -1 (0 for expiry ordinal and option type).
+    """
+    NUMERIC_COLUMNS: Dict[str, str] = {
+        "lot_size": "q",
+        "expiry": "i",
+        "exchange_code": "q",
+        "code": "q",
+        "option_type": "b",
+        "strike": "q",
+        "index": "b",
+    }
+
+    def __init__(self):
+        self.trading_symbol: List[str] = []
+        self.symbol: List[str] = []
+        self.exchange: List[str] = []
+        self.lot_size: array.array = array.array("q")
+        self.expiry: array.array = array.array("i")
+        self.exchange_code: array.array = array.array("q")
+        self.code: array.array = array.array("q")
+        self.option_type: array.array = array.array("b")
+        self.strike: array.array = array.array("q")
+        self.index: array.array = array.array("b")
+
+    @classmethod
+    def from_contracts(cls, contracts: Iterable) -> "InstrumentTable":
+        """ Build table directly from master contracts """
+        table = cls()
+        table.extend_rows(parse_contract(x) for x in contracts)
+        return table
+
+    @classmethod
+    def from_instruments(cls, instruments: Iterable[Instrument]) -> "InstrumentTable":
+        """ Build table from instruments """
+        table = cls()
+        table.extend_rows(x.to_row() for x in instruments)
+        return table
+
+    @classmethod
+    def from_numpy(cls, records: "np.ndarray") -> "InstrumentTable":
+        """ Build table from a structured array created by to_numpy """
+        import numpy as np
+        table = cls()
+        table.trading_symbol = [x.decode() for x in records["trading_symbol"].tolist()]
+        table.symbol = [sys.intern(x.decode()) for x in records["symbol"].tolist()]
+        table.exchange = [sys.intern(x.decode()) for x in records["exchange"].tolist()]
+        for name, typecode in cls.NUMERIC_COLUMNS.items():
+            column = array.array(typecode)
+            column.frombytes(
+                np.ascontiguousarray(records[name], dtype=np.dtype(typecode)).tobytes()
+            )
+            setattr(table, name, column)
+        return table
+
+    def append_row(self, row: InstrumentRow):
+        """ Append an instrument row """
+        self.extend_rows((row, ))
+
+    def extend_rows(self, rows: Iterable[InstrumentRow]):
+        """ Append instrument rows """
+        trading_symbols = self.trading_symbol.append
+        symbols = self.symbol.append
+        exchanges = self.exchange.append
+        lot_sizes = self.lot_size.append
+        expiries = self.expiry.append
+        exchange_codes = self.exchange_code.append
+        codes = self.code.append
+        option_types = self.option_type.append
+        strikes = self.strike.append
+        indices = self.index.append
+        for (
+                trading_symbol, symbol, lot_size, expiry, exchange_code, exchange, code,
+                option_type, strike, index
+        ) in rows:
+            trading_symbols(trading_symbol)
+            symbols(symbol)
+            lot_sizes(-1 if lot_size is None else lot_size)
+            expiries(expiry)
+            exchange_codes(-1 if exchange_code is None else exchange_code)
+            exchanges(exchange)
+            codes(code)
+            option_types(option_type)
+            strikes(-1 if strike is None else strike)
+            indices(index)
+
+    def get_row(self, pos: int) -> InstrumentRow:
+        """ Instrument row at a position """
+        lot_size = self.lot_size[pos]
+        exchange_code = self.exchange_code[pos]
+        strike = self.strike[pos]
+        return (
+            self.trading_symbol[pos],
+            self.symbol[pos],
+            None if lot_size == -1 else lot_size,
+            self.expiry[pos],
+            None if exchange_code == -1 else exchange_code,
+            self.exchange[pos],
+            self.code[pos],
+            self.option_type[pos],
+            None if strike == -1 else strike,
+            bool(self.index[pos])
+        )
+
+    def to_instruments(self) -> List[Instrument]:
+        """ Instruments of all the rows """
+        return [Instrument.from_row(self.get_row(pos)) for pos in range(len(self))]
+
+    def to_numpy(self) -> "np.ndarray":
+        """ Structured array of the table. String columns are fixed width bytes """
+        import numpy as np
+        trading_symbols = [x.encode() for x in self.trading_symbol]
+        symbols = [x.encode() for x in self.symbol]
+        exchanges = [x.encode() for x in self.exchange]
+        dtype = np.dtype([
+            ("trading_symbol", f"S{max(map(len, trading_symbols), default=1)}"),
+            ("symbol", f"S{max(map(len, symbols), default=1)}"),
+            ("lot_size", np.int64),
+            ("expiry", np.int32),
+            ("exchange_code", np.int64),
+            ("exchange", f"S{max(map(len, exchanges), default=1)}"),
+            ("code", np.int64),
+            ("option_type", np.int8),
+            ("strike", np.int64),
+            ("index", np.bool_),
+        ])
+        records = np.empty(len(self), dtype=dtype)
+        records["trading_symbol"] = trading_symbols
+        records["symbol"] = symbols
+        records["exchange"] = exchanges
+        for name, typecode in self.NUMERIC_COLUMNS.items():
+            records[name] = np.frombuffer(getattr(self, name), dtype=np.dtype(typecode))
+        return records
+
+    def __getitem__(self, pos: int) -> Instrument:
+        return Instrument.from_row(self.get_row(pos))
+
+    def __iter__(self) -> Iterator[Instrument]:
+        for pos in range(len(self)):
+            yield Instrument.from_row(self.get_row(pos))
+
+    def __len__(self) -> int:
+        return len(self.code)
@@ -0,0 +1,72 @@
+"""
+File:           latency.py
+Author:         Dibyaranjan Sathua
+Created on:     27/10/21, 6:15 pm
+
+Latency histogram shared by the HTTP client and the feed queues.
+"""
+from typing import Dict, Optional, Tuple
+import bisect
+import math
+
+
+class LatencyHistogram:
+    """ Latency histogram with fixed millisecond buckets """
+    # Upper bound in milliseconds of every bucket. Last bucket has no upper bound
+    BUCKETS: Tuple[float, ...] = (
+        1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, math.inf
+    )
+
+    def __init__(self):
+        self.counts: list = [0] * len(self.BUCKETS)
+        self.count: int = 0
+        self.total: float = 0.0
+        self.min: float = math.inf
+        self.max: float = 0.0
+
+    def add(self, milliseconds: float):
+        """ Add a latency """
+        self.counts[bisect.bisect_left(self.BUCKETS, milliseconds)] += 1
+        self.count += 1
+        self.total += milliseconds
+        self.min = min(self.min, milliseconds)
+        self.max = max(self.max, milliseconds)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """ Upper bound of the bucket having the percentile (max for the last bucket) """
+        if not self.count:
+            return None
+        rank = percent / 100 * self.count
+        cumulative = 0
+        for bound, count in zip(self.BUCKETS, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def merge(self, other: "LatencyHistogram"):
+        """ Add the latencies of another histogram """
+        self.counts = [x + y for x, y in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def to_dict(self) -> Dict:
+        """ Summary of the histogram """
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "buckets": {
+                str(bound): count for bound, count in zip(self.BUCKETS, self.counts) if count
+            },
+        }
@@ -3,9 +3,16 @@ File:           option_chain.py
 Author:         Dibyaranjan Sathua
 Created on:     25/06/21, 2:05 pm
 """
-from typing import Optional, Dict
-from alice_blue_api.websocket_streams import MarketData, CompactMarketData
+from typing import Callable, Optional, Dict, Union, List
+import datetime
+
+from alice_blue_api.enums import FeedModes
+from alice_blue_api.websocket_streams import MarketData, CompactMarketData, SnapQuote, \
+    FullSnapQuote, OpenInterest, DPRData, MarketStatus, MARKET_DATA_STRUCT, \
+    COMPACT_MARKET_DATA_STRUCT, DECODER_BY_MODE_BYTE, MODE_BYTE_BY_MODE, \
+    price_divisor_by_exchange
 from alice_blue_api.instruments import Instrument
+from alice_blue_api.tick_store import TickStore, TickSnapshot
 
 
 class OptionChain:
@@ -20,7 +27,41 @@ class OptionChain:
 
     def __init__(self):
         # Use for other variable initialization
-        self.__option_chain: Dict = dict()
+        # Latest ltp, change, volume and timestamp of every instrument
+        self.__tick_store: TickStore = TickStore()
+        self.__depth: Dict = dict()
+        self.__open_interest: Dict = dict()
+        self.__dpr: Dict = dict()
+        self.__market_status: Dict = dict()
+        # Last MARKET_DATA frame (decoded on read) or record of instruments fed in that mode
+        self.__market_data: Dict[int, Union[bytes, MarketData]] = dict()
+        # Called with (code, ltp, volume, timestamp) after every market data tick
+        self.__tick_listeners: List[Callable[[int, float, int, int], None]] = []
+        # Mode byte to method updating the option chain from decoded data
+        self.__decoded_handlers = {
+            MODE_BYTE_BY_MODE[FeedModes.SNAPQUOTE]: self.update_depth,
+            MODE_BYTE_BY_MODE[FeedModes.FULL_SNAPQUOTE]: self.update_depth,
+            MODE_BYTE_BY_MODE[FeedModes.DPR]: self.update_dpr,
+            MODE_BYTE_BY_MODE[FeedModes.OI]: self.update_open_interest,
+            MODE_BYTE_BY_MODE[FeedModes.MARKET_STATUS]: self.update_market_status,
+        }
+        # Mode byte to method updating the option chain from the binary stream data
+        self.__stream_handlers = {
+            MODE_BYTE_BY_MODE[FeedModes.MARKET_DATA]: self._update_market_data_stream,
+            MODE_BYTE_BY_MODE[FeedModes.COMPACT_MARKETDATA]: self._update_compact_stream,
+        }
+        for mode in self.__decoded_handlers:
+            self.__stream_handlers[mode] = self._update_decoded_stream
+        # Record type to method updating the option chain from it
+        self.__record_handlers = {
+            MarketData: self.update,
+            CompactMarketData: self.update,
+            SnapQuote: self.update_depth,
+            FullSnapQuote: self.update_depth,
+            DPRData: self.update_dpr,
+            OpenInterest: self.update_open_interest,
+            MarketStatus: self.update_market_status,
+        }
 
     @classmethod
     def get_instance(cls):
@@ -34,10 +75,143 @@ class OptionChain:
         """ Method for test purposes. Don't use it in real code """
         cls.__instance = None
 
-    def update(self, data: CompactMarketData):
-        """ Parse the binary data and add to Option Chain """
-        self.__option_chain[data.code] = data
+    def update_from_stream(self, bin_data):
+        """
+        Update Option Chain from the binary stream data. Market data and compact market data
+        are unpacked straight into the tick store without creating any record object.
+        """
+        handler = self.__stream_handlers.get(bin_data[0])
+        if handler is not None:
+            handler(bin_data)
+
+    def _update_market_data_stream(self, bin_data):
+        """ Write market data stream to tick store """
+        values = MARKET_DATA_STRUCT.unpack_from(bin_data)
+        exchange = values[0]
+        ltp = values[2] / price_divisor_by_exchange(exchange)
+        self.__tick_store.write(values[1], exchange, ltp, None, values[5], values[13])
+        self.__market_data[values[1]] = bin_data
+        for listener in self.__tick_listeners:
+            listener(values[1], ltp, values[5], values[13])
+
+    def _update_compact_stream(self, bin_data):
+        """ Write compact market data stream to tick store """
+        exchange, code, ltp, change, exchange_timestamp, volume = \
+            COMPACT_MARKET_DATA_STRUCT.unpack_from(bin_data)
+        ltp = ltp / price_divisor_by_exchange(exchange)
+        self.__tick_store.write(code, exchange, ltp, change, volume, exchange_timestamp)
+        if self.__market_data:
+            self.__market_data.pop(code, None)
+        for listener in self.__tick_listeners:
+            listener(code, ltp, volume, exchange_timestamp)
+
+    def _update_decoded_stream(self, bin_data):
+        """ Decode the stream data and pass it to update method of its mode """
+        mode = bin_data[0]
+        self.__decoded_handlers[mode](DECODER_BY_MODE_BYTE[mode](bin_data))
+
+    def update_decoded(self, data):
+        """ Update Option Chain from a record already decoded by decode_stream """
+        self.__record_handlers[type(data)](data)
+
+    def update(self, data: Union[MarketData, CompactMarketData]):
+        """ Add decoded market data to Option Chain """
+        timestamp = int(data.exchange_timestamp.timestamp())
+        self.__tick_store.write(
+            data.code,
+            data.exchange,
+            data.ltp,
+            getattr(data, "change", None),
+            data.volume,
+            timestamp
+        )
+        if isinstance(data, MarketData):
+            self.__market_data[data.code] = data
+        elif self.__market_data:
+            self.__market_data.pop(data.code, None)
+        for listener in self.__tick_listeners:
+            listener(data.code, data.ltp, data.volume, timestamp)
+
+    def add_tick_listener(self, listener: Callable[[int, float, int, int], None]):
+        """
+        Call listener with (code, ltp, volume, timestamp) for every market data tick.
+        Listeners run on the websocket thread, so they should be quick.
+        """
+        self.__tick_listeners.append(listener)
+
+    def remove_tick_listener(self, listener: Callable[[int, float, int, int], None]):
+        """ Remove a tick listener """
+        self.__tick_listeners.remove(listener)
+
+    def update_depth(self, data: Union[SnapQuote, FullSnapQuote]):
+        """ Add five level market depth to Option Chain """
+        self.__depth[data.code] = data
+
+    def update_open_interest(self, data: OpenInterest):
+        """ Add open interest to Option Chain """
+        self.__open_interest[data.code] = data
+
+    def update_dpr(self, data: DPRData):
+        """ Add daily price range to Option Chain """
+        self.__dpr[data.code] = data
+
+    def update_market_status(self, data: MarketStatus):
+        """ Add market status of an exchange """
+        self.__market_status[data.exchange] = data
+
+    def get_market_data_by_instrument(
+            self, instrument: Instrument
+    ) -> Union[MarketData, CompactMarketData]:
+        """
+        Get the market data by instrument. MarketData (with bid, ask and OHLC) for instruments fed
+        in MARKET_DATA mode, else CompactMarketData read from the tick store.
+        Raise KeyError if there is no tick for it.
+        """
+        market_data = self.__market_data.get(instrument.code)
+        if market_data is not None:
+            if isinstance(market_data, MarketData):
+                return market_data
+            return MarketData.create(market_data)
+        row = self.__tick_store.read(instrument.code)
+        if row is None:
+            raise KeyError(instrument.code)
+        exchange, ltp, change, volume, timestamp = row
+        return CompactMarketData(
+            exchange,
+            instrument.code,
+            ltp,
+            change,
+            datetime.datetime.fromtimestamp(timestamp),
+            volume
+        )
+
+    def get_snapshot(self, instruments: Optional[List[Instrument]] = None) -> TickSnapshot:
+        """
+        Consistent snapshot of ltp, change, volume and timestamp columns of the instruments
+        (for example every strike of an expiry). Snapshot of all instruments if None.
+        Instruments without any tick are skipped.
+        """
+        codes = None if instruments is None else [x.code for x in instruments]
+        return self.__tick_store.snapshot(codes)
+
+    def get_depth_by_instrument(
+            self, instrument: Instrument
+    ) -> Optional[Union[SnapQuote, FullSnapQuote]]:
+        """ Get the market depth by instrument """
+        return self.__depth.get(instrument.code)
+
+    def get_open_interest_by_instrument(self, instrument: Instrument) -> Optional[OpenInterest]:
+        """ Get the open interest by instrument """
+        return self.__open_interest.get(instrument.code)
+
+    def get_dpr_by_instrument(self, instrument: Instrument) -> Optional[DPRData]:
+        """ Get the daily price range by instrument """
+        return self.__dpr.get(instrument.code)
+
+    def get_market_status(self, exchange: int) -> Optional[MarketStatus]:
+        """ Get the market status of an exchange """
+        return self.__market_status.get(exchange)
 
-    def get_market_data_by_instrument(self, instrument: Instrument) -> CompactMarketData:
-        """ Get the market data by instrument """
-        return self.__option_chain[instrument.code]
+    @property
+    def tick_store(self) -> TickStore:
+        return self.__tick_store
@@ -0,0 +1,162 @@
+"""
+File:           response_decoder.py
+Author:         Dibyaranjan Sathua
+Created on:     22/10/21, 6:30 pm
+
+Decode streamed responses. The raw (compressed) body is read chunk by chunk and every chunk
+goes through an incremental brotli / gzip / deflate decompressor, so only one compressed chunk
+is held at a time. Decompressed chunks are either yielded to a streaming parser (master
+contracts) or collected into one buffer which is parsed by json without creating the response
+text. Compressed and decompressed bytes and the time taken are recorded for every response.
+"""
+from typing import Iterator, Optional, TYPE_CHECKING
+from dataclasses import dataclass
+import json
+import time
+import zlib
+import brotli
+
+from alice_blue_api.exceptions import AliceBlueApiError
+
+if TYPE_CHECKING:
+    import requests
+
+
+CHUNK_SIZE: int = 64 * 1024
+
+
+class StreamDecoder:
+    """ Incremental decoder of a Content-Encoding (gzip, deflate, br or identity) """
+    ENCODINGS = ("identity", "gzip", "x-gzip", "deflate", "br")
+    # Largest decompressed piece
+    MAX_OUTPUT: int = 64 * 1024
+    # Brotli 1.0 has no output limit. Input is fed in slices of this size to keep the pieces
+    # small, though a slice of a very repetitive body can still decompress into megabytes
+    BROTLI_INPUT: int = 1024
+
+    def __init__(self, encoding: str):
+        self.encoding: str = encoding.strip().lower() or "identity"
+        if self.encoding not in self.ENCODINGS:
+            raise AliceBlueApiError(f"Unsupported Content-Encoding {encoding}")
+        self._decompressor = None
+        if self.encoding in ("gzip", "x-gzip"):
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self.encoding == "deflate":
+            self._decompressor = zlib.decompressobj()
+        elif self.encoding == "br":
+            self._decompressor = brotli.Decompressor()
+        # Brotli 1.1 and above can limit the output of a call
+        self._has_output_limit: bool = hasattr(self._decompressor, "can_accept_more_data")
+
+    def decompress(self, chunk: bytes) -> Iterator[bytes]:
+        """ Decompressed pieces available after chunk """
+        try:
+            if self._decompressor is None:
+                if chunk:
+                    yield chunk
+            elif self.encoding == "br" and self._has_output_limit:
+                data = self._decompressor.process(chunk, output_buffer_limit=self.MAX_OUTPUT)
+                while True:
+                    if data:
+                        yield data
+                    # Output can be pending even if more data can be accepted
+                    if self._decompressor.can_accept_more_data() and len(data) < self.MAX_OUTPUT:
+                        break
+                    data = self._decompressor.process(b"", output_buffer_limit=self.MAX_OUTPUT)
+            elif self.encoding == "br":
+                for pos in range(0, len(chunk), self.BROTLI_INPUT):
+                    data = self._decompressor.process(chunk[pos:pos + self.BROTLI_INPUT])
+                    if data:
+                        yield data
+            else:
+                while True:
+                    data = self._decompressor.decompress(chunk, self.MAX_OUTPUT)
+                    if data:
+                        yield data
+                    chunk = self._decompressor.unconsumed_tail
+                    # Output can be pending in the decompressor if the limit was reached
+                    if not chunk and len(data) < self.MAX_OUTPUT:
+                        break
+        except (zlib.error, brotli.error) as err:
+            raise AliceBlueApiError(f"Invalid {self.encoding} response body: {err}")
+
+    def flush(self) -> bytes:
+        """ Remaining decompressed bytes at the end of the body """
+        if self.encoding in ("gzip", "x-gzip", "deflate"):
+            return self._decompressor.flush()
+        return b""
+
+
+@dataclass()
+class TransferStats:
+    """ Bytes and time of a response. Times are seconds from sending the request """
+    endpoint: str
+    encoding: str
+    compressed_bytes: int = 0
+    decoded_bytes: int = 0
+    # Till the headers are received
+    headers_time: float = 0.0
+    # Till the body is read (and parsed by read_json)
+    total_time: float = 0.0
+
+    @classmethod
+    def create(cls, response: "requests.Response", endpoint: str) -> "TransferStats":
+        """ Stats of a response whose body is not read yet """
+        return cls(
+            endpoint=endpoint,
+            encoding=response.headers.get("Content-Encoding", "identity"),
+            headers_time=response.elapsed.total_seconds()
+        )
+
+    @property
+    def ratio(self) -> Optional[float]:
+        """ Compression ratio """
+        return self.decoded_bytes / self.compressed_bytes if self.compressed_bytes else None
+
+
+def iter_body(
+        response: "requests.Response",
+        stats: Optional[TransferStats] = None,
+        chunk_size: int = CHUNK_SIZE
+) -> Iterator[bytes]:
+    """
+    Decompressed body of a response sent with stream=True, piece by piece. stats are final
+    once the body is read or the iterator is closed.
+    """
+    start = time.perf_counter()
+    decoder = StreamDecoder(response.headers.get("Content-Encoding", "identity"))
+    try:
+        for chunk in response.raw.stream(chunk_size, decode_content=False):
+            if stats is not None:
+                stats.compressed_bytes += len(chunk)
+            for data in decoder.decompress(chunk):
+                if stats is not None:
+                    stats.decoded_bytes += len(data)
+                yield data
+        data = decoder.flush()
+        if stats is not None:
+            stats.decoded_bytes += len(data)
+        if data:
+            yield data
+    finally:
+        if stats is not None:
+            stats.total_time = stats.headers_time + time.perf_counter() - start
+
+
+def read_json(
+        response: "requests.Response",
+        stats: Optional[TransferStats] = None,
+        chunk_size: int = CHUNK_SIZE
+):
+    """ Parse the json body of a response sent with stream=True """
+    start = time.perf_counter()
+    body = bytearray()
+    for data in iter_body(response, stats, chunk_size):
+        body += data
+    try:
+        value = json.loads(body)
+    except ValueError as err:
+        raise AliceBlueApiError(f"Invalid json response: {err}")
+    if stats is not None:
+        stats.total_time = stats.headers_time + time.perf_counter() - start
+    return value
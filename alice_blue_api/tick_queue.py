@@ -0,0 +1,223 @@
+"""
+File:           tick_queue.py
+Author:         Dibyaranjan Sathua
+Created on:     27/10/21, 6:40 pm
+
+Bounded queue between the web socket reader and the decoders. The reader thread only appends
+the raw frame to a ring buffer, so a slow consumer (decoding, option chain, tick listeners)
+cannot stall the socket. Worker threads drain the buffers and handle the frames. Frames are
+sharded by instrument code, one buffer per worker, which keeps the ticks of an instrument in
+order. A full buffer drops the oldest frame or coalesces the new frame into the queued frame of
+the same instrument. Depth, drops and the reader to consumer lag are recorded.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+import threading
+import time
+
+from alice_blue_api.enums import FeedModes, OverflowPolicy
+from alice_blue_api.latency import LatencyHistogram
+from alice_blue_api.websocket_streams import MODE_BYTE_BY_MODE
+
+
+# Modes whose frames start with mode, exchange and code. Only these are coalesced
+COALESCE_MODE_BYTES = frozenset(
+    MODE_BYTE_BY_MODE[x] for x in (
+        FeedModes.MARKET_DATA, FeedModes.COMPACT_MARKETDATA, FeedModes.SNAPQUOTE,
+        FeedModes.FULL_SNAPQUOTE, FeedModes.OI, FeedModes.DPR
+    )
+)
+
+
+def get_coalesce_key(frame: bytes) -> Optional[bytes]:
+    """ Mode, exchange and code bytes of a frame. None if the frame is never coalesced """
+    if len(frame) >= 6 and frame[0] in COALESCE_MODE_BYTES:
+        return frame[:6]
+    return None
+
+
+class FrameQueue:
+    """ Bounded ring buffer of raw frames with one producer and one consumer thread """
+
+    def __init__(self, capacity: int, policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST):
+        self._capacity: int = capacity
+        self._coalesce: bool = policy is OverflowPolicy.COALESCE
+        self._frames: List[Optional[bytes]] = [None] * capacity
+        # perf_counter time at which every frame was pushed
+        self._times: List[float] = [0.0] * capacity
+        self._keys: List[Optional[bytes]] = [None] * capacity
+        # Sequence numbers of the oldest frame and of the next push. Slot is seq % capacity
+        self._head: int = 0
+        self._tail: int = 0
+        # Coalesce key to sequence number of its queued frame
+        self._queued: Dict[bytes, int] = dict()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._closed: bool = False
+        self.pushed: int = 0
+        self.dropped: int = 0
+        self.coalesced: int = 0
+        self.max_depth: int = 0
+        # Milliseconds from push till the consumer handles a frame. Written by the consumer
+        self.lag: LatencyHistogram = LatencyHistogram()
+
+    def push(self, frame: bytes):
+        """ Add a frame. Never blocks """
+        now = time.perf_counter()
+        with self._lock:
+            key = get_coalesce_key(frame) if self._coalesce else None
+            if self._tail - self._head == self._capacity:
+                seq = self._queued.get(key) if key is not None else None
+                if seq is not None:
+                    pos = seq % self._capacity
+                    self._frames[pos] = frame
+                    self._times[pos] = now
+                    self.coalesced += 1
+                    return
+                self._drop_oldest()
+            pos = self._tail % self._capacity
+            self._frames[pos] = frame
+            self._times[pos] = now
+            if self._coalesce:
+                self._keys[pos] = key
+                if key is not None:
+                    self._queued[key] = self._tail
+            self._tail += 1
+            self.pushed += 1
+            depth = self._tail - self._head
+            if depth > self.max_depth:
+                self.max_depth = depth
+            self._not_empty.notify()
+
+    def _drop_oldest(self):
+        """ Remove the oldest frame of a full queue """
+        self._take(self._head % self._capacity)
+        self._head += 1
+        self.dropped += 1
+
+    def _take(self, pos: int) -> Tuple[bytes, float]:
+        """ Frame and push time at slot pos, which is the head """
+        frame = self._frames[pos]
+        self._frames[pos] = None
+        if self._coalesce:
+            key = self._keys[pos]
+            if key is not None and self._queued.get(key) == self._head:
+                del self._queued[key]
+        return frame, self._times[pos]
+
+    def pop_many(
+            self,
+            max_items: int,
+            timeout: Optional[float] = None
+    ) -> List[Tuple[bytes, float]]:
+        """
+        Up to max_items oldest (frame, push time). Waits till a frame is pushed or timeout.
+        Empty if nothing was pushed in time or the queue is closed.
+        """
+        with self._not_empty:
+            if self._head == self._tail and not self._closed:
+                self._not_empty.wait(timeout)
+            items = []
+            while self._head < self._tail and len(items) < max_items:
+                items.append(self._take(self._head % self._capacity))
+                self._head += 1
+            return items
+
+    def close(self):
+        """ Wake up the consumer. Queued frames can still be popped """
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def depth(self) -> int:
+        return self._tail - self._head
+
+
+class TickPipeline:
+    """ Frames pushed by the socket reader are handled by worker threads """
+
+    def __init__(
+            self,
+            handler: Callable[[bytes], None],
+            workers: int = 1,
+            capacity: int = 65536,
+            policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+            batch_size: int = 256
+    ):
+        """
+        Constructor.
+        Args:
+            handler: Called with every frame on a worker thread.
+            workers: Number of worker threads. Frames of an instrument go to the same worker.
+            capacity: Frames buffered per worker.
+            policy: What a full buffer does with a new frame.
+            batch_size: Frames taken from a buffer at once.
+        """
+        self._handler: Callable[[bytes], None] = handler
+        self._queues: List[FrameQueue] = [FrameQueue(capacity, policy) for _ in range(workers)]
+        self._batch_size: int = batch_size
+        self._threads: List[threading.Thread] = []
+        self.errors: int = 0
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+    def push(self, frame: bytes):
+        """ Queue a frame for its worker. Called by the socket reader """
+        queues = self._queues
+        if len(queues) == 1:
+            queues[0].push(frame)
+        else:
+            queues[int.from_bytes(frame[2:6], "big") % len(queues)].push(frame)
+
+    def start(self):
+        """ Start the worker threads """
+        if self._threads:
+            return
+        for queue in self._queues:
+            thread = threading.Thread(target=self._work, args=(queue,))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self, queue: FrameQueue):
+        """ Handle the frames of a queue till it is closed and drained """
+        handler = self._handler
+        while True:
+            items = queue.pop_many(self._batch_size, timeout=1.0)
+            if not items and queue.closed:
+                return
+            for frame, pushed_at in items:
+                queue.lag.add((time.perf_counter() - pushed_at) * 1000)
+                try:
+                    handler(frame)
+                except Exception as err:
+                    # A bad frame or listener should not stop the feed
+                    self.errors += 1
+                    self._logger.exception(f"Error handling feed frame: {err}")
+
+    def stop(self):
+        """ Handle the queued frames and stop the workers """
+        for queue in self._queues:
+            queue.close()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def get_stats(self) -> Dict:
+        """ Queue depth, drops and lag in milliseconds of all the workers """
+        lag = LatencyHistogram()
+        for queue in self._queues:
+            lag.merge(queue.lag)
+        return {
+            "depth": sum(x.depth for x in self._queues),
+            "max_depth": max(x.max_depth for x in self._queues),
+            "pushed": sum(x.pushed for x in self._queues),
+            "dropped": sum(x.dropped for x in self._queues),
+            "coalesced": sum(x.coalesced for x in self._queues),
+            "errors": self.errors,
+            "lag": lag.to_dict(),
+        }
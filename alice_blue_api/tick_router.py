@@ -0,0 +1,270 @@
+"""
+File:           tick_router.py
+Author:         Dibyaranjan Sathua
+Created on:     29/10/21, 6:45 pm
+
+Route the ticks of the option chain to callbacks registered per instrument code, per underlying
+and per expiry. Filters are resolved into a code to subscriptions table whenever a callback or an
+instrument is added, so dispatching a tick is one dict lookup. Every call is timed. Exceptions
+are logged and counted. A callback whose moving average of slow calls is too high, or which
+blocks the feed once, is moved to its own thread with a bounded queue, so that one strategy cannot
+hold up the feed. A callback known to be slow can ask for its own thread when subscribing.
+"""
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+from collections import deque
+import datetime
+import logging
+import threading
+import time
+
+from alice_blue_api.instrument_index import InstrumentIndex
+from alice_blue_api.instruments import Instrument
+
+
+# (code, ltp, volume, timestamp) like an option chain tick listener
+TickCallback = Callable[[int, float, int, int], None]
+
+
+class TickSubscription:
+    """ Callback with its instrument filter and call statistics """
+
+    def __init__(
+            self,
+            callback: TickCallback,
+            codes: Optional[Iterable[int]],
+            underlying: Optional[str],
+            expiry: Optional[datetime.date],
+            slow_call_seconds: float,
+            slow_rate_alpha: float,
+            slow_rate_limit: float,
+            blocking_call_seconds: float,
+            queue_size: int,
+            threaded: bool = False
+    ):
+        self._callback: TickCallback = callback
+        self._codes: Optional[frozenset] = None if codes is None else frozenset(codes)
+        self._underlying: Optional[str] = underlying
+        self._expiry: Optional[datetime.date] = expiry
+        self._slow_call_seconds: float = slow_call_seconds
+        self._slow_rate_alpha: float = slow_rate_alpha
+        self._slow_rate_limit: float = slow_rate_limit
+        self._blocking_call_seconds: float = blocking_call_seconds
+        self._queue_size: int = queue_size
+        # Ticks waiting for the callback thread once the subscription is isolated
+        self._queue: Optional[Deque[Tuple[int, float, int, int]]] = None
+        self._not_empty = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closed: bool = False
+        self.calls: int = 0
+        self.errors: int = 0
+        self.slow_calls: int = 0
+        # Exponential moving average of slow calls (1) and other calls (0). A rare slow call,
+        # like a GC pause, decays away
+        self.slow_rate: float = 0.0
+        self.dropped: int = 0
+        self.total_seconds: float = 0.0
+        self.max_seconds: float = 0.0
+        self._logger = logging.getLogger(self.__class__.__name__)
+        if threaded:
+            self._start_thread()
+
+    def matches(self, code: int, instrument: Optional[Instrument]) -> bool:
+        """ True if ticks of the instrument code go to this subscription """
+        if self._codes is not None and code not in self._codes:
+            return False
+        if self._underlying is not None and (
+                instrument is None or
+                InstrumentIndex.get_underlying(instrument) != self._underlying
+        ):
+            return False
+        if self._expiry is not None and (instrument is None or instrument.expiry != self._expiry):
+            return False
+        return True
+
+    def deliver(self, code: int, ltp: float, volume: int, timestamp: int):
+        """ Call the callback, or queue the tick for the callback thread if isolated """
+        if self._queue is None:
+            elapsed = self._call(code, ltp, volume, timestamp)
+            if self._closed:
+                return
+            if elapsed > self._blocking_call_seconds:
+                self._logger.warning(
+                    f"Tick callback {self._callback} blocked the feed for {elapsed:.3f} s. "
+                    f"Moving it to its own thread"
+                )
+                self.isolate()
+            elif self.slow_rate >= self._slow_rate_limit:
+                self._logger.warning(
+                    f"Tick callback {self._callback} was slow in {self.slow_rate:.0%} "
+                    f"of recent calls. Moving it to its own thread"
+                )
+                self.isolate()
+            return
+        with self._not_empty:
+            if len(self._queue) == self._queue_size:
+                self.dropped += 1
+            self._queue.append((code, ltp, volume, timestamp))
+            self._not_empty.notify()
+
+    def _call(self, code: int, ltp: float, volume: int, timestamp: int) -> float:
+        """ Call the callback and return its time. Exception is logged and counted """
+        start = time.perf_counter()
+        try:
+            self._callback(code, ltp, volume, timestamp)
+        except Exception as err:
+            self.errors += 1
+            self._logger.exception(f"Error in tick callback {self._callback}: {err}")
+        elapsed = time.perf_counter() - start
+        self.calls += 1
+        self.total_seconds += elapsed
+        if elapsed > self.max_seconds:
+            self.max_seconds = elapsed
+        slow = elapsed > self._slow_call_seconds
+        if slow:
+            self.slow_calls += 1
+        self.slow_rate += self._slow_rate_alpha * (slow - self.slow_rate)
+        return elapsed
+
+    def isolate(self):
+        """ Call the callback on its own thread from now on. Oldest ticks are dropped if full """
+        if self._queue is not None:
+            return
+        self._start_thread()
+
+    def _start_thread(self):
+        """ Queue the ticks from now on and start the callback thread """
+        self._queue = deque(maxlen=self._queue_size)
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        """ Call the callback with the queued ticks till closed """
+        while True:
+            with self._not_empty:
+                while not self._queue and not self._closed:
+                    self._not_empty.wait()
+                if not self._queue:
+                    return
+                tick = self._queue.popleft()
+            self._call(*tick)
+
+    def close(self, timeout: Optional[float] = None):
+        """ Stop the callback thread after the queued ticks are handled """
+        with self._not_empty:
+            self._closed = True
+            self._not_empty.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def isolated(self) -> bool:
+        return self._queue is not None
+
+    def get_stats(self) -> Dict:
+        """ Calls, errors, slow calls, drops and call time in milliseconds """
+        return {
+            "callback": repr(self._callback),
+            "calls": self.calls,
+            "errors": self.errors,
+            "slow_calls": self.slow_calls,
+            "slow_rate": self.slow_rate,
+            "dropped": self.dropped,
+            "isolated": self.isolated,
+            "mean_ms": self.total_seconds * 1000 / self.calls if self.calls else 0.0,
+            "max_ms": self.max_seconds * 1000,
+        }
+
+
+class TickRouter:
+    """
+    Code to subscriptions routing table. update_tick has the signature of an option chain tick
+    listener. Underlying and expiry filters match the instruments added to the router.
+    """
+    # A call longer than this is slow. The callback is moved to its own thread once the
+    # moving average of slow calls (weight SLOW_RATE_ALPHA of the latest call) reaches
+    # SLOW_RATE_LIMIT, or at once after a call longer than BLOCKING_CALL_SECONDS
+    SLOW_CALL_SECONDS: float = 0.001
+    SLOW_RATE_ALPHA: float = 0.1
+    SLOW_RATE_LIMIT: float = 0.5
+    BLOCKING_CALL_SECONDS: float = 0.1
+    QUEUE_SIZE: int = 10000
+
+    def __init__(self):
+        self._instruments: Dict[int, Instrument] = dict()
+        self._subscriptions: List[TickSubscription] = []
+        # Tuples are replaced, never changed in place, so the dispatch path reads them without
+        # locking
+        self._routes: Dict[int, Tuple[TickSubscription, ...]] = dict()
+        self._lock = threading.Lock()
+
+    def add_instruments(self, instruments: Iterable[Instrument]):
+        """ Route ticks of new instruments to the subscriptions matching them """
+        with self._lock:
+            for instrument in instruments:
+                if instrument.code in self._instruments:
+                    continue
+                self._instruments[instrument.code] = instrument
+                subscriptions = tuple(
+                    x for x in self._subscriptions if x.matches(instrument.code, instrument)
+                )
+                if subscriptions:
+                    self._routes[instrument.code] = subscriptions
+
+    def subscribe(
+            self,
+            callback: TickCallback,
+            instruments: Optional[List[Instrument]] = None,
+            underlying: Optional[str] = None,
+            expiry: Optional[datetime.date] = None,
+            threaded: bool = False
+    ) -> TickSubscription:
+        """
+        Call callback with (code, ltp, volume, timestamp) of every tick of the instruments
+        matching all the given filters. Underlying is like NIFTY or BANKNIFTY. Callback runs on
+        its own thread from the start if threaded.
+        """
+        if instruments is not None:
+            self.add_instruments(instruments)
+        subscription = TickSubscription(
+            callback,
+            codes=None if instruments is None else [x.code for x in instruments],
+            underlying=underlying,
+            expiry=expiry,
+            slow_call_seconds=self.SLOW_CALL_SECONDS,
+            slow_rate_alpha=self.SLOW_RATE_ALPHA,
+            slow_rate_limit=self.SLOW_RATE_LIMIT,
+            blocking_call_seconds=self.BLOCKING_CALL_SECONDS,
+            queue_size=self.QUEUE_SIZE,
+            threaded=threaded
+        )
+        with self._lock:
+            self._subscriptions.append(subscription)
+            for code, instrument in self._instruments.items():
+                if subscription.matches(code, instrument):
+                    self._routes[code] = self._routes.get(code, ()) + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription: TickSubscription):
+        """ Stop routing ticks to a subscription and stop its thread """
+        with self._lock:
+            self._subscriptions.remove(subscription)
+            for code, subscriptions in list(self._routes.items()):
+                if subscription in subscriptions:
+                    subscriptions = tuple(x for x in subscriptions if x is not subscription)
+                    if subscriptions:
+                        self._routes[code] = subscriptions
+                    else:
+                        del self._routes[code]
+        subscription.close()
+
+    def update_tick(self, code: int, ltp: float, volume: int, timestamp: int):
+        """ Deliver a tick to the subscriptions of its instrument """
+        subscriptions = self._routes.get(code)
+        if subscriptions is not None:
+            for subscription in subscriptions:
+                subscription.deliver(code, ltp, volume, timestamp)
+
+    def get_stats(self) -> List[Dict]:
+        """ Call statistics of every subscription """
+        return [x.get_stats() for x in self._subscriptions]
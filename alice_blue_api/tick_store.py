@@ -0,0 +1,192 @@
+"""
+File:           tick_store.py
+Author:         Dibyaranjan Sathua
+Created on:     07/10/21, 10:20 pm
+
+Columnar store of the latest tick of every subscribed instrument. Single writer (websocket
+thread) and many readers (strategy threads). Every row has a sequence number which is odd while
+the writer is updating the row (seqlock), so readers can take a consistent copy of any set of
+rows without locking the writer.
+"""
+from typing import Dict, Iterable, Optional, Tuple, TYPE_CHECKING
+from dataclasses import dataclass
+import array
+
+from alice_blue_api.exceptions import AliceBlueApiError
+
+if TYPE_CHECKING:
+    # numpy is imported by the first reader, so that the writer and the decode path do not
+    # load it
+    import numpy as np
+
+
+COLUMN_TYPECODES = {
+    "code": "q",
+    "exchange": "q",
+    "ltp": "d",
+    "change": "q",
+    "volume": "q",
+    "timestamp": "q",
+    "seq": "q",
+}
+
+
+class TickColumns:
+    """
+    Preallocated columns. Writer writes to array.array buffers (cheaper per element than numpy
+    scalar assignment) and readers use numpy views sharing the same memory, as attributes
+    named like the columns. Views are created on first read. Replaced as a whole when the store
+    grows.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity: int = capacity
+        self.buffers: Dict[str, array.array] = {
+            name: array.array(typecode, bytes(8 * capacity))
+            for name, typecode in COLUMN_TYPECODES.items()
+        }
+        # Buffers in COLUMN_TYPECODES order for unpacking on the write path
+        self.row_buffers = tuple(self.buffers.values())
+        self._views: Optional[Dict[str, "np.ndarray"]] = None
+
+    def __getattr__(self, name: str) -> "np.ndarray":
+        """ numpy view of a column """
+        if name not in COLUMN_TYPECODES:
+            raise AttributeError(f"{self.__class__.__name__} has no attribute {name}")
+        if self._views is None:
+            import numpy as np
+            self._views = {
+                name: np.frombuffer(
+                    buffer, dtype=np.float64 if buffer.typecode == "d" else np.int64
+                )
+                for name, buffer in self.buffers.items()
+            }
+        return self._views[name]
+
+
+@dataclass()
+class TickSnapshot:
+    """ Consistent copy of a set of rows. seq // 2 is the number of ticks seen by each row """
+    code: "np.ndarray"
+    exchange: "np.ndarray"
+    ltp: "np.ndarray"
+    change: "np.ndarray"
+    volume: "np.ndarray"
+    timestamp: "np.ndarray"
+    seq: "np.ndarray"
+
+
+class TickStore:
+    """ Preallocated array backed store of latest ltp, change, volume and timestamp by slot """
+    MAX_SNAPSHOT_RETRIES: int = 1000
+
+    def __init__(self, capacity: int = 4096):
+        self._slots: Dict[int, int] = dict()
+        self._columns: TickColumns = TickColumns(capacity)
+
+    def slot(self, code: int) -> int:
+        """ Return the slot of an instrument code. Slot is assigned on first use """
+        slot = self._slots.get(code)
+        if slot is None:
+            slot = len(self._slots)
+            if slot == self._columns.capacity:
+                self._grow()
+            self._columns.buffers["code"][slot] = code
+            self._slots[code] = slot
+        return slot
+
+    def get_slot(self, code: int) -> Optional[int]:
+        """ Return the slot of an instrument code. None if there is no tick for it yet """
+        return self._slots.get(code)
+
+    def write(
+            self,
+            code: int,
+            exchange: int,
+            ltp: float,
+            change: Optional[int],
+            volume: int,
+            timestamp: int
+    ):
+        """ Write latest tick of an instrument. change is left untouched if None """
+        slot = self._slots.get(code)
+        if slot is None:
+            slot = self.slot(code)
+        _, exchanges, ltps, changes, volumes, timestamps, seq = self._columns.row_buffers
+        seq[slot] += 1
+        exchanges[slot] = exchange
+        ltps[slot] = ltp
+        if change is not None:
+            changes[slot] = change
+        volumes[slot] = volume
+        timestamps[slot] = timestamp
+        seq[slot] += 1
+
+    def snapshot(self, codes: Optional[Iterable[int]] = None) -> TickSnapshot:
+        """
+        Consistent copy of the rows of the given instrument codes (all rows if None).
+        Codes without any tick are skipped. Rows are copied and the copy is retried if the
+        writer touched any of them in between.
+        """
+        import numpy as np
+        if codes is None:
+            slots = np.arange(len(self._slots))
+        else:
+            slots = np.fromiter(
+                (self._slots[x] for x in codes if x in self._slots), dtype=np.int64
+            )
+        # Columns are read after slots. Writer grows the columns before publishing a new slot.
+        columns = self._columns
+        for _ in range(self.MAX_SNAPSHOT_RETRIES):
+            before = columns.seq[slots]
+            snapshot = TickSnapshot(
+                code=columns.code[slots],
+                exchange=columns.exchange[slots],
+                ltp=columns.ltp[slots],
+                change=columns.change[slots],
+                volume=columns.volume[slots],
+                timestamp=columns.timestamp[slots],
+                seq=columns.seq[slots]
+            )
+            if not (before & 1).any() and np.array_equal(before, snapshot.seq):
+                return snapshot
+        raise AliceBlueApiError(
+            f"Unable to take consistent snapshot after {self.MAX_SNAPSHOT_RETRIES} retries"
+        )
+
+    def read(self, code: int) -> Optional[Tuple[int, float, int, int, int]]:
+        """
+        Consistent (exchange, ltp, change, volume, timestamp) of an instrument without creating
+        numpy arrays. None if there is no tick for it.
+        """
+        slot = self._slots.get(code)
+        if slot is None:
+            return None
+        for _ in range(self.MAX_SNAPSHOT_RETRIES):
+            _, exchanges, ltps, changes, volumes, timestamps, seq = self._columns.row_buffers
+            before = seq[slot]
+            row = (exchanges[slot], ltps[slot], changes[slot], volumes[slot], timestamps[slot])
+            if not before & 1 and seq[slot] == before:
+                return row
+        raise AliceBlueApiError(
+            f"Unable to read consistent row after {self.MAX_SNAPSHOT_RETRIES} retries"
+        )
+
+    def _grow(self):
+        """ Double the capacity. Readers holding old columns keep a stale but consistent copy """
+        old = self._columns
+        new = TickColumns(old.capacity * 2)
+        for name in COLUMN_TYPECODES:
+            new.buffers[name][:old.capacity] = old.buffers[name]
+        self._columns = new
+
+    def __contains__(self, code: int) -> bool:
+        return code in self._slots
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    @property
+    def columns(self) -> TickColumns:
+        """ Live columns. Use snapshot() for a consistent copy """
+        return self._columns
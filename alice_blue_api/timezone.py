@@ -0,0 +1,12 @@
+"""
+File:           timezone.py
+Author:         Dibyaranjan Sathua
+Created on:     01/11/21, 6:40 pm
+
+Indian standard time, the time zone of the exchange sessions, token expiry and contract refresh.
+"""
+import datetime
+
+
+IST_OFFSET: int = 19800
+IST = datetime.timezone(datetime.timedelta(seconds=IST_OFFSET))
@@ -0,0 +1,293 @@
+"""
+File:           token_manager.py
+Author:         Dibyaranjan Sathua
+Created on:     23/10/21, 6:40 pm
+
+Lifecycle of the API tokens. Tokens are cached on disk with their expiry, so a new process
+reuses the token of the last login instead of logging in again. A background thread refreshes
+every token some time before it expires, so callers always get a valid token from memory.
+Refresh is single flight: one thread of one process logs in while the other threads wait for
+it, and processes on the same host are serialised by a file lock on the token.
+"""
+from typing import Callable, Dict, Optional
+from dataclasses import dataclass, asdict
+from pathlib import Path
+import contextlib
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+
+from alice_blue_api.exceptions import AliceBlueApiError
+from alice_blue_api.timezone import IST
+
+try:
+    import fcntl
+except ImportError:
+    # No file locks on Windows. Processes may log in concurrently
+    fcntl = None
+
+
+@dataclass()
+class Token:
+    """ Token value with creation and expiry time in epoch seconds """
+    value: str
+    created_at: float
+    expires_at: float
+
+    def is_valid(self, now: float) -> bool:
+        return now < self.expires_at
+
+
+@dataclass()
+class _TokenSpec:
+    """ Registered token """
+    name: str
+    generate: Callable[[], Optional[str]]
+    ttl: float
+    daily_expiry: Optional[datetime.time]
+    lock: threading.Lock
+    token: Optional[Token] = None
+    # Time after which background refresh is retried after a failure
+    retry_at: float = 0.0
+
+
+class TokenManager:
+    """ Disk cached tokens refreshed in the background before they expire """
+    CACHE_DIR: Path = Path.home() / ".stocklabs" / "tokens"
+
+    def __init__(
+            self,
+            cache_dir: Optional[str] = None,
+            refresh_before: float = 1800,
+            retry_interval: float = 60
+    ):
+        """
+        Constructor.
+        Args:
+            cache_dir: Directory of the token files.
+            refresh_before: Seconds before the expiry at which a token is refreshed.
+            retry_interval: Seconds after which a failed background refresh is retried.
+        """
+        self._cache_dir: Path = Path(cache_dir) if cache_dir is not None else self.CACHE_DIR
+        self._refresh_before: float = refresh_before
+        self._retry_interval: float = retry_interval
+        self._specs: Dict[str, _TokenSpec] = dict()
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._logger = logging.getLogger(self.__class__.__name__)
+        # Used in testing to fix the current time
+        self._now: Optional[float] = None
+
+    def register(
+            self,
+            name: str,
+            generate: Callable[[], Optional[str]],
+            ttl: float,
+            daily_expiry: Optional[datetime.time] = None
+    ):
+        """
+        Register a token.
+        Args:
+            name: Name of the token file. Should be unique per user.
+            generate: Logs in and returns a new token. None or empty if login failed.
+            ttl: Seconds for which a new token is valid.
+            daily_expiry: IST time at which tokens expire every day, if earlier than ttl.
+        """
+        self._specs[name] = _TokenSpec(
+            name=name, generate=generate, ttl=ttl, daily_expiry=daily_expiry,
+            lock=threading.Lock()
+        )
+
+    def get(self, name: str) -> str:
+        """
+        Valid token. Served from memory unless it expired, in which case it is loaded from disk
+        or generated. Only one caller generates a token, the others wait for it.
+        """
+        spec = self._get_spec(name)
+        token = spec.token
+        now = self._time()
+        if token is not None and token.is_valid(now):
+            if now >= self._get_refresh_time(spec, token):
+                # Background thread is late (or not started)
+                self._wake_event.set()
+            return token.value
+        return self._load_or_generate(spec, force=False).value
+
+    def refresh(self, name: str) -> str:
+        """
+        Replace the token even if it is valid. A newer token saved on disk by another process
+        is used instead of logging in again.
+        """
+        return self._load_or_generate(self._get_spec(name), force=True).value
+
+    def invalidate(self, name: str):
+        """ Remove a token, for example when the API rejects it """
+        spec = self._get_spec(name)
+        with spec.lock:
+            spec.token = None
+            try:
+                self._get_path(name).unlink()
+            except FileNotFoundError:
+                pass
+
+    def get_token(self, name: str) -> Optional[Token]:
+        """ Token in memory with its expiry. None if not loaded yet """
+        return self._get_spec(name).token
+
+    def _get_spec(self, name: str) -> _TokenSpec:
+        spec = self._specs.get(name)
+        if spec is None:
+            raise AliceBlueApiError(f"Token {name} is not registered")
+        return spec
+
+    def _time(self) -> float:
+        return self._now if self._now is not None else time.time()
+
+    def _get_path(self, name: str) -> Path:
+        return self._cache_dir / f"{name}.json"
+
+    def _load_or_generate(self, spec: _TokenSpec, force: bool) -> Token:
+        """
+        Valid token from disk, saved by another process, or a new token. With force the token
+        in memory is replaced even if valid, by a newer token on disk if there is one.
+        """
+        stale = spec.token
+        with spec.lock:
+            token = spec.token
+            if token is not stale and token is not None and token.is_valid(self._time()):
+                # Refreshed by another thread while this one waited for the lock
+                return token
+            with self._file_lock(spec.name):
+                token = self._load(spec.name)
+                now = self._time()
+                usable = token is not None and token.is_valid(now) and (
+                    not force or stale is None or token.created_at > stale.created_at
+                )
+                if not usable:
+                    token = self._generate(spec, now)
+                    self._save(spec.name, token)
+            spec.token = token
+            return token
+
+    @contextlib.contextmanager
+    def _file_lock(self, name: str):
+        """ Lock a token across the processes of the host """
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self._cache_dir / f"{name}.lock", "a") as lock_file:
+            if fcntl is None:
+                yield
+                return
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _generate(self, spec: _TokenSpec, now: float) -> Token:
+        """ Log in and create a token """
+        self._logger.info(f"Generating token {spec.name}")
+        value = spec.generate()
+        if not value:
+            raise AliceBlueApiError(f"Unable to generate token {spec.name}")
+        return Token(value=value, created_at=now, expires_at=self._get_expiry(spec, now))
+
+    @staticmethod
+    def _get_expiry(spec: _TokenSpec, created_at: float) -> float:
+        """ Expiry of a token created at created_at """
+        expires_at = created_at + spec.ttl
+        if spec.daily_expiry is not None:
+            created = datetime.datetime.fromtimestamp(created_at, tz=IST)
+            expiry = datetime.datetime.combine(created.date(), spec.daily_expiry, tzinfo=IST)
+            if expiry <= created:
+                expiry += datetime.timedelta(days=1)
+            expires_at = min(expires_at, expiry.timestamp())
+        return expires_at
+
+    def _get_refresh_time(self, spec: _TokenSpec, token: Token) -> float:
+        """
+        Time at which a token is refreshed, refresh_before seconds before it expires. A token
+        expiring soon after its creation, or whose replacement would expire at the same time
+        (daily expiry), is refreshed at expiry.
+        """
+        due = token.expires_at - self._refresh_before
+        if token.created_at >= due or self._get_expiry(spec, due) <= token.expires_at:
+            return token.expires_at
+        return due
+
+    def _load(self, name: str) -> Optional[Token]:
+        """ Token saved on disk. None if missing or corrupt """
+        path = self._get_path(name)
+        try:
+            with open(path) as fh_:
+                return Token(**json.load(fh_))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as err:
+            self._logger.warning(f"Ignoring corrupt token file {path}: {err}")
+            return None
+
+    def _save(self, name: str, token: Token):
+        """ Write token readable only by the user. Rename makes the write atomic """
+        path = self._get_path(name)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            fd = os.open(str(tmp_path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as fh_:
+                json.dump(asdict(token), fh_)
+            os.replace(str(tmp_path), str(path))
+        except OSError as err:
+            self._logger.warning(f"Unable to write token file {path}: {err}")
+
+    def refresh_due(self) -> float:
+        """
+        Refresh the tokens which expire within refresh_before seconds. Returns seconds till
+        the next refresh is due.
+        """
+        next_due = float(self._retry_interval)
+        for spec in list(self._specs.values()):
+            token = spec.token
+            if token is None:
+                continue
+            now = self._time()
+            due = self._get_refresh_time(spec, token)
+            if now < due:
+                next_due = min(next_due, due - now)
+                continue
+            if now < spec.retry_at:
+                next_due = min(next_due, spec.retry_at - now)
+                continue
+            try:
+                self._load_or_generate(spec, force=True)
+            except Exception as err:
+                self._logger.exception(f"Unable to refresh token {spec.name}: {err}")
+                spec.retry_at = now + self._retry_interval
+                next_due = min(next_due, self._retry_interval)
+        return max(next_due, 0.0)
+
+    def _run(self):
+        """ Refresh tokens till stopped """
+        while not self._stop_event.is_set():
+            wait = self.refresh_due()
+            self._wake_event.wait(wait)
+            self._wake_event.clear()
+
+    def start(self):
+        """ Start the background refresh thread """
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stop the background refresh thread """
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
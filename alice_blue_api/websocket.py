@@ -5,33 +5,81 @@ Created on:     20/06/21, 7:36 pm
 
 https://websocket-client.readthedocs.io/en/latest/app.html#websocket._app.WebSocketApp.__init__
 """
-from typing import Optional
+from typing import Callable, Dict, List, Optional, TYPE_CHECKING
 import json
 import threading
 import time
-import websocket
 
-from alice_blue_api.api import AliceBlueApi
-from alice_blue_api.websocket_streams import MarketData, CompactMarketData, get_mode_from_stream
 from alice_blue_api.option_chain import OptionChain
-from alice_blue_api.enums import FeedModes, FeedAction
+from alice_blue_api.enums import FeedAction, OverflowPolicy
+from alice_blue_api.feed_recovery import Backoff, FeedRecovery
+from alice_blue_api.tick_queue import TickPipeline
+
+if TYPE_CHECKING:
+    # websocket-client is imported on connect. API (requests) is imported only if the url is
+    # not given
+    import websocket
+    from alice_blue_api.api import AliceBlueApi
 
 
 class AliceBlueWebSocket:
     """ Web socket connection to get live feed market data """
     WS_ENDPOINT: str = 'wss://ant.aliceblueonline.com/hydrasocket/v2/websocket' \
                        '?access_token={access_token}'
-
-    def __init__(self):
-        self._websocket: Optional[websocket.WebSocketApp] = None
+    # Opcodes of websocket.ABNF, which is not imported till connect
+    OPCODE_TEXT: int = 0x1
+    OPCODE_PING: int = 0x9
+    # Frames are queued by the socket thread and handled by decode workers
+    DECODE_WORKERS: int = 1
+    QUEUE_CAPACITY: int = 65536
+    OVERFLOW_POLICY: OverflowPolicy = OverflowPolicy.COALESCE
+    # Seconds before reconnecting a dropped connection. Doubles after every failed attempt
+    RECONNECT_INITIAL_DELAY: float = 0.5
+    RECONNECT_MAX_DELAY: float = 30.0
+    # Seconds between pings of websocket-client and to wait for the pong. Connection without a
+    # pong is dropped and reconnected
+    PING_INTERVAL: float = 10.0
+    PING_TIMEOUT: float = 5.0
+    # Shortest outage (disconnect till reconnect) whose missed ticks are reported as gaps
+    MIN_GAP_SECONDS: float = 60
+
+    def __init__(self, url: Optional[str] = None):
+        """ url is WS_ENDPOINT with the access token of the API handler if None """
+        self._url: Optional[str] = url
+        self._websocket: Optional["websocket.WebSocketApp"] = None
         self._connected = False
+        self._stopped = False
         self._websocket_thread = None
-        self._alice_blue_api_handler: AliceBlueApi = AliceBlueApi.get_handler()
+        self._alice_blue_api_handler: Optional["AliceBlueApi"] = None
+        if url is None:
+            from alice_blue_api.api import AliceBlueApi
+            self._alice_blue_api_handler = AliceBlueApi.get_handler()
         self._option_chain: OptionChain = OptionChain.get_instance()
+        self._backoff: Backoff = Backoff(self.RECONNECT_INITIAL_DELAY, self.RECONNECT_MAX_DELAY)
+        self._recovery: FeedRecovery = FeedRecovery(self.MIN_GAP_SECONDS)
+        self._option_chain.add_tick_listener(self._recovery.update_tick)
+        self._connections: int = 0
+        # A connection was open. Only then a closed connection is an outage and an open one is
+        # a reconnect
+        self._was_open: bool = False
+        # Called on the socket thread when a dropped connection is open again
+        self._reconnect_callbacks: List[Callable[[], None]] = []
+        self._pipeline: TickPipeline = TickPipeline(
+            self._option_chain.update_from_stream,
+            workers=self.DECODE_WORKERS,
+            capacity=self.QUEUE_CAPACITY,
+            policy=self.OVERFLOW_POLICY
+        )
 
     def connect(self):
         """ Connect to web socket """
-        url = self.WS_ENDPOINT.format(access_token=self._alice_blue_api_handler.access_token)
+        import websocket
+        url = self._url
+        if url is None:
+            # Access token may have been refreshed since the last connect
+            url = self.WS_ENDPOINT.format(
+                access_token=self._alice_blue_api_handler.access_token
+            )
         self._websocket = websocket.WebSocketApp(
             url=url,
             on_open=self.on_open,
@@ -40,16 +88,27 @@ class AliceBlueWebSocket:
         )
 
     def _run_forever(self):
-        """ Run the websocket forever """
-        while True:
+        """ Run the websocket and reconnect with exponential backoff when the connection drops """
+        while not self._stopped:
             try:
-                self._websocket.run_forever()
+                self._websocket.run_forever(
+                    ping_interval=self.PING_INTERVAL, ping_timeout=self.PING_TIMEOUT
+                )
             except Exception as err:
                 print(f"Exception in websocket, {err}")
-            time.sleep(1)
+            self._connected = False
+            if self._stopped:
+                break
+            if self._was_open:
+                self._recovery.on_disconnect()
+            delay = self._backoff.next_delay()
+            print(f"Reconnecting websocket in {delay:.2f} sec")
+            time.sleep(delay)
+            self.connect()
 
     def start(self, thread=True):
         """ Start websocket. If thread is True, it will run in a different thread """
+        self._pipeline.start()
         self.connect()
         if thread:
             print(f"Starting websocket connection in a thread")
@@ -60,30 +119,52 @@ class AliceBlueWebSocket:
             self._run_forever()
 
     def on_message(self, ws, message):
-        """ on message callback """
-        # print("Receive message. Update option chain")
-        # print(message)
-        # Get mode of the stream
-        mode = get_mode_from_stream(message)
-        if mode == FeedModes.MARKET_DATA:
-            data = MarketData.create(message)
-            self._option_chain.update(data)
-        elif mode == FeedModes.COMPACT_MARKETDATA:
-            data = CompactMarketData.create(message)
-            self._option_chain.update(data)
-            print(data)
+        """ on message callback. Binary frames are queued for the decode workers """
+        if isinstance(message, bytes):
+            self._pipeline.push(message)
 
     def on_open(self, ws):
-        """ on open callback """
+        """ on open callback. Subscriptions are sent again on a reconnect """
         print("Connection open")
         self._connected = True
+        self._connections += 1
+        self._backoff.reset()
+        if not self._was_open:
+            # First connection, even after failed attempts, is not a reconnect
+            self._was_open = True
+            return None
+        self._recovery.on_connect()
+        for callback in self._reconnect_callbacks:
+            try:
+                callback()
+            except Exception as err:
+                print(f"Exception in reconnect callback {callback}, {err}")
 
-    def on_close(self, ws):
-        """ Connection closed """
+    def on_close(self, ws, *args):
+        """ Connection closed. websocket-client passes close status code and message """
         print("Connection closed")
         self._connected = False
 
-    def send(self, data, opcode=websocket.ABNF.OPCODE_TEXT):
+    def close(self):
+        """
+        Close the connection without reconnecting, stop the decode workers and remove the
+        recovery listener from the option chain
+        """
+        if not self._stopped:
+            self._option_chain.remove_tick_listener(self._recovery.update_tick)
+        self._stopped = True
+        if self._websocket is not None:
+            self._websocket.close()
+        if self._websocket_thread is not None:
+            self._websocket_thread.join()
+        self._connected = False
+        self._pipeline.stop()
+
+    def add_reconnect_callback(self, callback: Callable[[], None]):
+        """ Call callback on the socket thread after a dropped connection is open again """
+        self._reconnect_callbacks.append(callback)
+
+    def send(self, data, opcode=OPCODE_TEXT):
         """ Send data to web socket api """
         data = json.dumps(data)
         if self._connected:
@@ -94,7 +175,7 @@ class AliceBlueWebSocket:
         data = {"a": FeedAction.HEARTBEAT.value, "v": [], "m": ""}
         while True:
             time.sleep(5)
-            self.send(data, opcode=websocket.ABNF.OPCODE_PING)
+            self.send(data, opcode=self.OPCODE_PING)
 
     def send_heartbeat(self):
         """ Wrapper to run send_heartbeat in thread """
@@ -107,6 +188,18 @@ class AliceBlueWebSocket:
         while not self._connected:
             time.sleep(0.01)
 
+    def get_queue_stats(self) -> Dict:
+        """ Depth, drops and reader to decoder lag of the frame queues """
+        return self._pipeline.get_stats()
+
+    def get_recovery_stats(self) -> Dict:
+        """ Disconnects, reconnects, gaps and time to reconnect and recover """
+        return self._recovery.get_stats()
+
+    @property
+    def recovery(self) -> FeedRecovery:
+        return self._recovery
+
     @property
     def connected(self) -> bool:
         return self._connected
@@ -3,11 +3,17 @@ File:           websocket_streams.py
 Author:         Dibyaranjan Sathua
 Created on:     21/06/21, 7:15 pm
 """
+from typing import Iterable, List, Optional, Tuple, TYPE_CHECKING
 from dataclasses import dataclass
 import datetime
 import struct
 
 from alice_blue_api.enums import FeedModes
+from alice_blue_api.exceptions import FeedDecodeError
+
+if TYPE_CHECKING:
+    # numpy is imported by the batch decoders only, so that decoding a packet does not load it
+    import numpy as np
 
 
 def unpack_int8(bin_data, pos):
@@ -30,44 +36,71 @@ def unpack_int64(bin_data, pos):
     return struct.unpack(">Q", bin_data[pos:pos+8])[0]
 
 
+# Precompiled struct per feed mode. First byte (mode) is skipped using pad byte "x".
+MARKET_DATA_STRUCT = struct.Struct(">xBIIIIIIIIIQQIIIIIIII")
+COMPACT_MARKET_DATA_STRUCT = struct.Struct(">xBIIIII")
+# Five level depth: buyers, bid prices, bid quantities, sellers, ask prices, ask quantities
+SNAPQUOTE_STRUCT = struct.Struct(">xBI30II")
+FULL_SNAPQUOTE_STRUCT = struct.Struct(">xBI30IIIIIIQQI")
+OPEN_INTEREST_STRUCT = struct.Struct(">xBIII")
+DPR_STRUCT = struct.Struct(">xBIIII")
+MARKET_STATUS_LENGTH_STRUCT = struct.Struct(">H")
+
+# Exchanges whose prices are sent in paise. Rest are sent with 10^7 multiplier.
+PAISE_PRICE_EXCHANGES = frozenset([1, 2, 4, 6, 7])
+
+
+def price_divisor_by_exchange(exchange: int) -> int:
+    """ Return the value by which the raw price of an exchange should be divided """
+    return 100 if exchange in PAISE_PRICE_EXCHANGES else 10000000
+
+
 def price_multiplier_by_exchange(exchange: int):
     """ Return a price multiplier function """
-    if exchange in [1, 2, 4, 6, 7]:
-        return lambda x: x / 100
-    else:
-        return lambda x: x / 10000000
+    divisor = price_divisor_by_exchange(exchange)
+    return lambda x: x / divisor
+
+
+# Mode byte (1st byte of the stream) to feed mode
+FEED_MODE_BY_BYTE = {
+    1: FeedModes.MARKET_DATA,
+    2: FeedModes.COMPACT_MARKETDATA,
+    3: FeedModes.SNAPQUOTE,
+    4: FeedModes.FULL_SNAPQUOTE,
+    5: FeedModes.SPREADDATA,
+    6: FeedModes.SPREAD_SNAPQUOTE,
+    7: FeedModes.DPR,
+    8: FeedModes.OI,
+    9: FeedModes.MARKET_STATUS,
+    10: FeedModes.EXCHANGE_MESSAGES,
+}
+MODE_BYTE_BY_MODE = {mode: mode_byte for mode_byte, mode in FEED_MODE_BY_BYTE.items()}
 
 
 def get_mode_from_stream(bin_data) -> FeedModes:
     """ Return the mode from the binary stream data (1st byte) """
-    mode = unpack_int8(bin_data, 0)
-    enum_mode = None
-    if mode == 1:
-        enum_mode = FeedModes.MARKET_DATA
-    elif mode == 2:
-        enum_mode = FeedModes.COMPACT_MARKETDATA
-    elif mode == 3:
-        enum_mode = FeedModes.SNAPQUOTE
-    elif mode == 4:
-        enum_mode = FeedModes.FULL_SNAPQUOTE
-    elif mode == 5:
-        enum_mode = FeedModes.SPREADDATA
-    elif mode == 6:
-        enum_mode = FeedModes.SPREAD_SNAPQUOTE
-    elif mode == 7:
-        enum_mode = FeedModes.DPR
-    elif mode == 8:
-        enum_mode = FeedModes.OI
-    elif mode == 9:
-        enum_mode = FeedModes.MARKET_STATUS
-    elif mode == 10:
-        enum_mode = FeedModes.EXCHANGE_MESSAGES
-    return enum_mode
+    return FEED_MODE_BY_BYTE.get(bin_data[0])
+
+
+class InstrumentRecord:
+    """ Base of the decoded records of an instrument """
+    __slots__ = ()
+
+    @property
+    def token(self) -> int:
+        """ Instrument token, alias of code kept for existing callers """
+        return self.code
 
 
 @dataclass()
-class MarketData:
+class MarketData(InstrumentRecord):
     """ Parse market binary data """
+    __slots__ = (
+        "exchange", "code", "ltp", "last_trade_time", "last_trade_quantity", "volume",
+        "best_bid_price", "best_bid_quantity", "best_ask_price", "best_ask_quantity",
+        "total_buy_quantity", "total_sell_quantity", "avg_trade_price", "exchange_timestamp",
+        "open", "high", "low", "close", "yearly_high", "yearly_low"
+    )
     exchange: int
     code: int
     ltp: int
@@ -92,35 +125,41 @@ class MarketData:
     @classmethod
     def create(cls, bin_data):
         """ Unpack the binary data and create MarketData object """
-        # first byte will be ignored
-        kwargs = dict()
-        kwargs["exchange"] = unpack_int8(bin_data, 1)
-        price_multiplier = price_multiplier_by_exchange(kwargs["exchange"])
-        kwargs["code"] = unpack_int32(bin_data, 2)
-        kwargs["ltp"] = price_multiplier(unpack_int32(bin_data, 6))
-        kwargs["last_trade_time"] = datetime.datetime.fromtimestamp(unpack_int32(bin_data, 10))
-        kwargs["last_trade_quantity"] = unpack_int32(bin_data, 14)
-        kwargs["volume"] = unpack_int32(bin_data, 18)
-        kwargs["best_bid_price"] = price_multiplier(unpack_int32(bin_data, 22))
-        kwargs["best_bid_quantity"] = unpack_int32(bin_data, 26)
-        kwargs["best_ask_price"] = price_multiplier(unpack_int32(bin_data, 30))
-        kwargs["best_ask_quantity"] = unpack_int32(bin_data, 34)
-        kwargs["total_buy_quantity"] = unpack_int64(bin_data, 38)
-        kwargs["total_sell_quantity"] = unpack_int64(bin_data, 46)
-        kwargs["avg_trade_price"] = price_multiplier(unpack_int32(bin_data, 54))
-        kwargs["exchange_timestamp"] = datetime.datetime.fromtimestamp(unpack_int32(bin_data, 58))
-        kwargs["open"] = price_multiplier(unpack_int32(bin_data, 62))
-        kwargs["high"] = price_multiplier(unpack_int32(bin_data, 66))
-        kwargs["low"] = price_multiplier(unpack_int32(bin_data, 70))
-        kwargs["close"] = price_multiplier(unpack_int32(bin_data, 74))
-        kwargs["yearly_high"] = price_multiplier(unpack_int32(bin_data, 78))
-        kwargs["yearly_low"] = price_multiplier(unpack_int32(bin_data, 82))
-        return cls(**kwargs)
+        (
+            exchange, code, ltp, last_trade_time, last_trade_quantity, volume,
+            best_bid_price, best_bid_quantity, best_ask_price, best_ask_quantity,
+            total_buy_quantity, total_sell_quantity, avg_trade_price, exchange_timestamp,
+            open_, high, low, close, yearly_high, yearly_low
+        ) = MARKET_DATA_STRUCT.unpack_from(bin_data)
+        divisor = price_divisor_by_exchange(exchange)
+        return cls(
+            exchange,
+            code,
+            ltp / divisor,
+            datetime.datetime.fromtimestamp(last_trade_time),
+            last_trade_quantity,
+            volume,
+            best_bid_price / divisor,
+            best_bid_quantity,
+            best_ask_price / divisor,
+            best_ask_quantity,
+            total_buy_quantity,
+            total_sell_quantity,
+            avg_trade_price / divisor,
+            datetime.datetime.fromtimestamp(exchange_timestamp),
+            open_ / divisor,
+            high / divisor,
+            low / divisor,
+            close / divisor,
+            yearly_high / divisor,
+            yearly_low / divisor
+        )
 
 
 @dataclass()
-class CompactMarketData:
+class CompactMarketData(InstrumentRecord):
     """ Parse compact binary data """
+    __slots__ = ("exchange", "code", "ltp", "change", "exchange_timestamp", "volume")
     exchange: int
     code: int
     ltp: int
@@ -131,12 +170,303 @@ class CompactMarketData:
     @classmethod
     def create(cls, bin_data):
         """ Unpack the binary data and create CompactData object """
-        kwargs = dict()
-        kwargs["exchange"] = unpack_int8(bin_data, 1)
-        price_multiplier = price_multiplier_by_exchange(kwargs["exchange"])
-        kwargs["code"] = unpack_int32(bin_data, 2)
-        kwargs["ltp"] = price_multiplier(unpack_int32(bin_data, 6))
-        kwargs["change"] = unpack_int32(bin_data, 10)
-        kwargs["exchange_timestamp"] = datetime.datetime.fromtimestamp(unpack_int32(bin_data, 14))
-        kwargs["volume"] = unpack_int32(bin_data, 18)
-        return cls(**kwargs)
+        exchange, code, ltp, change, exchange_timestamp, volume = \
+            COMPACT_MARKET_DATA_STRUCT.unpack_from(bin_data)
+        return cls(
+            exchange,
+            code,
+            ltp / price_divisor_by_exchange(exchange),
+            change,
+            datetime.datetime.fromtimestamp(exchange_timestamp),
+            volume
+        )
+
+
+@dataclass()
+class SnapQuote(InstrumentRecord):
+    """ Parse snapquote binary data (five level market depth) """
+    __slots__ = (
+        "exchange", "code", "buyers", "bid_prices", "bid_quantities", "sellers", "ask_prices",
+        "ask_quantities", "exchange_timestamp"
+    )
+    exchange: int
+    code: int
+    buyers: Tuple[int, ...]
+    bid_prices: Tuple[float, ...]
+    bid_quantities: Tuple[int, ...]
+    sellers: Tuple[int, ...]
+    ask_prices: Tuple[float, ...]
+    ask_quantities: Tuple[int, ...]
+    exchange_timestamp: datetime.datetime
+
+    @classmethod
+    def create(cls, bin_data):
+        """ Unpack the binary data and create SnapQuote object """
+        values = SNAPQUOTE_STRUCT.unpack_from(bin_data)
+        exchange = values[0]
+        divisor = price_divisor_by_exchange(exchange)
+        return cls(
+            exchange,
+            values[1],
+            values[2:7],
+            tuple(x / divisor for x in values[7:12]),
+            values[12:17],
+            values[17:22],
+            tuple(x / divisor for x in values[22:27]),
+            values[27:32],
+            datetime.datetime.fromtimestamp(values[32])
+        )
+
+
+@dataclass()
+class FullSnapQuote(InstrumentRecord):
+    """ Parse full snapquote binary data (five level market depth with ohlc) """
+    __slots__ = (
+        "exchange", "code", "buyers", "bid_prices", "bid_quantities", "sellers", "ask_prices",
+        "ask_quantities", "avg_trade_price", "open", "high", "low", "close",
+        "total_buy_quantity", "total_sell_quantity", "volume"
+    )
+    exchange: int
+    code: int
+    buyers: Tuple[int, ...]
+    bid_prices: Tuple[float, ...]
+    bid_quantities: Tuple[int, ...]
+    sellers: Tuple[int, ...]
+    ask_prices: Tuple[float, ...]
+    ask_quantities: Tuple[int, ...]
+    avg_trade_price: float
+    open: float
+    high: float
+    low: float
+    close: float
+    total_buy_quantity: int
+    total_sell_quantity: int
+    volume: int
+
+    @classmethod
+    def create(cls, bin_data):
+        """ Unpack the binary data and create FullSnapQuote object """
+        values = FULL_SNAPQUOTE_STRUCT.unpack_from(bin_data)
+        exchange = values[0]
+        divisor = price_divisor_by_exchange(exchange)
+        return cls(
+            exchange,
+            values[1],
+            values[2:7],
+            tuple(x / divisor for x in values[7:12]),
+            values[12:17],
+            values[17:22],
+            tuple(x / divisor for x in values[22:27]),
+            values[27:32],
+            values[32] / divisor,
+            values[33] / divisor,
+            values[34] / divisor,
+            values[35] / divisor,
+            values[36] / divisor,
+            values[37],
+            values[38],
+            values[39]
+        )
+
+
+@dataclass()
+class OpenInterest(InstrumentRecord):
+    """ Parse open interest binary data """
+    __slots__ = ("exchange", "code", "current_open_interest", "initial_open_interest")
+    exchange: int
+    code: int
+    current_open_interest: int
+    initial_open_interest: int
+
+    @classmethod
+    def create(cls, bin_data):
+        """ Unpack the binary data and create OpenInterest object """
+        return cls(*OPEN_INTEREST_STRUCT.unpack_from(bin_data))
+
+
+@dataclass()
+class DPRData(InstrumentRecord):
+    """ Parse daily price range (circuit limits) binary data """
+    __slots__ = ("exchange", "code", "exchange_timestamp", "high", "low")
+    exchange: int
+    code: int
+    exchange_timestamp: datetime.datetime
+    high: float
+    low: float
+
+    @classmethod
+    def create(cls, bin_data):
+        """ Unpack the binary data and create DPRData object """
+        exchange, code, exchange_timestamp, high, low = DPR_STRUCT.unpack_from(bin_data)
+        divisor = price_divisor_by_exchange(exchange)
+        return cls(
+            exchange,
+            code,
+            datetime.datetime.fromtimestamp(exchange_timestamp),
+            high / divisor,
+            low / divisor
+        )
+
+
+@dataclass()
+class MarketStatus:
+    """ Parse market status binary data. Market type and status are length prefixed strings """
+    __slots__ = ("exchange", "market_type", "status")
+    exchange: int
+    market_type: str
+    status: str
+
+    @classmethod
+    def create(cls, bin_data):
+        """ Unpack the binary data and create MarketStatus object """
+        view = memoryview(bin_data)
+        pos = 2
+        market_type_length, = MARKET_STATUS_LENGTH_STRUCT.unpack_from(view, pos)
+        pos += 2
+        market_type = str(view[pos:pos + market_type_length], "utf-8")
+        pos += market_type_length
+        status_length, = MARKET_STATUS_LENGTH_STRUCT.unpack_from(view, pos)
+        pos += 2
+        status = str(view[pos:pos + status_length], "utf-8")
+        return cls(view[1], market_type, status)
+
+
+# Mode byte to decoder. Modes without an entry (spread data and exchange messages) are ignored.
+DECODER_BY_MODE_BYTE = {
+    MODE_BYTE_BY_MODE[FeedModes.MARKET_DATA]: MarketData.create,
+    MODE_BYTE_BY_MODE[FeedModes.COMPACT_MARKETDATA]: CompactMarketData.create,
+    MODE_BYTE_BY_MODE[FeedModes.SNAPQUOTE]: SnapQuote.create,
+    MODE_BYTE_BY_MODE[FeedModes.FULL_SNAPQUOTE]: FullSnapQuote.create,
+    MODE_BYTE_BY_MODE[FeedModes.DPR]: DPRData.create,
+    MODE_BYTE_BY_MODE[FeedModes.OI]: OpenInterest.create,
+    MODE_BYTE_BY_MODE[FeedModes.MARKET_STATUS]: MarketStatus.create,
+}
+
+
+def decode_stream(bin_data):
+    """ Decode the binary stream data using the decoder for its mode. None if not supported """
+    decoder = DECODER_BY_MODE_BYTE.get(bin_data[0])
+    if decoder is None:
+        return None
+    return decoder(bin_data)
+
+
+# Batch decoding of recorded frames. Each entry is (field name, big endian raw format, kind).
+# kind is "price" for fields scaled by exchange price divisor, "time" for epoch seconds and
+# "raw" for fields copied as it is.
+MARKET_DATA_FIELDS: List[Tuple[str, str, str]] = [
+    ("mode", "u1", "raw"),
+    ("exchange", "u1", "raw"),
+    ("code", ">u4", "raw"),
+    ("ltp", ">u4", "price"),
+    ("last_trade_time", ">u4", "time"),
+    ("last_trade_quantity", ">u4", "raw"),
+    ("volume", ">u4", "raw"),
+    ("best_bid_price", ">u4", "price"),
+    ("best_bid_quantity", ">u4", "raw"),
+    ("best_ask_price", ">u4", "price"),
+    ("best_ask_quantity", ">u4", "raw"),
+    ("total_buy_quantity", ">u8", "raw"),
+    ("total_sell_quantity", ">u8", "raw"),
+    ("avg_trade_price", ">u4", "price"),
+    ("exchange_timestamp", ">u4", "time"),
+    ("open", ">u4", "price"),
+    ("high", ">u4", "price"),
+    ("low", ">u4", "price"),
+    ("close", ">u4", "price"),
+    ("yearly_high", ">u4", "price"),
+    ("yearly_low", ">u4", "price"),
+]
+COMPACT_MARKET_DATA_FIELDS: List[Tuple[str, str, str]] = [
+    ("mode", "u1", "raw"),
+    ("exchange", "u1", "raw"),
+    ("code", ">u4", "raw"),
+    ("ltp", ">u4", "price"),
+    ("change", ">u4", "raw"),
+    ("exchange_timestamp", ">u4", "time"),
+    ("volume", ">u4", "raw"),
+]
+BATCH_FIELDS_BY_MODE = {
+    FeedModes.MARKET_DATA: MARKET_DATA_FIELDS,
+    FeedModes.COMPACT_MARKETDATA: COMPACT_MARKET_DATA_FIELDS,
+}
+
+
+def raw_frame_dtype(mode: FeedModes, frame_size: Optional[int] = None) -> "np.dtype":
+    """
+    Big endian structured dtype laid over a frame of the given mode.
+    frame_size can be more than the decoded bytes. Trailing bytes of each frame are skipped.
+    """
+    import numpy as np
+    names, formats, offsets = [], [], []
+    offset = 0
+    for name, fmt, _ in BATCH_FIELDS_BY_MODE[mode]:
+        names.append(name)
+        formats.append(fmt)
+        offsets.append(offset)
+        offset += np.dtype(fmt).itemsize
+    if frame_size is None:
+        frame_size = offset
+    if frame_size < offset:
+        raise FeedDecodeError(f"Frame size {frame_size} is less than {offset} bytes for {mode}")
+    return np.dtype(
+        {"names": names, "formats": formats, "offsets": offsets, "itemsize": frame_size}
+    )
+
+
+def decoded_frame_dtype(mode: FeedModes) -> "np.dtype":
+    """ Native dtype of decoded frames. Prices are float and timestamps are epoch seconds """
+    import numpy as np
+    formats = {"price": np.float64, "time": np.int64}
+    return np.dtype([
+        (name, formats.get(kind, np.dtype(fmt).newbyteorder("=")))
+        for name, fmt, kind in BATCH_FIELDS_BY_MODE[mode] if name != "mode"
+    ])
+
+
+def frames_view(buffer, mode: FeedModes, frame_size: Optional[int] = None) -> "np.ndarray":
+    """ Zero copy structured view over concatenated fixed size frames of a single mode """
+    import numpy as np
+    dtype = raw_frame_dtype(mode, frame_size=frame_size)
+    if len(buffer) % dtype.itemsize:
+        raise FeedDecodeError(
+            f"Buffer of {len(buffer)} bytes is not a multiple of frame size {dtype.itemsize}"
+        )
+    frames = np.frombuffer(buffer, dtype=dtype)
+    if frames.size and not (frames["mode"] == MODE_BYTE_BY_MODE[mode]).all():
+        raise FeedDecodeError(f"Buffer contains frames which are not of mode {mode}")
+    return frames
+
+
+def decode_frames(buffer, mode: FeedModes, frame_size: Optional[int] = None) -> "np.ndarray":
+    """
+    Decode concatenated MARKET_DATA or COMPACT_MARKETDATA frames into a structured array.
+    Frames are read in place using np.frombuffer and prices are scaled per exchange in a single
+    vectorized operation. Values are same as MarketData.create / CompactMarketData.create except
+    timestamps which are kept as epoch seconds.
+    """
+    import numpy as np
+    frames = frames_view(buffer, mode, frame_size=frame_size)
+    decoded = np.empty(frames.shape, dtype=decoded_frame_dtype(mode))
+    divisor = np.where(
+        np.isin(frames["exchange"], sorted(PAISE_PRICE_EXCHANGES)), 100.0, 10000000.0
+    )
+    for name, _, kind in BATCH_FIELDS_BY_MODE[mode]:
+        if name == "mode":
+            continue
+        if kind == "price":
+            np.divide(frames[name], divisor, out=decoded[name])
+        else:
+            decoded[name] = frames[name]
+    return decoded
+
+
+def decode_frame_list(frames: Iterable[bytes], mode: FeedModes) -> "np.ndarray":
+    """
+    Decode a list of frames of a single mode. Frames of a mode can differ in length (NFO
+    compact frames carry extra trailing bytes), so only the decoded prefix of each frame is
+    joined into one buffer before decoding.
+    """
+    size = raw_frame_dtype(mode).itemsize
+    buffer = b"".join(memoryview(frame)[:size] for frame in frames)
+    return decode_frames(buffer, mode)
@@ -0,0 +1,5 @@
+"""
+File:           __init__.py
+Author:         Dibyaranjan Sathua
+Created on:     05/10/21, 9:10 pm
+"""
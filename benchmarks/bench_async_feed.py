@@ -0,0 +1,126 @@
+"""
+File:           bench_async_feed.py
+Author:         Dibyaranjan Sathua
+Created on:     26/10/21, 9:00 pm
+
+Latency from frame arrival to callback of the threaded websocket-client feed (as
+AliceBlueWebSocket, callback in on_message on the socket thread) vs AsyncFeedClient (callback
+and async iterator on the event loop). A local stub server sends COMPACT_MARKETDATA packets in
+bursts. Latency is from the time the server writes a frame till the consumer gets its tick.
+The server thread shares the process, so the numbers include its GIL contention.
+Run using python -m benchmarks.bench_async_feed
+"""
+from typing import Dict, List
+import asyncio
+import statistics
+import threading
+import time
+
+from alice_blue_api.async_websocket import AsyncFeedClient
+from alice_blue_api.websocket_streams import decode_stream
+from test.helpers.feed import StubFeedServer, compact_packet
+
+
+PACKETS: int = 20000
+BURST: int = 50
+# Seconds between bursts
+BURST_INTERVAL: float = 0.002
+
+
+def send_bursts(server: StubFeedServer) -> List[float]:
+    """ Send PACKETS packets in bursts. Code of a packet is its sequence number """
+    send_times = []
+    for start in range(0, PACKETS, BURST):
+        packets = [
+            compact_packet(code, 35000 + code % 100, 1635235200)
+            for code in range(start, min(start + BURST, PACKETS))
+        ]
+        send_times += server.send_packets(packets)
+        time.sleep(BURST_INTERVAL)
+    return send_times
+
+
+def get_latency_stats(send_times: List[float], receive_times: List[float]) -> Dict:
+    """ Latency percentiles in microseconds """
+    latency = sorted((r - s) * 1e6 for s, r in zip(send_times, receive_times))
+    return {
+        "received": len(latency),
+        "p50": latency[len(latency) // 2],
+        "p99": latency[int(len(latency) * 0.99)],
+        "max": latency[-1],
+        "mean": statistics.mean(latency),
+    }
+
+
+def measure_threaded(server: StubFeedServer) -> Dict:
+    """ websocket-client WebSocketApp with run_forever in a thread """
+    import websocket
+    receive_times = [0.0] * PACKETS
+    done = threading.Event()
+
+    def on_message(ws, message):
+        tick = decode_stream(message)
+        receive_times[tick.code] = time.perf_counter()
+        if tick.code == PACKETS - 1:
+            done.set()
+
+    server.client_connected.clear()
+    app = websocket.WebSocketApp(server.url, on_message=on_message)
+    thread = threading.Thread(target=app.run_forever, daemon=True)
+    thread.start()
+    server.client_connected.wait(5)
+    send_times = send_bursts(server)
+    done.wait(10)
+    app.close()
+    thread.join(5)
+    return get_latency_stats(send_times, receive_times)
+
+
+async def measure_async(server: StubFeedServer, iterator: bool) -> Dict:
+    """ AsyncFeedClient with a callback or an async iterator consumer """
+    receive_times = [0.0] * PACKETS
+    done = asyncio.Event()
+
+    def on_tick(tick):
+        receive_times[tick.code] = time.perf_counter()
+        if tick.code == PACKETS - 1:
+            done.set()
+
+    async def consume(stream):
+        async for tick in stream:
+            on_tick(tick)
+
+    server.client_connected.clear()
+    client = AsyncFeedClient(server.url)
+    await client.start()
+    await client.wait_until_connection_open()
+    if iterator:
+        consumer = asyncio.create_task(consume(client.ticks(maxsize=PACKETS)))
+    else:
+        client.add_callback(on_tick)
+    # Server sends from its own thread, so that the event loop only receives
+    send_times = await asyncio.get_running_loop().run_in_executor(None, send_bursts, server)
+    await asyncio.wait_for(done.wait(), 10)
+    await client.close()
+    if iterator:
+        await consumer
+    return get_latency_stats(send_times, receive_times)
+
+
+def print_stats(name: str, stats: Dict):
+    print(f"{name:<40} received {stats['received']}  p50 {stats['p50']:7.1f} us  "
+          f"p99 {stats['p99']:8.1f} us  max {stats['max']:8.1f} us  mean {stats['mean']:7.1f} us")
+
+
+def main():
+    server = StubFeedServer().start()
+    print(f"{PACKETS} packets in bursts of {BURST} every {BURST_INTERVAL * 1000:.0f} ms, "
+          f"each consumer with its own connection")
+    print_stats("websocket-client thread (on_message)", measure_threaded(server))
+    print_stats("AsyncFeedClient callback", asyncio.run(measure_async(server, iterator=False)))
+    print_stats("AsyncFeedClient async iterator", asyncio.run(measure_async(server, iterator=True)))
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
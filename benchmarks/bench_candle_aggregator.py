@@ -0,0 +1,74 @@
+"""
+File:           bench_candle_aggregator.py
+Author:         Dibyaranjan Sathua
+Created on:     16/10/21, 10:10 pm
+
+Tick throughput of the candle aggregator building all timeframes and latency of the bar close
+callbacks fired by the timer.
+Run using python -m benchmarks.bench_candle_aggregator [--timer]
+--timer waits for the next minute boundary to measure the callback latency.
+"""
+import random
+import struct
+import sys
+import time
+
+from alice_blue_api.candle_aggregator import CandleAggregator
+from alice_blue_api.enums import CandleTimeFrame
+from alice_blue_api.option_chain import OptionChain
+
+TICKS = 200000
+INSTRUMENTS = 500
+# 11/10/21 09:15 IST
+SESSION_START = 1633923900
+
+
+def throughput():
+    """ Ticks per second through the option chain with and without the aggregator """
+    random.seed(7)
+    # Compact packets of one hour of ticks (NFO exchange)
+    packets = [
+        struct.pack(
+            ">BBIIIII", 2, 2, 40000 + x % INSTRUMENTS, 3600000 + random.randint(-500, 500), 25,
+            SESSION_START + x * 3600 // TICKS, x
+        )
+        for x in range(TICKS)
+    ]
+    for aggregator in [None, CandleAggregator()]:
+        OptionChain.reset()
+        option_chain = OptionChain.get_instance()
+        if aggregator is not None:
+            option_chain.add_tick_listener(aggregator.update_tick)
+        start = time.perf_counter()
+        for packet in packets:
+            option_chain.update_from_stream(packet)
+        elapsed = time.perf_counter() - start
+        name = "option chain only" if aggregator is None else "with 7 timeframe aggregator"
+        print(f"{name:<28} {TICKS / elapsed:9.0f} ticks/sec")
+    start = time.perf_counter()
+    closed = aggregator.close_due_bars(SESSION_START + 86400)
+    print(f"close_due_bars: {closed} bars in {(time.perf_counter() - start) * 1e3:.1f} ms")
+    OptionChain.reset()
+
+
+def timer_latency():
+    """ Delay between the minute boundary and the bar close callback """
+    aggregator = CandleAggregator(timeframes=[CandleTimeFrame.ONE_MINUTE], close_delay=0)
+    latencies = []
+    aggregator.add_bar_close_callback(
+        lambda bar: latencies.append(time.time() - (bar.start + 60))
+    )
+    for code in range(INSTRUMENTS):
+        aggregator.update_tick(code, 100.0, 0, int(time.time()))
+    aggregator.start()
+    while not latencies:
+        time.sleep(0.1)
+    aggregator.stop()
+    print(f"bar close callback latency: first {latencies[0] * 1e3:.2f} ms, "
+          f"last {latencies[-1] * 1e3:.2f} ms after the boundary for {len(latencies)} bars")
+
+
+if __name__ == "__main__":
+    throughput()
+    if "--timer" in sys.argv:
+        timer_latency()
@@ -0,0 +1,57 @@
+"""
+File:           bench_candle_container.py
+Author:         Dibyaranjan Sathua
+Created on:     18/10/21, 8:00 pm
+
+Candle lookups by datetime and previous trading day high low on months of 1-minute candles.
+List scans of CandleApi / KiteCandle vs CandleContainer binary search.
+Run using python -m benchmarks.bench_candle_container
+"""
+import datetime
+import timeit
+
+from candles.container import CandleContainer
+from candles.store import rows_to_records
+from test.helpers.candles import (
+    get_candle_rows, get_candles, legacy_price_by_time, legacy_previous_day_high_low
+)
+
+# 01/04/21 00:00 IST
+START = 1617215400
+
+
+def main(number: int = 20):
+    """ Time the queries on the last trading day (a Monday, so 3 days back is a trading day) """
+    for days in [30, 90, 180]:
+        candles = get_candles(days)
+        today = candles[-1].date
+        while today.weekday() != 0:
+            today -= datetime.timedelta(days=1)
+        time = datetime.time(9, 36)
+        container = CandleContainer.from_candles(candles)
+        build = timeit.timeit(lambda: CandleContainer.from_candles(candles), number=1)
+        records = rows_to_records(get_candle_rows(START, START + days * 86400))
+        build_records = timeit.timeit(lambda: CandleContainer(records), number=1)
+        assert candles[container.find(today, time)] is legacy_price_by_time(candles, today, time)
+        assert container.get_day_high_low(container.get_previous_trading_day(today)) == \
+            legacy_previous_day_high_low(candles, today)
+        results = [
+            timeit.timeit(lambda: legacy_price_by_time(candles, today, time), number=number),
+            timeit.timeit(lambda: container.find(today, time), number=number),
+            timeit.timeit(lambda: legacy_previous_day_high_low(candles, today), number=number),
+            timeit.timeit(
+                lambda: container.get_day_high_low(container.get_previous_trading_day(today)),
+                number=number
+            ),
+        ]
+        print(f"{days:>3} days, {len(candles):>6} candles. "
+              f"price_by_time: scan {results[0] / number * 1e3:8.3f} ms, "
+              f"container {results[1] / number * 1e3:6.3f} ms. "
+              f"prev day high low: scan {results[2] / number * 1e3:8.3f} ms, "
+              f"container {results[3] / number * 1e3:6.3f} ms. "
+              f"build: from candles {build * 1e3:.1f} ms, "
+              f"from records {build_records * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
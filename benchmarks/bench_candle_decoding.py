@@ -0,0 +1,49 @@
+"""
+File:           bench_candle_decoding.py
+Author:         Dibyaranjan Sathua
+Created on:     19/10/21, 6:50 pm
+
+Decoding a year of 1-minute candle API rows. Per row strptime and dataclass creation (previous
+CandleApi._get_candles) vs bulk parsing into records, indexing and lazy candle objects.
+Run using python -m benchmarks.bench_candle_decoding
+"""
+from typing import List
+import timeit
+
+from candles.container import CandleContainer, LazyCandles
+from candles.store import rows_to_records
+from test.helpers.candles import Candle, candle_from_record, get_candle_rows, legacy_get_candles
+
+# 01/04/21 00:00 IST
+START = 1617215400
+
+
+def decode(rows: List[List]) -> LazyCandles:
+    """ Current CandleApi decoding """
+    return LazyCandles(CandleContainer(rows_to_records(rows)), candle_from_record)
+
+
+def access(candles: LazyCandles, count: int) -> List[Candle]:
+    """ Access first candle of count days """
+    return [candles[x] for x in range(0, 375 * count, 375)]
+
+
+def main(number: int = 3):
+    rows = get_candle_rows(START, START + 365 * 86400)
+    candles = decode(rows)
+    assert candles[-1] == legacy_get_candles(rows[-1:])[0]
+    legacy = timeit.timeit(lambda: legacy_get_candles(rows), number=number) / number
+    current = timeit.timeit(lambda: decode(rows), number=number) / number
+    # Typical use touches a few candles (day open, candle at a time)
+    accessed = timeit.timeit(lambda: access(decode(rows), 3), number=number) / number
+    everything = timeit.timeit(lambda: list(decode(rows)), number=number) / number
+    print(f"{len(rows)} rows")
+    print(f"{'legacy strptime + dataclass':<36}{legacy * 1000:>10.1f} ms")
+    print(f"{'records + container':<36}{current * 1000:>10.1f} ms")
+    print(f"{'records + container + 3 candles':<36}{accessed * 1000:>10.1f} ms")
+    print(f"{'records + container + all candles':<36}{everything * 1000:>10.1f} ms")
+    print(f"Speedup (lazy): {legacy / accessed:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
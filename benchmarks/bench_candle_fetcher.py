@@ -0,0 +1,65 @@
+"""
+File:           bench_candle_fetcher.py
+Author:         Dibyaranjan Sathua
+Created on:     20/10/21, 8:10 pm
+
+Morning fetch of 5 days of 1-minute candles of 80 BANKNIFTY strikes from a local stub candle API
+with 30 ms latency. One request at a time on a new session (CandleApi.send_request) vs
+CandleFetcher on a thread pool sharing keep-alive connections.
+Run using python -m benchmarks.bench_candle_fetcher
+"""
+import time
+import requests
+
+from candles.fetcher import CandleFetcher, CandleJob
+from candles.store import rows_to_records
+from test.helpers.candles import SlowCandleHandler, get_request
+from test.helpers.servers import start_server
+
+# 01/04/21 00:00 IST
+START = 1617215400
+TOKENS = list(range(53000, 53080))
+
+
+def legacy_fetch(url: str, jobs):
+    """ One request at a time on a new session """
+    results = []
+    for job in jobs:
+        params = get_request(url)(job)[1]
+        with requests.Session() as session:
+            response = session.get(url=url, params=params)
+        results.append(rows_to_records(response.json()["data"]["candles"]))
+    return results
+
+
+def main():
+    server = start_server(SlowCandleHandler)
+    url = f"http://127.0.0.1:{server.server_port}/"
+    jobs = [CandleJob(x, "ONE_MINUTE", START, START + 5 * 86400) for x in TOKENS]
+    SlowCandleHandler.connections.clear()
+    start = time.perf_counter()
+    legacy = legacy_fetch(url, jobs)
+    legacy_elapsed = time.perf_counter() - start
+    legacy_connections = len(SlowCandleHandler.connections)
+    print(f"{'sequential, new session':<34}{legacy_elapsed * 1000:>9.0f} ms, "
+          f"{legacy_connections} connections")
+    for workers in [4, 8, 16]:
+        SlowCandleHandler.connections.clear()
+        with CandleFetcher(get_request(url), max_workers=workers, rate_limit=200) as fetcher:
+            start = time.perf_counter()
+            first = None
+            results = []
+            for result in fetcher.fetch(jobs):
+                first = first or time.perf_counter() - start
+                results.append(result)
+            elapsed = time.perf_counter() - start
+        assert all(x.ok for x in results)
+        assert sum(len(x.records) for x in results) == sum(len(x) for x in legacy)
+        print(f"{f'fetcher, {workers} workers':<34}{elapsed * 1000:>9.0f} ms, "
+              f"{len(SlowCandleHandler.connections)} connections, "
+              f"first result {first * 1000:.0f} ms, {legacy_elapsed / elapsed:.1f}x")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+File:           bench_candle_store.py
+Author:         Dibyaranjan Sathua
+Created on:     17/10/21, 8:20 pm
+
+Cold (fetch from a local stub candle API) vs warm (served from disk) candle store requests for
+months of 1-minute BANKNIFTY candles.
+Run using python -m benchmarks.bench_candle_store
+"""
+from http.server import ThreadingHTTPServer
+import tempfile
+import threading
+import time
+import requests
+
+from candles.exceptions import CandleStoreError
+from candles.store import CandleStore, CandleKey, rows_to_records
+from test.helpers.candles import StubCandleHandler
+
+# 01/04/21 00:00 IST
+START = 1617215400
+DAYS = 120
+
+
+def main():
+    """ Time a cold request, a warm request and a request extending the range by a week """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubCandleHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/"
+    fetches = []
+
+    def fetch(start: int, end: int):
+        fetches.append((start, end))
+        response = requests.get(url, params={"starttime": start, "endtime": end})
+        if not response.ok:
+            raise CandleStoreError(f"Stub returned {response.status_code}")
+        return rows_to_records(response.json()["data"]["candles"])
+
+    key = CandleKey(source="aliceblue", exchange="NSE_INDICES", token=26009, timeframe="ONE_MINUTE")
+    end = START + DAYS * 86400
+    with tempfile.TemporaryDirectory() as cache_dir:
+        store = CandleStore(cache_dir=cache_dir)
+        for name, request_end in [("cold", end), ("warm", end), ("extend 7 days", end + 7 * 86400)]:
+            count = len(fetches)
+            start = time.perf_counter()
+            candles = store.get(key, START, request_end, fetch)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<14} {len(candles):>7} candles in {elapsed * 1e3:8.2f} ms, "
+                  f"{len(fetches) - count} fetch")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+File:           bench_conflation.py
+Author:         Dibyaranjan Sathua
+Created on:     28/10/21, 8:30 pm
+
+Slow strategy consumer during a tick burst. The feed writes ticks of 500 instruments into the
+option chain at a fixed rate and a consumer spends WORK_US on every update it processes.
+A queued consumer (tick listener putting every tick in a queue) processes every tick and falls
+behind. A conflated subscription processes only the latest state of the changed instruments
+at most MAX_RATE times a second.
+Run using python -m benchmarks.bench_conflation
+"""
+from typing import Callable, Dict
+import queue
+import threading
+import time
+
+from alice_blue_api.conflation import Conflator
+from alice_blue_api.option_chain import OptionChain
+from test.helpers.feed import compact_packet
+
+
+RATE: int = 20000
+SECONDS: float = 2.0
+INSTRUMENTS: int = 500
+# Processing time of one update by the consumer
+WORK_US: int = 100
+MAX_RATE: float = 10.0
+
+
+def work():
+    """ Busy wait WORK_US microseconds """
+    end = time.perf_counter() + WORK_US / 1e6
+    while time.perf_counter() < end:
+        pass
+
+
+def write_ticks(option_chain: OptionChain):
+    """ Write RATE * SECONDS ticks at RATE, round robin over the instruments """
+    frames = [
+        compact_packet(50000 + x % INSTRUMENTS, 100 + x % 7, 1635235200 + x // RATE)
+        for x in range(int(RATE * SECONDS))
+    ]
+    start = time.perf_counter()
+    for i, frame in enumerate(frames):
+        arrival = start + i / RATE
+        now = time.perf_counter()
+        if now < arrival:
+            time.sleep(arrival - now)
+        option_chain.update_from_stream(frame)
+
+
+def run(setup: Callable[[OptionChain], Callable[[threading.Event], int]]) -> Dict:
+    """ Write the burst while the consumer runs. Returns processed updates and drain time """
+    OptionChain.reset()
+    option_chain = OptionChain.get_instance()
+    consume = setup(option_chain)
+    burst_done = threading.Event()
+    result = dict()
+
+    def consumer():
+        result["processed"] = consume(burst_done)
+        result["drained_at"] = time.perf_counter()
+
+    thread = threading.Thread(target=consumer)
+    thread.start()
+    write_ticks(option_chain)
+    burst_end = time.perf_counter()
+    burst_done.set()
+    thread.join()
+    OptionChain.reset()
+    return {
+        "processed": result["processed"],
+        "drain_seconds": result["drained_at"] - burst_end,
+    }
+
+
+def setup_queued(option_chain: OptionChain) -> Callable[[threading.Event], int]:
+    """ Every tick is queued and processed """
+    ticks = queue.SimpleQueue()
+    option_chain.add_tick_listener(lambda code, ltp, volume, timestamp: ticks.put(code))
+
+    def consume(burst_done: threading.Event) -> int:
+        processed = 0
+        while not (burst_done.is_set() and ticks.empty()):
+            try:
+                ticks.get(timeout=0.01)
+            except queue.Empty:
+                continue
+            work()
+            processed += 1
+        return processed
+
+    return consume
+
+
+def setup_conflated(option_chain: OptionChain) -> Callable[[threading.Event], int]:
+    """ Latest state of the changed instruments at most MAX_RATE times a second """
+    conflator = Conflator(option_chain.tick_store)
+    option_chain.add_tick_listener(conflator.update_tick)
+    subscription = conflator.subscribe(range(50000, 50000 + INSTRUMENTS), MAX_RATE)
+
+    def consume(burst_done: threading.Event) -> int:
+        processed = 0
+        while not burst_done.is_set():
+            snapshot = subscription.poll(timeout=0.01)
+            if snapshot is not None:
+                for _ in snapshot.code:
+                    work()
+                processed += len(snapshot.code)
+        return processed
+
+    return consume
+
+
+def main():
+    print(f"{int(RATE * SECONDS)} ticks at {RATE}/s over {INSTRUMENTS} instruments, "
+          f"{WORK_US} us of work per processed update")
+    for name, setup in [("Queued (every tick)", setup_queued),
+                        (f"Conflated ({MAX_RATE:.0f}/s)", setup_conflated)]:
+        stats = run(setup)
+        print(f"{name:<22} processed {stats['processed']:>6} updates, "
+              f"behind by {stats['drain_seconds']:.2f} s at the end of the burst")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+File:           bench_contract_cache.py
+Author:         Dibyaranjan Sathua
+Created on:     10/10/21, 7:30 pm
+
+Benchmark of creating instruments from master contracts json vs the on disk cache.
+Run using python -m benchmarks.bench_contract_cache
+"""
+import json
+import tempfile
+import time
+
+from alice_blue_api.contract_cache import MasterContractCache
+from alice_blue_api.instruments import Instrument
+from test.helpers.instruments import get_master_contracts_payload
+
+
+def main():
+    """ Compare network path (json parse + Instrument.create) with cache load """
+    payload = get_master_contracts_payload()
+    start = time.perf_counter()
+    data = json.loads(payload)
+    instruments = [
+        Instrument.create(x) for x in data["NSE-OPT"] if x["symbol"].startswith("BANKNIFTY")
+    ]
+    elapsed = time.perf_counter() - start
+    print(f"{len(data['NSE-OPT'])} contracts, {len(instruments)} BNF instruments. "
+          f"json + Instrument.create: {elapsed * 1e3:.1f} ms (excluding download)")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = MasterContractCache(cache_dir=cache_dir)
+        start = time.perf_counter()
+        cache.save("NFO", "BANKNIFTY", instruments)
+        print(f"cache save: {(time.perf_counter() - start) * 1e3:.1f} ms")
+        start = time.perf_counter()
+        cached = cache.load("NFO", "BANKNIFTY")
+        print(f"cache load: {(time.perf_counter() - start) * 1e3:.1f} ms")
+        assert cached == instruments
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+File:           bench_contract_stream.py
+Author:         Dibyaranjan Sathua
+Created on:     12/10/21, 11:40 pm
+
+Peak memory and wall time of json.loads vs streaming parse of the master contracts payload.
+Run using python -m benchmarks.bench_contract_stream
+"""
+import json
+import time
+import tracemalloc
+
+from alice_blue_api.contract_stream import MasterContractStream
+from alice_blue_api.instruments import Instrument
+from test.helpers.instruments import get_master_contracts_payload
+
+CHUNK_SIZE = 64 * 1024
+
+
+def full_parse(payload: bytes):
+    """ Previous path. response.json() followed by filter on the full tree """
+    data = json.loads(payload)
+    return [
+        Instrument.create(x)
+        for segment in ["NSE-OPT", "NSE-FUT"]
+        for x in data[segment] if x["symbol"].startswith("BANKNIFTY")
+    ]
+
+
+def stream_parse(payload: bytes):
+    """ Streaming path over chunks like requests iter_content """
+    chunks = (payload[x:x + CHUNK_SIZE] for x in range(0, len(payload), CHUNK_SIZE))
+    stream = MasterContractStream(
+        segments={"NSE-OPT", "NSE-FUT"}, predicate=lambda x: x["symbol"].startswith("BANKNIFTY")
+    )
+    return [x for _, x in stream.iter_instruments(chunks)]
+
+
+def measure(func, payload: bytes):
+    """ Return (wall time, peak memory) of func. Peak excludes the payload bytes """
+    start = time.perf_counter()
+    result = func(payload)
+    elapsed = time.perf_counter() - start
+    del result
+    tracemalloc.start()
+    func(payload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    """ Compare full json parse with streaming parse """
+    payload = get_master_contracts_payload(expiries=12, stocks=600)
+    print(f"Payload: {len(payload) / 1e6:.1f} MB")
+    assert full_parse(payload) == stream_parse(payload)
+    for name, func in [("json.loads", full_parse), ("stream", stream_parse)]:
+        elapsed, peak = measure(func, payload)
+        print(f"{name:<12} wall: {elapsed * 1e3:>8.1f} ms  peak memory: {peak / 1e6:>8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+File:           bench_http_client.py
+Author:         Dibyaranjan Sathua
+Created on:     21/10/21, 7:40 pm
+
+Per call latency of small JSON API calls to a local stub server. requests.request on every
+call (previous AliceBlueApi.api_call) vs the pooled HttpClient. With --tls the stub serves
+HTTPS with a self signed certificate (needs the openssl command), which adds the TLS
+handshake to every new connection.
+Run using python -m benchmarks.bench_http_client [--tls]
+"""
+import argparse
+import time
+import requests
+import urllib3
+
+from alice_blue_api.http_client import HttpClient, LatencyHistogram
+from test.helpers.servers import StubApiHandler, start_server
+
+
+def main(calls: int = 300, tls: bool = False):
+    server = start_server(StubApiHandler, tls)
+    url = f"{'https' if tls else 'http'}://127.0.0.1:{server.server_port}/api/v1/positions"
+    urllib3.disable_warnings()
+    legacy = LatencyHistogram()
+    StubApiHandler.connections.clear()
+    for _ in range(calls):
+        start = time.perf_counter()
+        requests.request(method="GET", url=url, verify=False).json()
+        legacy.add((time.perf_counter() - start) * 1000)
+    legacy_connections = len(StubApiHandler.connections)
+    client = HttpClient()
+    StubApiHandler.connections.clear()
+    for _ in range(calls):
+        client.request("GET", url, endpoint="/api/v1/positions", verify=False).json()
+    pooled = client.get_histogram("GET /api/v1/positions")
+    print(f"{calls} calls{' over TLS' if tls else ''}")
+    for name, histogram, connections in [
+        ("requests.request", legacy, legacy_connections),
+        ("HttpClient", pooled, len(StubApiHandler.connections)),
+    ]:
+        print(f"{name:<18} mean {histogram.mean:7.2f} ms, p50 <= {histogram.percentile(50):6.2f}"
+              f" ms, p99 <= {histogram.percentile(99):6.2f} ms, {connections} connections")
+    print(f"Mean latency reduced by {(1 - pooled.mean / legacy.mean) * 100:.0f}%")
+    client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tls", action="store_true")
+    main(tls=parser.parse_args().tls)
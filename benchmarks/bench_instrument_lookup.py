@@ -0,0 +1,63 @@
+"""
+File:           bench_instrument_lookup.py
+Author:         Dibyaranjan Sathua
+Created on:     09/10/21, 8:10 pm
+
+Benchmark of instrument lookup. Run using python -m benchmarks.bench_instrument_lookup
+"""
+import datetime
+import timeit
+
+from alice_blue_api.enums import OptionType
+from alice_blue_api.instrument_index import InstrumentIndex
+from test.helpers.instruments import get_bnf_instruments
+
+# 12 weekly expiries with strikes from 25000 to 50000 (roughly the BNF option universe)
+EXPIRIES = [datetime.date(2021, 10, 7) + datetime.timedelta(weeks=x) for x in range(12)]
+
+
+def linear_scan(instruments, strike, expiry, option_type):
+    """ Previous lookup used by AliceBlueApi.get_banknifty_option_instrument """
+    return next(
+        (
+            x for x in instruments
+            if x.option_type == option_type and x.strike == strike and x.expiry == expiry
+        ),
+        None
+    )
+
+
+def main(number: int = 2000):
+    """ Compare linear scan with instrument index """
+    instruments = get_bnf_instruments(EXPIRIES, low_strike=25000, high_strike=50000)
+    elapsed = min(timeit.repeat(lambda: InstrumentIndex(instruments), number=10, repeat=3))
+    print(f"{len(instruments)} instruments. Index build: {elapsed / 10 * 1e3:.2f} ms")
+    index = InstrumentIndex(instruments)
+    expiry = EXPIRIES[-1]
+    elapsed = min(timeit.repeat(
+        lambda: linear_scan(instruments, 37500, expiry, OptionType.PE), number=number, repeat=3
+    ))
+    print(f"linear scan:          {elapsed / number * 1e6:>10.2f} us per lookup")
+    elapsed = min(timeit.repeat(
+        lambda: index.get_option("BANKNIFTY", expiry, 37500, OptionType.PE),
+        number=number, repeat=3
+    ))
+    print(f"index lookup:         {elapsed / number * 1e6:>10.2f} us per lookup")
+
+    def scan_around_atm():
+        return [
+            x for x in instruments
+            if x.expiry == expiry and x.strike is not None and 37000 <= x.strike <= 38000
+        ]
+
+    elapsed = min(timeit.repeat(scan_around_atm, number=number, repeat=3))
+    print(f"scan +-5 strikes:     {elapsed / number * 1e6:>10.2f} us per query")
+    elapsed = min(timeit.repeat(
+        lambda: index.get_options_around_atm("BANKNIFTY", expiry, 37500, 5),
+        number=number, repeat=3
+    ))
+    print(f"index +-5 strikes:    {elapsed / number * 1e6:>10.2f} us per query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+File:           bench_instruments.py
+Author:         Dibyaranjan Sathua
+Created on:     13/10/21, 7:30 pm
+
+Memory per instrument and build time of the previous dataclass Instrument vs the slotted
+Instrument and InstrumentTable.
+Run using python -m benchmarks.bench_instruments
+"""
+import json
+import time
+import tracemalloc
+
+from alice_blue_api.instruments import Instrument, InstrumentTable
+from test.helpers.instruments import LegacyInstrument, get_master_contracts_payload
+
+
+def measure(name: str, build, contracts):
+    """ Print build time and memory per instrument retained by the result of build """
+    start = time.perf_counter()
+    build(contracts)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build(contracts)
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print(f"{name:<24} build: {elapsed * 1e3:7.1f} ms, "
+          f"memory: {retained / len(contracts):6.1f} bytes/instrument")
+    return result
+
+
+def main():
+    """ Master contracts are parsed once and each representation is built from them """
+    contracts = json.loads(get_master_contracts_payload())["NSE-OPT"]
+    print(f"{len(contracts)} contracts")
+    legacy = measure(
+        "dataclass Instrument", lambda x: [LegacyInstrument.create(y) for y in x], contracts
+    )
+    instruments = measure(
+        "slotted Instrument", lambda x: [Instrument.create(y) for y in x], contracts
+    )
+    table = measure("InstrumentTable", InstrumentTable.from_contracts, contracts)
+    start = time.perf_counter()
+    records = table.to_numpy()
+    print(f"InstrumentTable.to_numpy: {(time.perf_counter() - start) * 1e3:.1f} ms, "
+          f"{records.nbytes / len(records):.1f} bytes/instrument")
+    assert len(legacy) == len(instruments) == len(table)
+
+
+if __name__ == "__main__":
+    main()
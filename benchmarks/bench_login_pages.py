@@ -0,0 +1,101 @@
+"""
+File:           bench_login_pages.py
+Author:         Dibyaranjan Sathua
+Created on:     24/10/21, 7:30 pm
+
+Startup and login cost of scraping the OAuth login pages with BeautifulSoup (previous
+generate_access_token) vs FormFieldExtractor. Startup is the import time of the parser in a
+new interpreter. Login is the OAuth page flow (login, 2FA, consent) against a local stub server.
+BeautifulSoup is not a dependency any more, the legacy numbers need bs4 installed.
+Run using python -m benchmarks.bench_login_pages
+"""
+from typing import Dict, List
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+from alice_blue_api.http_client import HttpClient
+from test.helpers.login import (
+    CONSENT_PAGE, LOGIN_PAGE, TWOFA_PAGE, ExtractFunc, OAuthHandler, extract_fields, login
+)
+from test.helpers.servers import start_server
+
+
+def legacy_extract_fields(html: str, names: List[str]) -> Dict[str, List[str]]:
+    """ Input fields using BeautifulSoup, as previous generate_access_token """
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, features="html.parser")
+    return {
+        name: [x["value"] for x in soup.find_all("input", attrs={"name": name})]
+        for name in names
+    }
+
+
+def get_import_time(module: str, runs: int = 5) -> float:
+    """ Median import time in milliseconds of a module in a new interpreter """
+    times = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True, text=True, check=True
+        ).stderr
+        # Last line is the module itself. Cumulative time is the second column in microseconds
+        cumulative = re.findall(r"\|\s*(\d+)\s*\|", output.strip().splitlines()[-1])
+        times.append(int(cumulative[0]) / 1000)
+    return statistics.median(times)
+
+
+def measure_login(client: HttpClient, base_url: str, extract: ExtractFunc, runs: int) -> float:
+    """ Mean login time in milliseconds """
+    start = time.perf_counter()
+    for _ in range(runs):
+        assert login(client, base_url, extract) == "Y29kZQ"
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def measure_parse(extract: ExtractFunc, runs: int) -> float:
+    """ Mean time in milliseconds to extract the fields of the three pages """
+    pages = [
+        (LOGIN_PAGE, ["_csrf_token", "login_challenge"]),
+        (TWOFA_PAGE, ["question_id1", "_csrf_token", "login_challenge"]),
+        (CONSENT_PAGE, ["_csrf_token"]),
+    ]
+    start = time.perf_counter()
+    for _ in range(runs):
+        for page, names in pages:
+            extract(page, names)
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def main():
+    runs = 50
+    try:
+        import bs4
+        has_bs4 = True
+    except ImportError:
+        has_bs4 = False
+    print(f"Page size: {len(LOGIN_PAGE) / 1024:.1f} KB")
+    print(f"Import form_parser: {get_import_time('alice_blue_api.form_parser'):.1f} ms")
+    if has_bs4:
+        print(f"Import bs4: {get_import_time('bs4'):.1f} ms")
+    print(f"Parse 3 pages (FormFieldExtractor): {measure_parse(extract_fields, runs):.2f} ms")
+    if has_bs4:
+        print(f"Parse 3 pages (BeautifulSoup): {measure_parse(legacy_extract_fields, runs):.2f} ms")
+    server = start_server(OAuthHandler)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    client = HttpClient()
+    # Warm up the connection
+    login(client, base_url, extract_fields)
+    current = measure_login(client, base_url, extract_fields, runs)
+    print(f"Login (FormFieldExtractor): {current:.2f} ms")
+    if has_bs4:
+        legacy = measure_login(client, base_url, legacy_extract_fields, runs)
+        print(f"Login (BeautifulSoup): {legacy:.2f} ms")
+    client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
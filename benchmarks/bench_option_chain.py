@@ -0,0 +1,50 @@
+"""
+File:           bench_option_chain.py
+Author:         Dibyaranjan Sathua
+Created on:     08/10/21, 12:05 am
+
+Benchmark of option chain update on the websocket thread. Run using
+python -m benchmarks.bench_option_chain
+"""
+import struct
+import timeit
+
+from alice_blue_api.option_chain import OptionChain
+from alice_blue_api.websocket_streams import CompactMarketData
+
+# Compact packets of 400 strikes (NFO exchange)
+PACKETS = [
+    struct.pack(">BBIIIII", 2, 2, 40000 + x, 10000 + x, 25, 1627293599, 1000 + x)
+    for x in range(400)
+]
+
+
+def dict_update(store, packets):
+    """ Previous option chain update. One CompactMarketData per tick kept in a dict """
+    for packet in packets:
+        data = CompactMarketData.create(packet)
+        store[data.code] = data
+
+
+def main(number: int = 200):
+    """ Compare dict of objects with columnar tick store """
+    OptionChain.reset()
+    option_chain = OptionChain.get_instance()
+    store = dict()
+    ticks = number * len(PACKETS)
+    elapsed = min(timeit.repeat(lambda: dict_update(store, PACKETS), number=number, repeat=3))
+    print(f"dict of CompactMarketData: {ticks / elapsed:>12,.0f} ticks/sec")
+
+    def tick_store_update():
+        for packet in PACKETS:
+            option_chain.update_from_stream(packet)
+
+    elapsed = min(timeit.repeat(tick_store_update, number=number, repeat=3))
+    print(f"columnar tick store:       {ticks / elapsed:>12,.0f} ticks/sec")
+    elapsed = min(timeit.repeat(option_chain.get_snapshot, number=number, repeat=3))
+    print(f"snapshot of {len(PACKETS)} strikes:  {elapsed / number * 1e6:>12,.1f} us")
+    OptionChain.reset()
+
+
+if __name__ == "__main__":
+    main()
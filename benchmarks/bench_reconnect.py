@@ -0,0 +1,126 @@
+"""
+File:           bench_reconnect.py
+Author:         Dibyaranjan Sathua
+Created on:     30/10/21, 10:05 pm
+
+Time to recover from dropped feed connections. A local stub server sends ticks only to the
+connections which subscribed the instrument, like the real server, and drops the connections
+DROPS times. The previous AliceBlueWebSocket loop (run_forever again after a one second sleep,
+no resubscribe) vs reconnect with backoff and batched resubscribe of SUBSCRIBED instruments.
+Time to recover is from the drop till the first tick after the drop.
+Run using python -m benchmarks.bench_reconnect
+"""
+from typing import List, Optional
+import statistics
+import threading
+import time
+
+from alice_blue_api.enums import FeedAction
+from alice_blue_api.option_chain import OptionChain
+from alice_blue_api.websocket import AliceBlueWebSocket
+from test.helpers.feed import StubFeedServer, compact_packet
+
+
+DROPS: int = 5
+SUBSCRIBED: int = 1500
+BATCH_SIZE: int = 500
+# Seconds to wait for the first tick after a drop
+RECOVER_TIMEOUT: float = 5.0
+TICK_INTERVAL: float = 0.005
+
+
+class LegacyWebSocket(AliceBlueWebSocket):
+    """ Reconnect loop of AliceBlueWebSocket before backoff and resubscribe """
+
+    def _run_forever(self):
+        while not self._stopped:
+            try:
+                self._websocket.run_forever(
+                    ping_interval=self.PING_INTERVAL, ping_timeout=self.PING_TIMEOUT
+                )
+            except Exception as err:
+                print(f"Exception in websocket, {err}")
+            time.sleep(1)
+
+
+class QuickCloseWebSocket(AliceBlueWebSocket):
+    """ Short ping timeout, so that close does not wait long for the socket thread """
+    PING_INTERVAL: float = 1.0
+    PING_TIMEOUT: float = 0.5
+
+
+def subscribe(web_socket: AliceBlueWebSocket):
+    """ Subscribe SUBSCRIBED instruments in batches, as FeedSystem resubscribes """
+    codes = [[2, 50000 + x] for x in range(SUBSCRIBED)]
+    for pos in range(0, len(codes), BATCH_SIZE):
+        web_socket.send({
+            "a": FeedAction.SUBSCRIBE.value,
+            "v": codes[pos:pos + BATCH_SIZE],
+            "m": "compact_marketdata"
+        })
+
+
+def measure(web_socket_class, resubscribe: bool) -> List[Optional[float]]:
+    """ Seconds from each drop till the first tick after it. None if not recovered """
+    server = StubFeedServer(subscribed_only=True).start()
+    OptionChain.reset()
+    option_chain = OptionChain.get_instance()
+    tick_times = []
+    option_chain.add_tick_listener(
+        lambda code, ltp, volume, timestamp: tick_times.append(time.perf_counter())
+    )
+    web_socket = web_socket_class(url=server.url)
+    if resubscribe:
+        web_socket.add_reconnect_callback(lambda: subscribe(web_socket))
+    web_socket.start(thread=True)
+    web_socket.wait_until_connection_open()
+    subscribe(web_socket)
+    stop = threading.Event()
+
+    def send_ticks():
+        timestamp = 1635235200
+        while not stop.is_set():
+            timestamp += 1
+            server.send_packets([compact_packet(50000, 100, timestamp)])
+            time.sleep(TICK_INTERVAL)
+
+    sender = threading.Thread(target=send_ticks)
+    sender.start()
+    recover_times = []
+    for _ in range(DROPS):
+        time.sleep(0.2)
+        dropped_at = time.perf_counter()
+        server.drop_connections()
+        recovered_at = None
+        while time.perf_counter() - dropped_at < RECOVER_TIMEOUT:
+            if tick_times and tick_times[-1] > dropped_at:
+                recovered_at = next(x for x in tick_times if x > dropped_at)
+                break
+            time.sleep(0.005)
+        recover_times.append(None if recovered_at is None else recovered_at - dropped_at)
+    stop.set()
+    sender.join()
+    web_socket.close()
+    server.stop()
+    OptionChain.reset()
+    return recover_times
+
+
+def main():
+    print(f"{DROPS} dropped connections, {SUBSCRIBED} subscribed instruments")
+    for name, web_socket_class, resubscribe in [
+        ("Retry after 1 s, no resubscribe", LegacyWebSocket, False),
+        ("Backoff and resubscribe", QuickCloseWebSocket, True),
+    ]:
+        times = measure(web_socket_class, resubscribe)
+        recovered = [x for x in times if x is not None]
+        summary = (
+            f"median {statistics.median(recovered) * 1000:7.1f} ms, "
+            f"max {max(recovered) * 1000:7.1f} ms" if recovered else "never recovered"
+        )
+        print(f"{name:<34} recovered {len(recovered)}/{DROPS} within {RECOVER_TIMEOUT:.0f} s, "
+              f"{summary}")
+
+
+if __name__ == "__main__":
+    main()
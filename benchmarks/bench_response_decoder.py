@@ -0,0 +1,91 @@
+"""
+File:           bench_response_decoder.py
+Author:         Dibyaranjan Sathua
+Created on:     22/10/21, 8:00 pm
+
+Decoding compressed candle API and master contracts responses from a local stub server.
+requests decoding (response.json() / iter_content) vs response_decoder, which reads the raw
+body through an incremental decompressor. Peak memory is measured with tracemalloc.
+Run using python -m benchmarks.bench_response_decoder
+"""
+import json
+import time
+import tracemalloc
+import requests
+
+from alice_blue_api.contract_stream import MasterContractStream
+from alice_blue_api.response_decoder import TransferStats, iter_body, read_json
+from test.helpers.candles import START, get_candle_rows
+from test.helpers.instruments import get_master_contracts_payload
+from test.helpers.servers import CompressedHandler, start_server
+
+
+def measure(func):
+    """ (result, wall time, peak memory) of func """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def candles_requests(session: requests.Session, url: str):
+    return session.get(url).json()["data"]["candles"]
+
+
+def candles_decoder(session: requests.Session, url: str):
+    with session.get(url, stream=True) as response:
+        stats = TransferStats.create(response, url)
+        return read_json(response, stats)["data"]["candles"], stats
+
+
+def contracts_requests(session: requests.Session, url: str):
+    stream = MasterContractStream(segments={"NSE-OPT"})
+    with session.get(url, stream=True) as response:
+        return sum(1 for _ in stream.iter_contracts(response.iter_content(64 * 1024)))
+
+
+def contracts_decoder(session: requests.Session, url: str):
+    stream = MasterContractStream(segments={"NSE-OPT"})
+    with session.get(url, stream=True) as response:
+        stats = TransferStats.create(response, url)
+        body = iter_body(response, stats)
+        count = sum(1 for _ in stream.iter_contracts(body))
+        body.close()
+        return count, stats
+
+
+def main():
+    CompressedHandler.bodies["candles"] = json.dumps(
+        {"status": "success", "data": {"candles": get_candle_rows(START, START + 180 * 86400)}}
+    ).encode()
+    CompressedHandler.bodies["contracts"] = get_master_contracts_payload()
+    server = start_server(CompressedHandler)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    session = requests.Session()
+    for name, legacy, current in [
+        ("candles", candles_requests, candles_decoder),
+        ("contracts", contracts_requests, contracts_decoder),
+    ]:
+        for encoding in ["br", "gzip"]:
+            url = f"{base_url}/{name}/{encoding}"
+            # Warm up the server cache and the connection
+            session.get(url).content
+            expected, legacy_time, legacy_peak = measure(lambda: legacy(session, url))
+            (result, stats), current_time, current_peak = measure(lambda: current(session, url))
+            assert result == expected
+            print(f"{name} {encoding}: {stats.compressed_bytes / 1e6:.2f} MB -> "
+                  f"{stats.decoded_bytes / 1e6:.2f} MB ({stats.ratio:.1f}x)")
+            print(f"    {'requests':<16}{legacy_time * 1000:>8.0f} ms, "
+                  f"peak {legacy_peak / 1e6:>7.1f} MB")
+            print(f"    {'response_decoder':<16}{current_time * 1000:>8.0f} ms, "
+                  f"peak {current_peak / 1e6:>7.1f} MB, "
+                  f"headers {stats.headers_time * 1000:.1f} ms, "
+                  f"total {stats.total_time * 1000:.0f} ms")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+"""
+File:           bench_startup.py
+Author:         Dibyaranjan Sathua
+Created on:     25/10/21, 6:40 pm
+
+Startup time of a short lived process which imports FeedSystem and decodes one packet.
+Every run is a new interpreter with -X importtime. The slowest imports are listed along with
+the heavy dependencies (numpy, requests, websocket-client, Google API client) which should only
+be loaded on first use.
+Run using python -m benchmarks.bench_startup
+"""
+from test.helpers.startup import STARTUP_BUDGET_MS, measure_startup
+
+
+def main():
+    stats = measure_startup()
+    print(f"Import FeedSystem and decode one packet: median {stats['median_ms']:.1f} ms, "
+          f"min {stats['min_ms']:.1f} ms (budget {STARTUP_BUDGET_MS:.0f} ms)")
+    print(f"Heavy modules loaded: {stats['heavy_modules'] or 'none'}")
+    print("Slowest imports (cumulative):")
+    for cumulative, name in stats["slowest_imports"]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+File:           bench_streaming_indicators.py
+Author:         Dibyaranjan Sathua
+Created on:     14/10/21, 11:15 pm
+
+Per update cost of the streaming indicators vs recomputing with SMAIndicator, RSIIndicator and
+VWAPIndicator for every new bar.
+Run using python -m benchmarks.bench_streaming_indicators
+"""
+import random
+import time
+
+from indicators.momentum import RSIIndicator
+from indicators.streaming import StreamingSMA, StreamingRSI, StreamingVWAP, IndicatorEngine
+from indicators.trend import SMAIndicator, VWAPIndicator
+
+BARS = 20000
+PERIOD = 20
+
+
+def report(name: str, elapsed: float, updates: int):
+    """ Print cost per update """
+    print(f"{name:<36} {elapsed / updates * 1e6:7.2f} us/update")
+
+
+def main():
+    """ Feed the same bars to both implementations """
+    random.seed(7)
+    closes = [36000 + random.random() * 100 for _ in range(BARS)]
+    volumes = [random.randint(1, 1000) for _ in range(BARS)]
+
+    start = time.perf_counter()
+    window = []
+    for close in closes:
+        # Caller keeps the window and the indicator re-sums it
+        window.append(close)
+        if len(window) > PERIOD:
+            window.pop(0)
+        if len(window) == PERIOD:
+            SMAIndicator(window, PERIOD).calc()
+    report(f"SMAIndicator({PERIOD})", time.perf_counter() - start, BARS)
+    sma = StreamingSMA(PERIOD)
+    start = time.perf_counter()
+    for close in closes:
+        sma.update_value(close)
+    report(f"StreamingSMA({PERIOD})", time.perf_counter() - start, BARS)
+
+    start = time.perf_counter()
+    _, gain, loss = RSIIndicator(closes[:PERIOD + 1][::-1], period=PERIOD, initial=True).calc()
+    for pos in range(PERIOD + 1, BARS):
+        _, gain, loss = RSIIndicator(
+            [closes[pos], closes[pos - 1]], period=PERIOD, prev_avg_gain=gain, prev_avg_loss=loss
+        ).calc()
+    report(f"RSIIndicator({PERIOD})", time.perf_counter() - start, BARS)
+    rsi = StreamingRSI(PERIOD)
+    start = time.perf_counter()
+    for close in closes:
+        rsi.update_value(close)
+    report(f"StreamingRSI({PERIOD})", time.perf_counter() - start, BARS)
+
+    start = time.perf_counter()
+    sum_pv = sum_v = 0
+    for close, volume in zip(closes, volumes):
+        _, sum_pv, sum_v = VWAPIndicator(close, close, close, volume, sum_pv, sum_v).calc()
+    report("VWAPIndicator", time.perf_counter() - start, BARS)
+    vwap = StreamingVWAP()
+    start = time.perf_counter()
+    for pos, (close, volume) in enumerate(zip(closes, volumes)):
+        vwap.update(close, close, close, volume, pos)
+    report("StreamingVWAP", time.perf_counter() - start, BARS)
+
+    # 500 instruments with SMA, RSI and VWAP fed by ticks
+    engine = IndicatorEngine()
+    codes = list(range(40000, 40500))
+    for code in codes:
+        engine.register(code, "sma", StreamingSMA(PERIOD))
+        engine.register(code, "rsi", StreamingRSI(14))
+        engine.register(code, "vwap", StreamingVWAP())
+    ticks = [
+        (codes[pos % len(codes)], closes[pos], pos * 10, 1633923900 + pos // 1000)
+        for pos in range(BARS)
+    ]
+    start = time.perf_counter()
+    for code, ltp, volume, timestamp in ticks:
+        engine.update_tick(code, ltp, volume, timestamp)
+    report("IndicatorEngine tick (3 indicators)", time.perf_counter() - start, BARS)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+File:           bench_tick_queue.py
+Author:         Dibyaranjan Sathua
+Created on:     27/10/21, 8:20 pm
+
+Socket reader backlog with a slow consumer. Frames of 500 instruments arrive at a fixed rate.
+The consumer updates the option chain and a listener sleeps 1 ms on every 20th tick (a
+strategy doing I/O), which is more work than the feed rate allows. Handling frames in the
+reader (previous AliceBlueWebSocket.on_message) makes the reader fall behind the socket. With
+TickPipeline the reader only queues frames, and the queue absorbs the burst or drops (drop
+oldest) or coalesces frames once full.
+Run using python -m benchmarks.bench_tick_queue
+"""
+from typing import Callable, Dict, List
+import time
+
+from alice_blue_api.enums import OverflowPolicy
+from alice_blue_api.option_chain import OptionChain
+from alice_blue_api.tick_queue import TickPipeline
+from test.helpers.feed import compact_packet
+
+
+RATE: int = 20000
+SECONDS: float = 2.0
+INSTRUMENTS: int = 500
+CAPACITY: int = 4096
+
+
+def get_frames() -> List[bytes]:
+    """ Frames of RATE * SECONDS ticks round robin over the instruments """
+    return [
+        compact_packet(50000 + x % INSTRUMENTS, 100 + x % 7, 1635235200 + x // RATE)
+        for x in range(int(RATE * SECONDS))
+    ]
+
+
+def get_handler() -> Callable[[bytes], None]:
+    """ Option chain update with a slow tick listener """
+    OptionChain.reset()
+    option_chain = OptionChain.get_instance()
+    counter = [0]
+
+    def slow_listener(code, ltp, volume, timestamp):
+        counter[0] += 1
+        if counter[0] % 20 == 0:
+            time.sleep(0.001)
+
+    option_chain.add_tick_listener(slow_listener)
+    return option_chain.update_from_stream
+
+
+def run_reader(frames: List[bytes], on_frame: Callable[[bytes], None]) -> Dict:
+    """
+    Read frames at RATE, as they would arrive on the socket. Returns how far behind the
+    arrival time the reader got in milliseconds
+    """
+    start = time.perf_counter()
+    max_behind = 0.0
+    for i, frame in enumerate(frames):
+        arrival = start + i / RATE
+        now = time.perf_counter()
+        if now < arrival:
+            time.sleep(arrival - now)
+            now = time.perf_counter()
+        max_behind = max(max_behind, now - arrival)
+        on_frame(frame)
+    return {
+        "max_behind_ms": max_behind * 1000,
+        "read_seconds": time.perf_counter() - start,
+    }
+
+
+def main():
+    frames = get_frames()
+    print(f"{len(frames)} frames at {RATE}/s over {INSTRUMENTS} instruments, "
+          f"queue capacity {CAPACITY}")
+    stats = run_reader(frames, get_handler())
+    print(f"Handled in reader: reader behind socket by up to {stats['max_behind_ms']:.0f} ms, "
+          f"read took {stats['read_seconds']:.2f} s")
+    for policy in OverflowPolicy:
+        pipeline = TickPipeline(get_handler(), capacity=CAPACITY, policy=policy)
+        pipeline.start()
+        stats = run_reader(frames, pipeline.push)
+        pipeline.stop()
+        queue_stats = pipeline.get_stats()
+        lag = queue_stats["lag"]
+        print(f"TickPipeline {policy.value}: reader behind by up to "
+              f"{stats['max_behind_ms']:.1f} ms, read took {stats['read_seconds']:.2f} s, "
+              f"max depth {queue_stats['max_depth']}, dropped {queue_stats['dropped']}, "
+              f"coalesced {queue_stats['coalesced']}, lag p50 {lag['p50']:.0f} ms "
+              f"p99 {lag['p99']:.0f} ms")
+    OptionChain.reset()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+File:           bench_tick_router.py
+Author:         Dibyaranjan Sathua
+Created on:     29/10/21, 9:30 pm
+
+Tick callbacks vs polling and a plain listener list.
+1. Dispatch cost per tick with SUBSCRIPTIONS strategy callbacks filtered by code, underlying
+   or expiry: every callback checking its filter (listener list) vs the TickRouter table.
+2. Latency from a tick to the strategy seeing it: polling the option chain every
+   POLL_INTERVAL vs a callback.
+3. Feed thread time with one slow strategy callback: plain tick listener vs TickRouter, which
+   moves the callback to its own thread.
+Run using python -m benchmarks.bench_tick_router
+"""
+from typing import List
+import datetime
+import statistics
+import threading
+import time
+
+from alice_blue_api.enums import OptionType
+from alice_blue_api.instruments import Instrument
+from alice_blue_api.option_chain import OptionChain
+from alice_blue_api.tick_router import TickRouter
+from test.helpers.feed import compact_packet
+
+
+INSTRUMENTS: int = 1000
+SUBSCRIPTIONS: int = 300
+TICKS: int = 100000
+POLL_INTERVAL: float = 0.01
+LATENCY_TICKS: int = 200
+SLOW_TICKS: int = 500
+SLOW_CALL_SECONDS: float = 0.002
+UNDERLYINGS = ["NIFTY", "BANKNIFTY", "FINNIFTY"]
+EXPIRIES = [datetime.date(2021, 10, 28), datetime.date(2021, 11, 4)]
+
+
+def get_instruments() -> List[Instrument]:
+    """ Options of a few underlyings and expiries """
+    return [
+        Instrument(
+            trading_symbol="", symbol=f"{UNDERLYINGS[x % 3]} OCT {x}.0 CE", lot_size=None,
+            expiry=EXPIRIES[x % 2], exchange_code=2, exchange="NFO", code=50000 + x,
+            option_type=OptionType.CE, strike=x, index=False
+        )
+        for x in range(INSTRUMENTS)
+    ]
+
+
+def measure_dispatch():
+    """ Time per tick to find and call the callbacks of the ticked instrument """
+    instruments = get_instruments()
+    router = TickRouter()
+    router.add_instruments(instruments)
+    calls = [0]
+
+    def callback(code, ltp, volume, timestamp):
+        calls[0] += 1
+
+    subscriptions = []
+    for x in range(SUBSCRIPTIONS):
+        if x % 3 == 0:
+            kwargs = {"instruments": instruments[x:x + 5]}
+        elif x % 3 == 1:
+            kwargs = {"underlying": UNDERLYINGS[x % 2], "expiry": EXPIRIES[x % 2]}
+        else:
+            kwargs = {"instruments": [instruments[x]]}
+        subscriptions.append(router.subscribe(callback, **kwargs))
+    by_code = {x.code: x for x in instruments}
+
+    def listener_list(code, ltp, volume, timestamp):
+        instrument = by_code.get(code)
+        for subscription in subscriptions:
+            if subscription.matches(code, instrument):
+                callback(code, ltp, volume, timestamp)
+
+    for name, dispatch in [("Listener list", listener_list), ("TickRouter", router.update_tick)]:
+        calls[0] = 0
+        start = time.perf_counter()
+        for x in range(TICKS):
+            dispatch(50000 + x % INSTRUMENTS, 100.0, 10, 1635235200)
+        elapsed = time.perf_counter() - start
+        print(f"Dispatch {name:<14} {elapsed / TICKS * 1e6:7.2f} us per tick, "
+              f"{calls[0] / TICKS:.1f} callbacks per tick")
+
+
+def measure_latency():
+    """ Time from the option chain write till the strategy sees the new ltp """
+    instrument = get_instruments()[0]
+    OptionChain.reset()
+    option_chain = OptionChain.get_instance()
+    write_times = dict()
+    polled = []
+    called = []
+    stop = threading.Event()
+
+    def poll():
+        last = None
+        while not stop.is_set():
+            try:
+                ltp = option_chain.get_market_data_by_instrument(instrument).ltp
+            except KeyError:
+                ltp = None
+            if ltp != last and ltp is not None:
+                polled.append(time.perf_counter() - write_times[ltp])
+                last = ltp
+            time.sleep(POLL_INTERVAL)
+
+    router = TickRouter()
+    router.subscribe(
+        lambda code, ltp, volume, timestamp: called.append(time.perf_counter() - write_times[ltp]),
+        instruments=[instrument]
+    )
+    option_chain.add_tick_listener(router.update_tick)
+    poller = threading.Thread(target=poll)
+    poller.start()
+    for x in range(1, LATENCY_TICKS + 1):
+        # A tick every 7 ms, not aligned to the poll interval
+        time.sleep(0.007)
+        write_times[float(x)] = time.perf_counter()
+        option_chain.update_from_stream(compact_packet(instrument.code, x, 1635235200))
+    time.sleep(POLL_INTERVAL * 2)
+    stop.set()
+    poller.join()
+    OptionChain.reset()
+    for name, latency in [(f"Polling every {POLL_INTERVAL * 1000:.0f} ms", polled),
+                          ("Callback", called)]:
+        print(f"Latency {name:<22} seen {len(latency):>3}/{LATENCY_TICKS} ticks, "
+              f"median {statistics.median(latency) * 1000:7.3f} ms, "
+              f"max {max(latency) * 1000:7.3f} ms")
+
+
+def measure_slow_callback():
+    """ Feed thread time to write ticks with a slow strategy callback """
+    instrument = get_instruments()[0]
+
+    def slow(code, ltp, volume, timestamp):
+        time.sleep(SLOW_CALL_SECONDS)
+
+    frames = [compact_packet(instrument.code, x, 1635235200) for x in range(SLOW_TICKS)]
+    router = TickRouter()
+    subscription = router.subscribe(slow, instruments=[instrument])
+    for name, listener in [("Tick listener", slow), ("TickRouter", router.update_tick)]:
+        OptionChain.reset()
+        option_chain = OptionChain.get_instance()
+        option_chain.add_tick_listener(listener)
+        start = time.perf_counter()
+        for frame in frames:
+            option_chain.update_from_stream(frame)
+        elapsed = time.perf_counter() - start
+        print(f"Slow callback {name:<14} feed thread took {elapsed * 1000:7.1f} ms "
+              f"for {SLOW_TICKS} ticks")
+    stats = subscription.get_stats()
+    print(f"  TickRouter isolated the callback at {router.SLOW_RATE_LIMIT:.0%} slow calls, "
+          f"dropped {stats['dropped']} ticks, mean call {stats['mean_ms']:.2f} ms")
+    router.unsubscribe(subscription)
+    OptionChain.reset()
+
+
+def main():
+    print(f"{INSTRUMENTS} instruments, {SUBSCRIPTIONS} callbacks")
+    measure_dispatch()
+    measure_latency()
+    measure_slow_callback()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+File:           bench_vectorized_indicators.py
+Author:         Dibyaranjan Sathua
+Created on:     15/10/21, 11:00 pm
+
+Full series SMA, RSI and VWAP of many instruments using the vectorized indicators vs feeding
+the streaming indicators bar by bar, plus the O(n^2) initial RSIIndicator.calc.
+Run using python -m benchmarks.bench_vectorized_indicators
+"""
+import time
+import numpy as np
+
+from indicators.momentum import RSIIndicator
+from indicators.streaming import StreamingSMA, StreamingRSI, StreamingVWAP
+from indicators.vectorized import VectorizedSMA, VectorizedRSI, VectorizedVWAP
+from test.helpers.candles import get_candle_arrays
+
+# One year of 1-minute candles
+BARS = 250 * 375
+STREAMING_INSTRUMENTS = 5
+VECTORIZED_INSTRUMENTS = 200
+
+
+def run_streaming(high, low, close, volume, timestamp) -> float:
+    """ Time of feeding every instrument bar by bar """
+    start = time.perf_counter()
+    timestamps = timestamp.tolist()
+    for column in range(close.shape[1]):
+        indicators = [StreamingSMA(20), StreamingRSI(14), StreamingVWAP()]
+        updates = [x.update for x in indicators]
+        for bar in zip(
+                high[:, column].tolist(), low[:, column].tolist(), close[:, column].tolist(),
+                volume[:, column].tolist(), timestamps
+        ):
+            for update in updates:
+                update(*bar)
+    return time.perf_counter() - start
+
+
+def run_vectorized(high, low, close, volume, timestamp) -> float:
+    """ Time of computing the full series of every instrument """
+    start = time.perf_counter()
+    VectorizedSMA(close, 20).calc()
+    VectorizedRSI(close, 14).calc()
+    VectorizedVWAP(high, low, close, volume, timestamp).calc()
+    return time.perf_counter() - start
+
+
+def main():
+    """ Report time per instrument year """
+    candles = get_candle_arrays(bars=BARS, instruments=VECTORIZED_INSTRUMENTS)
+    elapsed = run_streaming(*[x[:, :STREAMING_INSTRUMENTS] if x.ndim == 2 else x for x in candles])
+    print(f"streaming  {STREAMING_INSTRUMENTS:>3} instruments x {BARS} bars: {elapsed:6.2f} s "
+          f"({elapsed / STREAMING_INSTRUMENTS * 1e3:7.1f} ms/instrument)")
+    elapsed = run_vectorized(*candles)
+    print(f"vectorized {VECTORIZED_INSTRUMENTS:>3} instruments x {BARS} bars: {elapsed:6.2f} s "
+          f"({elapsed / VECTORIZED_INSTRUMENTS * 1e3:7.1f} ms/instrument)")
+    elapsed = run_vectorized(*[x[:, 0] if x.ndim == 2 else x for x in candles])
+    print(f"vectorized   1 instrument  x {BARS} bars: {elapsed:6.2f} s")
+    # RSIIndicator over a full series inserts every change at the start of a list
+    for size in (2000, 8000):
+        prices = candles[2][:size, 0].tolist()[::-1]
+        start = time.perf_counter()
+        RSIIndicator(prices, period=size - 1, initial=True).calc()
+        elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        VectorizedRSI(prices[::-1], period=size - 1).calc()
+        print(f"initial RSI of {size} bars: RSIIndicator.calc {elapsed * 1e3:7.1f} ms, "
+              f"VectorizedRSI {(time.perf_counter() - start) * 1e3:5.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+File:           bench_websocket_streams.py
+Author:         Dibyaranjan Sathua
+Created on:     05/10/21, 9:12 pm
+
+Micro-benchmark for websocket stream decoders. Run using
+python -m benchmarks.bench_websocket_streams
+"""
+import time
+import timeit
+
+from alice_blue_api.enums import FeedModes
+from alice_blue_api.websocket_streams import (
+    MarketData, CompactMarketData, decode_frames, decode_stream, get_mode_from_stream
+)
+from test.helpers.feed import (
+    COMPACT_MARKET_DATA_PACKET, MARKET_DATA_PACKET, SAMPLE_PACKETS, legacy_compact_market_data,
+    legacy_market_data
+)
+
+
+def packets_per_sec(func, packet, number=200000) -> float:
+    """ Return number of packets decoded per second by func """
+    elapsed = min(timeit.repeat(lambda: func(packet), number=number, repeat=3))
+    return number / elapsed
+
+
+def main():
+    """ Compare legacy decoder with precompiled struct decoder """
+    cases = [
+        ("MARKET_DATA", legacy_market_data, MarketData.create, MARKET_DATA_PACKET),
+        (
+            "COMPACT_MARKETDATA",
+            legacy_compact_market_data,
+            CompactMarketData.create,
+            COMPACT_MARKET_DATA_PACKET
+        ),
+    ]
+    for name, legacy, current, packet in cases:
+        assert legacy(packet) == current(packet)
+        legacy_rate = packets_per_sec(legacy, packet)
+        current_rate = packets_per_sec(current, packet)
+        print(
+            f"{name:<20} legacy: {legacy_rate:>12,.0f} packets/sec  "
+            f"struct: {current_rate:>12,.0f} packets/sec  "
+            f"speedup: {current_rate / legacy_rate:.2f}x"
+        )
+
+
+def batch_main(count: int = 500000):
+    """ Compare replaying recorded frames one by one with batch decoding """
+    cases = [
+        (FeedModes.MARKET_DATA, MarketData.create, MARKET_DATA_PACKET),
+        (FeedModes.COMPACT_MARKETDATA, CompactMarketData.create, COMPACT_MARKET_DATA_PACKET),
+    ]
+    for mode, scalar, packet in cases:
+        size = len(packet)
+        buffer = packet * count
+        start = time.perf_counter()
+        view = memoryview(buffer)
+        for pos in range(0, len(buffer), size):
+            scalar(view[pos:pos + size])
+        scalar_elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        decode_frames(buffer, mode, frame_size=size)
+        batch_elapsed = time.perf_counter() - start
+        print(
+            f"{mode.name:<20} {count:,} frames  scalar: {scalar_elapsed:.3f}s  "
+            f"batch: {batch_elapsed:.3f}s  speedup: {scalar_elapsed / batch_elapsed:.1f}x"
+        )
+
+
+def modes_main():
+    """ Decode throughput of every supported mode through the dispatch table """
+    for packet in SAMPLE_PACKETS:
+        mode = get_mode_from_stream(packet)
+        rate = packets_per_sec(decode_stream, packet)
+        print(f"{mode.name:<20} {len(packet):>4} bytes  {rate:>12,.0f} packets/sec")
+
+
+if __name__ == "__main__":
+    main()
+    batch_main()
+    modes_main()
@@ -0,0 +1,22 @@
+"""
+File:           __init__.py
+Author:         Dibyaranjan Sathua
+Created on:     17/10/21, 5:40 pm
+"""
+from .store import CandleStore, CandleKey
+from .container import CandleContainer
+
+# Fetcher imports requests. Loaded on first access of its names, so that importing a candles
+# module (like candles.store) stays cheap
+LAZY_EXPORTS = {
+    "CandleFetcher": "candles.fetcher",
+    "CandleJob": "candles.fetcher",
+    "CandleResult": "candles.fetcher",
+}
+
+
+def __getattr__(name):
+    if name in LAZY_EXPORTS:
+        import importlib
+        return getattr(importlib.import_module(LAZY_EXPORTS[name]), name)
+    raise AttributeError(f"module {__name__} has no attribute {name}")
@@ -0,0 +1,169 @@
+"""
+File:           container.py
+Author:         Dibyaranjan Sathua
+Created on:     18/10/21, 6:10 pm
+
+Columnar container of the candles of an instrument indexed by time. Candles are sorted by
+timestamp and grouped by day (IST), so lookup by datetime and by day are binary searches.
+Daily open, high and low are computed once when the container is built.
+"""
+from typing import Callable, Generic, Iterable, List, Optional, Sequence, Tuple, TypeVar
+import datetime
+import numpy as np
+
+from candles.store import CANDLE_DTYPE, IST, IST_OFFSET
+
+
+SECONDS_IN_DAY: int = 86400
+# Day number (days since epoch) of a date is date.toordinal() - EPOCH_ORDINAL
+EPOCH_ORDINAL: int = datetime.date(1970, 1, 1).toordinal()
+CandleType = TypeVar("CandleType")
+
+
+class CandleContainer:
+    """ Candles with binary search lookup by datetime and per day offsets """
+
+    def __init__(self, records: np.ndarray):
+        """
+        Constructor.
+        Args:
+            records: Candles as CANDLE_DTYPE structured array in any order. Position of a
+            candle in records is its position returned by find.
+        """
+        timestamps = np.asarray(records["timestamp"], dtype=np.int64)
+        # Position of the sorted candles in the input
+        self._order: np.ndarray = np.argsort(timestamps, kind="stable")
+        # Sorted position of every input position. Created on first use
+        self._sorted_pos: Optional[np.ndarray] = None
+        self.timestamp: np.ndarray = timestamps[self._order]
+        self.open: np.ndarray = np.asarray(records["open"], dtype=np.float64)[self._order]
+        self.high: np.ndarray = np.asarray(records["high"], dtype=np.float64)[self._order]
+        self.low: np.ndarray = np.asarray(records["low"], dtype=np.float64)[self._order]
+        self.close: np.ndarray = np.asarray(records["close"], dtype=np.float64)[self._order]
+        self.volume: np.ndarray = np.asarray(records["volume"], dtype=np.float64)[self._order]
+        self.open_interest: np.ndarray = \
+            np.asarray(records["open_interest"], dtype=np.float64)[self._order]
+        # Days having candles and offset of their first candle. Candles of days[i] are
+        # day_starts[i]:day_starts[i + 1]
+        day_numbers = (self.timestamp + IST_OFFSET) // SECONDS_IN_DAY
+        self.days: np.ndarray = np.unique(day_numbers)
+        self.day_starts: np.ndarray = np.searchsorted(day_numbers, self.days)
+        if len(self.timestamp):
+            self.day_open: np.ndarray = self.open[self.day_starts]
+            self.day_high: np.ndarray = np.maximum.reduceat(self.high, self.day_starts)
+            self.day_low: np.ndarray = np.minimum.reduceat(self.low, self.day_starts)
+        else:
+            self.day_open = self.day_high = self.day_low = np.empty(0)
+        self.day_starts = np.append(self.day_starts, len(self.timestamp))
+
+    @classmethod
+    def from_candles(cls, candles: Iterable) -> "CandleContainer":
+        """ Build from InstrumentCandle like objects having date and time in IST """
+        candles = list(candles)
+        records = np.empty(len(candles), dtype=CANDLE_DTYPE)
+        # Epoch seconds from date ordinal and time fields, which is cheaper than datetime
+        records["timestamp"] = [
+            (x.date.toordinal() - EPOCH_ORDINAL) * SECONDS_IN_DAY - IST_OFFSET +
+            x.time.hour * 3600 + x.time.minute * 60 + x.time.second
+            for x in candles
+        ]
+        for name in ["open", "high", "low", "close", "volume"]:
+            records[name] = [getattr(x, name) for x in candles]
+        records["open_interest"] = [
+            np.nan if x.open_interest is None else x.open_interest for x in candles
+        ]
+        return cls(records)
+
+    def get_record(self, pos: int) -> Tuple:
+        """
+        (timestamp, open, high, low, close, volume, open_interest) of the candle at input
+        position pos
+        """
+        if self._sorted_pos is None:
+            self._sorted_pos = np.empty_like(self._order)
+            self._sorted_pos[self._order] = np.arange(len(self._order))
+        pos = self._sorted_pos[pos]
+        return (
+            int(self.timestamp[pos]), float(self.open[pos]), float(self.high[pos]),
+            float(self.low[pos]), float(self.close[pos]), float(self.volume[pos]),
+            float(self.open_interest[pos])
+        )
+
+    @staticmethod
+    def get_day_number(date: datetime.date) -> int:
+        """ Day number of a date """
+        return date.toordinal() - EPOCH_ORDINAL
+
+    def find(self, date: datetime.date, time: datetime.time) -> Optional[int]:
+        """ Input position of the candle starting at date and time. None if there is none """
+        timestamp = int(datetime.datetime.combine(date, time, tzinfo=IST).timestamp())
+        pos = int(np.searchsorted(self.timestamp, timestamp))
+        if pos < len(self.timestamp) and self.timestamp[pos] == timestamp:
+            return int(self._order[pos])
+        return None
+
+    def get_day_index(self, date: datetime.date) -> Optional[int]:
+        """ Index of a date in days. None if there is no candle of the date """
+        day = self.get_day_number(date)
+        pos = int(np.searchsorted(self.days, day))
+        if pos < len(self.days) and self.days[pos] == day:
+            return pos
+        return None
+
+    def get_day_range(self, date: datetime.date) -> Tuple[int, int]:
+        """ Sorted position range (start, end) of the candles of a date """
+        pos = self.get_day_index(date)
+        if pos is None:
+            return 0, 0
+        return int(self.day_starts[pos]), int(self.day_starts[pos + 1])
+
+    def get_previous_trading_day(
+            self,
+            date: datetime.date,
+            max_days: int = 5
+    ) -> Optional[datetime.date]:
+        """ Latest day having candles within max_days before date """
+        day = self.get_day_number(date)
+        pos = int(np.searchsorted(self.days, day)) - 1
+        if pos < 0 or day - self.days[pos] > max_days:
+            return None
+        return datetime.date.fromordinal(int(self.days[pos]) + EPOCH_ORDINAL)
+
+    def get_day_open(self, date: datetime.date) -> Optional[float]:
+        """ Open of the first candle of a date """
+        pos = self.get_day_index(date)
+        return None if pos is None else self.day_open[pos].item()
+
+    def get_day_high_low(self, date: datetime.date) -> Tuple[Optional[float], Optional[float]]:
+        """ High and low of a date """
+        pos = self.get_day_index(date)
+        if pos is None:
+            return None, None
+        return self.day_high[pos].item(), self.day_low[pos].item()
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+
+class LazyCandles(Sequence, Generic[CandleType]):
+    """
+    Read only list of candle objects (for example InstrumentCandle) of a container in input
+    order. Object of a candle is created on first access by factory, which is called with the
+    record of the candle.
+    """
+
+    def __init__(self, container: CandleContainer, factory: Callable[[Tuple], CandleType]):
+        self._container: CandleContainer = container
+        self._factory: Callable[[Tuple], CandleType] = factory
+        self._candles: List[Optional[CandleType]] = [None] * len(container)
+
+    def __getitem__(self, pos):
+        if isinstance(pos, slice):
+            return [self[x] for x in range(*pos.indices(len(self)))]
+        candle = self._candles[pos]
+        if candle is None:
+            candle = self._candles[pos] = self._factory(self._container.get_record(pos))
+        return candle
+
+    def __len__(self) -> int:
+        return len(self._candles)
@@ -0,0 +1,13 @@
+"""
+File:           exceptions.py
+Author:         Dibyaranjan Sathua
+Created on:     17/10/21, 5:42 pm
+"""
+
+
+class CandleStoreError(Exception):
+    pass
+
+
+class CandleFetchError(Exception):
+    pass
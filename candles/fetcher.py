@@ -0,0 +1,289 @@
+"""
+File:           fetcher.py
+Author:         Dibyaranjan Sathua
+Created on:     20/10/21, 6:30 pm
+
+Fetch candles of many instruments in parallel. Jobs are split into chunks the candle API
+accepts and the chunks are requested on a bounded thread pool through one pooled HttpClient,
+usually the client of the API, so its retry policy, latency histograms and transfer stats cover
+these requests too. Requests are rate limited per host. Results are yielded as soon as all
+chunks of a job are fetched. With a candle store only the missing ranges are requested.
+"""
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from urllib.parse import urlparse
+import logging
+import threading
+import time
+import numpy as np
+import requests
+
+from alice_blue_api.http_client import HttpClient
+from candles.exceptions import CandleFetchError
+from candles.store import CANDLE_DTYPE, CandleKey, CandleStore, rows_to_records
+
+
+@dataclass(frozen=True)
+class CandleJob:
+    """ Candles of an instrument and timeframe with start <= timestamp < end (epoch seconds) """
+    token: int
+    timeframe: Hashable
+    start: int
+    end: int
+
+
+@dataclass()
+class CandleResult:
+    """ Candles of a job. error is set and records are empty if any chunk failed """
+    job: CandleJob
+    records: np.ndarray
+    error: Optional[Exception] = None
+    # HTTP requests sent for the job including retries
+    requests: int = 0
+    # Seconds from the start of fetch till the job completed
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+# URL and query params of the API request of a chunk
+RequestFunc = Callable[[CandleJob], Tuple[str, Optional[Dict]]]
+
+
+def parse_response(response: requests.Response) -> np.ndarray:
+    """ Candle records of a candle API response """
+    return rows_to_records(response.json()["data"]["candles"])
+
+
+class RateLimiter:
+    """ Token bucket allowing rate requests per second with bursts of up to burst requests """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self._rate: float = rate
+        self._burst: float = float(burst)
+        self._tokens: float = float(burst)
+        self._updated: float = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """ Block till a request is allowed """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            self._tokens -= 1
+            # Negative tokens are the requests waiting before this one
+            wait = -self._tokens / self._rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+
+@dataclass()
+class _JobState:
+    """ Progress of a job """
+    job: CandleJob
+    chunks: int
+    key: Optional[CandleKey] = None
+    parts: List[np.ndarray] = field(default_factory=list)
+    error: Optional[Exception] = None
+    requests: int = 0
+
+
+class CandleFetcher:
+    """ Parallel candle fetcher. Use as a context manager or call close to release the client """
+
+    def __init__(
+            self,
+            get_request: RequestFunc,
+            headers: Optional[Dict] = None,
+            max_workers: int = 8,
+            rate_limit: float = 10.0,
+            max_retries: int = 3,
+            backoff: float = 0.5,
+            timeout: float = 30.0,
+            max_range: Optional[Dict[Hashable, int]] = None,
+            parse: Callable[[requests.Response], np.ndarray] = parse_response,
+            store: Optional[CandleStore] = None,
+            get_key: Optional[Callable[[CandleJob], CandleKey]] = None,
+            http_client: Optional[HttpClient] = None,
+            endpoint: Optional[str] = None
+    ):
+        """
+        Constructor.
+        Args:
+            get_request: Returns url and query params of the request of a chunk.
+            headers: Headers of every request.
+            max_workers: Number of parallel requests.
+            rate_limit: Requests per second per host.
+            max_retries: Retries of a chunk on connection error or a retryable status. Only
+            if http_client is not given.
+            backoff: Backoff factor of the retries. Only if http_client is not given.
+            timeout: Request timeout in seconds. Only if http_client is not given.
+            max_range: Longest range in seconds the API accepts for a timeframe. Longer jobs
+            are split into chunks. Not split if the timeframe is missing.
+            parse: Converts a successful response into candle records.
+            store: Candle store. Only the missing ranges are requested and fetched candles
+            are saved.
+            get_key: Store key of a job. Required with store.
+            http_client: Client sending the requests, with its retry policy. A client of
+            max_workers connections is created (and closed with the fetcher) if None.
+            endpoint: Latency of the requests is recorded under it. URL without the query
+            string if None.
+        """
+        if store is not None and get_key is None:
+            raise CandleFetchError("get_key is required with store")
+        self._get_request: RequestFunc = get_request
+        self._headers: Optional[Dict] = headers
+        self._max_workers: int = max_workers
+        self._rate_limit: float = rate_limit
+        self._max_range: Dict[Hashable, int] = max_range or dict()
+        self._parse: Callable[[requests.Response], np.ndarray] = parse
+        self._store: Optional[CandleStore] = store
+        self._get_key: Optional[Callable[[CandleJob], CandleKey]] = get_key
+        self._limiters: Dict[str, RateLimiter] = dict()
+        self._limiters_lock = threading.Lock()
+        # Shared by the workers
+        self._owns_client: bool = http_client is None
+        if http_client is None:
+            http_client = HttpClient(
+                pool_size=max_workers, timeout=timeout, max_retries=max_retries, backoff=backoff
+            )
+        self._http: HttpClient = http_client
+        self._endpoint: Optional[str] = endpoint
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+    def split(self, job: CandleJob) -> List[CandleJob]:
+        """ Chunks of a job, each within the max range of the timeframe """
+        max_range = self._max_range.get(job.timeframe)
+        if max_range is None:
+            return [job]
+        return [
+            CandleJob(job.token, job.timeframe, start, min(start + max_range, job.end))
+            for start in range(job.start, job.end, max_range)
+        ]
+
+    def fetch(self, jobs: Iterable[CandleJob]) -> Iterator[CandleResult]:
+        """ Fetch the jobs in parallel and yield the result of every job as it completes """
+        fetch_start = time.perf_counter()
+        states: List[_JobState] = []
+        chunks: List[Tuple[_JobState, CandleJob]] = []
+        for job in jobs:
+            ranges = [(job.start, job.end)]
+            key = None
+            if self._store is not None:
+                key = self._get_key(job)
+                ranges = self._store.get_missing_ranges(key, job.start, job.end)
+            state = _JobState(job=job, chunks=0, key=key)
+            for start, end in ranges:
+                for chunk in self.split(CandleJob(job.token, job.timeframe, start, end)):
+                    chunks.append((state, chunk))
+                    state.chunks += 1
+            states.append(state)
+        # Jobs served from the store
+        for state in states:
+            if not state.chunks:
+                yield self._get_result(state, fetch_start)
+        executor = ThreadPoolExecutor(max_workers=self._max_workers)
+        try:
+            futures = {
+                executor.submit(self._fetch_chunk, chunk): (state, chunk)
+                for state, chunk in chunks
+            }
+            for future in as_completed(futures):
+                state, chunk = futures[future]
+                state.chunks -= 1
+                records, count, error = future.result()
+                state.requests += count
+                if records is None:
+                    if state.error is None:
+                        state.error = CandleFetchError(f"{error} for {chunk}")
+                elif state.key is not None:
+                    # Saved from this thread only, so the store is not written concurrently
+                    self._store.save(state.key, records, chunk.start, chunk.end)
+                else:
+                    state.parts.append(records)
+                if not state.chunks:
+                    yield self._get_result(state, fetch_start)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _get_result(self, state: _JobState, fetch_start: float) -> CandleResult:
+        """ Result of a completed job """
+        job = state.job
+        if state.error is not None:
+            records = np.empty(0, dtype=CANDLE_DTYPE)
+        elif state.key is not None:
+            records = self._store.read(state.key, job.start, job.end)
+        else:
+            records = self.merge(state.parts)
+        return CandleResult(
+            job=job,
+            records=records,
+            error=state.error,
+            requests=state.requests,
+            elapsed=time.perf_counter() - fetch_start
+        )
+
+    @staticmethod
+    def merge(parts: List[np.ndarray]) -> np.ndarray:
+        """ Candles of the chunks sorted by timestamp without duplicates """
+        if not parts:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        records = np.concatenate(parts)
+        records = records[np.argsort(records["timestamp"], kind="stable")]
+        timestamps = records["timestamp"]
+        return records[np.r_[True, timestamps[1:] != timestamps[:-1]]]
+
+    def _get_limiter(self, url: str) -> RateLimiter:
+        """ Rate limiter of the host of url """
+        host = urlparse(url).netloc
+        with self._limiters_lock:
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                limiter = self._limiters[host] = RateLimiter(self._rate_limit)
+            return limiter
+
+    def _fetch_chunk(self, chunk: CandleJob) -> Tuple[Optional[np.ndarray], int, str]:
+        """
+        Candles of a chunk, number of requests sent and error. Candles are None and error is
+        set if the request fails after the retries of the client.
+        """
+        url, params = self._get_request(chunk)
+        self._get_limiter(url).acquire()
+        try:
+            # Body is read by parse, so that it can decode the response as a stream
+            response = self._http.request(
+                "GET", url, endpoint=self._endpoint, params=params, headers=self._headers,
+                stream=True
+            )
+        except (requests.ConnectionError, requests.Timeout) as err:
+            return None, self._http.max_retries + 1, f"{type(err).__name__}: {err}"
+        # Retries of the client are in the history of the final response
+        retries = getattr(response.raw, "retries", None)
+        count = 1 + (len(retries.history) if retries is not None else 0)
+        if not response.ok:
+            # Error body is read so that the connection goes back to the pool
+            response.content
+            return None, count, f"Candle API returned {response.status_code}"
+        try:
+            with response:
+                records = self._parse(response)
+        except Exception as err:
+            return None, count, f"Invalid candle API response. {err}"
+        timestamps = records["timestamp"]
+        records = records[(timestamps >= chunk.start) & (timestamps < chunk.end)]
+        return records, count, ""
+
+    def close(self):
+        """ Close the pooled connections of the client created by the fetcher """
+        if self._owns_client:
+            self._http.close()
+
+    def __enter__(self) -> "CandleFetcher":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,235 @@
+"""
+File:           store.py
+Author:         Dibyaranjan Sathua
+Created on:     17/10/21, 5:45 pm
+
+On disk store of historical candles keyed by (source, exchange, token, timeframe). Candles of
+a key are partitioned by month into numpy structured arrays (.npy) which are memory mapped on
+read. Ranges already downloaded are recorded in coverage.json, so a request only fetches the
+missing ranges from the candle API.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass
+from pathlib import Path
+import json
+import logging
+import os
+import time
+import numpy as np
+
+from alice_blue_api.timezone import IST, IST_OFFSET
+from candles.exceptions import CandleStoreError
+
+
+# Open interest is NaN if not available
+CANDLE_DTYPE = np.dtype([
+    ("timestamp", np.int64),
+    ("open", np.float64),
+    ("high", np.float64),
+    ("low", np.float64),
+    ("close", np.float64),
+    ("volume", np.float64),
+    ("open_interest", np.float64),
+])
+# Fetch function called with (start, end) epoch seconds. Returns candles with start <= timestamp
+# < end and raises CandleStoreError if the API request fails.
+FetchFunc = Callable[[int, int], np.ndarray]
+
+
+# Seconds of utc offset texts
+_UTC_OFFSETS: Dict[str, int] = dict()
+
+
+def get_utc_offset(text: str) -> int:
+    """ Seconds of an ISO utc offset like +0530, +05:30 or Z """
+    offset = _UTC_OFFSETS.get(text)
+    if offset is None:
+        if text in ("", "Z"):
+            offset = 0
+        else:
+            digits = text[1:].replace(":", "")
+            offset = int(digits[:2]) * 3600 + int(digits[2:4]) * 60
+            offset = -offset if text[0] == "-" else offset
+        _UTC_OFFSETS[text] = offset
+    return offset
+
+
+def parse_timestamps(values: List[str]) -> np.ndarray:
+    """
+    Epoch seconds of ISO timestamps like 2021-07-23T09:15:00+0530. Date and time part is parsed
+    by numpy in bulk and the utc offset, which is the same for almost all rows, through a cache.
+    """
+    local = np.array([x[:19] for x in values], dtype="datetime64[s]").astype(np.int64)
+    offsets = {x[19:] for x in values}
+    if len(offsets) == 1:
+        return local - get_utc_offset(offsets.pop())
+    return local - np.array([get_utc_offset(x[19:]) for x in values], dtype=np.int64)
+
+
+def rows_to_records(rows: List[List]) -> np.ndarray:
+    """ Convert candle API rows [timestamp, open, high, low, close, volume, oi] to records """
+    records = np.empty(len(rows), dtype=CANDLE_DTYPE)
+    records["timestamp"] = parse_timestamps([x[0] for x in rows])
+    for pos, name in enumerate(["open", "high", "low", "close", "volume"], start=1):
+        records[name] = [x[pos] for x in rows]
+    records["open_interest"] = [x[6] if len(x) == 7 else np.nan for x in rows]
+    return records
+
+
+@dataclass(frozen=True)
+class CandleKey:
+    """ Key of a candle series. source is the candle API, for example aliceblue or kite """
+    source: str
+    exchange: str
+    token: int
+    timeframe: str
+
+    def get_dir(self, root: Path) -> Path:
+        """ Directory of the series partitions """
+        return root / self.source / self.exchange / str(self.token) / self.timeframe
+
+
+class CandleStore:
+    """ Month partitioned memory mapped candle store """
+    CACHE_DIR: Path = Path.home() / ".stocklabs" / "candles"
+    COVERAGE_FILE: str = "coverage.json"
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self._cache_dir: Path = Path(cache_dir) if cache_dir is not None else self.CACHE_DIR
+        self._logger = logging.getLogger(self.__class__.__name__)
+        # Used in testing to fix the current time
+        self._now: Optional[int] = None
+
+    def get(self, key: CandleKey, start: int, end: int, fetch: FetchFunc) -> np.ndarray:
+        """
+        Candles of key with start <= timestamp < end (epoch seconds). Missing ranges are fetched
+        using fetch and saved. Range after the last fetched candle of today is not marked as
+        downloaded, so the incomplete last candle is fetched again by the next request.
+        """
+        for missing_start, missing_end in self.get_missing_ranges(key, start, end):
+            self._logger.debug(f"Fetching {key} from {missing_start} to {missing_end}")
+            self.save(key, fetch(missing_start, missing_end), missing_start, missing_end)
+        return self.read(key, start, end)
+
+    def save(self, key: CandleKey, records: np.ndarray, start: int, end: int):
+        """
+        Save candles fetched for start to end. Range after the last candle of today is not
+        marked as downloaded.
+        """
+        now = self._now if self._now is not None else int(time.time())
+        timestamps = records["timestamp"]
+        records = records[(timestamps >= start) & (timestamps < end)]
+        covered_end = end
+        if end > now:
+            covered_end = int(records["timestamp"].max()) if len(records) else start
+            covered_end = min(covered_end, now)
+        self.write(key, records, start, covered_end)
+
+    def get_missing_ranges(self, key: CandleKey, start: int, end: int) -> List[Tuple[int, int]]:
+        """ Ranges within start and end which are not downloaded yet """
+        missing = []
+        for covered_start, covered_end in self._load_coverage(key):
+            if covered_end <= start:
+                continue
+            if covered_start >= end:
+                break
+            if covered_start > start:
+                missing.append((start, covered_start))
+            start = max(start, covered_end)
+        if start < end:
+            missing.append((start, end))
+        return missing
+
+    def read(self, key: CandleKey, start: int, end: int) -> np.ndarray:
+        """
+        Candles of key with start <= timestamp < end from disk. Candles within a single month
+        are returned as a view of the memory mapped partition.
+        """
+        series_dir = key.get_dir(self._cache_dir)
+        parts = []
+        for partition in self._get_partitions(start, end):
+            path = series_dir / f"{partition}.npy"
+            if not path.is_file():
+                continue
+            try:
+                records = np.load(str(path), mmap_mode="r")
+            except (OSError, ValueError) as err:
+                raise CandleStoreError(f"Corrupt candle store partition {path}: {err}")
+            timestamps = records["timestamp"]
+            parts.append(records[
+                np.searchsorted(timestamps, start):np.searchsorted(timestamps, end)
+            ])
+        if not parts:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts)
+
+    def write(self, key: CandleKey, records: np.ndarray, start: int, end: int):
+        """ Merge records into the partitions and mark start to end as downloaded """
+        series_dir = key.get_dir(self._cache_dir)
+        series_dir.mkdir(parents=True, exist_ok=True)
+        partitions = self._get_partition_names(records["timestamp"])
+        for partition in np.unique(partitions).tolist():
+            path = series_dir / f"{partition}.npy"
+            new = records[partitions == partition]
+            if path.is_file():
+                # New candles replace the saved candles of the same timestamp
+                combined = np.concatenate([np.load(str(path)), new.astype(CANDLE_DTYPE)])
+                combined = combined[np.argsort(combined["timestamp"], kind="stable")]
+                timestamps = combined["timestamp"]
+                new = combined[np.r_[timestamps[1:] != timestamps[:-1], True]]
+            else:
+                new = np.sort(new.astype(CANDLE_DTYPE), order="timestamp")
+            self._atomic_save(path, new)
+        if start < end:
+            self._add_coverage(key, start, end)
+
+    @staticmethod
+    def _get_partition_names(timestamps: np.ndarray) -> np.ndarray:
+        """ Month partition (YYYYMM in IST) of every timestamp """
+        months = (timestamps + IST_OFFSET).astype("datetime64[s]")
+        months = months.astype("datetime64[M]").astype(np.int64)
+        return (1970 + months // 12) * 100 + months % 12 + 1
+
+    def _get_partitions(self, start: int, end: int) -> List[int]:
+        """ Month partitions overlapping start to end """
+        if start >= end:
+            return []
+        first, last = self._get_partition_names(np.array([start, end - 1])).tolist()
+        partitions = []
+        while first <= last:
+            partitions.append(first)
+            first = first + 1 if first % 100 < 12 else (first // 100 + 1) * 100 + 1
+        return partitions
+
+    def _load_coverage(self, key: CandleKey) -> List[Tuple[int, int]]:
+        """ Sorted non overlapping downloaded ranges """
+        path = key.get_dir(self._cache_dir) / self.COVERAGE_FILE
+        if not path.is_file():
+            return []
+        with open(path) as fh_:
+            return [tuple(x) for x in json.load(fh_)]
+
+    def _add_coverage(self, key: CandleKey, start: int, end: int):
+        """ Add a downloaded range merging it with the overlapping or adjacent ranges """
+        ranges = sorted(self._load_coverage(key) + [(start, end)])
+        merged = [list(ranges[0])]
+        for range_start, range_end in ranges[1:]:
+            if range_start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], range_end)
+            else:
+                merged.append([range_start, range_end])
+        path = key.get_dir(self._cache_dir) / self.COVERAGE_FILE
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as fh_:
+            json.dump(merged, fh_)
+        os.replace(str(tmp_path), str(path))
+
+    @staticmethod
+    def _atomic_save(path: Path, records: np.ndarray):
+        """ Write to a temporary file and rename so that readers never see a partial file """
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as fh_:
+            np.save(fh_, records)
+        os.replace(str(tmp_path), str(path))
@@ -4,8 +4,6 @@ Author:         Dibyaranjan Sathua
 Created on:     25/07/21, 1:50 am
 """
 from pathlib import Path
-from googleapiclient.discovery import build
-from google.oauth2.service_account import Credentials
 
 from google_sheet_api.exceptions import GoogleSheetError
 
@@ -23,6 +21,9 @@ class BaseSheetAPI:
 
     def _get_service(self):
         """ Get the service object for executing spreadsheets methods """
+        # Google API client takes long to import. Imported only when a sheet is accessed
+        from googleapiclient.discovery import build
+        from google.oauth2.service_account import Credentials
         # Make sure that you have shared the google sheet with the client_email in token.json
         creds = Credentials.from_service_account_file(str(self._token_file), scopes=self.SCOPES)
         service = build('sheets', 'v4', credentials=creds)
@@ -0,0 +1,262 @@
+"""
+File:           streaming.py
+Author:         Dibyaranjan Sathua
+Created on:     14/10/21, 9:05 pm
+
+Stateful indicators updated one bar at a time in O(1). Unlike RSIIndicator, VWAPIndicator and
+SMAIndicator the state (previous averages and sums) is kept inside the indicator object, so one
+object is created per instrument and fed every new bar (or tick).
+Values are not rounded.
+"""
+from typing import Dict, List, Optional, Tuple
+from abc import ABC, abstractmethod
+
+from indicators.exceptions import IndicatorException
+
+
+# Sessions are split at midnight IST
+IST_OFFSET: int = 19800
+SECONDS_IN_DAY: int = 86400
+
+
+class StreamingIndicator(ABC):
+    """ Base class of streaming indicators. value is None till enough bars are seen """
+
+    def __init__(self):
+        self.value: Optional[float] = None
+
+    @abstractmethod
+    def update(self, high: float, low: float, close: float, volume: float, timestamp: int):
+        """ Update indicator with a new bar. timestamp is epoch seconds """
+        pass
+
+    @abstractmethod
+    def reset(self):
+        """ Clear the state """
+        pass
+
+    @property
+    def ready(self) -> bool:
+        return self.value is not None
+
+
+class StreamingSMA(StreamingIndicator):
+    """
+    Simple moving average of close or volume.
+    Ring buffer keeps the running sum (prefix sum) of the last period bars, so the average is the
+    difference of two running sums instead of summing the window for every bar.
+    """
+    SOURCES: Tuple[str, ...] = ("close", "volume")
+
+    def __init__(self, period: int, source: str = "close"):
+        super(StreamingSMA, self).__init__()
+        if period < 1:
+            raise IndicatorException(f"Period should be positive, got {period}")
+        if source not in self.SOURCES:
+            raise IndicatorException(f"Source should be one of {self.SOURCES}, got {source}")
+        self._period: int = period
+        self._source: str = source
+        self._sums: List[float] = []
+        self._pos: int = 0
+        self._total: float = 0.0
+        self._count: int = 0
+        self.reset()
+
+    def update(self, high: float, low: float, close: float, volume: float, timestamp: int):
+        """ Update indicator with a new bar """
+        return self.update_value(close if self._source == "close" else volume)
+
+    def update_value(self, value: float) -> Optional[float]:
+        """ Add a value to the window and return the average """
+        self._total += value
+        old = self._sums[self._pos]
+        self._sums[self._pos] = self._total
+        self._pos = (self._pos + 1) % self._period
+        self._count += 1
+        if self._count >= self._period:
+            self.value = (self._total - old) / self._period
+        return self.value
+
+    def reset(self):
+        """ Clear the state """
+        self._sums = [0.0] * self._period
+        self._pos = 0
+        self._total = 0.0
+        self._count = 0
+        self.value = None
+
+
+class StreamingRSI(StreamingIndicator):
+    """
+    RSI using Wilder smoothing. First average gain / loss is the simple average of the first
+    period changes and after that avg = (prev avg * (period - 1) + current) / period.
+    """
+
+    def __init__(self, period: int = 14):
+        super(StreamingRSI, self).__init__()
+        if period < 1:
+            raise IndicatorException(f"Period should be positive, got {period}")
+        self._period: int = period
+        self._prev_close: Optional[float] = None
+        self._count: int = 0
+        self.avg_gain: float = 0.0
+        self.avg_loss: float = 0.0
+
+    def update(self, high: float, low: float, close: float, volume: float, timestamp: int):
+        """ Update indicator with a new bar """
+        return self.update_value(close)
+
+    def update_value(self, close: float) -> Optional[float]:
+        """ Add a close price and return the RSI """
+        prev_close = self._prev_close
+        self._prev_close = close
+        if prev_close is None:
+            return self.value
+        change = close - prev_close
+        gain = change if change > 0 else 0.0
+        loss = -change if change < 0 else 0.0
+        self._count += 1
+        if self._count < self._period:
+            # Sum of gain and loss till first average is available
+            self.avg_gain += gain
+            self.avg_loss += loss
+            return self.value
+        if self._count == self._period:
+            self.avg_gain = (self.avg_gain + gain) / self._period
+            self.avg_loss = (self.avg_loss + loss) / self._period
+        else:
+            self.avg_gain = (self.avg_gain * (self._period - 1) + gain) / self._period
+            self.avg_loss = (self.avg_loss * (self._period - 1) + loss) / self._period
+        if self.avg_loss == 0:
+            self.value = 100.0
+        elif self.avg_gain == 0:
+            self.value = 0.0
+        else:
+            self.value = 100 - 100 / (1 + self.avg_gain / self.avg_loss)
+        return self.value
+
+    def reset(self):
+        """ Clear the state """
+        self._prev_close = None
+        self._count = 0
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self.value = None
+
+
+class StreamingVWAP(StreamingIndicator):
+    """
+    VWAP = Summation (Price * Volume) / Summation of Volume where Price = (High + Low + Close) / 3.
+    Sums are reset when a bar of a new session (day) arrives.
+    """
+
+    def __init__(self, session_offset: int = IST_OFFSET):
+        """
+        Constructor.
+        Args:
+            session_offset: UTC offset in seconds of the timezone in which sessions are split.
+        """
+        super(StreamingVWAP, self).__init__()
+        self._session_offset: int = session_offset
+        self._session: Optional[int] = None
+        self.sum_pv: float = 0.0
+        self.sum_v: float = 0.0
+
+    def get_session(self, timestamp: int) -> int:
+        """ Session (day number) of an epoch timestamp """
+        return (timestamp + self._session_offset) // SECONDS_IN_DAY
+
+    def update(self, high: float, low: float, close: float, volume: float, timestamp: int):
+        """ Update indicator with a new bar """
+        session = self.get_session(timestamp)
+        if session != self._session:
+            self.reset()
+            self._session = session
+        self.sum_pv += (high + low + close) / 3 * volume
+        self.sum_v += volume
+        if self.sum_v:
+            self.value = self.sum_pv / self.sum_v
+        return self.value
+
+    def reset(self):
+        """ Clear the state """
+        self._session = None
+        self.sum_pv = 0.0
+        self.sum_v = 0.0
+        self.value = None
+
+
+class IndicatorEngine:
+    """
+    Streaming indicators of many instruments. Indicators are registered against an instrument
+    code and a name and updated together when a bar or tick of the instrument arrives.
+    """
+
+    def __init__(self):
+        self._indicators: Dict[int, Dict[str, StreamingIndicator]] = dict()
+        # Last cumulative volume of the day seen in ticks
+        self._last_volume: Dict[int, int] = dict()
+
+    def register(self, code: int, name: str, indicator: StreamingIndicator):
+        """ Register an indicator of an instrument """
+        indicators = self._indicators.setdefault(code, dict())
+        if name in indicators:
+            raise IndicatorException(f"Indicator {name} is already registered for {code}")
+        indicators[name] = indicator
+
+    def unregister(self, code: int, name: Optional[str] = None):
+        """ Remove an indicator of an instrument. All indicators of instrument if name is None """
+        if name is None:
+            self._indicators.pop(code, None)
+            self._last_volume.pop(code, None)
+        else:
+            self._indicators.get(code, dict()).pop(name, None)
+
+    def update_bar(
+            self,
+            code: int,
+            high: float,
+            low: float,
+            close: float,
+            volume: float,
+            timestamp: int
+    ):
+        """ Update all indicators of an instrument with a new bar """
+        indicators = self._indicators.get(code)
+        if indicators is None:
+            return
+        for indicator in indicators.values():
+            indicator.update(high, low, close, volume, timestamp)
+
+    def update_tick(self, code: int, ltp: float, volume: int, timestamp: int):
+        """
+        Update all indicators of an instrument with a tick. Tick volume is the cumulative volume
+        of the day, so the indicators get the volume traded since the previous tick.
+        """
+        indicators = self._indicators.get(code)
+        if indicators is None:
+            return
+        last_volume = self._last_volume.get(code)
+        self._last_volume[code] = volume
+        if last_volume is None:
+            # Volume traded before the first tick is unknown
+            traded = 0
+        else:
+            # Volume drops when a new day starts
+            traded = volume - last_volume if volume >= last_volume else volume
+        for indicator in indicators.values():
+            indicator.update(ltp, ltp, ltp, traded, timestamp)
+
+    def get(self, code: int, name: str) -> Optional[float]:
+        """ Latest value of an indicator of an instrument """
+        indicators = self._indicators.get(code)
+        if indicators is None or name not in indicators:
+            raise IndicatorException(f"Indicator {name} is not registered for {code}")
+        return indicators[name].value
+
+    def get_values(self, code: int) -> Dict[str, Optional[float]]:
+        """ Latest value of all indicators of an instrument """
+        return {name: x.value for name, x in self._indicators.get(code, dict()).items()}
+
+    def __contains__(self, code: int) -> bool:
+        return code in self._indicators
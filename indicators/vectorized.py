@@ -0,0 +1,150 @@
+"""
+File:           vectorized.py
+Author:         Dibyaranjan Sathua
+Created on:     15/10/21, 8:40 pm
+
+Indicators computed over full series of numpy arrays. Input is 1-D (bars) or 2-D
+(bars x instruments) and output has the same shape, with NaN where the streaming indicator
+has no value yet. Arithmetic is done in the same order as in the streaming indicators, so
+values are exactly equal to them.
+"""
+from typing import Tuple
+import numpy as np
+
+from indicators.exceptions import IndicatorException
+from indicators.streaming import IST_OFFSET, SECONDS_IN_DAY
+
+
+def as_series(data, name: str) -> np.ndarray:
+    """ float64 1-D or 2-D array with bars on first axis """
+    array = np.asarray(data, dtype=np.float64)
+    if array.ndim not in (1, 2):
+        raise IndicatorException(f"{name} should be 1-D or 2-D, got {array.ndim}-D")
+    return array
+
+
+class VectorizedSMA:
+    """ Simple moving average. Counterpart of StreamingSMA """
+
+    def __init__(self, data, period: int):
+        if period < 1:
+            raise IndicatorException(f"Period should be positive, got {period}")
+        self._data = as_series(data, "data")
+        self._period = period
+
+    def calc(self) -> np.ndarray:
+        """ Calculate """
+        # Running sum is accumulated sequentially like StreamingSMA
+        sums = np.cumsum(self._data, axis=0)
+        result = np.full_like(self._data, np.nan)
+        period = self._period
+        if len(sums) >= period:
+            result[period - 1] = sums[period - 1] / period
+            result[period:] = (sums[period:] - sums[:-period]) / period
+        return result
+
+
+class VectorizedRSI:
+    """ RSI using Wilder smoothing. Counterpart of StreamingRSI """
+
+    def __init__(self, close, period: int = 14):
+        if period < 1:
+            raise IndicatorException(f"Period should be positive, got {period}")
+        self._close = as_series(close, "close")
+        self._period = period
+
+    def calc(self) -> np.ndarray:
+        """ Calculate """
+        close = self._close
+        result = np.full_like(close, np.nan)
+        period = self._period
+        if len(close) <= period:
+            return result
+        change = np.diff(close, axis=0)
+        gain = np.where(change > 0, change, 0.0)
+        loss = np.where(change < 0, -change, 0.0)
+        avg_gain, avg_loss = self.wilder_smoothing(gain, loss, period)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+        rsi = np.where(avg_gain == 0, 0.0, rsi)
+        rsi = np.where(avg_loss == 0, 100.0, rsi)
+        result[period:] = rsi
+        return result
+
+    @staticmethod
+    def wilder_smoothing(
+            gain: np.ndarray,
+            loss: np.ndarray,
+            period: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Average gain and loss from the first average onwards. Smoothing is recursive, so it is
+        computed bar by bar, for all instruments at once if the input is 2-D.
+        """
+        first_gain = np.cumsum(gain[:period], axis=0)[-1] / period
+        first_loss = np.cumsum(loss[:period], axis=0)[-1] / period
+        count = len(gain) - period + 1
+        if gain.ndim == 1:
+            # Python floats are cheaper than numpy scalars for a single series
+            avg_gain = [first_gain.item()]
+            avg_loss = [first_loss.item()]
+            prev_gain, prev_loss = avg_gain[0], avg_loss[0]
+            for current_gain, current_loss in zip(
+                    gain[period:].tolist(), loss[period:].tolist()
+            ):
+                prev_gain = (prev_gain * (period - 1) + current_gain) / period
+                prev_loss = (prev_loss * (period - 1) + current_loss) / period
+                avg_gain.append(prev_gain)
+                avg_loss.append(prev_loss)
+            return np.array(avg_gain), np.array(avg_loss)
+        # Gain and loss are smoothed together to halve the number of numpy calls per bar
+        changes = np.stack([gain, loss], axis=1)
+        averages = np.empty((count, ) + changes.shape[1:])
+        averages[0, 0] = first_gain
+        averages[0, 1] = first_loss
+        multiply, add, divide = np.multiply, np.add, np.divide
+        weight = float(period - 1)
+        for pos in range(1, count):
+            current = averages[pos]
+            multiply(averages[pos - 1], weight, out=current)
+            add(current, changes[period + pos - 1], out=current)
+            divide(current, period, out=current)
+        avg_gain, avg_loss = averages[:, 0], averages[:, 1]
+        return avg_gain, avg_loss
+
+
+class VectorizedVWAP:
+    """ VWAP reset every session (day). Counterpart of StreamingVWAP """
+
+    def __init__(self, high, low, close, volume, timestamp, session_offset: int = IST_OFFSET):
+        """
+        Constructor.
+        Args:
+            high, low, close, volume: Series of same shape.
+            timestamp: 1-D epoch seconds of the bars, shared by all instruments.
+            session_offset: UTC offset in seconds of the timezone in which sessions are split.
+        """
+        self._high = as_series(high, "high")
+        self._low = as_series(low, "low")
+        self._close = as_series(close, "close")
+        self._volume = as_series(volume, "volume")
+        self._timestamp = np.asarray(timestamp, dtype=np.int64)
+        if not self._high.shape == self._low.shape == self._close.shape == self._volume.shape:
+            raise IndicatorException("high, low, close and volume should have same shape")
+        if self._timestamp.shape != self._high.shape[:1]:
+            raise IndicatorException("timestamp should have one value per bar")
+        self._session_offset = session_offset
+
+    def calc(self) -> np.ndarray:
+        """ Calculate """
+        pv = (self._high + self._low + self._close) / 3 * self._volume
+        sessions = (self._timestamp + self._session_offset) // SECONDS_IN_DAY
+        starts = np.flatnonzero(np.diff(sessions)) + 1
+        sum_pv = np.empty_like(pv)
+        sum_v = np.empty_like(pv)
+        # Running sums restart at every session
+        for start, end in zip(np.r_[0, starts], np.r_[starts, len(pv)]):
+            np.cumsum(pv[start:end], axis=0, out=sum_pv[start:end])
+            np.cumsum(self._volume[start:end], axis=0, out=sum_v[start:end])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(sum_v != 0, sum_pv / sum_v, np.nan)
@@ -3,12 +3,18 @@ File:           historical_price.py
 Author:         Dibyaranjan Sathua
 Created on:     06/07/21, 12:44 am
 """
-from typing import Optional, List, Dict, Tuple
+from typing import Optional, List, Dict, Iterable, Iterator, Sequence, Tuple
 import datetime
 from dataclasses import dataclass
 import requests
+import numpy as np
 import enum
+from alice_blue_api.http_client import HttpClient
 from kite_api.config import Config
+from candles.container import CandleContainer, LazyCandles
+from candles.exceptions import CandleStoreError
+from candles.fetcher import CandleFetcher, CandleJob, CandleResult
+from candles.store import CandleStore, CandleKey, IST, rows_to_records
 
 
 @dataclass()
@@ -38,6 +44,22 @@ class InstrumentCandle:
             open_interest=data[6] if len(data) == 7 else None
         )
 
+    @classmethod
+    def from_record(cls, record: Tuple):
+        """ Create object from a candle store record """
+        timestamp, open_, high, low, close, volume, open_interest = record
+        timestamp = datetime.datetime.fromtimestamp(timestamp, tz=IST)
+        return cls(
+            date=timestamp.date(),
+            time=timestamp.time(),
+            open=open_,
+            high=high,
+            low=low,
+            close=close,
+            volume=volume,
+            open_interest=None if open_interest != open_interest else open_interest
+        )
+
 
 class CandleTimeFrame(enum.Enum):
     """ Candle timeframe """
@@ -53,9 +75,30 @@ class KiteCandle:
     """ Kite internal API to get candle data of an instruments """
     BASE_URL = "https://kite.zerodha.com/oms/instruments/historical/{instrument_token}/" \
                "{timeframe}?user_id=TW1320&oi={oi}&from={from_date}&to={to_date}"
+    # Latency of all the candle requests is recorded under this endpoint
+    ENDPOINT: str = "https://kite.zerodha.com/oms/instruments/historical"
+    # Longest range in days of a request. Longer ranges are fetched in chunks by fetch_many
+    MAX_RANGE_DAYS: Dict[CandleTimeFrame, int] = {
+        CandleTimeFrame.ONE_MINUTE: 60,
+        CandleTimeFrame.FIVE_MINUTE: 100,
+        CandleTimeFrame.FIFTEEN_MINUTE: 200,
+        CandleTimeFrame.THIRTY_MINUTE: 200,
+        CandleTimeFrame.ONE_HOUR: 400,
+        CandleTimeFrame.ONE_DAY: 2000,
+    }
 
-    def __init__(self):
-        self._candles: List[InstrumentCandle] = []
+    def __init__(
+            self,
+            store: Optional[CandleStore] = None,
+            http_client: Optional[HttpClient] = None
+    ):
+        # Candles are served from the store and only missing ranges are downloaded
+        self._store: Optional[CandleStore] = store
+        # Pooled connections shared by every request of this instance
+        self._http: HttpClient = http_client if http_client is not None else HttpClient()
+        self._candles: Sequence[InstrumentCandle] = []
+        # Time index of the candles
+        self._container: CandleContainer = CandleContainer.from_candles([])
         self._request_successful: bool = False
         self._today: Optional[datetime.date] = None
 
@@ -68,30 +111,150 @@ class KiteCandle:
             open_interest: bool = True
     ):
         """ Send API request and create InstrumentCandle """
+        if self._store is not None:
+            self._send_request_with_store(instrument_token, timeframe, from_date, to_date)
+            return None
+        response = self._fetch(instrument_token, timeframe, from_date, to_date, open_interest)
+        if response.ok:
+            self._request_successful = True
+            self._set_candles(self._get_candles(response.json()))
+        else:
+            print("Error fetching data using Kite internal API.")
+
+    def _fetch(
+            self,
+            instrument_token: int,
+            timeframe: CandleTimeFrame,
+            from_date: datetime.date,
+            to_date: datetime.date,
+            open_interest: bool
+    ) -> requests.Response:
+        """ Send candle API request """
+        url = KiteCandle.get_url(instrument_token, timeframe, from_date, to_date, open_interest)
+        return self._http.request(
+            "GET", url, endpoint=self.ENDPOINT, headers=KiteCandle.get_headers()
+        )
+
+    @staticmethod
+    def get_url(
+            instrument_token: int,
+            timeframe: CandleTimeFrame,
+            from_date: datetime.date,
+            to_date: datetime.date,
+            open_interest: bool
+    ) -> str:
+        """ URL of the candle API request """
         from_date_str = from_date.strftime("%Y-%m-%d")
         to_date_str = to_date.strftime("%Y-%m-%d")
         oi = 1 if open_interest else 0
-        url = KiteCandle.BASE_URL.format(
+        return KiteCandle.BASE_URL.format(
             instrument_token=instrument_token,
             timeframe=timeframe.value,
             from_date=from_date_str,
             to_date=to_date_str,
             oi=oi
         )
-        headers = {
+
+    @staticmethod
+    def get_headers() -> Dict:
+        """ Headers for the API request """
+        return {
             "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 11_2_3) AppleWebKit/537.36 "
                           "(KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36",
             "authorization": f"enctoken {Config.CANDLE_API_TOKEN}",
             "referer": "https://kite.zerodha.com/static/build/chart.html?v=2.9.2",
             "accept-language": "en-IN,en;q=0.9,hi-IN;q=0.8,hi;q=0.7,en-GB;q=0.6,en-US;q=0.5",
         }
-        with requests.Session() as session:
-            response = session.get(url=url, headers=headers)
-            if response.ok:
-                self._request_successful = True
-                self._candles = self._get_candles(response.json())
-            else:
-                print("Error fetching data using Kite internal API.")
+
+    def _send_request_with_store(
+            self,
+            instrument_token: int,
+            timeframe: CandleTimeFrame,
+            from_date: datetime.date,
+            to_date: datetime.date
+    ):
+        """
+        Get candles from the store fetching only the missing ranges. Kite API works on dates,
+        so the ranges are whole days. Open interest is always fetched.
+        """
+        def fetch(start: int, end: int):
+            response = self._fetch(
+                instrument_token,
+                timeframe,
+                datetime.datetime.fromtimestamp(start, tz=IST).date(),
+                datetime.datetime.fromtimestamp(end - 1, tz=IST).date(),
+                True
+            )
+            if not response.ok:
+                raise CandleStoreError(
+                    f"Candle API returned {response.status_code} for {instrument_token}"
+                )
+            return rows_to_records(response.json()["data"]["candles"])
+
+        key = self._get_key(instrument_token, timeframe)
+        start = datetime.datetime.combine(from_date, datetime.time(), tzinfo=IST)
+        end = datetime.datetime.combine(
+            to_date + datetime.timedelta(days=1), datetime.time(), tzinfo=IST
+        )
+        try:
+            records = self._store.get(
+                key, int(start.timestamp()), int(end.timestamp()), fetch
+            )
+        except CandleStoreError as err:
+            print(f"Error fetching data using Kite internal API. {err}")
+            return None
+        self._request_successful = True
+        self._set_candles(records)
+
+    def fetch_many(
+            self,
+            jobs: Iterable[CandleJob],
+            max_workers: int = 4,
+            rate_limit: float = 3.0
+    ) -> Iterator[CandleResult]:
+        """
+        Fetch candles of many instruments (job timeframe is CandleTimeFrame) in parallel on
+        pooled connections. Results are yielded as the jobs complete. Kite API works on dates,
+        so every request covers whole days and the candles are trimmed to the job range.
+        Open interest is always fetched.
+        """
+        max_range = {x: days * 86400 for x, days in self.MAX_RANGE_DAYS.items()}
+        with CandleFetcher(
+                get_request=self._get_request,
+                headers=self.get_headers(),
+                max_workers=max_workers,
+                rate_limit=rate_limit,
+                max_range=max_range,
+                store=self._store,
+                get_key=lambda job: self._get_key(job.token, job.timeframe),
+                http_client=self._http,
+                endpoint=self.ENDPOINT
+        ) as fetcher:
+            yield from fetcher.fetch(jobs)
+
+    @staticmethod
+    def _get_request(job: CandleJob) -> Tuple[str, None]:
+        """ URL of the request of a job. Query params are part of the URL """
+        url = KiteCandle.get_url(
+            job.token,
+            job.timeframe,
+            datetime.datetime.fromtimestamp(job.start, tz=IST).date(),
+            datetime.datetime.fromtimestamp(job.end - 1, tz=IST).date(),
+            True
+        )
+        return url, None
+
+    @staticmethod
+    def _get_key(instrument_token: int, timeframe: CandleTimeFrame) -> CandleKey:
+        """ Candle store key of an instrument """
+        return CandleKey(
+            source="kite", exchange="ALL", token=instrument_token, timeframe=timeframe.name
+        )
+
+    def _set_candles(self, records: np.ndarray):
+        """ Index the candles. InstrumentCandle objects are created only when accessed """
+        self._container = CandleContainer(records)
+        self._candles = LazyCandles(self._container, InstrumentCandle.from_record)
 
     def get_todays_open_price(self) -> float:
         """ Return today's open price """
@@ -100,39 +263,42 @@ class KiteCandle:
     def get_todays_price_by_time(self, time: datetime.time) -> InstrumentCandle:
         """ Return today's price by time """
         today = self._today if self._today is not None else datetime.date.today()
-        candle = next((x for x in self._candles if x.date == today and x.time == time), None)
-        if candle is not None:
-            return candle
+        pos = self._container.find(today, time)
+        if pos is not None:
+            return self._candles[pos]
         print(f"No candle data for date {today} and time {time}")
 
     def get_previous_trading_day_high_low(self) -> Tuple[Optional[float], Optional[float]]:
         """ Return previous trading day's high low """
         today = self._today if self._today is not None else datetime.date.today()
         # Previous day can be a non-trading day. So check up to today - 5
-        for day in range(1, 6):
-            time_delta = datetime.timedelta(days=day)
-            previous_day = today - time_delta
-            candles = [x for x in self._candles if x.date == previous_day]
-            if candles:
-                break
-        else:
-            # Executed if for loop is not terminated by break statement
+        previous_day = self._container.get_previous_trading_day(today, max_days=5)
+        if previous_day is None:
             print("No candles data found for the last 5 days")
             return None, None
-        high = max(x.high for x in candles)
-        low = min(x.low for x in candles)
-        return high, low
+        return self._container.get_day_high_low(previous_day)
 
     @staticmethod
-    def _get_candles(json_data: Dict):
-        """ Convert json data into list on InstrumentCandles """
-        candles = json_data["data"]["candles"]
-        return [InstrumentCandle.create(x) for x in candles]
+    def _get_candles(json_data: Dict) -> np.ndarray:
+        """ Convert json data into candle records """
+        return rows_to_records(json_data["data"]["candles"])
 
     @property
-    def candles(self) -> List[InstrumentCandle]:
+    def candles(self) -> Sequence[InstrumentCandle]:
         return self._candles
 
+    def close(self):
+        """ Close the pooled connections """
+        self._http.close()
+
+    @property
+    def http_client(self) -> HttpClient:
+        return self._http
+
+    @property
+    def container(self) -> CandleContainer:
+        return self._container
+
     @property
     def request_successful(self) -> bool:
         return self._request_successful
@@ -0,0 +1,7 @@
+"""
+File:           __init__.py
+Author:         Dibyaranjan Sathua
+Created on:     31/10/21, 7:00 pm
+
+Stubs, sample data and previous implementations shared by the tests and the benchmarks.
+"""
@@ -0,0 +1,163 @@
+"""
+File:           candles.py
+Author:         Dibyaranjan Sathua
+Created on:     31/10/21, 7:10 pm
+
+Candle API rows and a stub candle API serving them, the candle objects and list scans used
+before CandleContainer and random candle arrays for the indicators.
+"""
+from typing import List, Optional, Tuple
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import datetime
+import json
+import time
+import numpy as np
+
+from candles.fetcher import CandleJob
+from candles.store import IST
+
+# 01/04/21 00:00 IST
+START = 1617215400
+
+
+def get_candle_rows(start: int, end: int, seconds: int = 60) -> List[List]:
+    """ Candle API like rows of every trading minute (09:15 to 15:30 IST, Mon-Fri) """
+    rows = []
+    day = datetime.datetime.fromtimestamp(start, tz=IST).replace(hour=0, minute=0, second=0)
+    while day.timestamp() < end:
+        if day.weekday() < 5:
+            session_start = int(day.timestamp()) + 33300
+            for timestamp in range(session_start, session_start + 22500, seconds):
+                if start <= timestamp < end:
+                    price = 35000 + timestamp % 997
+                    rows.append([
+                        datetime.datetime.fromtimestamp(timestamp, tz=IST).strftime(
+                            "%Y-%m-%dT%H:%M:%S%z"
+                        ),
+                        price, price + 12.5, price - 10.25, price + 2.5, 1000 + timestamp % 89
+                    ])
+        day += datetime.timedelta(days=1)
+    return rows
+
+
+class StubCandleHandler(BaseHTTPRequestHandler):
+    """ Candle API returning get_candle_rows for starttime and endtime query params """
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        rows = get_candle_rows(int(query["starttime"][0]), int(query["endtime"][0]))
+        body = json.dumps({"data": {"candles": rows}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SlowCandleHandler(StubCandleHandler):
+    """ Stub candle API with network latency and keep-alive connections """
+    protocol_version = "HTTP/1.1"
+    latency: float = 0.03
+    connections: set = set()
+
+    def do_GET(self):
+        SlowCandleHandler.connections.add(self.client_address)
+        time.sleep(self.latency)
+        super(SlowCandleHandler, self).do_GET()
+
+
+def get_request(url: str):
+    """ get_request of CandleFetcher for the stub """
+    def request(job: CandleJob):
+        return url, {"token": job.token, "starttime": job.start, "endtime": job.end}
+    return request
+
+
+@dataclass()
+class Candle:
+    """ Same fields as InstrumentCandle """
+    date: datetime.date
+    time: datetime.time
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    open_interest: Optional[float]
+
+
+def get_candles(days: int, seconds: int = 60) -> List[Candle]:
+    """ InstrumentCandle like objects of every trading minute """
+    candles = []
+    for row in get_candle_rows(START, START + days * 86400, seconds):
+        timestamp = datetime.datetime.strptime(row[0], "%Y-%m-%dT%H:%M:%S%z")
+        candles.append(Candle(timestamp.date(), timestamp.time(), *row[1:], None))
+    return candles
+
+
+def legacy_price_by_time(candles: List[Candle], today: datetime.date, time: datetime.time):
+    """ Previous CandleApi.get_todays_price_by_time """
+    return next((x for x in candles if x.date == today and x.time == time), None)
+
+
+def legacy_previous_day_high_low(
+        candles: List[Candle],
+        today: datetime.date
+) -> Tuple[Optional[float], Optional[float]]:
+    """ Previous CandleApi.get_previous_trading_day_high_low """
+    for day in range(1, 6):
+        previous_day = today - datetime.timedelta(days=day)
+        day_candles = [x for x in candles if x.date == previous_day]
+        if day_candles:
+            break
+    else:
+        return None, None
+    return max(x.high for x in day_candles), min(x.low for x in day_candles)
+
+
+def legacy_get_candles(rows: List[List]) -> List[Candle]:
+    """ Previous CandleApi._get_candles """
+    candles = []
+    for row in rows:
+        timestamp = datetime.datetime.strptime(row[0], "%Y-%m-%dT%H:%M:%S%z")
+        candles.append(Candle(
+            timestamp.date(), timestamp.time(), *row[1:6], row[6] if len(row) == 7 else None
+        ))
+    return candles
+
+
+def candle_from_record(record: Tuple) -> Candle:
+    """ Same as InstrumentCandle.from_record """
+    timestamp, open_, high, low, close, volume, open_interest = record
+    timestamp = datetime.datetime.fromtimestamp(timestamp, tz=IST)
+    return Candle(
+        timestamp.date(), timestamp.time(), open_, high, low, close, volume,
+        None if open_interest != open_interest else open_interest
+    )
+
+
+def candles_equal(candles, expected) -> bool:
+    """ Structured arrays are equal. Missing open interest is NaN """
+    return len(candles) == len(expected) and all(
+        np.array_equal(candles[x], expected[x], equal_nan=x == "open_interest")
+        for x in expected.dtype.names
+    )
+
+
+def get_candle_arrays(bars: int = 1200, instruments: int = 4):
+    """ Random 1-minute high, low, close, volume and timestamp arrays spanning multiple days """
+    rng = np.random.default_rng(7)
+    close = np.round(200 + np.cumsum(rng.normal(0, 2, (bars, instruments)), axis=0), 2)
+    high = close + np.round(rng.random((bars, instruments)) * 3, 2)
+    low = close - np.round(rng.random((bars, instruments)) * 3, 2)
+    volume = rng.integers(0, 5000, (bars, instruments))
+    # 375 bars per day starting 09:15 IST
+    timestamp = np.array([
+        1633923900 + (x // 375) * 86400 + (x % 375) * 60 for x in range(bars)
+    ])
+    return high, low, close, volume, timestamp
@@ -0,0 +1,231 @@
+"""
+File:           feed.py
+Author:         Dibyaranjan Sathua
+Created on:     31/10/21, 7:00 pm
+
+Recorded and synthetic feed packets, the previous packet decoders and a stand-in of the
+AliceBlue feed web socket server. The server runs on a local port with its own event loop in a
+thread, records the json messages and pings of the clients and sends them binary packets on
+request. Connections can be dropped to test reconnects. With subscribed_only a packet goes only
+to the clients which subscribed its instrument code, like the real server.
+"""
+from typing import Dict, List, Optional, Set
+import asyncio
+import datetime
+import json
+import struct
+import threading
+import time
+
+from alice_blue_api.async_websocket import (
+    OPCODE_BINARY, OPCODE_CLOSE, OPCODE_PING, OPCODE_PONG, OPCODE_TEXT, encode_frame,
+    FrameReader, get_accept_key
+)
+from alice_blue_api.enums import FeedAction
+from alice_blue_api.websocket_streams import (
+    MarketData, CompactMarketData, unpack_int8, unpack_int32, unpack_int64,
+    price_multiplier_by_exchange
+)
+
+
+MARKET_DATA_PACKET = b"\x01\x02\x00\x00\xcc\x13\x00\x00\x83\x8b`\xd4W\x9f\x00\x00\x00\xaf" \
+                     b"\x00\x15\x0f6\x00\x00\x7f\xbc\x00\x00\x00\xc8\x00\x00\x83\x8b\x00\x00" \
+                     b"\x00\x19\x00\x00\x00\x00\x00\x00h\xfb\x00\x00\x00\x00\x00\x00xP\x00\x00" \
+                     b"\x91P`\xd4W\xa0\x00\x00\xc9@\x00\x00\xd3'\x00\x00}\x00\x00\x00\xcag\x00" \
+                     b"\x00\xd3'\x00\x00\x00\x00"
+
+COMPACT_MARKET_DATA_PACKET = b"\x02\x02\x00\x00\xd1]\x00\x00\x82U\xff\xff\xd5\xe4`\xfe?\xb7" \
+                             b"\x00\x00\x00\x05\x00\x03\xa4?\x00\x0b\xd53\x00\x06\xed>\x00\x00" \
+                             b"\x82\xdc\x00\x00\x83\x18"
+
+# Synthetic packets for modes we have not recorded yet (NFO exchange, token 53179)
+DEPTH = list(range(1, 6)) + [3495000 + x * 5 for x in range(5)] + [25 * x for x in range(1, 6)] + \
+    list(range(6, 11)) + [3495100 + x * 5 for x in range(5)] + [50 * x for x in range(1, 6)]
+
+SNAPQUOTE_PACKET = struct.pack(">BBI30II", 3, 2, 53179, *DEPTH, 1627293599)
+
+FULL_SNAPQUOTE_PACKET = struct.pack(
+    ">BBI30IIIIIIQQI", 4, 2, 53179, *DEPTH, 3495050, 3490000, 3500000, 3480000, 3485000,
+    120000, 130000, 3153685
+)
+
+OPEN_INTEREST_PACKET = struct.pack(">BBIII", 8, 2, 53179, 2512500, 2400000)
+
+DPR_PACKET = struct.pack(">BBIIII", 7, 2, 53179, 1627293599, 3844400, 3145400)
+
+MARKET_STATUS_PACKET = struct.pack(">BBH", 9, 2, 6) + b"NORMAL" + struct.pack(">H", 4) + b"OPEN"
+
+SAMPLE_PACKETS = [
+    MARKET_DATA_PACKET,
+    COMPACT_MARKET_DATA_PACKET,
+    SNAPQUOTE_PACKET,
+    FULL_SNAPQUOTE_PACKET,
+    OPEN_INTEREST_PACKET,
+    DPR_PACKET,
+    MARKET_STATUS_PACKET,
+]
+
+
+def legacy_market_data(bin_data):
+    """ Decoder used before precompiled structs (one slice + unpack per field) """
+    kwargs = dict()
+    kwargs["exchange"] = unpack_int8(bin_data, 1)
+    price_multiplier = price_multiplier_by_exchange(kwargs["exchange"])
+    kwargs["code"] = unpack_int32(bin_data, 2)
+    kwargs["ltp"] = price_multiplier(unpack_int32(bin_data, 6))
+    kwargs["last_trade_time"] = datetime.datetime.fromtimestamp(unpack_int32(bin_data, 10))
+    kwargs["last_trade_quantity"] = unpack_int32(bin_data, 14)
+    kwargs["volume"] = unpack_int32(bin_data, 18)
+    kwargs["best_bid_price"] = price_multiplier(unpack_int32(bin_data, 22))
+    kwargs["best_bid_quantity"] = unpack_int32(bin_data, 26)
+    kwargs["best_ask_price"] = price_multiplier(unpack_int32(bin_data, 30))
+    kwargs["best_ask_quantity"] = unpack_int32(bin_data, 34)
+    kwargs["total_buy_quantity"] = unpack_int64(bin_data, 38)
+    kwargs["total_sell_quantity"] = unpack_int64(bin_data, 46)
+    kwargs["avg_trade_price"] = price_multiplier(unpack_int32(bin_data, 54))
+    kwargs["exchange_timestamp"] = datetime.datetime.fromtimestamp(unpack_int32(bin_data, 58))
+    kwargs["open"] = price_multiplier(unpack_int32(bin_data, 62))
+    kwargs["high"] = price_multiplier(unpack_int32(bin_data, 66))
+    kwargs["low"] = price_multiplier(unpack_int32(bin_data, 70))
+    kwargs["close"] = price_multiplier(unpack_int32(bin_data, 74))
+    kwargs["yearly_high"] = price_multiplier(unpack_int32(bin_data, 78))
+    kwargs["yearly_low"] = price_multiplier(unpack_int32(bin_data, 82))
+    return MarketData(**kwargs)
+
+
+def legacy_compact_market_data(bin_data):
+    """ Decoder used before precompiled structs (one slice + unpack per field) """
+    kwargs = dict()
+    kwargs["exchange"] = unpack_int8(bin_data, 1)
+    price_multiplier = price_multiplier_by_exchange(kwargs["exchange"])
+    kwargs["code"] = unpack_int32(bin_data, 2)
+    kwargs["ltp"] = price_multiplier(unpack_int32(bin_data, 6))
+    kwargs["change"] = unpack_int32(bin_data, 10)
+    kwargs["exchange_timestamp"] = datetime.datetime.fromtimestamp(unpack_int32(bin_data, 14))
+    kwargs["volume"] = unpack_int32(bin_data, 18)
+    return CompactMarketData(**kwargs)
+
+
+def compact_packet(
+        code: int,
+        ltp: float,
+        exchange_timestamp: int,
+        exchange: int = 2,
+        volume: int = 0
+) -> bytes:
+    """ COMPACT_MARKETDATA packet of an instrument """
+    return struct.pack(
+        ">BBIIIII", 2, exchange, code, int(round(ltp * 100)), 0, exchange_timestamp, volume
+    )
+
+
+class StubFeedServer:
+    """ Local web socket feed server """
+
+    def __init__(self, subscribed_only: bool = False):
+        self.port: int = 0
+        self._subscribed_only: bool = subscribed_only
+        # Instrument codes subscribed by every connection
+        self._subscribed: Dict[asyncio.StreamWriter, Set[int]] = dict()
+        # Json messages (subscribe, unsubscribe) received from the clients
+        self.messages: List[Dict] = []
+        self.pings: int = 0
+        self.connections: int = 0
+        self._writers: List[asyncio.StreamWriter] = []
+        self._loop = asyncio.new_event_loop()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._thread: Optional[threading.Thread] = None
+        # Set when a client connects
+        self.client_connected = threading.Event()
+
+    def start(self) -> "StubFeedServer":
+        """ Start the server thread """
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self._server = self._run(asyncio.start_server(self._handle, "127.0.0.1", 0))
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    @property
+    def url(self) -> str:
+        return f"ws://127.0.0.1:{self.port}/hydrasocket/v2/websocket?access_token=test"
+
+    def _run(self, coroutine, timeout: float = 10.0):
+        """ Run a coroutine on the server loop and wait for its result """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result(timeout)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """ Handshake and read the frames of a client """
+        request = await reader.readuntil(b"\r\n\r\n")
+        headers = {
+            name.strip().lower(): value.strip()
+            for name, _, value in (x.partition(":") for x in request.decode().split("\r\n")[1:])
+        }
+        writer.write(
+            f"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {get_accept_key(headers['sec-websocket-key'])}\r\n\r\n"
+            .encode()
+        )
+        self._writers.append(writer)
+        self._subscribed[writer] = set()
+        self.connections += 1
+        self.client_connected.set()
+        frames = FrameReader(reader)
+        try:
+            while True:
+                _, opcode, payload = await frames.read()
+                if opcode == OPCODE_PING:
+                    self.pings += 1
+                    writer.write(encode_frame(OPCODE_PONG, payload, mask=False))
+                elif opcode == OPCODE_TEXT:
+                    message = json.loads(payload)
+                    self.messages.append(message)
+                    codes = {x[1] for x in message.get("v", [])}
+                    if message.get("a") == FeedAction.SUBSCRIBE.value:
+                        self._subscribed[writer] |= codes
+                    elif message.get("a") == FeedAction.UNSUBSCRIBE.value:
+                        self._subscribed[writer] -= codes
+                elif opcode == OPCODE_CLOSE:
+                    writer.write(encode_frame(OPCODE_CLOSE, payload, mask=False))
+                    break
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if writer in self._writers:
+                self._writers.remove(writer)
+            self._subscribed.pop(writer, None)
+            writer.close()
+
+    def send_packets(self, packets: List[bytes]) -> List[float]:
+        """ Send packets to every client. Returns perf_counter time at which each was sent """
+        async def send():
+            times = []
+            for packet in packets:
+                frame = encode_frame(OPCODE_BINARY, packet, mask=False)
+                code = int.from_bytes(packet[2:6], "big")
+                times.append(time.perf_counter())
+                for writer in self._writers:
+                    if not self._subscribed_only or code in self._subscribed[writer]:
+                        writer.write(frame)
+            for writer in self._writers:
+                await writer.drain()
+            return times
+        return self._run(send())
+
+    def drop_connections(self):
+        """ Abort the client connections without a close frame """
+        async def drop():
+            for writer in list(self._writers):
+                writer.transport.abort()
+            self._writers.clear()
+        self._run(drop())
+        self.client_connected.clear()
+
+    def stop(self):
+        """ Stop the server and its thread """
+        self.drop_connections()
+        self._server.close()
+        self._run(self._server.wait_closed())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
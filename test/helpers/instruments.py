@@ -0,0 +1,118 @@
+"""
+File:           instruments.py
+Author:         Dibyaranjan Sathua
+Created on:     31/10/21, 7:40 pm
+
+BANKNIFTY instruments, master contracts payload and the previous dataclass Instrument.
+"""
+from typing import Optional
+from dataclasses import dataclass
+import datetime
+import json
+
+from alice_blue_api.enums import OptionType
+from alice_blue_api.instruments import Instrument
+
+
+EXPIRIES = [datetime.date(2021, 10, 14), datetime.date(2021, 10, 21), datetime.date(2021, 10, 28)]
+
+
+def get_bnf_instruments(expiries=None, low_strike=35000, high_strike=40000):
+    """ BNF options from low_strike to high_strike and futures for all expiries """
+    instruments = []
+    code = 40000
+    for expiry in expiries or EXPIRIES:
+        month = expiry.strftime("%b").upper()
+        for strike in range(low_strike, high_strike + 1, 100):
+            for option_type in [OptionType.CE, OptionType.PE]:
+                code += 1
+                instruments.append(Instrument(
+                    trading_symbol=f"BANKNIFTY21{month}{strike}{option_type.name}",
+                    symbol=f"BANKNIFTY {month} {strike}.0 {option_type.name}",
+                    lot_size=25, expiry=expiry, exchange_code=2, exchange="NFO", code=code,
+                    option_type=option_type, strike=strike, index=False
+                ))
+        code += 1
+        instruments.append(Instrument(
+            trading_symbol=f"BANKNIFTY21{month}FUT", symbol=f"BANKNIFTY {month} FUT",
+            lot_size=25, expiry=expiry, exchange_code=2, exchange="NFO", code=code,
+            option_type=OptionType.FUT, strike=None, index=False
+        ))
+    return instruments
+
+
+def get_master_contracts_payload(expiries: int = 12, stocks: int = 150) -> bytes:
+    """ Master contracts like json payload of BNF options and monthly stock options """
+    contracts = []
+    code = 40000
+    underlyings = [("BANKNIFTY", week, range(25000, 50001, 100)) for week in range(expiries)]
+    underlyings += [
+        (f"STOCK{x}", week, range(1000, 1500, 20)) for x in range(stocks) for week in (0, 4, 8)
+    ]
+    for underlying, week, strikes in underlyings:
+        expiry = datetime.datetime(2021, 10, 7, 15, 30) + datetime.timedelta(weeks=week)
+        month = expiry.strftime("%b").upper()
+        for strike in strikes:
+            for option_type in ["CE", "PE"]:
+                code += 1
+                contracts.append({
+                    "trading_symbol": f"{underlying}21{month}{strike}{option_type}",
+                    "symbol": f"{underlying} {month} {strike}.0 {option_type}",
+                    "lotSize": "25",
+                    "expiry": int(expiry.timestamp()),
+                    "exchange_code": 2,
+                    "exchange": "NFO",
+                    "code": str(code)
+                })
+    return json.dumps({"NSE-OPT": contracts, "NSE-FUT": []}).encode()
+
+
+@dataclass()
+class LegacyInstrument:
+    """ Previous Instrument implementation """
+    trading_symbol: str
+    symbol: str
+    lot_size: Optional[int]
+    expiry: Optional[datetime.date]
+    exchange_code: Optional[int]
+    exchange: str
+    code: int
+    option_type: Optional[OptionType]
+    strike: Optional[int]
+    index: bool
+
+    @classmethod
+    def create(cls, data):
+        lot_size = None
+        expiry = None
+        option_type = None
+        strike = None
+        if "lotSize" in data:
+            lot_size = int(data["lotSize"])
+        if "expiry" in data:
+            expiry = datetime.datetime.fromtimestamp(data["expiry"]).date()
+        code = int(data["code"])
+        index = data.get("index", False)
+        if not index:
+            symbol_parts = data["symbol"].split(" ")
+            if symbol_parts[-1] == "CE":
+                option_type = OptionType.CE
+                strike = int(float(symbol_parts[-2]))
+            elif symbol_parts[-1] == "PE":
+                option_type = OptionType.PE
+                strike = int(float(symbol_parts[-2]))
+            elif symbol_parts[-1] == "FUT":
+                option_type = OptionType.FUT
+                strike = None
+        return cls(
+            trading_symbol=data["trading_symbol"],
+            symbol=data["symbol"],
+            lot_size=lot_size,
+            expiry=expiry,
+            exchange_code=data["exchange_code"],
+            exchange=data["exchange"],
+            code=code,
+            option_type=option_type,
+            strike=strike,
+            index=index
+        )
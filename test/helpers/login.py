@@ -0,0 +1,133 @@
+"""
+File:           login.py
+Author:         Dibyaranjan Sathua
+Created on:     31/10/21, 7:30 pm
+
+OAuth login pages of AliceBlue with the markup around their forms, a stub OAuth server
+serving them and the page flow of generate_access_token.
+"""
+from http.server import BaseHTTPRequestHandler
+from typing import Callable, Dict, List
+from urllib.parse import parse_qs
+
+from alice_blue_api.form_parser import parse_form_fields
+from alice_blue_api.http_client import HttpClient
+
+
+# Markup around the forms, like the scripts and styles of the real pages
+PADDING: str = (
+    "<style>" + ".form-control{padding:6px 12px;border:1px solid #ccc}" * 40 + "</style>"
+    "<script>var config = {\"inputs\": \"<input name='_csrf_token' value='fake'>\"};</script>"
+    "<!-- <input name=\"login_challenge\" value=\"commented\"> -->"
+    + "<div class=\"row\"><p>Trade with AliceBlue &amp; invest</p></div>" * 150
+)
+
+
+def get_page(title: str, inputs: str) -> str:
+    """ Login page with a form of inputs """
+    return (
+        f"<!DOCTYPE html><html><head><title>{title}</title></head><body>{PADDING}"
+        f"<form method=\"post\">{inputs}<button type=\"submit\">Submit</button></form>"
+        f"{PADDING}</body></html>"
+    )
+
+
+HIDDEN: str = (
+    "<input type=\"hidden\" name=\"_csrf_token\" value=\"Q2hhbGxlbmdl&#43;T2tlbg==\"/>"
+    "<input type=\"hidden\" name=\"login_challenge\" value=\"6f2c1a9e8b7d4c3a\">"
+)
+
+LOGIN_PAGE: str = get_page(
+    "Login",
+    "<input type=\"text\" name=\"client_id\"><input type=\"password\" name=\"password\">" + HIDDEN
+)
+
+TWOFA_PAGE: str = get_page(
+    "2FA",
+    "".join(
+        f"<label>Question {x}</label><input type=\"hidden\" name=\"question_id1\" value=\"{x}\">"
+        f"<input type=\"password\" name=\"answer{x}\">"
+        for x in (12, 31)
+    ) + HIDDEN
+)
+
+CONSENT_PAGE: str = get_page(
+    "Consent",
+    "<input type=\"hidden\" name=\"_csrf_token\" value=\"Q29uc2VudA==\">"
+    "<input type=\"submit\" name=\"consent\" value=\"Authorize\">"
+)
+
+
+class OAuthHandler(BaseHTTPRequestHandler):
+    """ OAuth pages of the login flow. Posted forms are kept in forms """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    forms: Dict[str, Dict[str, List[str]]] = dict()
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/oauth2/auth":
+            self._send_page(LOGIN_PAGE)
+        elif path == "/oauth2/consent":
+            self._send_page(CONSENT_PAGE)
+        else:
+            self._send_page("<html><body>Logged in</body></html>")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        path = self.path.split("?")[0]
+        OAuthHandler.forms[path] = parse_qs(self.rfile.read(length).decode())
+        if path == "/oauth2/login":
+            self._send_page(TWOFA_PAGE)
+        elif path == "/oauth2/twofa":
+            self._redirect("/oauth2/consent?consent_challenge=a1b2c3")
+        else:
+            self._redirect("/callback?code=Y29kZQ&state=test_state")
+
+    def _send_page(self, page: str):
+        body = page.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _redirect(self, location: str):
+        self.send_response(302)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+# Input fields of a page: (html, names) -> {name: values}
+ExtractFunc = Callable[[str, List[str]], Dict[str, List[str]]]
+
+
+def extract_fields(html: str, names: List[str]) -> Dict[str, List[str]]:
+    """ Input fields using FormFieldExtractor """
+    return parse_form_fields(html, names).fields
+
+
+def login(client: HttpClient, base_url: str, extract: ExtractFunc) -> str:
+    """ OAuth page flow of generate_access_token. Returns the authorization code """
+    client.session.cookies.clear()
+    response = client.request("GET", f"{base_url}/oauth2/auth?response_type=code")
+    fields = extract(response.text, ["_csrf_token", "login_challenge"])
+    payload = {
+        "client_id": "AB123", "password": "secret",
+        "login_challenge": fields["login_challenge"][0], "_csrf_token": fields["_csrf_token"][0]
+    }
+    response = client.request("POST", f"{base_url}/oauth2/login", data=payload)
+    fields = extract(response.text, ["question_id1", "_csrf_token", "login_challenge"])
+    payload = {
+        "answer1": "1990", "answer2": "1990", "question_id1": fields["question_id1"],
+        "login_challenge": fields["login_challenge"][0], "_csrf_token": fields["_csrf_token"][0]
+    }
+    response = client.request("POST", f"{base_url}/oauth2/twofa", data=payload)
+    fields = extract(response.text, ["_csrf_token"])
+    payload = {"_csrf_token": fields["_csrf_token"][0], "consent": "Authorize", "scopes": ""}
+    response = client.request("POST", f"{base_url}/oauth2/consent", data=payload)
+    return parse_qs(response.url.split("?")[1])["code"][0]
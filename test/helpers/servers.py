@@ -0,0 +1,107 @@
+"""
+File:           servers.py
+Author:         Dibyaranjan Sathua
+Created on:     31/10/21, 7:20 pm
+
+Local HTTP servers of the API tests and benchmarks.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import gzip
+import json
+import os
+import ssl
+import subprocess
+import tempfile
+import threading
+import zlib
+import brotli
+
+
+def start_server(handler, tls: bool = False) -> ThreadingHTTPServer:
+    """
+    Serve handler on a free local port. With tls the server is HTTPS with a self signed
+    certificate (needs the openssl command)
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    if tls:
+        cert_dir = tempfile.mkdtemp()
+        cert, key = os.path.join(cert_dir, "cert.pem"), os.path.join(cert_dir, "key.pem")
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+             "-subj", "/CN=127.0.0.1", "-keyout", key, "-out", cert],
+            check=True, capture_output=True
+        )
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class StubApiHandler(BaseHTTPRequestHandler):
+    """ Small JSON response on keep-alive connections. /fail/<n> fails the first n calls """
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes, which Nagle would delay on keep-alive connections
+    disable_nagle_algorithm = True
+    body: bytes = json.dumps({"status": "success", "data": {"ltp": 35210.5}}).encode()
+    calls: dict = dict()
+    connections: set = set()
+
+    def do_GET(self):
+        self._respond()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        self._respond()
+
+    def _respond(self):
+        StubApiHandler.connections.add(self.client_address)
+        count = StubApiHandler.calls[self.path] = StubApiHandler.calls.get(self.path, 0) + 1
+        if self.path.startswith("/fail/") and count <= int(self.path.split("/")[2]):
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+# Quality of on the fly compression by web servers
+COMPRESS = {
+    "identity": lambda x: x,
+    "gzip": lambda x: gzip.compress(x, compresslevel=6),
+    "deflate": lambda x: zlib.compress(x, 6),
+    "br": lambda x: brotli.compress(x, quality=6),
+}
+
+
+class CompressedHandler(BaseHTTPRequestHandler):
+    """ Serves bodies[name] compressed with encoding for path /<name>/<encoding> """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    bodies: dict = dict()
+    _compressed: dict = dict()
+
+    def do_GET(self):
+        _, name, encoding = self.path.split("/")
+        key = (name, encoding)
+        if key not in self._compressed:
+            CompressedHandler._compressed[key] = COMPRESS[encoding](self.bodies[name])
+        body = self._compressed[key]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
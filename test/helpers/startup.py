@@ -0,0 +1,84 @@
+"""
+File:           startup.py
+Author:         Dibyaranjan Sathua
+Created on:     31/10/21, 7:50 pm
+
+Startup time of a short lived process which imports FeedSystem and decodes one packet.
+Every run is a new interpreter with -X importtime.
+"""
+from typing import Dict, List, Tuple
+import json
+import statistics
+import subprocess
+import sys
+
+
+# Imports of the signal process and decode of a COMPACT_MARKETDATA packet. Elapsed time and
+# the modules it loaded are printed as json on the last line of stdout
+STARTUP_CODE: str = """
+import json, sys, time
+loaded = set(sys.modules)
+start = time.perf_counter()
+from alice_blue_api.feed_system import FeedSystem
+from alice_blue_api.websocket_streams import decode_stream
+decode_stream(%r)
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({"elapsed": elapsed, "modules": sorted(set(sys.modules) - loaded)}))
+"""
+
+PACKET: bytes = b"\x02\x02\x00\x00\xd1]\x00\x00\x82U\xff\xff\xd5\xe4`\xfe?\xb7\x00\x00\x00\x05" \
+                b"\x00\x03\xa4?\x00\x0b\xd53\x00\x06\xed>\x00\x00\x82\xdc\x00\x00\x83\x18"
+
+# Loaded on first use only
+HEAVY_MODULES: Tuple[str, ...] = (
+    "numpy", "requests", "urllib3", "websocket", "bs4", "googleapiclient", "google.oauth2",
+    "alice_blue_api.api", "alice_blue_api.websocket"
+)
+
+REPO_PACKAGES: Tuple[str, ...] = ("alice_blue_api.", "candles.")
+
+# Median milliseconds to import FeedSystem and decode a packet, enforced by test_startup.
+# STARTUP_BUDGET_MS environment variable overrides it
+STARTUP_BUDGET_MS: float = 150.0
+
+
+def run_startup() -> Tuple[float, List[str], List[Tuple[int, str]]]:
+    """
+    Startup in a new interpreter. Returns elapsed milliseconds, modules loaded by the
+    startup code and (cumulative microseconds, module) of the packages and repo modules it
+    imported
+    """
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_CODE % PACKET],
+        capture_output=True, text=True, check=True
+    )
+    result = json.loads(output.stdout.strip().splitlines()[-1])
+    modules = set(result["modules"])
+    imports = []
+    for line in output.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        if name in modules and ("." not in name or name.startswith(REPO_PACKAGES)):
+            imports.append((int(cumulative), name))
+    return result["elapsed"], result["modules"], imports
+
+
+def measure_startup(runs: int = 5) -> Dict:
+    """ Median startup time, heavy modules loaded and slowest imports """
+    times = []
+    modules, imports = [], []
+    for _ in range(runs):
+        elapsed, modules, imports = run_startup()
+        times.append(elapsed)
+    loaded = [
+        x for x in HEAVY_MODULES if any(m == x or m.startswith(f"{x}.") for m in modules)
+    ]
+    slowest = sorted((x for x in imports if not x[1].startswith("_")), reverse=True)
+    return {
+        "median_ms": statistics.median(times),
+        "min_ms": min(times),
+        "heavy_modules": loaded,
+        "slowest_imports": slowest[:10],
+    }
@@ -3,7 +3,16 @@ File:           test_alice_blue_streams.py
 Author:         Dibyaranjan Sathua
 Created on:     26/07/21, 10:24 am
 """
-from alice_blue_api.websocket_streams import MarketData, CompactMarketData, get_mode_from_stream
+import datetime
+from alice_blue_api.enums import FeedModes
+from alice_blue_api.websocket_streams import MarketData, CompactMarketData, get_mode_from_stream, \
+    decode_frames, decode_frame_list, decode_stream, SnapQuote, FullSnapQuote, OpenInterest, \
+    DPRData, MarketStatus
+from test.helpers.feed import (
+    MARKET_DATA_PACKET, COMPACT_MARKET_DATA_PACKET, SNAPQUOTE_PACKET, FULL_SNAPQUOTE_PACKET,
+    OPEN_INTEREST_PACKET, DPR_PACKET, MARKET_STATUS_PACKET, legacy_market_data,
+    legacy_compact_market_data
+)
 
 
 def test_websocket_streams():
@@ -28,7 +37,7 @@ def test_websocket_streams():
                   b"\xa0\x00\x00\xc9@\x00\x00\xd3'\x00\x00}\x00\x00\x00\xcag\x00\x00\xd3'\x00\
                   x00\x00\x00"
     data = MarketData.create(binary_data)
-    print(data.token)
+    assert data.token == data.code == 52243
     print(data.ltp)
     print(data.open)
     print(data.close)
@@ -67,8 +76,67 @@ def test_websocket_compact_market():
     print(data.ltp)
 
 
+def test_struct_decoders():
+    """ Precompiled struct decoders should match per field unpacking """
+    data = MarketData.create(MARKET_DATA_PACKET)
+    print(data)
+    assert data == legacy_market_data(MARKET_DATA_PACKET)
+    data = CompactMarketData.create(COMPACT_MARKET_DATA_PACKET)
+    print(data)
+    assert data == legacy_compact_market_data(COMPACT_MARKET_DATA_PACKET)
+
+
+def test_batch_decoders():
+    """ Batch decoded frames should have same values as scalar decoders """
+    cases = [
+        (FeedModes.MARKET_DATA, MarketData, MARKET_DATA_PACKET),
+        (FeedModes.COMPACT_MARKETDATA, CompactMarketData, COMPACT_MARKET_DATA_PACKET),
+    ]
+    for mode, record_cls, packet in cases:
+        frames = decode_frames(packet * 3, mode, frame_size=len(packet))
+        print(frames)
+        assert len(frames) == 3
+        expected = record_cls.create(packet)
+        for name in frames.dtype.names:
+            value = frames[name][2].item()
+            if isinstance(getattr(expected, name), datetime.datetime):
+                value = datetime.datetime.fromtimestamp(value)
+            assert value == getattr(expected, name), name
+        assert (decode_frame_list([packet, packet], mode) == frames[:2]).all()
+
+
+def test_other_mode_decoders():
+    """ Decoders of depth, open interest, dpr and market status """
+    data = decode_stream(SNAPQUOTE_PACKET)
+    print(data)
+    assert isinstance(data, SnapQuote)
+    assert data.code == 53179
+    assert data.bid_prices == (34950.0, 34950.05, 34950.1, 34950.15, 34950.2)
+    assert data.ask_quantities == (50, 100, 150, 200, 250)
+    data = decode_stream(FULL_SNAPQUOTE_PACKET)
+    print(data)
+    assert isinstance(data, FullSnapQuote)
+    assert data.sellers == (6, 7, 8, 9, 10)
+    assert data.close == 34850.0
+    assert data.volume == 3153685
+    data = decode_stream(OPEN_INTEREST_PACKET)
+    print(data)
+    assert data == OpenInterest(2, 53179, 2512500, 2400000)
+    data = decode_stream(DPR_PACKET)
+    print(data)
+    assert isinstance(data, DPRData)
+    assert (data.high, data.low) == (38444.0, 31454.0)
+    data = decode_stream(MARKET_STATUS_PACKET)
+    print(data)
+    assert data == MarketStatus(2, "NORMAL", "OPEN")
+    assert decode_stream(b"\x05\x02") is None
+
+
 if __name__ == "__main__":
     test_websocket_compact_market()
+    test_struct_decoders()
+    test_batch_decoders()
+    test_other_mode_decoders()
 
 
 """
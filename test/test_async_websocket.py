@@ -0,0 +1,164 @@
+"""
+File:           test_async_websocket.py
+Author:         Dibyaranjan Sathua
+Created on:     26/10/21, 10:15 pm
+"""
+import asyncio
+from alice_blue_api.async_websocket import (
+    OPCODE_BINARY, OPCODE_CONTINUATION, OPCODE_PING, OPCODE_PONG, OPCODE_TEXT, AsyncFeedClient,
+    FrameReader, WebSocketConnection, encode_frame
+)
+from alice_blue_api.enums import FeedAction
+from alice_blue_api.option_chain import OptionChain
+from alice_blue_api.instruments import Instrument
+from test.helpers.feed import StubFeedServer, compact_packet
+
+
+def get_instrument(code):
+    """ Dummy instrument with the given code """
+    return Instrument(
+        trading_symbol="", symbol="", lot_size=None, expiry=None, exchange_code=2,
+        exchange="NFO", code=code, option_type=None, strike=None, index=False
+    )
+
+
+def test_frame_reader():
+    """ Masked frames of all length encodings are read back, split at any point """
+    payloads = [b"", b"x" * 125, b"y" * 126, b"z" * 70000]
+    data = b"".join(encode_frame(OPCODE_BINARY, x, mask=True) for x in payloads)
+    # Fragmented message: the first frame is not final
+    fragment = bytearray(encode_frame(OPCODE_TEXT, b"sub", mask=False))
+    fragment[0] &= 0x7F
+    data += bytes(fragment) + encode_frame(OPCODE_CONTINUATION, b"scribe", mask=False)
+
+    async def read():
+        reader = asyncio.StreamReader()
+        for pos in range(0, len(data), 1000):
+            reader.feed_data(data[pos:pos + 1000])
+        reader.feed_eof()
+        frames = FrameReader(reader)
+        return [await frames.read() for _ in range(len(payloads) + 2)]
+
+    frames = asyncio.run(read())
+    assert [x[2] for x in frames[:4]] == payloads
+    assert frames[4] == (False, OPCODE_TEXT, b"sub")
+    assert frames[5] == (True, OPCODE_CONTINUATION, b"scribe")
+
+
+class SlowWriter:
+    """ Stream writer whose drain takes a while. Overlapping drains are counted """
+
+    def __init__(self):
+        self.data = bytearray()
+        self.draining = 0
+        self.overlaps = 0
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        self.draining += 1
+        if self.draining > 1:
+            self.overlaps += 1
+        await asyncio.sleep(0.01)
+        self.draining -= 1
+
+
+def test_send_lock():
+    """ Pong of the reader and a heartbeat sent at the same time are written one after other """
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(
+            encode_frame(OPCODE_PING, b"ping", mask=False) +
+            encode_frame(OPCODE_BINARY, b"tick", mask=False)
+        )
+        reader.feed_eof()
+        writer = SlowWriter()
+        connection = WebSocketConnection(reader, writer, mask=True)
+        message, _ = await asyncio.gather(
+            connection.recv(), connection.send(b"heartbeat", OPCODE_PING)
+        )
+        sent = asyncio.StreamReader()
+        sent.feed_data(bytes(writer.data))
+        sent.feed_eof()
+        frames = FrameReader(sent)
+        return message, writer.overlaps, [await frames.read() for _ in range(2)]
+
+    message, overlaps, frames = asyncio.run(run())
+    assert message == (OPCODE_BINARY, b"tick")
+    assert overlaps == 0
+    assert sorted(x[1:] for x in frames) == [(OPCODE_PING, b"heartbeat"), (OPCODE_PONG, b"ping")]
+
+
+def test_async_feed_client():
+    """ Ticks reach the iterator and option chain, subscribe and heartbeat reach the server """
+    server = StubFeedServer().start()
+    OptionChain.reset()
+    option_chain = OptionChain.get_instance()
+
+    async def run():
+        client = AsyncFeedClient(server.url, option_chain=option_chain, heartbeat_interval=0.05)
+        async with client:
+            await client.wait_until_connection_open(timeout=5)
+            stream = client.ticks()
+            await client.subscribe([get_instrument(53179), get_instrument(53180)])
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, server.send_packets, [
+                compact_packet(53179, 350.25, 1635235200), compact_packet(53180, 120.5, 1635235201)
+            ])
+            ticks = [await stream.__anext__() for _ in range(2)]
+            await asyncio.sleep(0.2)
+        # Stream ends with the connection
+        assert [x async for x in stream] == []
+        return ticks
+
+    ticks = asyncio.run(run())
+    assert [(x.code, x.ltp) for x in ticks] == [(53179, 350.25), (53180, 120.5)]
+    assert option_chain.get_market_data_by_instrument(get_instrument(53180)).ltp == 120.5
+    assert server.messages == [{
+        "a": FeedAction.SUBSCRIBE.value, "v": [[2, 53179], [2, 53180]], "m": "compact_marketdata"
+    }]
+    assert server.pings >= 2
+    server.stop()
+    OptionChain.reset()
+
+
+def test_async_feed_client_errors():
+    """ Bad packet and failing callback are counted, the reader goes on with the next packets """
+    server = StubFeedServer().start()
+    OptionChain.reset()
+    option_chain = OptionChain.get_instance()
+    codes = []
+
+    def failing(tick):
+        codes.append(tick.code)
+        raise ValueError("Bad strategy")
+
+    async def run():
+        client = AsyncFeedClient(server.url, option_chain=option_chain)
+        client.add_callback(failing)
+        async with client:
+            await client.wait_until_connection_open(timeout=5)
+            stream = client.ticks()
+            loop = asyncio.get_running_loop()
+            # Compact market data packet cut short
+            await loop.run_in_executor(None, server.send_packets, [
+                compact_packet(53179, 350.25, 1635235200)[:8],
+                compact_packet(53180, 120.5, 1635235201),
+            ])
+            tick = await stream.__anext__()
+        return client, tick
+
+    client, tick = asyncio.run(run())
+    assert tick.code == 53180 and codes == [53180]
+    assert client.errors == 2
+    assert option_chain.get_market_data_by_instrument(get_instrument(53180)).ltp == 120.5
+    server.stop()
+    OptionChain.reset()
+
+
+if __name__ == "__main__":
+    test_frame_reader()
+    test_send_lock()
+    test_async_feed_client()
+    test_async_feed_client_errors()
@@ -0,0 +1,104 @@
+"""
+File:           test_candle_aggregator.py
+Author:         Dibyaranjan Sathua
+Created on:     16/10/21, 8:45 pm
+"""
+import datetime
+from alice_blue_api.candle_aggregator import CandleAggregator, Bar
+from alice_blue_api.enums import CandleTimeFrame
+from alice_blue_api.option_chain import OptionChain
+from alice_blue_api.websocket_streams import CompactMarketData
+from test.helpers.feed import COMPACT_MARKET_DATA_PACKET
+
+# 11/10/21 09:15 IST
+SESSION_START = 1633923900
+
+
+def test_bar_range():
+    """ Bars should be aligned to the session start and clamped to the session end """
+    aggregator = CandleAggregator()
+    assert aggregator.get_bar_range(SESSION_START + 299, 300) == \
+        (SESSION_START, SESSION_START + 300)
+    assert aggregator.get_bar_range(SESSION_START + 1900, 1800) == \
+        (SESSION_START + 1800, SESSION_START + 3600)
+    # 13:15 to 17:15 bar ends at 15:30
+    assert aggregator.get_bar_range(SESSION_START + 14400, 14400) == \
+        (SESSION_START + 14400, SESSION_START + 22500)
+    day_start = SESSION_START - 33300
+    assert aggregator.get_bar_range(SESSION_START, 86400) == (day_start, day_start + 86400)
+
+
+def test_candle_aggregator():
+    """ Ticks should be aggregated into bars and closed by a later tick or the timer """
+    aggregator = CandleAggregator(
+        timeframes=[CandleTimeFrame.ONE_MINUTE, CandleTimeFrame.FIVE_MINUTE], history=3
+    )
+    closed = []
+    five_minute = []
+    aggregator.add_bar_close_callback(closed.append)
+    aggregator.add_bar_close_callback(five_minute.append, CandleTimeFrame.FIVE_MINUTE)
+    ticks = [(0, 100.0, 1000), (10, 105.0, 1010), (50, 95.0, 1030), (65, 101.0, 1100)]
+    for offset, ltp, volume in ticks:
+        aggregator.update_tick(11, ltp, volume, SESSION_START + offset)
+    assert closed == [
+        Bar(11, CandleTimeFrame.ONE_MINUTE, SESSION_START, 100.0, 105.0, 95.0, 95.0, 30)
+    ]
+    current = aggregator.get_current_bar(11, CandleTimeFrame.FIVE_MINUTE)
+    assert current == \
+        Bar(11, CandleTimeFrame.FIVE_MINUTE, SESSION_START, 100.0, 105.0, 95.0, 101.0, 100)
+    # Timer closes both bars at the 5 minute boundary
+    assert aggregator.close_due_bars(SESSION_START + 299) == 1
+    assert aggregator.close_due_bars(SESSION_START + 300) == 1
+    assert five_minute == [current]
+    assert len(closed) == 3
+    # Tick of a closed 5 minute bar is dropped but opens a new 1 minute bar
+    aggregator.update_tick(11, 99.0, 1200, SESSION_START + 299)
+    assert aggregator.late_ticks == 1
+    assert aggregator.get_current_bar(11, CandleTimeFrame.ONE_MINUTE).start == SESSION_START + 240
+    # History is bounded
+    for minute in range(5, 12):
+        aggregator.update_tick(11, 100.0 + minute, 1200 + minute, SESSION_START + minute * 60)
+    bars = aggregator.get_bars(11, CandleTimeFrame.ONE_MINUTE)
+    assert [x.start for x in bars] == [SESSION_START + x * 60 for x in range(8, 11)]
+    start = datetime.datetime.fromtimestamp(SESSION_START + 600)
+    assert aggregator.get_bar(11, CandleTimeFrame.ONE_MINUTE, start).open == 110.0
+    assert aggregator.get_bar(11, CandleTimeFrame.FIVE_MINUTE, start).close == 111.0
+    assert aggregator.get_bars(12, CandleTimeFrame.ONE_MINUTE) == []
+
+
+def test_candle_aggregator_option_chain():
+    """ Aggregator should be fed by the option chain ticks """
+    OptionChain.reset()
+    option_chain = OptionChain.get_instance()
+    aggregator = CandleAggregator(timeframes=[CandleTimeFrame.ONE_MINUTE])
+    option_chain.add_tick_listener(aggregator.update_tick)
+    option_chain.update_from_stream(COMPACT_MARKET_DATA_PACKET)
+    data = CompactMarketData.create(COMPACT_MARKET_DATA_PACKET)
+    bar = aggregator.get_current_bar(data.code, CandleTimeFrame.ONE_MINUTE)
+    assert bar.open == bar.close == data.ltp
+    OptionChain.reset()
+
+
+def test_fill_bars():
+    """ Missed bars are added to the history in order, existing and current bars are kept """
+    aggregator = CandleAggregator(timeframes=[CandleTimeFrame.ONE_MINUTE], history=10)
+    minute = CandleTimeFrame.ONE_MINUTE
+    aggregator.update_tick(101, 100.0, 1000, SESSION_START + 10)
+    # Reconnected after four minutes
+    aggregator.update_tick(101, 110.0, 1500, SESSION_START + 250)
+    backfill = [
+        Bar(101, minute, SESSION_START + 60 * x, 1.0, 2.0, 0.5, 1.5, 10) for x in range(5)
+    ]
+    assert aggregator.fill_bars(backfill) == 3
+    bars = aggregator.get_bars(101, minute)
+    assert [x.start for x in bars] == [SESSION_START + 60 * x for x in range(4)]
+    assert bars[0].open == 100.0 and bars[1].open == 1.0
+    assert aggregator.get_current_bar(101, minute).open == 110.0
+    assert aggregator.fill_bars([Bar(102, minute, SESSION_START, 1.0, 1.0, 1.0, 1.0, 0)]) == 0
+
+
+if __name__ == "__main__":
+    test_bar_range()
+    test_candle_aggregator()
+    test_candle_aggregator_option_chain()
+    test_fill_bars()
@@ -0,0 +1,46 @@
+"""
+File:           test_candle_container.py
+Author:         Dibyaranjan Sathua
+Created on:     18/10/21, 7:20 pm
+"""
+import datetime
+import random
+from candles.container import CandleContainer
+from test.helpers.candles import get_candles, legacy_price_by_time, \
+    legacy_previous_day_high_low
+
+
+def test_candle_container():
+    """ Container lookups should match the list scans they replace """
+    candles = get_candles(days=20, seconds=300)
+    # Position returned by find is of the input order
+    random.seed(7)
+    random.shuffle(candles)
+    container = CandleContainer.from_candles(candles)
+    assert len(container) == len(candles)
+    day = datetime.date(2021, 4, 1)
+    for _ in range(25):
+        for time in [datetime.time(9, 15), datetime.time(9, 35), datetime.time(15, 25)]:
+            pos = container.find(day, time)
+            expected = legacy_price_by_time(candles, day, time)
+            assert (pos is None and expected is None) or candles[pos] is expected
+        previous_day = container.get_previous_trading_day(day)
+        if previous_day is None:
+            assert legacy_previous_day_high_low(candles, day) == (None, None)
+        else:
+            assert container.get_day_high_low(previous_day) == \
+                legacy_previous_day_high_low(candles, day)
+        day += datetime.timedelta(days=1)
+    # 01/04/21 is a Thursday
+    start, end = container.get_day_range(datetime.date(2021, 4, 1))
+    assert end - start == 75
+    assert container.get_day_open(datetime.date(2021, 4, 1)) == \
+        legacy_price_by_time(candles, datetime.date(2021, 4, 1), datetime.time(9, 15)).open
+    assert container.get_day_open(datetime.date(2021, 4, 3)) is None
+    # Nothing within 5 days
+    assert container.get_previous_trading_day(datetime.date(2021, 5, 30)) is None
+    assert CandleContainer.from_candles([]).find(day, datetime.time(9, 15)) is None
+
+
+if __name__ == "__main__":
+    test_candle_container()
@@ -0,0 +1,58 @@
+"""
+File:           test_candle_decoding.py
+Author:         Dibyaranjan Sathua
+Created on:     19/10/21, 7:40 pm
+"""
+import datetime
+from candles.container import CandleContainer, LazyCandles
+from candles.store import parse_timestamps, rows_to_records
+from test.helpers.candles import START, candle_from_record, get_candle_rows, legacy_get_candles
+
+
+def test_parse_timestamps():
+    """ Bulk parsing should match strptime for every utc offset format """
+    values = [
+        "2021-07-23T09:15:00+0530", "2021-07-23T09:16:00+05:30", "2021-07-23T03:47:00Z",
+        "2021-07-23T03:48:00+0000", "2021-07-22T23:49:00-04:00", "2021-07-23T03:50:00"
+    ]
+    expected = [
+        int(datetime.datetime.strptime(x, "%Y-%m-%dT%H:%M:%S%z").timestamp())
+        for x in values[:-1]
+    ]
+    assert parse_timestamps(values).tolist()[:-1] == expected
+    # No offset is UTC
+    assert parse_timestamps(values).tolist()[-1] == 1627012200
+    # Same offset for all rows
+    values = [x[0] for x in get_candle_rows(START, START + 3 * 86400)]
+    assert parse_timestamps(values).tolist() == [
+        int(datetime.datetime.strptime(x, "%Y-%m-%dT%H:%M:%S%z").timestamp()) for x in values
+    ]
+
+
+def test_lazy_candles():
+    """ Candles should be created on access, once, and equal the legacy InstrumentCandles """
+    rows = get_candle_rows(START, START + 3 * 86400)
+    rows[5] = rows[5] + [12000]
+    legacy = legacy_get_candles(rows)
+    created = []
+
+    def factory(record):
+        created.append(record)
+        return candle_from_record(record)
+
+    container = CandleContainer(rows_to_records(rows))
+    candles = LazyCandles(container, factory)
+    assert len(candles) == len(rows)
+    assert not created
+    assert candles[5] == legacy[5] and candles[5].open_interest == 12000
+    assert candles[5] is candles[5]
+    assert len(created) == 1
+    assert candles[-1] == legacy[-1]
+    assert candles[:3] == legacy[:3]
+    assert list(candles) == legacy
+    assert len(created) == len(rows)
+
+
+if __name__ == "__main__":
+    test_parse_timestamps()
+    test_lazy_candles()
@@ -0,0 +1,110 @@
+"""
+File:           test_candle_fetcher.py
+Author:         Dibyaranjan Sathua
+Created on:     20/10/21, 9:00 pm
+"""
+from urllib.parse import urlparse, parse_qs
+import tempfile
+import time
+from alice_blue_api.http_client import HttpClient
+from candles.fetcher import CandleFetcher, CandleJob, RateLimiter
+from candles.store import CandleStore, CandleKey, rows_to_records
+from test.helpers.candles import SlowCandleHandler, candles_equal, get_candle_rows, get_request
+from test.helpers.servers import start_server
+
+# 01/09/21 00:00 IST
+START = 1630434600
+DAY = 86400
+
+
+class FlakyCandleHandler(SlowCandleHandler):
+    """ First request of every token fails with 503. Token 404 is not found """
+    latency = 0.0
+    tokens: list = []
+
+    def do_GET(self):
+        token = parse_qs(urlparse(self.path).query)["token"][0]
+        FlakyCandleHandler.tokens.append(token)
+        if token == "404" or FlakyCandleHandler.tokens.count(token) == 1:
+            self.send_response(404 if token == "404" else 503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        super(FlakyCandleHandler, self).do_GET()
+
+
+def test_candle_fetcher():
+    """ Jobs should be chunked, retried and merged. Store should skip downloaded ranges """
+    FlakyCandleHandler.connections.clear()
+    server = start_server(FlakyCandleHandler)
+    url = f"http://127.0.0.1:{server.server_port}/"
+    jobs = [CandleJob(x, "FIVE_MINUTE", START, START + 10 * DAY) for x in range(101, 107)]
+    fetcher = CandleFetcher(
+        get_request(url), max_workers=4, rate_limit=1000, backoff=0.01,
+        max_range={"FIVE_MINUTE": 4 * DAY}
+    )
+    assert [(x.start, x.end) for x in fetcher.split(jobs[0])] == \
+        [(START, START + 4 * DAY), (START + 4 * DAY, START + 8 * DAY),
+         (START + 8 * DAY, START + 10 * DAY)]
+    expected = rows_to_records(get_candle_rows(START, START + 10 * DAY))
+    with fetcher:
+        results = list(fetcher.fetch(jobs + [CandleJob(404, "FIVE_MINUTE", START, START + DAY)]))
+    assert sorted(x.job.token for x in results) == [101, 102, 103, 104, 105, 106, 404]
+    for result in results:
+        if result.job.token == 404:
+            assert not result.ok and "404" in str(result.error) and result.requests == 1
+            continue
+        assert result.ok and candles_equal(result.records, expected)
+        # 3 chunks and one retry
+        assert result.requests == 4
+    # Connections are reused
+    assert len(FlakyCandleHandler.connections) <= 4
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        store = CandleStore(cache_dir)
+        store._now = START + 100 * DAY
+        FlakyCandleHandler.tokens.clear()
+        fetcher = CandleFetcher(
+            get_request(url), rate_limit=1000, backoff=0.01, store=store,
+            get_key=lambda job: CandleKey("stub", "NFO", job.token, job.timeframe)
+        )
+        with fetcher:
+            assert all(x.ok for x in fetcher.fetch(jobs[:2]))
+            count = len(FlakyCandleHandler.tokens)
+            results = list(fetcher.fetch(jobs[:2]))
+        assert len(FlakyCandleHandler.tokens) == count
+        assert all(candles_equal(x.records, expected) and x.requests == 0 for x in results)
+    server.shutdown()
+
+
+def test_candle_fetcher_http_client():
+    """ Requests go through the given client, which records them and stays open """
+    FlakyCandleHandler.tokens.clear()
+    server = start_server(FlakyCandleHandler)
+    url = f"http://127.0.0.1:{server.server_port}/"
+    http_client = HttpClient(backoff=0.01)
+    jobs = [CandleJob(x, "FIVE_MINUTE", START, START + DAY) for x in range(101, 103)]
+    with CandleFetcher(get_request(url), rate_limit=1000, http_client=http_client) as fetcher:
+        results = list(fetcher.fetch(jobs))
+    assert all(x.ok and x.requests == 2 for x in results)
+    assert http_client.get_latency_stats()[f"GET {url}"]["count"] == 2
+    # Client of the API is not closed with the fetcher
+    params = {"token": 101, "starttime": START, "endtime": START + DAY}
+    assert http_client.request("GET", url, params=params).ok
+    http_client.close()
+    server.shutdown()
+
+
+def test_rate_limiter():
+    """ Requests after the first should be spaced by 1 / rate """
+    limiter = RateLimiter(rate=50)
+    start = time.perf_counter()
+    for _ in range(6):
+        limiter.acquire()
+    assert time.perf_counter() - start >= 0.09
+
+
+if __name__ == "__main__":
+    test_candle_fetcher()
+    test_candle_fetcher_http_client()
+    test_rate_limiter()
@@ -0,0 +1,58 @@
+"""
+File:           test_candle_store.py
+Author:         Dibyaranjan Sathua
+Created on:     17/10/21, 7:30 pm
+"""
+import tempfile
+from candles.store import CandleStore, CandleKey, rows_to_records
+from test.helpers.candles import candles_equal, get_candle_rows
+
+# 01/09/21 00:00 IST
+START = 1630434600
+DAY = 86400
+
+
+def test_candle_store():
+    """ Store should fetch only the missing ranges and serve the rest from disk """
+    key = CandleKey(source="aliceblue", exchange="NFO", token=53179, timeframe="FIVE_MINUTE")
+    fetches = []
+
+    def fetch(start, end):
+        fetches.append((start, end))
+        # API has candles only till now
+        return rows_to_records(get_candle_rows(start, min(end, store._now), seconds=300))
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        store = CandleStore(cache_dir=cache_dir)
+        store._now = START + 90 * DAY
+        expected = rows_to_records(get_candle_rows(START + 20 * DAY, START + 40 * DAY, 300))
+        candles = store.get(key, START + 20 * DAY, START + 40 * DAY, fetch)
+        assert candles_equal(candles, expected)
+        # Range spanning two months is merged from both partitions
+        candles = store.get(key, START + 10 * DAY, START + 50 * DAY, fetch)
+        assert fetches == [
+            (START + 20 * DAY, START + 40 * DAY),
+            (START + 10 * DAY, START + 20 * DAY),
+            (START + 40 * DAY, START + 50 * DAY),
+        ]
+        assert candles_equal(
+            candles, rows_to_records(get_candle_rows(START + 10 * DAY, START + 50 * DAY, 300))
+        )
+        # Warm request is served from disk
+        store.get(key, START + 15 * DAY, START + 45 * DAY, fetch)
+        assert len(fetches) == 3
+        assert store.get_missing_ranges(key, START, START + 60 * DAY) == \
+            [(START, START + 10 * DAY), (START + 50 * DAY, START + 60 * DAY)]
+        # Today's range is fetched again from the last (incomplete) candle
+        store._now = START + 50 * DAY + 36000
+        store.get(key, START + 50 * DAY, START + 51 * DAY, fetch)
+        last_candle = START + 50 * DAY + 35700
+        assert store.get_missing_ranges(key, START + 50 * DAY, START + 51 * DAY) == \
+            [(last_candle, START + 51 * DAY)]
+        # Another key has its own candles
+        other = CandleKey(source="kite", exchange="ALL", token=260105, timeframe="FIVE_MINUTE")
+        assert len(store.read(other, START, START + 60 * DAY)) == 0
+
+
+if __name__ == "__main__":
+    test_candle_store()
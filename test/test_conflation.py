@@ -0,0 +1,62 @@
+"""
+File:           test_conflation.py
+Author:         Dibyaranjan Sathua
+Created on:     28/10/21, 9:15 pm
+"""
+import threading
+import time
+from alice_blue_api.conflation import Conflator
+from alice_blue_api.option_chain import OptionChain
+from test.helpers.feed import compact_packet
+
+
+def get_option_chain():
+    """ Option chain with a conflator listening to its ticks """
+    OptionChain.reset()
+    option_chain = OptionChain.get_instance()
+    conflator = Conflator(option_chain.tick_store)
+    option_chain.add_tick_listener(conflator.update_tick)
+    return option_chain, conflator
+
+
+def test_latest_state_of_changed_instruments():
+    """ Poll returns only the latest tick of each changed instrument of the subscription """
+    option_chain, conflator = get_option_chain()
+    option_chain.update_from_stream(compact_packet(101, 10, 1635235200))
+    subscription = conflator.subscribe([101, 102])
+    for ltp in (11, 12, 13):
+        option_chain.update_from_stream(compact_packet(102, ltp, 1635235200))
+        option_chain.update_from_stream(compact_packet(103, ltp, 1635235200))
+    snapshot = subscription.poll(timeout=0)
+    assert sorted(zip(snapshot.code.tolist(), snapshot.ltp.tolist())) == [(101, 10), (102, 13)]
+    assert subscription.poll(timeout=0) is None
+    option_chain.update_from_stream(compact_packet(101, 14, 1635235201))
+    snapshot = subscription.poll(timeout=0)
+    assert snapshot.code.tolist() == [101] and snapshot.ltp.tolist() == [14]
+    assert subscription.deliveries == 2 and subscription.updates == 3
+    conflator.unsubscribe(subscription)
+    option_chain.update_from_stream(compact_packet(101, 15, 1635235202))
+    assert subscription.poll(timeout=0) is None
+    OptionChain.reset()
+
+
+def test_max_rate():
+    """ Snapshots are not delivered more often than max rate, a waiting poll wakes on a tick """
+    option_chain, conflator = get_option_chain()
+    subscription = conflator.subscribe([101], max_rate=20)
+    timer = threading.Timer(
+        0.02, option_chain.update_from_stream, args=(compact_packet(101, 10, 1635235200),)
+    )
+    timer.start()
+    assert subscription.poll(timeout=1).ltp.tolist() == [10]
+    start = time.monotonic()
+    option_chain.update_from_stream(compact_packet(101, 11, 1635235200))
+    assert subscription.poll(timeout=0.01) is None
+    assert subscription.poll(timeout=1).ltp.tolist() == [11]
+    assert time.monotonic() - start >= 0.04
+    OptionChain.reset()
+
+
+if __name__ == "__main__":
+    test_latest_state_of_changed_instruments()
+    test_max_rate()
@@ -0,0 +1,53 @@
+"""
+File:           test_contract_cache.py
+Author:         Dibyaranjan Sathua
+Created on:     10/10/21, 7:05 pm
+"""
+from pathlib import Path
+import datetime
+import tempfile
+from alice_blue_api.contract_cache import MasterContractCache
+from alice_blue_api.instruments import Instrument
+from test.helpers.instruments import get_bnf_instruments
+
+
+def test_contract_cache():
+    """ Instruments should round trip through the cache for the same trading date only """
+    instruments = get_bnf_instruments()
+    instruments.append(Instrument(
+        trading_symbol="Nifty Bank", symbol="Nifty Bank", lot_size=None, expiry=None,
+        exchange_code=1, exchange="NSE", code=26009, option_type=None, strike=None, index=True
+    ))
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = MasterContractCache(cache_dir=cache_dir)
+        cache._now = datetime.datetime(2021, 10, 11, 9, 15)
+        assert cache.load("NFO", "BANKNIFTY") is None
+        cache.save("NFO", "BANKNIFTY", instruments)
+        assert cache.load("NFO", "BANKNIFTY") == instruments
+        # Still valid before next day's contract refresh
+        cache._now = datetime.datetime(2021, 10, 12, 7, 59)
+        assert cache.load("NFO", "BANKNIFTY") == instruments
+        # Invalid after the refresh
+        cache._now = datetime.datetime(2021, 10, 12, 8, 0)
+        assert cache.load("NFO", "BANKNIFTY") is None
+        cache.save("NFO", "BANKNIFTY", instruments[:10])
+        assert cache.load("NFO", "BANKNIFTY") == instruments[:10]
+        # Previous day's file is removed
+        cache._now = datetime.datetime(2021, 10, 11, 9, 15)
+        assert cache.load("NFO", "BANKNIFTY") is None
+
+
+def test_contract_cache_failed_write():
+    """ Failed write leaves no temporary file behind """
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = MasterContractCache(cache_dir=cache_dir)
+        cache._now = datetime.datetime(2021, 10, 11, 9, 15)
+        # Rename fails as the cache file path is a directory
+        cache.get_path("NFO", "BANKNIFTY", cache.trading_date()).mkdir()
+        cache.save("NFO", "BANKNIFTY", get_bnf_instruments())
+        assert [x.suffix for x in Path(cache_dir).iterdir()] == [".npy"]
+
+
+if __name__ == "__main__":
+    test_contract_cache()
+    test_contract_cache_failed_write()
@@ -0,0 +1,41 @@
+"""
+File:           test_contract_stream.py
+Author:         Dibyaranjan Sathua
+Created on:     12/10/21, 11:10 pm
+"""
+import json
+from alice_blue_api.contract_stream import MasterContractStream
+from alice_blue_api.instruments import Instrument
+from test.helpers.instruments import get_master_contracts_payload
+
+
+def get_chunks(payload: bytes, size: int):
+    """ Split payload in chunks of size bytes """
+    return [payload[x:x + size] for x in range(0, len(payload), size)]
+
+
+def test_contract_stream():
+    """ Streamed contracts should match json.loads of the full payload for any chunk size """
+    payload = get_master_contracts_payload(expiries=2, stocks=2)
+    data = json.loads(payload)
+    data["NSE-IND"] = [{"symbol": "Nifty Bank", "code": "26009", "note": "₹ [1, {2}]"}]
+    data["status"] = 12345
+    payload = json.dumps(data, indent=1, ensure_ascii=False).encode()
+    expected = [
+        x for x in data["NSE-OPT"] + data["NSE-FUT"] if x["symbol"].startswith("BANKNIFTY")
+    ]
+    stream = MasterContractStream(
+        segments={"NSE-OPT", "NSE-FUT"}, predicate=lambda x: x["symbol"].startswith("BANKNIFTY")
+    )
+    for size in [1, 7, 4096, len(payload)]:
+        contracts = [x for _, x in stream.iter_contracts(get_chunks(payload, size))]
+        assert contracts == expected, size
+    indices = list(MasterContractStream(segments={"NSE-IND"}).iter_contracts([payload]))
+    print(indices)
+    assert indices == [("NSE-IND", data["NSE-IND"][0])]
+    instruments = [x for _, x in stream.iter_instruments(get_chunks(payload, 1000))]
+    assert instruments == [Instrument.create(x) for x in expected]
+
+
+if __name__ == "__main__":
+    test_contract_stream()
@@ -0,0 +1,145 @@
+"""
+File:           test_feed_recovery.py
+Author:         Dibyaranjan Sathua
+Created on:     30/10/21, 9:10 pm
+"""
+import time
+from alice_blue_api.enums import FeedAction
+from alice_blue_api.feed_recovery import Backoff, FeedRecovery, Gap
+from alice_blue_api.option_chain import OptionChain
+from alice_blue_api.websocket import AliceBlueWebSocket
+from test.helpers.feed import StubFeedServer, compact_packet
+
+
+class FastReconnectWebSocket(AliceBlueWebSocket):
+    """ Web socket reconnecting quickly and reporting the gaps of every outage """
+    RECONNECT_INITIAL_DELAY: float = 0.05
+    PING_INTERVAL: float = 1.0
+    PING_TIMEOUT: float = 0.5
+    MIN_GAP_SECONDS: float = 0
+
+
+class FailFirstWebSocket(FastReconnectWebSocket):
+    """ Web socket whose first connect attempt goes to a closed port """
+
+    def __init__(self, url):
+        super(FailFirstWebSocket, self).__init__(url="ws://127.0.0.1:1")
+        self._next_url = url
+
+    def connect(self):
+        super(FailFirstWebSocket, self).connect()
+        self._url = self._next_url
+
+
+def wait_for(condition, timeout=5.0):
+    """ Wait till condition() is true """
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "Timed out"
+        time.sleep(0.01)
+
+
+def test_backoff():
+    """ Delays double till the maximum, with jitter, and start again after reset """
+    backoff = Backoff(initial=1, maximum=8, jitter=0.5)
+    delays = [backoff.next_delay() for _ in range(6)]
+    for delay, expected in zip(delays, [1, 2, 4, 8, 8, 8]):
+        assert expected / 2 <= delay <= expected
+    assert backoff.attempts == 6
+    backoff.reset()
+    assert backoff.next_delay() <= 1
+
+
+def test_gap_detection():
+    """
+    After an outage of min_gap_seconds, first tick of an instrument after the reconnect closes
+    a gap from the disconnect. A shorter outage has no gaps, even for an illiquid instrument
+    """
+    recovery = FeedRecovery(min_gap_seconds=0.05)
+    gaps = []
+    recovery.add_gap_callback(gaps.append)
+    recovery.on_connect()
+    recovery.update_tick(101, 10.0, 0, 1635235200)
+    # Illiquid instrument, last traded long before the disconnect
+    recovery.update_tick(102, 20.0, 0, 1635231600)
+    recovery.on_disconnect()
+    recovery.on_connect()
+    recovery.update_tick(101, 11.0, 0, 1635235201)
+    recovery.update_tick(102, 21.0, 0, 1635235202)
+    assert gaps == [] and not recovery.recovering
+    recovery.on_disconnect()
+    # Failed attempts of the same outage are not counted
+    recovery.on_disconnect()
+    assert recovery.recovering
+    time.sleep(0.06)
+    recovery.on_connect()
+    recovery.update_tick(101, 12.0, 0, 1635235230)
+    assert not recovery.recovering
+    recovery.update_tick(102, 22.0, 0, 1635235380)
+    recovery.update_tick(102, 23.0, 0, 1635235500)
+    assert gaps == [Gap(101, 1635235202, 1635235230), Gap(102, 1635235202, 1635235380)]
+    stats = recovery.get_stats()
+    assert stats["disconnects"] == 2 and stats["reconnects"] == 2 and stats["gaps"] == 2
+    assert stats["time_to_reconnect"]["count"] == 2 and stats["time_to_recover"]["count"] == 2
+
+
+def test_reconnect():
+    """ Dropped connection is opened again, subscriptions are sent again and the gap found """
+    server = StubFeedServer(subscribed_only=True).start()
+    OptionChain.reset()
+    web_socket = FastReconnectWebSocket(url=server.url)
+    subscription = {"a": FeedAction.SUBSCRIBE.value, "v": [[2, 101]], "m": "compact_marketdata"}
+    web_socket.add_reconnect_callback(lambda: web_socket.send(subscription))
+    gaps = []
+    web_socket.recovery.add_gap_callback(gaps.append)
+    web_socket.start(thread=True)
+    web_socket.wait_until_connection_open()
+    web_socket.send(subscription)
+    wait_for(lambda: len(server.messages) == 1)
+    server.send_packets([compact_packet(101, 10, 1635235200)])
+    wait_for(lambda: web_socket.get_queue_stats()["pushed"] == 1)
+    server.drop_connections()
+    wait_for(lambda: server.messages == [subscription, subscription])
+    server.send_packets([compact_packet(101, 11, 1635235260)])
+    wait_for(lambda: gaps == [Gap(101, 1635235200, 1635235260)])
+    stats = web_socket.get_recovery_stats()
+    assert stats["reconnects"] == 1 and not stats["recovering"]
+    assert stats["time_to_recover"]["count"] == 1
+    web_socket.close()
+    assert server.connections == 2
+    server.stop()
+    OptionChain.reset()
+
+
+def test_failed_first_connect():
+    """ Failed first connect attempt is not an outage, so the next real drop finds the gap """
+    server = StubFeedServer(subscribed_only=True).start()
+    OptionChain.reset()
+    web_socket = FailFirstWebSocket(url=server.url)
+    subscription = {"a": FeedAction.SUBSCRIBE.value, "v": [[2, 101]], "m": "compact_marketdata"}
+    web_socket.add_reconnect_callback(lambda: web_socket.send(subscription))
+    gaps = []
+    web_socket.recovery.add_gap_callback(gaps.append)
+    web_socket.start(thread=True)
+    web_socket.wait_until_connection_open()
+    assert not web_socket.recovery.recovering
+    web_socket.send(subscription)
+    wait_for(lambda: len(server.messages) == 1)
+    server.send_packets([compact_packet(101, 10, 1635235200)])
+    wait_for(lambda: web_socket.get_queue_stats()["pushed"] == 1)
+    server.drop_connections()
+    wait_for(lambda: server.messages == [subscription, subscription])
+    server.send_packets([compact_packet(101, 11, 1635235260)])
+    wait_for(lambda: gaps == [Gap(101, 1635235200, 1635235260)])
+    stats = web_socket.get_recovery_stats()
+    assert stats["disconnects"] == 1 and stats["reconnects"] == 1
+    web_socket.close()
+    server.stop()
+    OptionChain.reset()
+
+
+if __name__ == "__main__":
+    test_backoff()
+    test_gap_detection()
+    test_reconnect()
+    test_failed_first_connect()
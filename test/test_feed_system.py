@@ -0,0 +1,186 @@
+"""
+File:           test_feed_system.py
+Author:         Dibyaranjan Sathua
+Created on:     31/10/21, 6:20 pm
+"""
+import time
+from alice_blue_api.enums import CandleTimeFrame, FeedAction
+from alice_blue_api.exceptions import AliceBlueApiError
+from alice_blue_api.feed_recovery import Gap
+from alice_blue_api.feed_system import FeedSystem
+from alice_blue_api.instruments import Instrument
+from alice_blue_api.option_chain import OptionChain
+from alice_blue_api.websocket import AliceBlueWebSocket
+from candles.fetcher import CandleFetcher
+from test.helpers.candles import StubCandleHandler, get_request
+from test.helpers.feed import StubFeedServer, compact_packet
+from test.helpers.servers import start_server
+
+# 09:15 IST on 26/10/21
+TIMESTAMP = 1635219900
+
+
+class NoApi:
+    """ API handler of a feed system which is never started """
+
+
+class FastReconnectWebSocket(AliceBlueWebSocket):
+    """ Web socket reconnecting quickly """
+    RECONNECT_INITIAL_DELAY: float = 0.05
+    PING_INTERVAL: float = 1.0
+    PING_TIMEOUT: float = 0.5
+
+
+class StubCandleFeedSystem(FeedSystem):
+    """ Feed system backfilling from a stub candle API, with the fetched jobs recorded """
+    BACKFILL_DELAY_SECONDS: float = 0.05
+    candle_url: str = ""
+
+    def _fetch_candles(self, exchange, jobs):
+        self.fetched = getattr(self, "fetched", []) + [(exchange, jobs)]
+        with CandleFetcher(get_request(self.candle_url)) as fetcher:
+            yield from fetcher.fetch(jobs)
+
+
+def get_feed_system(url: str = "ws://127.0.0.1:1", feed_system_class=FeedSystem) -> FeedSystem:
+    """ Feed system with a web socket to url and no API handler """
+    FeedSystem.reset()
+    OptionChain.reset()
+    return feed_system_class(api_handler=NoApi(), web_socket=AliceBlueWebSocket(url=url))
+
+
+def get_instrument(code, exchange="NFO", index=False):
+    """ Dummy instrument with the given code """
+    return Instrument(
+        trading_symbol="", symbol="", lot_size=None, expiry=None, exchange_code=2,
+        exchange=exchange, code=code, option_type=None, strike=None, index=index
+    )
+
+
+def test_enable_candles():
+    """ Bars are built only after candles are enabled, and only of the given timeframes """
+    feed_system = get_feed_system()
+    option_chain = feed_system.option_chain
+    timestamp = TIMESTAMP
+    option_chain.update_from_stream(compact_packet(101, 100, timestamp))
+    assert feed_system.candle_aggregator is None
+    candle_aggregator = feed_system.enable_candles([CandleTimeFrame.FIVE_MINUTE])
+    try:
+        assert feed_system.candle_aggregator is candle_aggregator
+        assert candle_aggregator.timeframes == (CandleTimeFrame.FIVE_MINUTE, )
+        option_chain.update_from_stream(compact_packet(101, 105, timestamp + 10))
+        bar = candle_aggregator.get_current_bar(101, CandleTimeFrame.FIVE_MINUTE)
+        assert bar.open == 105 and bar.start == timestamp
+        assert candle_aggregator.get_current_bar(101, CandleTimeFrame.ONE_MINUTE) is None
+        try:
+            feed_system.enable_candles([CandleTimeFrame.ONE_MINUTE])
+            assert False, "Candles enabled twice"
+        except AliceBlueApiError:
+            pass
+    finally:
+        candle_aggregator.stop()
+        FeedSystem.reset()
+        OptionChain.reset()
+
+
+def test_close():
+    """ Closed feed system and web socket get no more ticks from the option chain """
+    FeedSystem.reset()
+    OptionChain.reset()
+    web_socket = AliceBlueWebSocket(url="ws://127.0.0.1:1")
+    feed_system = FeedSystem(api_handler=NoApi(), web_socket=web_socket)
+    option_chain = feed_system.option_chain
+    recovery = web_socket.recovery
+    ticks = []
+    feed_system.add_tick_callback(lambda *tick: ticks.append(tick[1]), [get_instrument(101)])
+    candle_aggregator = feed_system.enable_candles([CandleTimeFrame.ONE_MINUTE])
+    option_chain.update_from_stream(compact_packet(101, 100, TIMESTAMP))
+    feed_system.close()
+    feed_system.close()
+    recovery.on_disconnect()
+    recovery.on_connect()
+    option_chain.update_from_stream(compact_packet(101, 105, TIMESTAMP + 10))
+    assert ticks == [100]
+    assert candle_aggregator.get_current_bar(101, CandleTimeFrame.ONE_MINUTE).close == 100
+    # Recovery did not see the tick after the reconnect
+    assert recovery.recovering
+    FeedSystem.reset()
+    OptionChain.reset()
+
+
+def wait_for(condition, timeout=5.0):
+    """ Wait till condition() is true """
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "Timed out"
+        time.sleep(0.01)
+
+
+def test_resubscribe():
+    """ Subscribed instruments, not the unsubscribed ones, are sent again in batches """
+    server = StubFeedServer().start()
+    FeedSystem.reset()
+    OptionChain.reset()
+    web_socket = FastReconnectWebSocket(url=server.url)
+    feed_system = FeedSystem(api_handler=NoApi(), web_socket=web_socket)
+    feed_system.RESUBSCRIBE_BATCH_SIZE = 2
+    try:
+        web_socket.start(thread=True)
+        web_socket.wait_until_connection_open()
+        instruments = [get_instrument(x) for x in (101, 102, 103, 104)]
+        feed_system.subscribe(instruments)
+        feed_system.unsubscribe(instruments[1:2])
+        wait_for(lambda: len(server.messages) == 2)
+        server.drop_connections()
+        wait_for(lambda: len(server.messages) == 4)
+        resubscribed = server.messages[2:]
+        assert all(x["a"] == FeedAction.SUBSCRIBE.value for x in resubscribed)
+        assert [len(x["v"]) for x in resubscribed] == [2, 1]
+        assert sorted(y[1] for x in resubscribed for y in x["v"]) == [101, 103, 104]
+    finally:
+        web_socket.close()
+        server.stop()
+        FeedSystem.reset()
+        OptionChain.reset()
+
+
+def test_backfill():
+    """ Gaps found together are backfilled in one batch, one fetch per candle exchange """
+    server = start_server(StubCandleHandler)
+    feed_system = get_feed_system(feed_system_class=StubCandleFeedSystem)
+    feed_system.candle_url = f"http://127.0.0.1:{server.server_port}/"
+    option_chain = feed_system.option_chain
+    instruments = [get_instrument(101), get_instrument(102), get_instrument(26009, "NSE", True)]
+    feed_system.subscribe(instruments)
+    candle_aggregator = feed_system.enable_candles([CandleTimeFrame.ONE_MINUTE])
+    try:
+        for instrument in instruments:
+            option_chain.update_from_stream(compact_packet(instrument.code, 100, TIMESTAMP))
+        # First ticks after a ten minute outage
+        for instrument in instruments:
+            option_chain.update_from_stream(compact_packet(instrument.code, 101, TIMESTAMP + 600))
+            feed_system._on_gap(Gap(instrument.code, TIMESTAMP, TIMESTAMP + 600))
+        end = time.monotonic() + 5
+        while feed_system._backfilling:
+            assert time.monotonic() < end, "Backfill timed out"
+            time.sleep(0.01)
+        assert sorted((x, [y.token for y in jobs]) for x, jobs in feed_system.fetched) == [
+            ("NFO", [101, 102]), ("NSE_INDICES", [26009])
+        ]
+        for instrument in instruments:
+            bars = candle_aggregator.get_bars(instrument.code, CandleTimeFrame.ONE_MINUTE)
+            assert [x.start for x in bars] == list(range(TIMESTAMP, TIMESTAMP + 600, 60))
+        # Bars already in the history are not added again
+        assert feed_system._backfill([Gap(101, TIMESTAMP, TIMESTAMP + 600)]) == 0
+    finally:
+        candle_aggregator.stop()
+        server.shutdown()
+        FeedSystem.reset()
+        OptionChain.reset()
+
+
+if __name__ == "__main__":
+    test_enable_candles()
+    test_close()
+    test_resubscribe()
+    test_backfill()
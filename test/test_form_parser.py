@@ -0,0 +1,67 @@
+"""
+File:           test_form_parser.py
+Author:         Dibyaranjan Sathua
+Created on:     24/10/21, 8:45 pm
+"""
+from alice_blue_api.exceptions import AliceBlueApiError
+from alice_blue_api.form_parser import FormFieldExtractor, parse_form_fields
+from alice_blue_api.http_client import HttpClient
+from test.helpers.login import (
+    CONSENT_PAGE, LOGIN_PAGE, TWOFA_PAGE, OAuthHandler, extract_fields, login
+)
+from test.helpers.servers import start_server
+
+
+def test_parse_form_fields():
+    """ Inputs in comments and scripts are skipped and entities are unescaped """
+    fields = parse_form_fields(LOGIN_PAGE, ["_csrf_token", "login_challenge"])
+    assert fields.get("_csrf_token") == "Q2hhbGxlbmdl+T2tlbg=="
+    assert fields.get_all("login_challenge") == ["6f2c1a9e8b7d4c3a"]
+    assert parse_form_fields(TWOFA_PAGE).get_all("question_id1") == ["12", "31"]
+    fields = parse_form_fields(
+        "<INPUT Name=consent value='Auth>orize' disabled><input name=\"empty\"/>"
+    )
+    assert fields.fields == {"consent": ["Auth>orize"], "empty": [""]}
+    # Input with an unbalanced quote is skipped, not the rest of the page
+    page = "<input name=q value=don't><input name=\"_csrf_token\" value=\"T\">"
+    assert parse_form_fields(page).fields == {"_csrf_token": ["T"]}
+    extractor = FormFieldExtractor()
+    for pos in range(0, len(page), 5):
+        extractor.feed(page[pos:pos + 5])
+    extractor.close()
+    assert extractor.fields == {"_csrf_token": ["T"]}
+    try:
+        parse_form_fields(CONSENT_PAGE, ["_csrf_token"]).get("login_challenge")
+        assert False, "Missing field should raise"
+    except AliceBlueApiError:
+        pass
+
+
+def test_chunked_feed():
+    """ Splitting the page at any size gives the same fields """
+    expected = parse_form_fields(TWOFA_PAGE).fields
+    for size in [1, 3, 7, 64, 1000]:
+        extractor = FormFieldExtractor()
+        for pos in range(0, len(TWOFA_PAGE), size):
+            extractor.feed(TWOFA_PAGE[pos:pos + size])
+        extractor.close()
+        assert extractor.fields == expected, size
+
+
+def test_login_flow():
+    """ Login flow posts the fields of every page """
+    server = start_server(OAuthHandler)
+    client = HttpClient()
+    code = login(client, f"http://127.0.0.1:{server.server_port}", extract_fields)
+    assert code == "Y29kZQ"
+    assert OAuthHandler.forms["/oauth2/login"]["login_challenge"] == ["6f2c1a9e8b7d4c3a"]
+    assert OAuthHandler.forms["/oauth2/twofa"]["question_id1"] == ["12", "31"]
+    assert OAuthHandler.forms["/oauth2/consent"]["_csrf_token"] == ["Q29uc2VudA=="]
+    client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    test_parse_form_fields()
+    test_chunked_feed()
+    test_login_flow()
@@ -0,0 +1,54 @@
+"""
+File:           test_http_client.py
+Author:         Dibyaranjan Sathua
+Created on:     21/10/21, 8:30 pm
+"""
+from alice_blue_api.http_client import HttpClient, LatencyHistogram
+from test.helpers.servers import StubApiHandler, start_server
+
+
+def test_latency_histogram():
+    """ Percentile is the upper bound of its bucket, capped at the max """
+    histogram = LatencyHistogram()
+    assert histogram.percentile(50) is None and histogram.mean is None
+    for milliseconds in [0.5, 1.5, 1.8, 3, 7, 40, 40, 45, 180, 12000]:
+        histogram.add(milliseconds)
+    assert histogram.count == 10
+    assert histogram.percentile(30) == 2
+    assert histogram.percentile(50) == 10
+    assert histogram.percentile(80) == 50
+    assert histogram.percentile(100) == 12000
+    assert histogram.to_dict()["buckets"] == {
+        "1": 1, "2": 2, "5": 1, "10": 1, "50": 3, "200": 1, "inf": 1
+    }
+
+
+def test_http_client():
+    """ Connections should be reused and only idempotent requests retried """
+    server = start_server(StubApiHandler)
+    url = f"http://127.0.0.1:{server.server_port}"
+    client = HttpClient(pool_size=2, max_retries=2, backoff=0)
+    StubApiHandler.connections.clear()
+    for _ in range(5):
+        response = client.request("GET", f"{url}/api/v1/positions?client_id=AB123")
+        assert response.json()["status"] == "success"
+    assert len(StubApiHandler.connections) == 1
+    # GET is retried on 503
+    response = client.request("GET", f"{url}/fail/2", endpoint="/fail")
+    assert response.ok and StubApiHandler.calls["/fail/2"] == 3
+    # POST is not
+    response = client.request("POST", f"{url}/fail/1", endpoint="/fail", data="{}")
+    assert response.status_code == 503 and StubApiHandler.calls["/fail/1"] == 1
+    stats = client.get_latency_stats()
+    # Endpoint defaults to the url without the query string
+    assert sorted(stats) == ["GET /fail", f"GET {url}/api/v1/positions", "POST /fail"]
+    assert stats[f"GET {url}/api/v1/positions"]["count"] == 5
+    # Retries are part of one call
+    assert stats["GET /fail"]["count"] == 1
+    client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    test_latency_histogram()
+    test_http_client()
@@ -0,0 +1,38 @@
+"""
+File:           test_instrument_index.py
+Author:         Dibyaranjan Sathua
+Created on:     09/10/21, 7:45 pm
+"""
+from alice_blue_api.enums import OptionType
+from alice_blue_api.instrument_index import InstrumentIndex
+from test.helpers.instruments import EXPIRIES, get_bnf_instruments
+
+
+def test_instrument_index():
+    """ Lookup and range queries on instrument index """
+    instruments = get_bnf_instruments()
+    index = InstrumentIndex(instruments)
+    expiry = EXPIRIES[1]
+    instrument = index.get_option("BANKNIFTY", expiry, 37500, OptionType.PE)
+    print(instrument)
+    assert instrument == next(
+        x for x in instruments
+        if x.option_type == OptionType.PE and x.strike == 37500 and x.expiry == expiry
+    )
+    assert index.get_by_code(instrument.code) is instrument
+    assert index.get_option("BANKNIFTY", expiry, 37550, OptionType.PE) is None
+    assert index.get_future("BANKNIFTY", expiry).symbol == "BANKNIFTY OCT FUT"
+    assert index.get_expiries("BANKNIFTY") == EXPIRIES
+    options = index.get_options_around_atm("BANKNIFTY", expiry, 37530, 2, OptionType.CE)
+    assert [x.strike for x in options] == [37300, 37400, 37500, 37600, 37700]
+    options = index.get_options_in_range("BANKNIFTY", expiry, 39850, 45000)
+    assert [(x.strike, x.option_type) for x in options] == [
+        (39900, OptionType.CE), (39900, OptionType.PE),
+        (40000, OptionType.CE), (40000, OptionType.PE)
+    ]
+    options = index.get_options_around_atm("BANKNIFTY", expiry, 35000, 1, OptionType.CE)
+    assert [x.strike for x in options] == [35000, 35100]
+
+
+if __name__ == "__main__":
+    test_instrument_index()
@@ -0,0 +1,62 @@
+"""
+File:           test_instruments.py
+Author:         Dibyaranjan Sathua
+Created on:     13/10/21, 8:10 pm
+"""
+import datetime
+from alice_blue_api.enums import OptionType
+from alice_blue_api.instruments import Instrument, InstrumentTable
+from test.helpers.instruments import LegacyInstrument, get_master_contracts_payload
+from test.helpers.instruments import get_bnf_instruments
+import json
+
+
+def test_instrument_create():
+    """ Instrument.create should match the dataclass implementation """
+    contracts = json.loads(get_master_contracts_payload(expiries=2, stocks=2))["NSE-OPT"]
+    contracts.append({
+        "trading_symbol": "BANKNIFTY21OCTFUT", "symbol": "BANKNIFTY OCT FUT", "lotSize": "25",
+        "expiry": 1635416999, "exchange_code": 2, "exchange": "NFO", "code": "35001"
+    })
+    contracts.append({
+        "trading_symbol": "Nifty Bank", "symbol": "Nifty Bank", "exchange_code": 1,
+        "exchange": "NSE", "code": "26009", "index": True
+    })
+    for contract in contracts:
+        instrument = Instrument.create(contract)
+        legacy = LegacyInstrument.create(contract)
+        for field in LegacyInstrument.__dataclass_fields__:
+            assert getattr(instrument, field) == getattr(legacy, field), field
+    future = Instrument.create(contracts[-2])
+    assert future.option_type == OptionType.FUT and future.strike is None
+    assert future.expiry == datetime.date(2021, 10, 28)
+    # Repeated strings and expiry dates are shared
+    first, second = Instrument.create(contracts[0]), Instrument.create(contracts[0])
+    assert first.symbol is second.symbol and first.expiry is second.expiry
+    print(future)
+
+
+def test_instrument_table():
+    """ Instruments should round trip through the table and its numpy export """
+    instruments = get_bnf_instruments()
+    instruments.append(Instrument(
+        trading_symbol="Nifty Bank", symbol="Nifty Bank", lot_size=None, expiry=None,
+        exchange_code=1, exchange="NSE", code=26009, option_type=None, strike=None, index=True
+    ))
+    table = InstrumentTable.from_instruments(instruments)
+    assert len(table) == len(instruments)
+    assert table[0] == instruments[0]
+    assert list(table) == instruments
+    records = table.to_numpy()
+    assert records["strike"][-1] == -1 and records["expiry"][-1] == 0
+    assert records["option_type"][0] == OptionType.CE.value
+    assert InstrumentTable.from_numpy(records).to_instruments() == instruments
+    assert len(InstrumentTable().to_numpy()) == 0
+    contracts = json.loads(get_master_contracts_payload(expiries=1, stocks=1))["NSE-OPT"]
+    assert InstrumentTable.from_contracts(contracts).to_instruments() == \
+        [Instrument.create(x) for x in contracts]
+
+
+if __name__ == "__main__":
+    test_instrument_create()
+    test_instrument_table()
@@ -0,0 +1,70 @@
+"""
+File:           test_option_chain.py
+Author:         Dibyaranjan Sathua
+Created on:     07/10/21, 11:40 pm
+"""
+import threading
+from alice_blue_api.option_chain import OptionChain
+from alice_blue_api.instruments import Instrument
+from alice_blue_api.tick_store import TickStore
+from alice_blue_api.websocket_streams import CompactMarketData, MarketData
+from test.helpers.feed import COMPACT_MARKET_DATA_PACKET, MARKET_DATA_PACKET
+
+
+def get_instrument(code):
+    """ Dummy instrument with the given code """
+    return Instrument(
+        trading_symbol="", symbol="", lot_size=None, expiry=None, exchange_code=2,
+        exchange="NFO", code=code, option_type=None, strike=None, index=False
+    )
+
+
+def test_option_chain_update_from_stream():
+    """ Compact market data stream should be readable back as CompactMarketData """
+    OptionChain.reset()
+    option_chain = OptionChain.get_instance()
+    option_chain.update_from_stream(COMPACT_MARKET_DATA_PACKET)
+    expected = CompactMarketData.create(COMPACT_MARKET_DATA_PACKET)
+    data = option_chain.get_market_data_by_instrument(get_instrument(expected.code))
+    print(data)
+    assert data == expected
+    option_chain.update_from_stream(MARKET_DATA_PACKET)
+    market_data = option_chain.get_market_data_by_instrument(get_instrument(52243))
+    assert isinstance(market_data, MarketData)
+    assert market_data.best_bid_price == MarketData.create(MARKET_DATA_PACKET).best_bid_price
+    snapshot = option_chain.get_snapshot()
+    print(snapshot)
+    assert list(snapshot.code) == [expected.code, 52243]
+    OptionChain.reset()
+
+
+def test_tick_store_snapshot_consistency():
+    """ Readers should never see a half written row while writer is running """
+    store = TickStore(capacity=4)
+    codes = list(range(100, 164))
+    stop = threading.Event()
+
+    def writer():
+        tick = 0
+        while not stop.is_set():
+            tick += 1
+            for code in codes:
+                store.write(code, 2, float(tick), tick, tick, tick)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(2000):
+            snapshot = store.snapshot(codes)
+            assert (snapshot.ltp == snapshot.volume).all()
+            assert (snapshot.volume == snapshot.timestamp).all()
+            assert (snapshot.seq % 2 == 0).all()
+    finally:
+        stop.set()
+        thread.join()
+    assert len(store) == len(codes)
+
+
+if __name__ == "__main__":
+    test_option_chain_update_from_stream()
+    test_tick_store_snapshot_consistency()
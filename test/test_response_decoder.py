@@ -0,0 +1,61 @@
+"""
+File:           test_response_decoder.py
+Author:         Dibyaranjan Sathua
+Created on:     22/10/21, 9:10 pm
+"""
+import json
+import requests
+from alice_blue_api.contract_stream import MasterContractStream
+from alice_blue_api.response_decoder import StreamDecoder, TransferStats, iter_body, read_json
+from test.helpers.candles import START, get_candle_rows
+from test.helpers.instruments import get_master_contracts_payload
+from test.helpers.servers import COMPRESS, CompressedHandler, start_server
+
+
+def test_stream_decoder():
+    """ Decompressed pieces should be bounded and join into the body for any chunking """
+    body = get_master_contracts_payload(expiries=2, stocks=20)
+    for encoding, compress in COMPRESS.items():
+        compressed = compress(body)
+        for chunk_size in [97, 4096, len(compressed)]:
+            decoder = StreamDecoder(encoding)
+            pieces = [
+                data for pos in range(0, len(compressed), chunk_size)
+                for data in decoder.decompress(compressed[pos:pos + chunk_size])
+            ]
+            pieces.append(decoder.flush())
+            assert b"".join(pieces) == body
+            if encoding == "identity":
+                continue
+            # Brotli pieces can exceed the limit a little
+            assert max(len(x) for x in pieces) <= 2 * StreamDecoder.MAX_OUTPUT
+
+
+def test_read_json():
+    """ Candle and master contracts responses should decode with byte accounting """
+    candles = {"status": "success", "data": {"candles": get_candle_rows(START, START + 86400 * 3)}}
+    CompressedHandler.bodies["candles"] = json.dumps(candles).encode()
+    CompressedHandler.bodies["contracts"] = get_master_contracts_payload(expiries=2, stocks=20)
+    server = start_server(CompressedHandler)
+    url = f"http://127.0.0.1:{server.server_port}"
+    session = requests.Session()
+    for encoding, compress in COMPRESS.items():
+        with session.get(f"{url}/candles/{encoding}", stream=True) as response:
+            stats = TransferStats.create(response, "candles")
+            assert read_json(response, stats) == candles
+        assert stats.encoding == encoding
+        assert stats.compressed_bytes == len(compress(CompressedHandler.bodies["candles"]))
+        assert stats.decoded_bytes == len(CompressedHandler.bodies["candles"])
+        assert 0 < stats.headers_time <= stats.total_time
+        # Master contracts are parsed while the body is decompressed
+        with session.get(f"{url}/contracts/{encoding}", stream=True) as response:
+            stream = MasterContractStream(segments={"NSE-FUT"})
+            contracts = list(stream.iter_contracts(iter_body(response, chunk_size=1024)))
+        expected = json.loads(CompressedHandler.bodies["contracts"])["NSE-FUT"]
+        assert [x for _, x in contracts] == expected
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    test_stream_decoder()
+    test_read_json()
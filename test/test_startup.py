@@ -0,0 +1,22 @@
+"""
+File:           test_startup.py
+Author:         Dibyaranjan Sathua
+Created on:     25/10/21, 7:30 pm
+"""
+import os
+from test.helpers.startup import STARTUP_BUDGET_MS, measure_startup
+
+
+def test_startup_budget():
+    """
+    Importing FeedSystem and decoding a packet loads no heavy modules and is within the budget.
+    STARTUP_BUDGET_MS environment variable overrides the budget.
+    """
+    stats = measure_startup(runs=3)
+    assert not stats["heavy_modules"], stats["heavy_modules"]
+    budget = float(os.environ.get("STARTUP_BUDGET_MS", STARTUP_BUDGET_MS))
+    assert stats["median_ms"] < budget, stats
+
+
+if __name__ == "__main__":
+    test_startup_budget()
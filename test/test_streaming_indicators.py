@@ -0,0 +1,111 @@
+"""
+File:           test_streaming_indicators.py
+Author:         Dibyaranjan Sathua
+Created on:     14/10/21, 10:30 pm
+"""
+import random
+from alice_blue_api.option_chain import OptionChain
+from indicators.streaming import StreamingSMA, StreamingRSI, StreamingVWAP, IndicatorEngine
+from indicators.trend import VWAPIndicator
+from test.helpers.feed import COMPACT_MARKET_DATA_PACKET
+
+
+def get_closes(count: int = 500):
+    """ Random walk of close price """
+    random.seed(7)
+    closes = [36000.0]
+    for _ in range(count - 1):
+        closes.append(round(closes[-1] + random.choice([-1, 1]) * random.random() * 20, 2))
+    return closes
+
+
+def test_streaming_sma():
+    """ SMA should match the average of the window """
+    closes = get_closes()
+    sma = StreamingSMA(period=20)
+    for pos, close in enumerate(closes):
+        value = sma.update_value(close)
+        if pos < 19:
+            assert value is None
+        else:
+            assert abs(value - sum(closes[pos - 19:pos + 1]) / 20) < 1e-6
+
+
+def test_streaming_rsi():
+    """ RSI should match Wilder smoothing computed over the full series """
+    closes = get_closes()
+    period = 14
+    rsi = StreamingRSI(period=period)
+    values = [rsi.update_value(x) for x in closes]
+    changes = [closes[x] - closes[x - 1] for x in range(1, len(closes))]
+    avg_gain = sum(max(x, 0) for x in changes[:period]) / period
+    avg_loss = sum(max(-x, 0) for x in changes[:period]) / period
+    assert values[period - 1] is None
+    assert abs(values[period] - (100 - 100 / (1 + avg_gain / avg_loss))) < 1e-9
+    for pos in range(period, len(changes)):
+        avg_gain = (avg_gain * (period - 1) + max(changes[pos], 0)) / period
+        avg_loss = (avg_loss * (period - 1) + max(-changes[pos], 0)) / period
+        assert abs(values[pos + 1] - (100 - 100 / (1 + avg_gain / avg_loss))) < 1e-9
+    # Flat prices have no loss
+    rsi.reset()
+    for _ in range(period + 1):
+        rsi.update_value(100)
+    assert rsi.value == 100
+
+
+def test_streaming_vwap():
+    """ VWAP should match chained VWAPIndicator and reset on a new day """
+    vwap = StreamingVWAP()
+    # 09:15 IST on 11/10/21
+    timestamp = 1633923900
+    sum_pv = sum_v = 0
+    for pos, close in enumerate(get_closes(75)):
+        volume = 1000 + pos
+        value = vwap.update(close + 5, close - 5, close, volume, timestamp + pos * 300)
+        expected, sum_pv, sum_v = VWAPIndicator(
+            close + 5, close - 5, close, volume, prev_sum_pv=sum_pv, prev_sum_v=sum_v
+        ).calc()
+        assert round(value, 2) == expected
+    # Next day
+    assert vwap.update(110, 90, 100, 10, timestamp + 86400) == 100
+
+
+def test_indicator_engine():
+    """ Engine should be fed by the option chain ticks """
+    engine = IndicatorEngine()
+    engine.register(101, "sma", StreamingSMA(period=2))
+    engine.register(101, "vwap", StreamingVWAP())
+    engine.update_tick(101, 100.0, 10, 1633923900)
+    engine.update_tick(101, 110.0, 30, 1633923901)
+    engine.update_tick(101, 120.0, 40, 1633923902)
+    engine.update_tick(102, 110.0, 30, 1633923901)
+    assert engine.get_values(101) == {"sma": 115.0, "vwap": (110.0 * 20 + 120.0 * 10) / 30}
+    assert 102 not in engine
+    OptionChain.reset()
+    option_chain = OptionChain.get_instance()
+    option_chain.add_tick_listener(engine.update_tick)
+    code = COMPACT_MARKET_DATA_PACKET[2:6]
+    engine.register(int.from_bytes(code, "big"), "sma", StreamingSMA(period=1))
+    option_chain.update_from_stream(COMPACT_MARKET_DATA_PACKET)
+    assert engine.get(int.from_bytes(code, "big"), "sma") is not None
+    OptionChain.reset()
+
+
+def test_indicator_engine_mid_session():
+    """ Volume traded before the first tick of an engine started mid session is not counted """
+    engine = IndicatorEngine()
+    engine.register(101, "vwap", StreamingVWAP())
+    # 13:00 IST with 5 lakh traded since the open
+    engine.update_tick(101, 100.0, 500000, 1633937400)
+    assert engine.get(101, "vwap") is None
+    engine.update_tick(101, 110.0, 500100, 1633937401)
+    engine.update_tick(101, 120.0, 500400, 1633937402)
+    assert engine.get(101, "vwap") == (110.0 * 100 + 120.0 * 300) / 400
+
+
+if __name__ == "__main__":
+    test_streaming_sma()
+    test_streaming_rsi()
+    test_streaming_vwap()
+    test_indicator_engine()
+    test_indicator_engine_mid_session()
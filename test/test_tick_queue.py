@@ -0,0 +1,74 @@
+"""
+File:           test_tick_queue.py
+Author:         Dibyaranjan Sathua
+Created on:     27/10/21, 9:30 pm
+"""
+import struct
+import threading
+from alice_blue_api.enums import OverflowPolicy
+from alice_blue_api.tick_queue import FrameQueue, TickPipeline
+from test.helpers.feed import compact_packet
+
+
+def test_drop_oldest():
+    """ Full queue drops the oldest frames """
+    queue = FrameQueue(capacity=3, policy=OverflowPolicy.DROP_OLDEST)
+    frames = [compact_packet(code, 100, 1635235200) for code in range(5)]
+    for frame in frames:
+        queue.push(frame)
+    assert queue.depth == 3 and queue.dropped == 2 and queue.max_depth == 3
+    assert [x[0] for x in queue.pop_many(10)] == frames[2:]
+    assert queue.depth == 0
+
+
+def test_coalesce():
+    """ Full queue replaces the queued frame of the instrument, else drops the oldest """
+    queue = FrameQueue(capacity=3, policy=OverflowPolicy.COALESCE)
+    a1, a2, b1, c1, d1 = [
+        compact_packet(code, ltp, 1635235200)
+        for code, ltp in [(1, 100), (1, 101), (2, 200), (3, 300), (4, 400)]
+    ]
+    # Not coalesced below capacity
+    queue.push(a1)
+    queue.push(a2)
+    assert [x[0] for x in queue.pop_many(10)] == [a1, a2]
+    for frame in [a1, b1, c1, a2, d1]:
+        queue.push(frame)
+    assert queue.coalesced == 1 and queue.dropped == 1
+    assert [x[0] for x in queue.pop_many(10)] == [b1, c1, d1]
+    # Market status frames are never coalesced
+    status = struct.pack(">BBH", 9, 2, 6) + b"NORMAL"
+    for frame in [status, status, status, status]:
+        queue.push(frame)
+    assert queue.coalesced == 1 and queue.dropped == 2
+
+
+def test_pipeline():
+    """ Frames of an instrument are handled in order and handler errors are counted """
+    handled = dict()
+    lock = threading.Lock()
+
+    def handler(frame):
+        code, ltp = struct.unpack_from(">II", frame, 2)
+        if ltp == 0:
+            raise ValueError("Bad frame")
+        with lock:
+            handled.setdefault(code, []).append(ltp)
+
+    pipeline = TickPipeline(handler, workers=4, capacity=10000)
+    pipeline.start()
+    for ltp in range(1, 501):
+        for code in range(10):
+            pipeline.push(compact_packet(code, ltp / 100, 1635235200))
+    pipeline.push(compact_packet(3, 0, 1635235200))
+    pipeline.stop()
+    assert handled == {code: list(range(1, 501)) for code in range(10)}
+    stats = pipeline.get_stats()
+    assert stats["pushed"] == 5001 and stats["dropped"] == 0 and stats["errors"] == 1
+    assert stats["depth"] == 0 and stats["lag"]["count"] == 5001
+
+
+if __name__ == "__main__":
+    test_drop_oldest()
+    test_coalesce()
+    test_pipeline()
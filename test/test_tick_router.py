@@ -0,0 +1,136 @@
+"""
+File:           test_tick_router.py
+Author:         Dibyaranjan Sathua
+Created on:     29/10/21, 8:40 pm
+"""
+import datetime
+import threading
+import time
+from alice_blue_api.enums import OptionType
+from alice_blue_api.instruments import Instrument
+from alice_blue_api.tick_router import TickRouter
+
+
+EXPIRY = datetime.date(2021, 10, 28)
+NEXT_EXPIRY = datetime.date(2021, 11, 4)
+
+
+def get_option(underlying, expiry, strike, code):
+    """ Dummy call option """
+    return Instrument(
+        trading_symbol="", symbol=f"{underlying} OCT {strike}.0 CE", lot_size=None,
+        expiry=expiry, exchange_code=2, exchange="NFO", code=code, option_type=OptionType.CE,
+        strike=strike, index=False
+    )
+
+
+def test_routing():
+    """ Ticks reach the callbacks by code, underlying and expiry, including later instruments """
+    router = TickRouter()
+    nifty = get_option("NIFTY", EXPIRY, 18000, 101)
+    nifty_next = get_option("NIFTY", NEXT_EXPIRY, 18000, 102)
+    banknifty = get_option("BANKNIFTY", EXPIRY, 40000, 201)
+    router.add_instruments([nifty, banknifty])
+    received = {"code": [], "underlying": [], "expiry": [], "both": []}
+    router.subscribe(lambda *tick: received["code"].append(tick[0]), instruments=[banknifty])
+    router.subscribe(lambda *tick: received["underlying"].append(tick[0]), underlying="NIFTY")
+    router.subscribe(lambda *tick: received["expiry"].append(tick[0]), expiry=EXPIRY)
+    both = router.subscribe(
+        lambda *tick: received["both"].append(tick[0]), underlying="NIFTY", expiry=NEXT_EXPIRY
+    )
+    router.add_instruments([nifty_next])
+    for code in (101, 102, 201, 999):
+        router.update_tick(code, 100.0, 10, 1635235200)
+    assert received == {
+        "code": [201], "underlying": [101, 102], "expiry": [101, 201], "both": [102]
+    }
+    router.unsubscribe(both)
+    router.update_tick(102, 100.0, 10, 1635235200)
+    assert received["both"] == [102] and received["underlying"] == [101, 102, 102]
+
+
+def test_isolation():
+    """ Failing callback is counted, slow callback moves to its own thread """
+    router = TickRouter()
+    router.SLOW_CALL_SECONDS = 0.001
+    option = get_option("NIFTY", EXPIRY, 18000, 101)
+    fast_ticks = []
+    slow_ticks = []
+    slow_thread = []
+
+    def failing(*tick):
+        raise ValueError("Bad strategy")
+
+    def slow(*tick):
+        time.sleep(0.005)
+        slow_ticks.append(tick[1])
+        slow_thread.append(threading.current_thread())
+
+    router.subscribe(failing, instruments=[option])
+    slow_subscription = router.subscribe(slow, instruments=[option])
+    router.subscribe(lambda *tick: fast_ticks.append(tick[1]), instruments=[option])
+    for ltp in range(10):
+        router.update_tick(101, float(ltp), 10, 1635235200)
+    assert fast_ticks == list(range(10))
+    assert slow_subscription.isolated
+    router.unsubscribe(slow_subscription)
+    assert slow_ticks == list(range(10))
+    assert slow_thread[0] is threading.main_thread()
+    assert slow_thread[-1] is not threading.main_thread()
+    failing_stats, = router.get_stats()[:1]
+    assert failing_stats["calls"] == 10 and failing_stats["errors"] == 10
+    assert slow_subscription.get_stats()["slow_calls"] == 10
+
+
+def test_slow_rate():
+    """ Rare slow calls do not isolate a callback, one blocking call does """
+    router = TickRouter()
+    router.SLOW_CALL_SECONDS = 0.001
+    router.BLOCKING_CALL_SECONDS = 0.02
+    option = get_option("NIFTY", EXPIRY, 18000, 101)
+    calls = []
+
+    def pausing(*tick):
+        # Slow once in every five calls, like a GC pause
+        calls.append(tick[1])
+        if len(calls) % 5 == 0:
+            time.sleep(0.002)
+
+    def blocking(*tick):
+        if tick[1] == 1:
+            time.sleep(0.03)
+
+    pausing_subscription = router.subscribe(pausing, instruments=[option])
+    blocking_subscription = router.subscribe(blocking, instruments=[option])
+    for ltp in range(50):
+        router.update_tick(101, float(ltp), 10, 1635235200)
+    assert not pausing_subscription.isolated
+    assert pausing_subscription.get_stats()["slow_calls"] == 10
+    assert pausing_subscription.slow_rate < router.SLOW_RATE_LIMIT
+    assert blocking_subscription.isolated
+    router.unsubscribe(blocking_subscription)
+    assert blocking_subscription.calls == 50
+
+
+def test_threaded():
+    """ Threaded callback runs on its own thread from the first tick """
+    router = TickRouter()
+    option = get_option("NIFTY", EXPIRY, 18000, 101)
+    threads = []
+    subscription = router.subscribe(
+        lambda *tick: threads.append(threading.current_thread()), instruments=[option],
+        threaded=True
+    )
+    assert subscription.isolated
+    for ltp in range(5):
+        router.update_tick(101, float(ltp), 10, 1635235200)
+    router.unsubscribe(subscription)
+    assert len(threads) == 5
+    assert all(x is not threading.main_thread() for x in threads)
+
+
+if __name__ == "__main__":
+    test_routing()
+    test_isolation()
+    test_slow_rate()
+    test_threaded()
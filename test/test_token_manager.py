@@ -0,0 +1,145 @@
+"""
+File:           test_token_manager.py
+Author:         Dibyaranjan Sathua
+Created on:     23/10/21, 8:10 pm
+"""
+import datetime
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from alice_blue_api.timezone import IST
+from alice_blue_api.token_manager import TokenManager
+
+
+def slow_login(counter_path: str) -> str:
+    """ Login taking some time. Every login is appended to the counter file """
+    time.sleep(0.2)
+    with open(counter_path, "a") as fh_:
+        fh_.write(f"{os.getpid()}\n")
+    return f"token-{time.time()}"
+
+
+def get_token_in_process(cache_dir: str, counter_path: str, queue):
+    """ Token of a new process """
+    manager = TokenManager(cache_dir=cache_dir)
+    manager.register("user_access_token", lambda: slow_login(counter_path), ttl=3600)
+    queue.put(manager.get("user_access_token"))
+
+
+def test_token_cache():
+    """ Token is generated once and reused by a new manager till it expires """
+    with tempfile.TemporaryDirectory() as cache_dir:
+        counter_path = str(Path(cache_dir) / "logins")
+        manager = TokenManager(cache_dir=cache_dir)
+        manager.register("user_access_token", lambda: slow_login(counter_path), ttl=3600)
+        token = manager.get("user_access_token")
+        assert manager.get("user_access_token") == token
+        assert oct(os.stat(Path(cache_dir) / "user_access_token.json").st_mode)[-3:] == "600"
+        other = TokenManager(cache_dir=cache_dir)
+        other.register("user_access_token", lambda: slow_login(counter_path), ttl=3600)
+        assert other.get("user_access_token") == token
+        # Expired token is generated again
+        other._now = time.time() + 3601
+        assert other.get("user_access_token") != token
+        with open(counter_path) as fh_:
+            assert len(fh_.readlines()) == 2
+
+
+def test_single_flight():
+    """ Threads waiting for a login get the token of that login """
+    with tempfile.TemporaryDirectory() as cache_dir:
+        counter_path = str(Path(cache_dir) / "logins")
+        manager = TokenManager(cache_dir=cache_dir)
+        manager.register("user_access_token", lambda: slow_login(counter_path), ttl=3600)
+        tokens = []
+        threads = [
+            threading.Thread(target=lambda: tokens.append(manager.get("user_access_token")))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(set(tokens)) == 1 and len(tokens) == 8
+        with open(counter_path) as fh_:
+            assert len(fh_.readlines()) == 1
+
+
+def test_multi_process():
+    """ Processes starting together log in once """
+    with tempfile.TemporaryDirectory() as cache_dir:
+        counter_path = str(Path(cache_dir) / "logins")
+        queue = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(
+                target=get_token_in_process, args=(cache_dir, counter_path, queue)
+            )
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        tokens = [queue.get(timeout=10) for _ in processes]
+        for process in processes:
+            process.join()
+        assert len(set(tokens)) == 1
+        with open(counter_path) as fh_:
+            assert len(fh_.readlines()) == 1
+
+
+def test_background_refresh():
+    """ Token is refreshed before it expires without blocking get """
+    with tempfile.TemporaryDirectory() as cache_dir:
+        counter_path = str(Path(cache_dir) / "logins")
+        manager = TokenManager(cache_dir=cache_dir, refresh_before=0.5, retry_interval=0.1)
+        manager.register("user_access_token", lambda: slow_login(counter_path), ttl=1)
+        first = manager.get("user_access_token")
+        # Not due yet
+        assert 0 < manager.refresh_due() <= 0.5
+        manager.start()
+        token = manager.get_token("user_access_token")
+        deadline = time.time() + 5
+        while token.value == first and time.time() < deadline:
+            start = time.perf_counter()
+            assert manager.get("user_access_token")
+            assert time.perf_counter() - start < 0.05
+            time.sleep(0.05)
+            token = manager.get_token("user_access_token")
+        manager.stop()
+        assert token.value != first and token.is_valid(time.time())
+
+
+def test_daily_expiry():
+    """ Token expires at 08:00 IST and is refreshed at expiry, as a new token expires then too """
+    with tempfile.TemporaryDirectory() as cache_dir:
+        counter_path = str(Path(cache_dir) / "logins")
+        manager = TokenManager(cache_dir=cache_dir, refresh_before=1800)
+        manager.register(
+            "user_access_token", lambda: slow_login(counter_path), ttl=24 * 3600,
+            daily_expiry=datetime.time(hour=8, minute=0)
+        )
+        manager._now = datetime.datetime(2021, 10, 25, 7, 0, tzinfo=IST).timestamp()
+        first = manager.get("user_access_token")
+        expiry = datetime.datetime(2021, 10, 25, 8, 0, tzinfo=IST).timestamp()
+        assert manager.get_token("user_access_token").expires_at == expiry
+        manager._now = datetime.datetime(2021, 10, 25, 7, 45, tzinfo=IST).timestamp()
+        assert manager.refresh_due() > 0
+        assert manager.get("user_access_token") == first
+        manager._now = expiry
+        assert manager.refresh_due() > 0
+        token = manager.get_token("user_access_token")
+        assert token.value != first
+        assert token.expires_at == datetime.datetime(2021, 10, 26, 8, 0, tzinfo=IST).timestamp()
+        with open(counter_path) as fh_:
+            assert len(fh_.readlines()) == 2
+
+
+if __name__ == "__main__":
+    test_token_cache()
+    test_single_flight()
+    test_multi_process()
+    test_background_refresh()
+    test_daily_expiry()
@@ -0,0 +1,48 @@
+"""
+File:           test_vectorized_indicators.py
+Author:         Dibyaranjan Sathua
+Created on:     15/10/21, 10:05 pm
+"""
+import numpy as np
+from indicators.streaming import StreamingSMA, StreamingRSI, StreamingVWAP
+from indicators.vectorized import VectorizedSMA, VectorizedRSI, VectorizedVWAP
+from test.helpers.candles import get_candle_arrays
+
+
+def streaming_series(indicator, *columns):
+    """ Values of a streaming indicator fed bar by bar. NaN for None """
+    values = [indicator(*x) for x in zip(*columns)]
+    return np.array([np.nan if x is None else x for x in values])
+
+
+def test_vectorized_matches_streaming():
+    """ Vectorized indicators should be exactly equal to the streaming ones """
+    high, low, close, volume, timestamp = get_candle_arrays()
+    sma = VectorizedSMA(close, period=20).calc()
+    volume_sma = VectorizedSMA(volume, period=20).calc()
+    rsi = VectorizedRSI(close, period=14).calc()
+    vwap = VectorizedVWAP(high, low, close, volume, timestamp).calc()
+    for column in range(close.shape[1]):
+        columns = (
+            high[:, column].tolist(), low[:, column].tolist(), close[:, column].tolist(),
+            volume[:, column].tolist(), timestamp.tolist()
+        )
+        expected = streaming_series(StreamingSMA(20).update, *columns)
+        assert np.array_equal(sma[:, column], expected, equal_nan=True)
+        expected = streaming_series(StreamingSMA(20, source="volume").update, *columns)
+        assert np.array_equal(volume_sma[:, column], expected, equal_nan=True)
+        expected = streaming_series(StreamingRSI(14).update, *columns)
+        assert np.array_equal(rsi[:, column], expected, equal_nan=True)
+        # 1-D input takes a different code path
+        assert np.array_equal(
+            VectorizedRSI(close[:, column], period=14).calc(), expected, equal_nan=True
+        )
+        expected = streaming_series(StreamingVWAP().update, *columns)
+        assert np.array_equal(vwap[:, column], expected, equal_nan=True)
+    # Not enough bars
+    assert np.isnan(VectorizedRSI(close[:14], period=14).calc()).all()
+    assert np.isnan(VectorizedSMA(close[:19], period=20).calc()).all()
+
+
+if __name__ == "__main__":
+    test_vectorized_matches_streaming()